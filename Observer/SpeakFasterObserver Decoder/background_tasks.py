@@ -0,0 +1,218 @@
+"""Background tasks of the data manager GUI.
+
+Long operations (e.g., downloading or preprocessing a session) run on
+background threads, so that the window stays responsive. The tasks report
+their progress and completion by posting events, e.g., with the
+`write_event_value()` method of a PySimpleGUI window, whose event loop then
+updates the widgets on the main thread.
+
+Cancellation is cooperative: cancelling a task sets its `cancel_event`, which
+the operations check between units of work (e.g., files or sessions).
+
+Each task may lock a set of prefixes (e.g., session prefixes). Tasks whose
+prefixes overlap (one is a prefix of the other) can't run at the same time, so
+that independent sessions can be processed concurrently without two tasks
+operating on the same session.
+"""
+import itertools
+import threading
+import time
+
+# Event posted with the Task as the value when a task reports progress.
+TASK_PROGRESS_EVENT = "TASK_PROGRESS"
+# Event posted with the Task as the value when a task finishes.
+TASK_DONE_EVENT = "TASK_DONE"
+# Event posted with a pending call as the value when a background thread needs
+# a function to be called on the main thread. See MainThreadCaller.
+MAIN_THREAD_CALL_EVENT = "MAIN_THREAD_CALL"
+
+# Maximum number of tasks that run at the same time. Additional tasks wait.
+DEFAULT_MAX_CONCURRENT_TASKS = 4
+# Minimum interval between progress events of a task, in seconds.
+PROGRESS_INTERVAL_S = 0.25
+
+
+def _prefixes_overlap(prefix1, prefix2):
+  return prefix1.startswith(prefix2) or prefix2.startswith(prefix1)
+
+
+class Task(object):
+  """A background task. Passed to the task function."""
+
+  def __init__(self, task_id, name, locked_prefixes, post_event,
+               on_done=None, clock=time.time):
+    self.task_id = task_id
+    self.name = name
+    self.locked_prefixes = frozenset(locked_prefixes)
+    self.on_done = on_done
+    self.cancel_event = threading.Event()
+    self.progress_message = None
+    # Set when the task is done.
+    self.result = None
+    self.error = None
+    self._post_event = post_event
+    self._clock = clock
+    self._last_progress_time = None
+
+  def is_cancelled(self):
+    return self.cancel_event.is_set()
+
+  def report_progress(self, message, force=False):
+    """Report the progress of the task.
+
+    Progress events are rate-limited to one per PROGRESS_INTERVAL_S, unless
+    force is True.
+    """
+    self.progress_message = message
+    now = self._clock()
+    if (not force and self._last_progress_time is not None and
+        now - self._last_progress_time < PROGRESS_INTERVAL_S):
+      return
+    self._last_progress_time = now
+    self._post_event(TASK_PROGRESS_EVENT, self)
+
+
+class TaskRunner(object):
+  """Runs tasks on background threads. Thread-safe."""
+
+  def __init__(self, post_event,
+               max_concurrent_tasks=DEFAULT_MAX_CONCURRENT_TASKS):
+    """Create a TaskRunner.
+
+    Args:
+      post_event: Function that posts an event. Called with the event key and
+        the value, from background threads.
+      max_concurrent_tasks: Maximum number of tasks that run at the same time.
+    """
+    if max_concurrent_tasks < 1:
+      raise ValueError(
+          "max_concurrent_tasks must be a positive integer, got %s" %
+          max_concurrent_tasks)
+    self._post_event = post_event
+    self._semaphore = threading.BoundedSemaphore(max_concurrent_tasks)
+    self._lock = threading.Lock()
+    self._task_ids = itertools.count(1)
+    # Maps task ID to Task, for the tasks that aren't done yet.
+    self._tasks = dict()
+
+  def submit(self, name, fn, locked_prefixes=(), on_done=None):
+    """Start a task.
+
+    Args:
+      name: Human-readable name of the task, e.g., for a status bar.
+      fn: The function that performs the task. Called with the Task as the
+        only argument, on a background thread. Its return value is stored as
+        the result of the task. If it raises an exception, the exception is
+        stored as the error of the task.
+      locked_prefixes: Prefixes (e.g., of sessions) that no other task may
+        operate on while this task is running.
+      on_done: Optional function stored as the on_done attribute of the Task,
+        for the event loop to call with the Task on TASK_DONE_EVENT. It is
+        not called by the TaskRunner.
+
+    Returns:
+      The Task.
+
+    Raises:
+      ValueError: if any of locked_prefixes overlaps with the locked prefixes
+        of an unfinished task.
+    """
+    with self._lock:
+      for other_task in self._tasks.values():
+        for prefix in locked_prefixes:
+          for other_prefix in other_task.locked_prefixes:
+            if _prefixes_overlap(prefix, other_prefix):
+              raise ValueError(
+                  "Cannot start \"%s\" while \"%s\" is running on %s" %
+                  (name, other_task.name, other_prefix))
+      task = Task(next(self._task_ids), name, locked_prefixes,
+                  self._post_event, on_done=on_done)
+      self._tasks[task.task_id] = task
+    # Daemon threads, so that unfinished tasks don't keep the process alive
+    # after the window is closed.
+    threading.Thread(target=self._run, args=(task, fn), daemon=True).start()
+    return task
+
+  def _run(self, task, fn):
+    with self._semaphore:
+      try:
+        if not task.is_cancelled():
+          task.result = fn(task)
+      except Exception as e:
+        print("Task \"%s\" failed: %s" % (task.name, e))
+        task.error = e
+    with self._lock:
+      del self._tasks[task.task_id]
+    self._post_event(TASK_DONE_EVENT, task)
+
+  def cancel(self, task_id=None):
+    """Request cancellation of a task, or of all tasks if task_id is None."""
+    with self._lock:
+      for task in self._tasks.values():
+        if task_id is None or task.task_id == task_id:
+          task.cancel_event.set()
+
+  def get_running_tasks(self):
+    """Get the tasks that aren't done yet, in the order they were started."""
+    with self._lock:
+      return [self._tasks[task_id] for task_id in sorted(self._tasks)]
+
+
+class _PendingCall(object):
+
+  def __init__(self, fn, args, kwargs):
+    self._fn = fn
+    self._args = args
+    self._kwargs = kwargs
+    self._done = threading.Event()
+    self._result = None
+    self._error = None
+
+  def run(self):
+    try:
+      self._result = self._fn(*self._args, **self._kwargs)
+    except Exception as e:
+      self._error = e
+    finally:
+      self._done.set()
+
+  def wait(self):
+    self._done.wait()
+    if self._error is not None:
+      raise self._error
+    return self._result
+
+
+class MainThreadCaller(object):
+  """Runs functions (e.g., popups) on the main thread for background threads.
+
+  Must be created on the main thread. The event loop of the main thread must
+  call `run_pending_call()` with the value of each MAIN_THREAD_CALL_EVENT.
+  """
+
+  def __init__(self):
+    self._main_thread = threading.current_thread()
+    self._post_event = None
+
+  def set_post_event(self, post_event):
+    """Set the function that posts events to the main thread's event loop."""
+    self._post_event = post_event
+
+  def wrap(self, fn):
+    """Get a function that calls fn on the main thread and waits for it."""
+
+    def call_on_main_thread(*args, **kwargs):
+      if threading.current_thread() is self._main_thread:
+        return fn(*args, **kwargs)
+      if self._post_event is None:
+        raise ValueError("Cannot call %s from a background thread before "
+                         "set_post_event() is called" % fn)
+      pending_call = _PendingCall(fn, args, kwargs)
+      self._post_event(MAIN_THREAD_CALL_EVENT, pending_call)
+      return pending_call.wait()
+
+    return call_on_main_thread
+
+  @staticmethod
+  def run_pending_call(pending_call):
+    pending_call.run()
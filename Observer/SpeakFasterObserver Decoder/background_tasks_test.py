@@ -0,0 +1,168 @@
+"""Unit tests for the background_tasks module."""
+import queue
+import threading
+
+import tensorflow as tf
+
+import background_tasks
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.time = 1000.0
+
+  def __call__(self):
+    return self.time
+
+
+class EventQueue(object):
+  """Collects posted events, like the event queue of a window."""
+
+  def __init__(self):
+    self._queue = queue.Queue()
+
+  def post_event(self, key, value):
+    self._queue.put((key, value))
+
+  def get(self, timeout=10):
+    return self._queue.get(timeout=timeout)
+
+  def wait_for(self, key, timeout=10):
+    while True:
+      event_key, value = self.get(timeout=timeout)
+      if event_key == key:
+        return value
+
+
+class TaskTest(tf.test.TestCase):
+
+  def testReportProgress_isRateLimited(self):
+    events = []
+    clock = FakeClock()
+    task = background_tasks.Task(
+        1, "Test task", (), lambda key, value: events.append(key),
+        clock=clock)
+    task.report_progress("1 of 3")
+    task.report_progress("2 of 3")
+    self.assertEqual(events, [background_tasks.TASK_PROGRESS_EVENT])
+    self.assertEqual(task.progress_message, "2 of 3")
+    task.report_progress("3 of 3", force=True)
+    self.assertLen(events, 2)
+    clock.time += background_tasks.PROGRESS_INTERVAL_S
+    task.report_progress("Done")
+    self.assertLen(events, 3)
+
+
+class TaskRunnerTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(TaskRunnerTest, self).setUp()
+    self._events = EventQueue()
+    self._runner = background_tasks.TaskRunner(self._events.post_event)
+
+  def testSubmit_postsDoneEventWithResult(self):
+    on_done = lambda task: None
+    task = self._runner.submit("Add", lambda task: 1 + 2, on_done=on_done)
+    done_task = self._events.wait_for(background_tasks.TASK_DONE_EVENT)
+    self.assertIs(done_task, task)
+    self.assertEqual(done_task.result, 3)
+    self.assertIsNone(done_task.error)
+    self.assertIs(done_task.on_done, on_done)
+    self.assertEqual(self._runner.get_running_tasks(), [])
+
+  def testSubmit_storesError(self):
+
+    def fail(task):
+      raise ValueError("Failed")
+
+    self._runner.submit("Fail", fail)
+    done_task = self._events.wait_for(background_tasks.TASK_DONE_EVENT)
+    self.assertIsNone(done_task.result)
+    self.assertIsInstance(done_task.error, ValueError)
+
+  def testSubmit_overlappingLockedPrefixes_raisesValueError(self):
+    release = threading.Event()
+    self._runner.submit(
+        "Download", lambda task: release.wait(), locked_prefixes=("a/s1/",))
+    with self.assertRaisesRegex(ValueError, r"while \"Download\" is running"):
+      self._runner.submit("Batch", lambda task: None, locked_prefixes=("a/",))
+    # A non-overlapping prefix can run concurrently.
+    self._runner.submit(
+        "Preprocess", lambda task: None, locked_prefixes=("a/s2/",))
+    self.assertEqual(
+        self._events.wait_for(background_tasks.TASK_DONE_EVENT).name,
+        "Preprocess")
+    release.set()
+    self._events.wait_for(background_tasks.TASK_DONE_EVENT)
+    # The lock is released once the task is done.
+    self._runner.submit("Batch", lambda task: None, locked_prefixes=("a/",))
+    self._events.wait_for(background_tasks.TASK_DONE_EVENT)
+
+  def testCancel_setsCancelEvent(self):
+    started = threading.Event()
+
+    def wait_for_cancellation(task):
+      started.set()
+      task.cancel_event.wait()
+      return "Cancelled"
+
+    task = self._runner.submit("Wait", wait_for_cancellation)
+    started.wait()
+    self.assertEqual(self._runner.get_running_tasks(), [task])
+    self._runner.cancel()
+    done_task = self._events.wait_for(background_tasks.TASK_DONE_EVENT)
+    self.assertTrue(done_task.is_cancelled())
+    self.assertEqual(done_task.result, "Cancelled")
+
+  def testInvalidMaxConcurrentTasks_raisesValueError(self):
+    with self.assertRaises(ValueError):
+      background_tasks.TaskRunner(self._events.post_event,
+                                  max_concurrent_tasks=0)
+
+
+class MainThreadCallerTest(tf.test.TestCase):
+
+  def testWrap_onMainThread_callsDirectly(self):
+    caller = background_tasks.MainThreadCaller()
+    self.assertEqual(caller.wrap(lambda x: x * 2)(21), 42)
+
+  def testWrap_onBackgroundThread_callsOnMainThread(self):
+    events = EventQueue()
+    caller = background_tasks.MainThreadCaller()
+    caller.set_post_event(events.post_event)
+    calling_threads = []
+
+    def double(x):
+      calling_threads.append(threading.current_thread())
+      return x * 2
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(caller.wrap(double)(x=21)))
+    thread.start()
+    key, pending_call = events.get()
+    self.assertEqual(key, background_tasks.MAIN_THREAD_CALL_EVENT)
+    background_tasks.MainThreadCaller.run_pending_call(pending_call)
+    thread.join()
+    self.assertEqual(results, [42])
+    self.assertEqual(calling_threads, [threading.current_thread()])
+
+  def testWrap_onBackgroundThreadBeforeSetPostEvent_raisesValueError(self):
+    caller = background_tasks.MainThreadCaller()
+    errors = []
+
+    def call():
+      try:
+        caller.wrap(lambda: None)()
+      except ValueError as e:
+        errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    thread.join()
+    self.assertLen(errors, 1)
+
+
+if __name__ == "__main__":
+  tf.test.main()
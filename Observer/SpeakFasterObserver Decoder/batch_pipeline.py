@@ -0,0 +1,190 @@
+"""Staged pipeline for processing a batch of items (e.g., sessions).
+
+Each item passes through a fixed sequence of stages (e.g., download,
+preprocess and upload). Every stage has its own pool of worker threads and the
+stages are connected by bounded queues, so that different stages work on
+different items at the same time: while session N is being preprocessed,
+session N+1 can be downloaded and session N-1 uploaded.
+"""
+import collections
+import queue
+import threading
+import time
+
+# Marks the end of the items in a queue between stages.
+_END = object()
+
+
+class Stage(object):
+  """A stage of the pipeline."""
+
+  def __init__(self, name, fn, num_workers=1):
+    """Create a Stage.
+
+    Args:
+      name: Name of the stage, used in the report.
+      fn: A function that processes an item in this stage. It takes the item as
+        the only argument. Its return value is ignored. If it raises an
+        exception, the item is marked as failed and is not passed to the
+        subsequent stages.
+      num_workers: Number of items processed concurrently in this stage.
+    """
+    if num_workers < 1:
+      raise ValueError(
+          "num_workers must be a positive integer, got %s" % num_workers)
+    self.name = name
+    self.fn = fn
+    self.num_workers = num_workers
+
+
+class PipelineReport(object):
+  """Throughput report of a pipeline run."""
+
+  def __init__(self, stage_names):
+    self._lock = threading.Lock()
+    self.num_items = 0
+    self.num_completed = 0
+    # Number of items skipped due to cancellation.
+    self.num_cancelled = 0
+    # Maps item to error message.
+    self.failures = collections.OrderedDict()
+    self.elapsed_s = 0.0
+    self.stage_busy_s = collections.OrderedDict(
+        (name, 0.0) for name in stage_names)
+    self.stage_num_items = collections.OrderedDict(
+        (name, 0) for name in stage_names)
+
+  def _add_stage_time(self, stage_name, busy_s):
+    with self._lock:
+      self.stage_busy_s[stage_name] += busy_s
+      self.stage_num_items[stage_name] += 1
+
+  def _add_failure(self, item, stage_name, error):
+    with self._lock:
+      self.failures[item] = "%s: %s" % (stage_name, error)
+
+  def _add_completed(self):
+    with self._lock:
+      self.num_completed += 1
+
+  def _add_cancelled(self):
+    with self._lock:
+      self.num_cancelled += 1
+
+  @property
+  def items_per_hour(self):
+    if self.elapsed_s <= 0:
+      return 0.0
+    return self.num_completed / self.elapsed_s * 3600
+
+  def to_dict(self):
+    return {
+        "num_items": self.num_items,
+        "num_completed": self.num_completed,
+        "num_cancelled": self.num_cancelled,
+        "failures": {str(item): error for item, error in self.failures.items()},
+        "elapsed_s": self.elapsed_s,
+        "items_per_hour": self.items_per_hour,
+        "stage_busy_s": dict(self.stage_busy_s),
+        "stage_num_items": dict(self.stage_num_items),
+    }
+
+  def __str__(self):
+    lines = ["=== Batch pipeline report ===",
+             "%d of %d item(s) completed in %.1f s (%.2f items/hour)" % (
+                 self.num_completed, self.num_items, self.elapsed_s,
+                 self.items_per_hour)]
+    if self.num_cancelled:
+      lines.append("%d item(s) cancelled" % self.num_cancelled)
+    for stage_name, busy_s in self.stage_busy_s.items():
+      num_items = self.stage_num_items[stage_name]
+      lines.append("  %s: %d item(s), %.1f s busy (%.1f s/item)" % (
+          stage_name, num_items, busy_s,
+          (busy_s / num_items) if num_items else 0.0))
+    for item, error in self.failures.items():
+      lines.append("  FAILED: %s (%s)" % (item, error))
+    return "\n".join(lines)
+
+
+def run_pipeline(items, stages, cancel_event=None, progress_callback=None):
+  """Run items through the stages of a pipeline.
+
+  Args:
+    items: A sequence of items. Items enter the first stage in this order.
+    stages: A non-empty sequence of Stage objects.
+    cancel_event: Optional threading.Event. Once it is set, items are no
+      longer passed to any stage and are counted as cancelled. Stages that
+      are already running on an item are not interrupted.
+    progress_callback: Optional function to be called with the PipelineReport
+      as the only argument whenever an item has completed, failed or been
+      cancelled.
+
+  Returns:
+    A PipelineReport.
+  """
+  if not stages:
+    raise ValueError("stages must not be empty")
+  report = PipelineReport([stage.name for stage in stages])
+  report.num_items = len(items)
+  # The first queue holds all the items. The queues between stages are bounded
+  # by the number of workers of the consuming stage, so that an upstream stage
+  # (e.g., downloading) doesn't run far ahead of a slower downstream stage.
+  queues = [queue.Queue()]
+  for stage in stages[1:]:
+    queues.append(queue.Queue(maxsize=stage.num_workers))
+  for item in items:
+    queues[0].put(item)
+  for _ in range(stages[0].num_workers):
+    queues[0].put(_END)
+
+  num_active_workers = [stage.num_workers for stage in stages]
+  active_workers_lock = threading.Lock()
+
+  def work(stage_index):
+    stage = stages[stage_index]
+    input_queue = queues[stage_index]
+    is_last_stage = stage_index == len(stages) - 1
+    while True:
+      item = input_queue.get()
+      if item is _END:
+        break
+      if cancel_event is not None and cancel_event.is_set():
+        report._add_cancelled()
+        if progress_callback:
+          progress_callback(report)
+        continue
+      t0 = time.time()
+      try:
+        stage.fn(item)
+      except Exception as e:
+        print("Failed to run stage %s on %s: %s" % (stage.name, item, e))
+        report._add_failure(item, stage.name, e)
+        if progress_callback:
+          progress_callback(report)
+        continue
+      finally:
+        report._add_stage_time(stage.name, time.time() - t0)
+      if is_last_stage:
+        report._add_completed()
+        if progress_callback:
+          progress_callback(report)
+      else:
+        queues[stage_index + 1].put(item)
+    with active_workers_lock:
+      num_active_workers[stage_index] -= 1
+      is_last_worker = num_active_workers[stage_index] == 0
+    if is_last_worker and not is_last_stage:
+      for _ in range(stages[stage_index + 1].num_workers):
+        queues[stage_index + 1].put(_END)
+
+  t0 = time.time()
+  threads = []
+  for stage_index, stage in enumerate(stages):
+    for _ in range(stage.num_workers):
+      thread = threading.Thread(target=work, args=(stage_index,), daemon=True)
+      thread.start()
+      threads.append(thread)
+  for thread in threads:
+    thread.join()
+  report.elapsed_s = time.time() - t0
+  return report
@@ -0,0 +1,135 @@
+"""Unit tests for the batch_pipeline module."""
+import threading
+import time
+
+import tensorflow as tf
+
+import batch_pipeline
+
+
+class RunPipelineTest(tf.test.TestCase):
+
+  def testAllItemsPassThroughAllStagesInOrder(self):
+    calls = []
+    lock = threading.Lock()
+
+    def make_fn(stage_name):
+      def fn(item):
+        with lock:
+          calls.append((stage_name, item))
+      return fn
+
+    report = batch_pipeline.run_pipeline(
+        ["s1", "s2", "s3"],
+        [batch_pipeline.Stage("download", make_fn("download")),
+         batch_pipeline.Stage("preprocess", make_fn("preprocess")),
+         batch_pipeline.Stage("upload", make_fn("upload"))])
+
+    self.assertEqual(report.num_items, 3)
+    self.assertEqual(report.num_completed, 3)
+    self.assertEmpty(report.failures)
+    for item in ("s1", "s2", "s3"):
+      self.assertEqual(
+          [stage for stage, i in calls if i == item],
+          ["download", "preprocess", "upload"])
+    self.assertEqual(list(report.stage_num_items.values()), [3, 3, 3])
+    self.assertGreater(report.items_per_hour, 0)
+
+  def testStagesOverlap(self):
+    # The second stage of item 1 must be able to run while the first stage
+    # of item 2 is running.
+    second_stage_started = threading.Event()
+    overlapped = []
+
+    def first_stage(item):
+      if item == 2:
+        overlapped.append(second_stage_started.wait(timeout=5))
+
+    def second_stage(item):
+      if item == 1:
+        second_stage_started.set()
+
+    report = batch_pipeline.run_pipeline(
+        [1, 2],
+        [batch_pipeline.Stage("first", first_stage),
+         batch_pipeline.Stage("second", second_stage)])
+
+    self.assertEqual(overlapped, [True])
+    self.assertEqual(report.num_completed, 2)
+
+  def testNumWorkersLimitsConcurrencyPerStage(self):
+    lock = threading.Lock()
+    state = {"active": 0, "max_active": 0}
+
+    def slow_stage(item):
+      with lock:
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+      time.sleep(0.01)
+      with lock:
+        state["active"] -= 1
+
+    report = batch_pipeline.run_pipeline(
+        list(range(12)),
+        [batch_pipeline.Stage("fast", lambda item: None, num_workers=4),
+         batch_pipeline.Stage("slow", slow_stage, num_workers=3)])
+
+    self.assertEqual(report.num_completed, 12)
+    self.assertLessEqual(state["max_active"], 3)
+
+  def testFailedItemIsNotPassedToLaterStages(self):
+    uploaded = []
+
+    def preprocess(item):
+      if item == "bad":
+        raise ValueError("ASR failed")
+
+    report = batch_pipeline.run_pipeline(
+        ["good", "bad"],
+        [batch_pipeline.Stage("preprocess", preprocess),
+         batch_pipeline.Stage("upload", uploaded.append)])
+
+    self.assertEqual(uploaded, ["good"])
+    self.assertEqual(report.num_completed, 1)
+    self.assertEqual(report.failures, {"bad": "preprocess: ASR failed"})
+    self.assertIn("FAILED: bad", str(report))
+
+  def testCancellation_skipsRemainingItems(self):
+    cancel_event = threading.Event()
+    uploaded = []
+    progress = []
+
+    def download(item):
+      if item == "s2":
+        cancel_event.set()
+
+    report = batch_pipeline.run_pipeline(
+        ["s1", "s2", "s3"],
+        [batch_pipeline.Stage("download", download),
+         batch_pipeline.Stage("upload", uploaded.append)],
+        cancel_event=cancel_event,
+        progress_callback=lambda r: progress.append(
+            r.num_completed + r.num_cancelled))
+
+    # s1 may or may not have reached the upload stage before cancellation.
+    self.assertIn(uploaded, ([], ["s1"]))
+    self.assertEqual(report.num_completed + report.num_cancelled, 3)
+    self.assertGreaterEqual(report.num_cancelled, 2)
+    self.assertEqual(progress[-1], 3)
+    self.assertIn("cancelled", str(report))
+
+  def testEmptyItems(self):
+    report = batch_pipeline.run_pipeline(
+        [], [batch_pipeline.Stage("download", lambda item: None)])
+    self.assertEqual(report.num_completed, 0)
+    self.assertEqual(report.items_per_hour, 0.0)
+
+  def testInvalidArguments_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "num_workers"):
+      batch_pipeline.Stage("download", lambda item: None, num_workers=0)
+    with self.assertRaisesRegex(ValueError, "stages"):
+      batch_pipeline.run_pipeline(["s1"], [])
+
+
+if __name__ == "__main__":
+  tf.test.main()
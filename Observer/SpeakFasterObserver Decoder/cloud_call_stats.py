@@ -0,0 +1,396 @@
+"""Instrumentation of the calls made to S3 and GCS.
+
+`CallStats` records, for each service and operation (e.g., "s3" and
+"get_object"), the number of calls, the number of failed calls, the number of
+bytes transferred and a histogram of the call latencies.
+
+`InstrumentedS3Client` and `InstrumentedStorageClient` wrap a boto3 S3 client
+and a google.cloud.storage.Client, respectively, and record every call made
+through them. Each page fetched by an S3 paginator counts as one call of the
+paginated operation. The managed transfers of boto3 (e.g., `download_file`,
+which may make several requests under the hood) count as one call each, with
+the bytes reported to their callbacks.
+"""
+import collections
+import json
+import os
+import threading
+import time
+
+SERVICE_S3 = "s3"
+SERVICE_GCS = "gcs"
+
+# Upper bounds of the latency histogram buckets, in seconds. The last bucket
+# holds the latencies above the last bound.
+LATENCY_BUCKET_BOUNDS_S = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _get_bucket_labels():
+  labels = ["<=%gs" % bound for bound in LATENCY_BUCKET_BOUNDS_S]
+  labels.append(">%gs" % LATENCY_BUCKET_BOUNDS_S[-1])
+  return labels
+
+
+def _format_bytes(num_bytes):
+  if num_bytes < 1024:
+    return "%d B" % num_bytes
+  for unit in ("KB", "MB", "GB"):
+    num_bytes /= 1024
+    if num_bytes < 1024 or unit == "GB":
+      return "%.1f %s" % (num_bytes, unit)
+
+
+class _OperationStats(object):
+
+  def __init__(self):
+    self.num_calls = 0
+    self.num_errors = 0
+    self.num_bytes = 0
+    self.total_latency_s = 0.0
+    self.max_latency_s = 0.0
+    self.latency_histogram = [0] * (len(LATENCY_BUCKET_BOUNDS_S) + 1)
+
+  def add(self, latency_s, num_bytes, is_error):
+    self.num_calls += 1
+    if is_error:
+      self.num_errors += 1
+    self.num_bytes += num_bytes
+    self.total_latency_s += latency_s
+    self.max_latency_s = max(self.max_latency_s, latency_s)
+    index = len(LATENCY_BUCKET_BOUNDS_S)
+    for i, bound in enumerate(LATENCY_BUCKET_BOUNDS_S):
+      if latency_s <= bound:
+        index = i
+        break
+    self.latency_histogram[index] += 1
+
+  def to_dict(self):
+    return {
+        "num_calls": self.num_calls,
+        "num_errors": self.num_errors,
+        "num_bytes": self.num_bytes,
+        "total_latency_s": self.total_latency_s,
+        "mean_latency_s": (self.total_latency_s / self.num_calls
+                           if self.num_calls else 0.0),
+        "max_latency_s": self.max_latency_s,
+        "latency_histogram": collections.OrderedDict(
+            zip(_get_bucket_labels(), self.latency_histogram)),
+    }
+
+
+class CallStats(object):
+  """Statistics of the calls made to cloud services. Thread-safe."""
+
+  def __init__(self, clock=time.time):
+    """Create an empty CallStats.
+
+    Args:
+      clock: Function that returns the current time in seconds.
+    """
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._start_time = clock()
+    # Maps (service, operation) to _OperationStats.
+    self._stats = dict()
+
+  def record(self, service, operation, latency_s, num_bytes=0,
+             is_error=False):
+    """Record a call.
+
+    Args:
+      service: Name of the service, e.g., SERVICE_S3.
+      operation: Name of the operation, e.g., "get_object".
+      latency_s: Latency of the call, in seconds.
+      num_bytes: Number of bytes transferred by the call.
+      is_error: Whether the call failed.
+    """
+    with self._lock:
+      key = (service, operation)
+      if key not in self._stats:
+        self._stats[key] = _OperationStats()
+      self._stats[key].add(latency_s, num_bytes, is_error)
+
+  def time_call(self, service, operation, fn, *args, **kwargs):
+    """Call a function and time the call.
+
+    Failed calls are recorded as errors. Successful calls are left to the
+    caller to record, since their number of bytes may depend on the result.
+
+    Returns:
+      A (result, latency_s) tuple.
+    """
+    t0 = self._clock()
+    try:
+      result = fn(*args, **kwargs)
+    except Exception:
+      self.record(service, operation, self._clock() - t0, is_error=True)
+      raise
+    return result, self._clock() - t0
+
+  def get_total_calls(self):
+    with self._lock:
+      return sum(stats.num_calls for stats in self._stats.values())
+
+  def summary(self):
+    """Get a one-line summary, e.g., for a status bar."""
+    with self._lock:
+      service_calls = collections.OrderedDict()
+      service_bytes = collections.Counter()
+      for (service, operation), stats in sorted(self._stats.items()):
+        service_calls.setdefault(service, []).append(
+            (stats.num_calls, operation))
+        service_bytes[service] += stats.num_bytes
+    if not service_calls:
+      return "No cloud calls"
+    items = []
+    for service, calls in service_calls.items():
+      total_calls = sum(num_calls for num_calls, _ in calls)
+      top_calls = ", ".join(
+          "%s %d" % (operation, num_calls)
+          for num_calls, operation in sorted(calls, reverse=True)[:3])
+      items.append("%s: %d calls (%s), %s" % (
+          service.upper(), total_calls, top_calls,
+          _format_bytes(service_bytes[service])))
+    return "; ".join(items)
+
+  def to_dict(self):
+    """Get the statistics as a JSON-serializable dict."""
+    with self._lock:
+      operations = collections.OrderedDict()
+      for (service, operation), stats in sorted(self._stats.items()):
+        operations.setdefault(service, collections.OrderedDict())[
+            operation] = stats.to_dict()
+      return {
+          "elapsed_s": self._clock() - self._start_time,
+          "operations": operations,
+      }
+
+  def write_json(self, json_path):
+    """Write the statistics to a JSON file."""
+    with open(json_path, "wt") as f:
+      json.dump(self.to_dict(), f, indent=2)
+    print("Wrote cloud call statistics to %s" % json_path)
+
+
+def _get_body_size(body):
+  if isinstance(body, (bytes, bytearray)):
+    return len(body)
+  elif isinstance(body, str):
+    return len(body.encode("utf-8"))
+  return 0
+
+
+class _InstrumentedProxy(object):
+  """Base class of the proxies that record the calls made through them.
+
+  Methods that aren't overridden by subclasses are recorded under their own
+  names, without bytes. Other attributes are passed through.
+  """
+
+  def __init__(self, wrapped, call_stats, service, operation_prefix=""):
+    object.__setattr__(self, "_wrapped", wrapped)
+    object.__setattr__(self, "_call_stats", call_stats)
+    object.__setattr__(self, "_service", service)
+    object.__setattr__(self, "_operation_prefix", operation_prefix)
+
+  @property
+  def wrapped(self):
+    return self._wrapped
+
+  def _call(self, operation, fn, *args, **kwargs):
+    """Call fn and time the call. Returns (result, latency_s)."""
+    return self._call_stats.time_call(
+        self._service, self._operation_prefix + operation, fn, *args,
+        **kwargs)
+
+  def _record(self, operation, latency_s, num_bytes=0):
+    self._call_stats.record(
+        self._service, self._operation_prefix + operation, latency_s,
+        num_bytes=num_bytes)
+
+  def _call_and_record(self, operation, fn, *args, **kwargs):
+    result, latency_s = self._call(operation, fn, *args, **kwargs)
+    self._record(operation, latency_s)
+    return result
+
+  def __getattr__(self, name):
+    attr = getattr(self._wrapped, name)
+    if name.startswith("_") or not callable(attr):
+      return attr
+
+    def instrumented(*args, **kwargs):
+      return self._call_and_record(name, attr, *args, **kwargs)
+
+    return instrumented
+
+  def __setattr__(self, name, value):
+    setattr(self._wrapped, name, value)
+
+
+class _CallbackByteCounter(object):
+  """Wraps a boto3 transfer Callback and sums the bytes reported to it."""
+
+  def __init__(self, callback):
+    self._callback = callback
+    self._lock = threading.Lock()
+    self.num_bytes = 0
+
+  def __call__(self, num_bytes):
+    with self._lock:
+      self.num_bytes += num_bytes
+    if self._callback:
+      self._callback(num_bytes)
+
+
+class InstrumentedS3Client(_InstrumentedProxy):
+  """Wraps a boto3 S3 client and records the calls made through it."""
+
+  def __init__(self, s3_client, call_stats):
+    super(InstrumentedS3Client, self).__init__(
+        s3_client, call_stats, SERVICE_S3)
+
+  def _transfer(self, operation, fn, *args, **kwargs):
+    counter = _CallbackByteCounter(kwargs.get("Callback"))
+    kwargs["Callback"] = counter
+    result, latency_s = self._call(operation, fn, *args, **kwargs)
+    self._record(operation, latency_s, num_bytes=counter.num_bytes)
+    return result
+
+  def download_file(self, *args, **kwargs):
+    return self._transfer(
+        "download_file", self._wrapped.download_file, *args, **kwargs)
+
+  def download_fileobj(self, *args, **kwargs):
+    return self._transfer(
+        "download_fileobj", self._wrapped.download_fileobj, *args, **kwargs)
+
+  def upload_file(self, *args, **kwargs):
+    return self._transfer(
+        "upload_file", self._wrapped.upload_file, *args, **kwargs)
+
+  def get_object(self, **kwargs):
+    response, latency_s = self._call(
+        "get_object", self._wrapped.get_object, **kwargs)
+    self._record("get_object", latency_s,
+                 num_bytes=response.get("ContentLength", 0))
+    return response
+
+  def put_object(self, **kwargs):
+    response, latency_s = self._call(
+        "put_object", self._wrapped.put_object, **kwargs)
+    self._record("put_object", latency_s,
+                 num_bytes=_get_body_size(kwargs.get("Body")))
+    return response
+
+  def get_paginator(self, operation_name):
+    return _InstrumentedPaginator(
+        self._wrapped.get_paginator(operation_name), self, operation_name)
+
+
+class _InstrumentedPaginator(object):
+  """Records each page fetched by a boto3 paginator as a call."""
+
+  def __init__(self, paginator, s3_client, operation_name):
+    self._paginator = paginator
+    self._s3_client = s3_client
+    self._operation_name = operation_name
+
+  def paginate(self, **kwargs):
+    pages = iter(self._paginator.paginate(**kwargs))
+    while True:
+      page, latency_s = self._s3_client._call(
+          self._operation_name, next, pages, None)
+      if page is None:
+        return
+      self._s3_client._record(self._operation_name, latency_s)
+      yield page
+
+
+class InstrumentedStorageClient(_InstrumentedProxy):
+  """Wraps a google.cloud.storage.Client and records the calls made through it.
+
+  Buckets and blobs obtained from the client are wrapped too.
+  """
+
+  def __init__(self, storage_client, call_stats):
+    super(InstrumentedStorageClient, self).__init__(
+        storage_client, call_stats, SERVICE_GCS)
+
+  def bucket(self, bucket_name, *args, **kwargs):
+    return _InstrumentedBucket(
+        self._wrapped.bucket(bucket_name, *args, **kwargs), self._call_stats)
+
+  def get_bucket(self, bucket_or_name, *args, **kwargs):
+    bucket = self._call_and_record(
+        "get_bucket", self._wrapped.get_bucket, _unwrap(bucket_or_name),
+        *args, **kwargs)
+    return _InstrumentedBucket(bucket, self._call_stats)
+
+  def create_bucket(self, bucket_or_name, *args, **kwargs):
+    bucket = self._call_and_record(
+        "create_bucket", self._wrapped.create_bucket, _unwrap(bucket_or_name),
+        *args, **kwargs)
+    return _InstrumentedBucket(bucket, self._call_stats)
+
+  def list_blobs(self, bucket_or_name, *args, **kwargs):
+    """List blobs. The whole listing is recorded as a single call."""
+    blobs = self._call_and_record(
+        "list_blobs",
+        lambda: list(self._wrapped.list_blobs(
+            _unwrap(bucket_or_name), *args, **kwargs)))
+    return [_InstrumentedBlob(blob, self._call_stats) for blob in blobs]
+
+
+class _InstrumentedBucket(_InstrumentedProxy):
+
+  def __init__(self, bucket, call_stats):
+    super(_InstrumentedBucket, self).__init__(
+        bucket, call_stats, SERVICE_GCS, operation_prefix="bucket.")
+
+  def blob(self, blob_name, *args, **kwargs):
+    return _InstrumentedBlob(
+        self._wrapped.blob(blob_name, *args, **kwargs), self._call_stats)
+
+
+class _InstrumentedBlob(_InstrumentedProxy):
+
+  def __init__(self, blob, call_stats):
+    super(_InstrumentedBlob, self).__init__(
+        blob, call_stats, SERVICE_GCS, operation_prefix="blob.")
+
+  def upload_from_filename(self, filename, *args, **kwargs):
+    result, latency_s = self._call(
+        "upload_from_filename", self._wrapped.upload_from_filename, filename,
+        *args, **kwargs)
+    self._record("upload_from_filename", latency_s,
+                 num_bytes=os.path.getsize(filename))
+    return result
+
+  def upload_from_string(self, data, *args, **kwargs):
+    result, latency_s = self._call(
+        "upload_from_string", self._wrapped.upload_from_string, data,
+        *args, **kwargs)
+    self._record("upload_from_string", latency_s,
+                 num_bytes=_get_body_size(data))
+    return result
+
+  def download_as_bytes(self, *args, **kwargs):
+    data, latency_s = self._call(
+        "download_as_bytes", self._wrapped.download_as_bytes, *args, **kwargs)
+    self._record("download_as_bytes", latency_s, num_bytes=len(data))
+    return data
+
+  def download_to_filename(self, filename, *args, **kwargs):
+    result, latency_s = self._call(
+        "download_to_filename", self._wrapped.download_to_filename, filename,
+        *args, **kwargs)
+    self._record("download_to_filename", latency_s,
+                 num_bytes=os.path.getsize(filename))
+    return result
+
+
+def _unwrap(obj):
+  if isinstance(obj, _InstrumentedProxy):
+    return obj.wrapped
+  return obj
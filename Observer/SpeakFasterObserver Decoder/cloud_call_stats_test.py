@@ -0,0 +1,143 @@
+"""Unit tests for the cloud_call_stats module."""
+import os
+import tempfile
+
+import tensorflow as tf
+
+import cloud_call_stats
+import local_object_store
+
+_BUCKET = "test-bucket"
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.time = 1000.0
+
+  def __call__(self):
+    return self.time
+
+
+class CallStatsTest(tf.test.TestCase):
+
+  def testRecordAndToDict(self):
+    clock = FakeClock()
+    call_stats = cloud_call_stats.CallStats(clock=clock)
+    call_stats.record("s3", "get_object", 0.02, num_bytes=100)
+    call_stats.record("s3", "get_object", 0.3, num_bytes=50)
+    call_stats.record("s3", "get_object", 20.0, is_error=True)
+    call_stats.record("gcs", "list_blobs", 0.005)
+    clock.time += 10
+    stats = call_stats.to_dict()
+    self.assertEqual(stats["elapsed_s"], 10)
+    get_object_stats = stats["operations"]["s3"]["get_object"]
+    self.assertEqual(get_object_stats["num_calls"], 3)
+    self.assertEqual(get_object_stats["num_errors"], 1)
+    self.assertEqual(get_object_stats["num_bytes"], 150)
+    self.assertEqual(get_object_stats["max_latency_s"], 20.0)
+    self.assertEqual(get_object_stats["latency_histogram"]["<=0.025s"], 1)
+    self.assertEqual(get_object_stats["latency_histogram"]["<=0.5s"], 1)
+    self.assertEqual(get_object_stats["latency_histogram"][">10s"], 1)
+    self.assertEqual(sum(get_object_stats["latency_histogram"].values()), 3)
+    self.assertEqual(call_stats.get_total_calls(), 4)
+
+  def testSummary(self):
+    call_stats = cloud_call_stats.CallStats()
+    self.assertEqual(call_stats.summary(), "No cloud calls")
+    for _ in range(3):
+      call_stats.record("s3", "list_objects_v2", 0.1)
+    call_stats.record("s3", "download_file", 0.1, num_bytes=2048)
+    self.assertEqual(
+        call_stats.summary(),
+        "S3: 4 calls (list_objects_v2 3, download_file 1), 2.0 KB")
+
+  def testWriteJson(self):
+    call_stats = cloud_call_stats.CallStats()
+    call_stats.record("gcs", "blob.exists", 0.1)
+    json_path = os.path.join(tempfile.mkdtemp(), "stats.json")
+    call_stats.write_json(json_path)
+    self.assertTrue(os.path.isfile(json_path))
+
+
+class InstrumentedS3ClientTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(InstrumentedS3ClientTest, self).setUp()
+    self._root_dir = tempfile.mkdtemp()
+    s3_client = local_object_store.LocalS3Client(self._root_dir, page_size=2)
+    for key in ("a/1", "a/2", "a/3"):
+      s3_client.put_object_data(_BUCKET, key, b"12345")
+    self._call_stats = cloud_call_stats.CallStats()
+    self._client = cloud_call_stats.InstrumentedS3Client(
+        s3_client, self._call_stats)
+
+  def _get_stats(self, operation):
+    return self._call_stats.to_dict()["operations"]["s3"][operation]
+
+  def testPaginator_recordsEachPage(self):
+    paginator = self._client.get_paginator("list_objects_v2")
+    keys = [obj["Key"] for page in paginator.paginate(
+        Bucket=_BUCKET, Prefix="a/") for obj in page["Contents"]]
+    self.assertEqual(keys, ["a/1", "a/2", "a/3"])
+    self.assertEqual(self._get_stats("list_objects_v2")["num_calls"], 2)
+    self.assertEqual(self._get_stats("list_objects_v2")["num_errors"], 0)
+
+  def testTransfers_recordBytes(self):
+    callback_bytes = []
+    local_path = os.path.join(self._root_dir, "downloaded")
+    self._client.download_file(
+        _BUCKET, "a/1", local_path, Callback=callback_bytes.append)
+    self.assertEqual(callback_bytes, [5])
+    self._client.upload_file(local_path, _BUCKET, "b/1")
+    self.assertEqual(self._get_stats("download_file")["num_bytes"], 5)
+    self.assertEqual(self._get_stats("upload_file")["num_bytes"], 5)
+
+  def testGetAndPutObject_recordBytes(self):
+    self._client.put_object(Bucket=_BUCKET, Key="b/2", Body=b"123")
+    response = self._client.get_object(Bucket=_BUCKET, Key="b/2")
+    self.assertEqual(response["Body"].read(), b"123")
+    self.assertEqual(self._get_stats("put_object")["num_bytes"], 3)
+    self.assertEqual(self._get_stats("get_object")["num_bytes"], 3)
+
+  def testFailedCall_isRecordedAsError(self):
+    with self.assertRaises(KeyError):
+      self._client.get_object(Bucket=_BUCKET, Key="nonexistent")
+    self.assertEqual(self._get_stats("get_object")["num_errors"], 1)
+
+  def testOtherMethods_areRecordedByName(self):
+    self._client.delete_object(Bucket=_BUCKET, Key="a/1")
+    self.assertEqual(self._get_stats("delete_object")["num_calls"], 1)
+    self.assertEqual(self._client.call_counts["DeleteObject"], 1)
+
+
+class InstrumentedStorageClientTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(InstrumentedStorageClientTest, self).setUp()
+    self._call_stats = cloud_call_stats.CallStats()
+    self._client = cloud_call_stats.InstrumentedStorageClient(
+        local_object_store.LocalGcsClient(tempfile.mkdtemp()),
+        self._call_stats)
+
+  def testBucketsAndBlobs_areInstrumented(self):
+    bucket = self._client.bucket(_BUCKET)
+    bucket.blob("p/1.json").upload_from_string("{}")
+    self.assertTrue(bucket.blob("p/1.json").exists())
+    blobs = self._client.list_blobs(bucket, prefix="p/")
+    self.assertEqual([blob.name for blob in blobs], ["p/1.json"])
+    self.assertEqual(blobs[0].download_as_bytes(), b"{}")
+    operations = self._call_stats.to_dict()["operations"]["gcs"]
+    self.assertEqual(operations["blob.upload_from_string"]["num_bytes"], 2)
+    self.assertEqual(operations["blob.exists"]["num_calls"], 1)
+    self.assertEqual(operations["list_blobs"]["num_calls"], 1)
+    self.assertEqual(operations["blob.download_as_bytes"]["num_bytes"], 2)
+
+  def testSetAttribute_isPassedThrough(self):
+    bucket = self._client.bucket(_BUCKET)
+    bucket.storage_class = "COLDLINE"
+    self.assertEqual(bucket.wrapped.storage_class, "COLDLINE")
+
+
+if __name__ == "__main__":
+  tf.test.main()
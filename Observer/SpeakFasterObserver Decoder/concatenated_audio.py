@@ -0,0 +1,97 @@
+"""Lossless FLAC copies of the concatenated audio of a session.
+
+The concatenated audio (concatenated_audio.wav) is uncompressed PCM for the
+whole session and is usually by far the largest result of preprocessing. In
+FLAC mode, a lossless concatenated_audio.flac is uploaded in lieu of the WAV,
+and the WAV that ELAN and the audio event extraction need is regenerated
+locally from the FLAC on demand.
+
+The conversions are done with the ffmpeg command line tool.
+"""
+import os
+import subprocess
+
+import file_naming
+
+
+def get_wav_path(session_dir):
+  return os.path.join(session_dir, file_naming.CONCATENATED_AUDIO_FILENAME)
+
+
+def get_flac_path(session_dir):
+  return os.path.join(session_dir, file_naming.CONCATENATED_AUDIO_FLAC_FILENAME)
+
+
+def has_concatenated_audio(session_dir):
+  """Whether a session directory has a nonempty WAV or FLAC concatenation."""
+  for file_path in (get_wav_path(session_dir), get_flac_path(session_dir)):
+    if os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
+      return True
+  return False
+
+
+def _is_up_to_date(output_path, input_path):
+  return (os.path.isfile(output_path) and
+          os.path.getsize(output_path) > 0 and
+          os.path.getmtime(output_path) >= os.path.getmtime(input_path))
+
+
+def _convert(input_path, output_path):
+  # Write to a temporary file first, so that an interrupted conversion doesn't
+  # leave a truncated file that looks up to date. The temporary file keeps the
+  # extension, from which ffmpeg determines the output format.
+  root, extension = os.path.splitext(output_path)
+  tmp_path = root + ".tmp" + extension
+  subprocess.check_call([
+      "ffmpeg", "-y", "-loglevel", "error", "-i", input_path, tmp_path])
+  os.replace(tmp_path, output_path)
+
+
+def compress_to_flac(session_dir):
+  """Write the FLAC copy of the concatenated WAV, unless it is up to date.
+
+  Args:
+    session_dir: Path to the local session directory.
+
+  Returns:
+    Path to the FLAC file.
+
+  Raises:
+    ValueError: if neither the WAV nor the FLAC file exists.
+  """
+  wav_path = get_wav_path(session_dir)
+  flac_path = get_flac_path(session_dir)
+  if not os.path.isfile(wav_path):
+    if os.path.isfile(flac_path):
+      return flac_path
+    raise ValueError("Cannot find concatenated audio in %s" % session_dir)
+  if not _is_up_to_date(flac_path, wav_path):
+    print("Compressing %s --> %s" % (wav_path, flac_path))
+    _convert(wav_path, flac_path)
+  return flac_path
+
+
+def ensure_wav(session_dir, force=False):
+  """Regenerate the concatenated WAV from the FLAC copy if needed.
+
+  The WAV is regenerated if it doesn't exist, or if force is True (e.g., after
+  a different FLAC file is downloaded). A FLAC file that is newer than the WAV
+  file doesn't imply that they differ, as the FLAC file may have been
+  compressed from the WAV file.
+
+  Args:
+    session_dir: Path to the local session directory.
+    force: Whether to regenerate an existing WAV file.
+
+  Returns:
+    Path to the WAV file, or None if neither the WAV nor the FLAC file exists.
+  """
+  wav_path = get_wav_path(session_dir)
+  flac_path = get_flac_path(session_dir)
+  if not os.path.isfile(flac_path):
+    return wav_path if os.path.isfile(wav_path) else None
+  if (force or not os.path.isfile(wav_path) or
+      os.path.getsize(wav_path) == 0):
+    print("Regenerating %s from %s" % (wav_path, flac_path))
+    _convert(flac_path, wav_path)
+  return wav_path
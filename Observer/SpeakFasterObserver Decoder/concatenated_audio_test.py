@@ -0,0 +1,89 @@
+"""Unit tests for the concatenated_audio module."""
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import tensorflow as tf
+
+import concatenated_audio
+
+
+def _fake_ffmpeg(command_args):
+  """Stands in for the ffmpeg command line tool by copying the input."""
+  shutil.copyfile(command_args[command_args.index("-i") + 1], command_args[-1])
+
+
+class ConcatenatedAudioTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(ConcatenatedAudioTest, self).setUp()
+    self._session_dir = tempfile.mkdtemp()
+    self._wav_path = concatenated_audio.get_wav_path(self._session_dir)
+    self._flac_path = concatenated_audio.get_flac_path(self._session_dir)
+    patcher = mock.patch.object(
+        concatenated_audio.subprocess, "check_call", side_effect=_fake_ffmpeg)
+    self._check_call = patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def _write(self, file_path, data=b"audio"):
+    with open(file_path, "wb") as f:
+      f.write(data)
+
+  def _set_mtime(self, file_path, mtime):
+    os.utime(file_path, (mtime, mtime))
+
+  def testHasConcatenatedAudio(self):
+    self.assertFalse(
+        concatenated_audio.has_concatenated_audio(self._session_dir))
+    self._write(self._flac_path, b"")
+    self.assertFalse(
+        concatenated_audio.has_concatenated_audio(self._session_dir))
+    self._write(self._flac_path)
+    self.assertTrue(
+        concatenated_audio.has_concatenated_audio(self._session_dir))
+
+  def testCompressToFlac_skipsUpToDateFlac(self):
+    self._write(self._wav_path)
+    self.assertEqual(
+        concatenated_audio.compress_to_flac(self._session_dir), self._flac_path)
+    self.assertTrue(os.path.isfile(self._flac_path))
+    self.assertFalse(os.path.exists(
+        os.path.join(self._session_dir, "concatenated_audio.tmp.flac")))
+    concatenated_audio.compress_to_flac(self._session_dir)
+    self.assertEqual(self._check_call.call_count, 1)
+
+  def testCompressToFlac_noAudio_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "Cannot find concatenated audio"):
+      concatenated_audio.compress_to_flac(self._session_dir)
+
+  def testEnsureWav_regeneratesMissingOrForcedWav(self):
+    self._write(self._flac_path, b"flac")
+    self.assertEqual(
+        concatenated_audio.ensure_wav(self._session_dir), self._wav_path)
+    self.assertEqual(self._check_call.call_count, 1)
+    concatenated_audio.ensure_wav(self._session_dir)
+    self.assertEqual(self._check_call.call_count, 1)
+    # E.g., the FLAC file is downloaded again.
+    concatenated_audio.ensure_wav(self._session_dir, force=True)
+    self.assertEqual(self._check_call.call_count, 2)
+
+  def testEnsureWav_keepsWavOlderThanFlac(self):
+    # E.g., the FLAC file is compressed from the WAV file.
+    self._write(self._wav_path)
+    concatenated_audio.compress_to_flac(self._session_dir)
+    self._set_mtime(self._wav_path, 1000)
+    self._set_mtime(self._flac_path, 2000)
+    concatenated_audio.ensure_wav(self._session_dir)
+    self.assertEqual(self._check_call.call_count, 1)
+
+  def testEnsureWav_withoutFlac(self):
+    self.assertIsNone(concatenated_audio.ensure_wav(self._session_dir))
+    self._write(self._wav_path)
+    self.assertEqual(
+        concatenated_audio.ensure_wav(self._session_dir), self._wav_path)
+    self._check_call.assert_not_called()
+
+
+if __name__ == "__main__":
+  tf.test.main()
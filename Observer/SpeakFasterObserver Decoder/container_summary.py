@@ -0,0 +1,108 @@
+"""Published summary of the per-session stats of a session container.
+
+Summarizing a container requires scanning every session in it, which takes a
+request or more per session. After a summary is computed, the per-session
+stats are published to GCS as a compact, columnar JSON object (one list per
+column, one element per session), along with the weekday / hour-of-the-day
+table of session start times. Subsequent summaries, by any curator, load the
+published summary and scan only the sessions that are not in it.
+
+The raw data of a complete session doesn't change after upload, so the stats
+of complete sessions are reused, except for the number of objects: derived
+objects (e.g., preprocessing results) are added to complete sessions over
+time, so their objects are counted again. Incomplete sessions may still be
+receiving data and are scanned again.
+"""
+import json
+
+SUMMARY_VERSION = 1
+
+# Name of the summary object under the container's summary prefix.
+SUMMARY_FILENAME = "container_summary.json"
+
+# Columns of the per-session stats.
+#   session: Base session prefix, e.g., "session-20211117T202235498Z".
+#   is_session_complete: Whether the session has a SessionEnd.bin file.
+#   time_zone: Name of the pytz time zone of the session.
+#   start_timestamp: Earliest data timestamp, in seconds since the epoch.
+#   duration_s: Duration of the session, in seconds.
+#   num_keypresses, num_audio_files, num_screenshots: Data counts.
+#   num_objects: Number of remote objects of the session when the stats were
+#     computed. Not reused.
+SESSION_STATS_COLUMNS = (
+    "session",
+    "is_session_complete",
+    "time_zone",
+    "start_timestamp",
+    "duration_s",
+    "num_keypresses",
+    "num_audio_files",
+    "num_screenshots",
+    "num_objects",
+)
+
+
+def make_summary(container_prefix,
+                 session_stats,
+                 start_time_table,
+                 weekdays,
+                 hour_ranges,
+                 generated):
+  """Make the summary of a container.
+
+  Args:
+    container_prefix: The container prefix.
+    session_stats: A list of dicts with the keys in SESSION_STATS_COLUMNS, one
+      per session.
+    start_time_table: The weekday / hour range table of session start times,
+      as a list of lists.
+    weekdays: Names of the rows of start_time_table.
+    hour_ranges: Hour ranges of the columns of start_time_table.
+    generated: The time at which the summary is generated, as an ISO string.
+
+  Returns:
+    The summary as a JSON-serializable dict.
+  """
+  return {
+      "version": SUMMARY_VERSION,
+      "container_prefix": container_prefix,
+      "generated": generated,
+      "num_sessions": len(session_stats),
+      "session_stats": {
+          column: [stats[column] for stats in session_stats]
+          for column in SESSION_STATS_COLUMNS},
+      "start_time_table": start_time_table,
+      "weekdays": list(weekdays),
+      "hour_ranges": [list(hour_range) for hour_range in hour_ranges],
+  }
+
+
+def parse_summary(summary_json):
+  """Parse the content of a summary object.
+
+  Args:
+    summary_json: Content of the summary JSON object, as a str or bytes.
+
+  Returns:
+    A dict mapping base session prefixes to dicts with the keys in
+    SESSION_STATS_COLUMNS.
+
+  Raises:
+    ValueError: if the summary version is unsupported or the summary is
+      malformed.
+  """
+  summary = json.loads(summary_json)
+  if summary.get("version") != SUMMARY_VERSION:
+    raise ValueError(
+        "Unsupported summary version: %s" % summary.get("version"))
+  columns = summary["session_stats"]
+  if set(columns) != set(SESSION_STATS_COLUMNS):
+    raise ValueError("Unexpected summary columns: %s" % sorted(columns))
+  num_sessions = summary["num_sessions"]
+  if any(len(values) != num_sessions for values in columns.values()):
+    raise ValueError("Summary columns have inconsistent lengths")
+  session_stats = dict()
+  for i in range(num_sessions):
+    stats = {column: columns[column][i] for column in SESSION_STATS_COLUMNS}
+    session_stats[stats["session"]] = stats
+  return session_stats
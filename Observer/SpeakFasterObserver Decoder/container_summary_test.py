@@ -0,0 +1,55 @@
+"""Unit tests for the container_summary module."""
+import json
+
+import tensorflow as tf
+
+import container_summary
+
+
+def _session_stats(session, is_session_complete=True):
+  return {
+      "session": session,
+      "is_session_complete": is_session_complete,
+      "time_zone": "US/Central",
+      "start_timestamp": 1637180555.0,
+      "duration_s": 600.0,
+      "num_keypresses": 100,
+      "num_audio_files": 2,
+      "num_screenshots": 3,
+      "num_objects": 8,
+  }
+
+
+class ContainerSummaryTest(tf.test.TestCase):
+
+  def testMakeAndParseSummary(self):
+    summary = container_summary.make_summary(
+        "c/", [_session_stats("session-1"), _session_stats("session-2", False)],
+        [[0, 1], [1, 0]], ("Mon", "Tue"), ((0, 12), (12, 24)),
+        "2021-11-18T00:00:00+00:00")
+    self.assertEqual(summary["num_sessions"], 2)
+    self.assertEqual(summary["session_stats"]["session"],
+                     ["session-1", "session-2"])
+    self.assertEqual(summary["hour_ranges"], [[0, 12], [12, 24]])
+    session_stats = container_summary.parse_summary(json.dumps(summary))
+    self.assertEqual(session_stats, {
+        "session-1": _session_stats("session-1"),
+        "session-2": _session_stats("session-2", False),
+    })
+
+  def testUnsupportedVersion_raisesValueError(self):
+    summary = container_summary.make_summary("c/", [], [], (), (), "")
+    summary["version"] = 0
+    with self.assertRaisesRegex(ValueError, r"Unsupported summary version"):
+      container_summary.parse_summary(json.dumps(summary))
+
+  def testInconsistentColumns_raisesValueError(self):
+    summary = container_summary.make_summary(
+        "c/", [_session_stats("session-1")], [], (), (), "")
+    summary["session_stats"]["num_keypresses"].append(1)
+    with self.assertRaisesRegex(ValueError, r"inconsistent lengths"):
+      container_summary.parse_summary(json.dumps(summary))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,15 @@
+"""Information about the curator running the data tools."""
+import getpass
+import os
+
+
+def get_curator_username():
+  """Determine the username of the curator.
+
+  os.getlogin() fails when there is no controlling terminal (e.g., when run
+  from cron), in which case the username is determined from the environment.
+  """
+  try:
+    return os.getlogin()
+  except OSError:
+    return getpass.getuser()
@@ -0,0 +1,24 @@
+"""Unit tests for the curator module."""
+from unittest import mock
+
+import tensorflow as tf
+
+import curator
+
+
+class GetCuratorUsernameTest(tf.test.TestCase):
+
+  def testUsesLoginName(self):
+    with mock.patch.object(curator.os, "getlogin", return_value="curator1"):
+      self.assertEqual(curator.get_curator_username(), "curator1")
+
+  def testFallsBackWithoutTerminal(self):
+    with mock.patch.object(
+        curator.os, "getlogin", side_effect=OSError("No tty")), \
+        mock.patch.object(
+            curator.getpass, "getuser", return_value="batch-user"):
+      self.assertEqual(curator.get_curator_username(), "batch-user")
+
+
+if __name__ == "__main__":
+  tf.test.main()
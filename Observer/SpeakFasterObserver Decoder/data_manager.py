@@ -13,7 +13,10 @@ python data_manager.py --s3_bucket_name=my-bucket-name
 ```
 """
 import argparse
+import atexit
+import concurrent.futures
 import datetime
+import functools
 import glob
 import io
 import json
@@ -24,18 +27,32 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 
 import boto3
 import numpy as np
 import PySimpleGUI as sg
 
+import background_tasks
+import batch_pipeline
+import cloud_call_stats
+import concatenated_audio
+import container_summary
+import curator
 import elan_process_curated
 import file_naming
 import freeform_text
 import gcloud_utils
+import keypress_table
 import metadata_pb2
 import process_keypresses
+import remote_state
+import s3_transfer
+import session_index
+import session_info_cache
+import session_archive
+import session_manifest
 import transcript_lib
 
 DEFAULT_PROFILE_NAME = "spo"
@@ -48,6 +65,18 @@ POSSIBLE_DATA_ROOT_DIRS = (
     os.path.join(pathlib.Path.home(), "sf_observer_data"),
 )
 DEFAULT_TIMEZONE_NAME = "US/Central"
+# Default maximum number of concurrent S3 / GCS requests made while scanning
+# sessions. Kept moderate to avoid being throttled by S3.
+DEFAULT_MAX_WORKERS = 8
+# Default number of sessions handled concurrently by each stage of batch
+# download-preprocess-upload.
+DEFAULT_BATCH_DOWNLOAD_WORKERS = 1
+DEFAULT_BATCH_PREPROCESS_WORKERS = 1
+DEFAULT_BATCH_UPLOAD_WORKERS = 1
+# Default number of sessions before and after the selected session whose info
+# is prefetched in the background, and number of threads that prefetch.
+DEFAULT_PREFETCH_SESSIONS = 5
+DEFAULT_PREFETCH_WORKERS = 2
 
 # Time-of-the-day hour ranges. Local time.
 HOUR_RANGES = ((0, 3), (3, 6), (6, 9), (9, 12), (12, 15), (15, 18),
@@ -58,7 +87,18 @@ DEFAULT_GCS_BUCKET_NAME = "speak-faster-curated-data-shared"
 GCS_SUMMARY_PREFIX = "summary"
 GCS_CURATED_FREEFORM_UPLOAD_PREFIX = "curated_freeform"
 GCS_POSTPROCESSED_UPLOAD_PREFIX = "postprocessed"
-CLAIM_JSON_FILENAME = "claim.json"
+CLAIM_JSON_FILENAME = file_naming.CLAIM_JSON_FILENAME
+# Name of the SQLite file under the local data root that caches the facts
+# derived from remote objects (see session_index.py).
+SESSION_INDEX_FILENAME = ".session_index.sqlite3"
+# Name of the JSON file under the local data root that caches the discovered
+# session container prefixes.
+CONTAINER_PREFIXES_CACHE_FILENAME = ".session_container_prefixes.json"
+# Default name of the file under the local data root to which the statistics
+# of the calls to S3 and GCS are written on exit.
+CALL_STATS_JSON_FILENAME = ".cloud_call_stats.json"
+# Interval between refreshes of the cloud call statistics in the status bar.
+CALL_STATS_REFRESH_INTERVAL_MS = 1000
 
 STATE_NOT_DOWNLOADED = "NOT_DOWNLOADED"
 STATE_DOWNLOADED = "DOWNLOADED"
@@ -73,6 +113,16 @@ STATE_NOT_PREPROCESSED = "NOT_PREPROCESSED"
 STATE_NOT_UPLOADED = "NOT_UPLOADED"
 STATE_UPLOADED = "UPLOADED"
 
+# Kinds of confirmations that DataManager asks for before performing an
+# operation. Non-interactive front ends (e.g., data_manager_cli.py) use them to
+# apply a policy in lieu of asking the user.
+# Redo work whose results already exist (locally, in S3 or in GCS).
+CONFIRM_REDO = "REDO"
+# Proceed with an operation that is hard to undo.
+CONFIRM_PROCEED = "PROCEED"
+# Ignore misspelled words found during postprocessing.
+CONFIRM_IGNORE_MISSPELLED = "IGNORE_MISSPELLED"
+
 # The set of files to upload to shared GCS folder. Must only include
 # the post-processed, curated results.
 POSTPROCESSING_FILES_TO_UPLOAD = (
@@ -80,6 +130,46 @@ POSTPROCESSING_FILES_TO_UPLOAD = (
     file_naming.CURATED_PROCESSED_TSV_FILENAME,
     file_naming.CURATED_PROCESSED_SPEECH_ONLY_TSV_FILENAME)
 
+# Include/exclude filters (see s3_transfer.py) for uploading the results of
+# preprocessing and postprocessing from a local session directory to S3.
+PREPROCESSING_UPLOAD_FILTERS = (
+    (s3_transfer.EXCLUDE, "*"),
+    (s3_transfer.INCLUDE, "*.tsv"),
+    (s3_transfer.INCLUDE, file_naming.CONCATENATED_AUDIO_FILENAME),
+    (s3_transfer.INCLUDE, file_naming.SCREENSHOTS_MP4_FILENAME),
+    (s3_transfer.INCLUDE, file_naming.MANIFEST_JSON_FILENAME))
+# In FLAC audio mode, the lossless FLAC copy of the concatenated audio is
+# uploaded in lieu of the much larger WAV file. See concatenated_audio.py.
+PREPROCESSING_FLAC_UPLOAD_FILTERS = PREPROCESSING_UPLOAD_FILTERS + (
+    (s3_transfer.EXCLUDE, file_naming.CONCATENATED_AUDIO_FILENAME),
+    (s3_transfer.INCLUDE, file_naming.CONCATENATED_AUDIO_FLAC_FILENAME))
+POSTPROCESSING_UPLOAD_FILTERS = (
+    (s3_transfer.EXCLUDE, "*"),
+    (s3_transfer.INCLUDE, "*.tsv"),
+    (s3_transfer.INCLUDE, file_naming.CURATED_PROCESSED_JSON_FILENAME),
+    (s3_transfer.INCLUDE, file_naming.CURATED_PROCESSED_TSV_FILENAME),
+    (s3_transfer.INCLUDE, file_naming.CURATED_PROCESSED_SPEECH_ONLY_TSV_FILENAME))
+
+# Selective download profiles, for `DataManager.sync_to_local()`. Each maps a
+# pipeline stage to the include/exclude filters (see s3_transfer.py) that
+# select the minimal set of session objects the stage needs, so that e.g.
+# post-hoc analysis doesn't download the raw audio and screenshots.
+SYNC_PROFILE_FULL = "full"
+SYNC_PROFILE_CHECK_KEYPRESSES = "check_keypresses"
+SYNC_PROFILE_ANALYZE_TRANSCRIPTS = "analyze_transcripts"
+SYNC_PROFILES = {
+    # Everything, e.g., for preprocessing or curation in ELAN.
+    SYNC_PROFILE_FULL: None,
+    SYNC_PROFILE_CHECK_KEYPRESSES: (
+        (s3_transfer.EXCLUDE, "*"),
+        (s3_transfer.INCLUDE, file_naming.MERGED_TSV_FILENAME),
+        (s3_transfer.INCLUDE, file_naming.CURATED_PROCESSED_TSV_FILENAME)),
+    SYNC_PROFILE_ANALYZE_TRANSCRIPTS: (
+        (s3_transfer.EXCLUDE, "*"),
+        (s3_transfer.INCLUDE, file_naming.MERGED_TSV_FILENAME),
+        (s3_transfer.INCLUDE, file_naming.CURATED_TSV_FILENAME)),
+}
+
 def get_hour_index(hour):
   for i, (hour_min, hour_max) in enumerate(HOUR_RANGES):
     if hour >= hour_min and hour < hour_max:
@@ -117,6 +207,62 @@ def parse_args():
       type=str,
       default=DEFAULT_GCS_BUCKET_NAME,
       help="AWS profile name")
+  parser.add_argument(
+      "--max_workers",
+      type=int,
+      default=DEFAULT_MAX_WORKERS,
+      help="Maximum number of concurrent requests to S3 and GCS when scanning "
+      "sessions (e.g., during summarization)")
+  parser.add_argument(
+      "--batch_download_workers",
+      type=int,
+      default=DEFAULT_BATCH_DOWNLOAD_WORKERS,
+      help="Number of sessions downloaded concurrently during batch "
+      "download-preprocess-upload")
+  parser.add_argument(
+      "--batch_preprocess_workers",
+      type=int,
+      default=DEFAULT_BATCH_PREPROCESS_WORKERS,
+      help="Number of sessions preprocessed concurrently during batch "
+      "download-preprocess-upload")
+  parser.add_argument(
+      "--batch_upload_workers",
+      type=int,
+      default=DEFAULT_BATCH_UPLOAD_WORKERS,
+      help="Number of sessions uploaded concurrently during batch "
+      "download-preprocess-upload")
+  parser.add_argument(
+      "--no_container_prefix_cache",
+      action="store_true",
+      help="Do not use the locally cached list of session containers at "
+      "startup; discover the containers before showing the window instead")
+  parser.add_argument(
+      "--prefetch_sessions",
+      type=int,
+      default=DEFAULT_PREFETCH_SESSIONS,
+      help="Number of sessions before and after the selected session whose "
+      "details are fetched in the background, so that browsing the sessions "
+      "in order doesn't wait for S3. 0 disables prefetching")
+  parser.add_argument(
+      "--call_stats_json",
+      type=str,
+      default=None,
+      help="Path to write the statistics of the calls to S3 and GCS to on "
+      "exit. Defaults to %s under the local data root" %
+      CALL_STATS_JSON_FILENAME)
+  parser.add_argument(
+      "--write_session_archives",
+      action="store_true",
+      help="After uploading the preprocessing results of a session, also "
+      "upload packed archives of its raw data files, so that subsequent "
+      "downloads of the session take a few range reads instead of one request "
+      "per file")
+  parser.add_argument(
+      "--flac_audio",
+      action="store_true",
+      help="Upload a lossless FLAC copy of the concatenated audio of sessions "
+      "instead of the WAV file. The WAV file is regenerated locally after "
+      "download")
   return parser.parse_args()
 
 
@@ -146,6 +292,19 @@ def _get_timezone(readable_timezone_name):
     raise ValueError("Unimplemented time zone: %s" % readable_timezone_name)
 
 
+def _gui_confirm(kind, message):
+  del kind  # Unused.
+  return sg.popup_yes_no(message) == "Yes"
+
+
+def _gui_notify(message, title=None):
+  sg.Popup(message, title=title, modal=True)
+
+
+def _gui_prompt(message):
+  return sg.popup_get_text(message)
+
+
 def find_speaker_id_config_json():
   """Try to find the speaker ID config JSON file among known possibilities."""
   possible_paths = [
@@ -175,65 +334,182 @@ class DataManager(object):
                aws_profile_name,
                s3_bucket_name,
                gcs_bucket_name,
-               local_data_root):
-    self._s3_session = boto3.Session(profile_name=aws_profile_name)
-    self._s3_client = self._s3_session.client("s3")
-    self._aws_profile_name = aws_profile_name
+               local_data_root,
+               max_workers=DEFAULT_MAX_WORKERS,
+               remote_state_ttl_s=remote_state.DEFAULT_TTL_S,
+               confirm_fn=_gui_confirm,
+               notify_fn=_gui_notify,
+               prompt_fn=_gui_prompt,
+               s3_client=None,
+               call_stats=None,
+               session_info_cache_size=session_info_cache.DEFAULT_MAX_SIZE,
+               num_prefetch_workers=DEFAULT_PREFETCH_WORKERS,
+               write_session_archives=False,
+               flac_audio=False):
+    """Create a DataManager.
+
+    Args:
+      aws_profile_name: Name of the AWS profile.
+      s3_bucket_name: Name of the S3 bucket that holds the Observer data.
+      gcs_bucket_name: Name of the GCS bucket for shared curated data.
+      local_data_root: Local directory that holds the session directories.
+      max_workers: Maximum number of concurrent requests to S3 and GCS.
+      remote_state_ttl_s: Time-to-live of the cached remote state of session
+        containers, in seconds.
+      confirm_fn: Function that asks the user for a confirmation. Called with
+        the kind of confirmation (one of the CONFIRM_* constants) and a
+        message. Returns a bool.
+      notify_fn: Function that shows a message to the user. Called with the
+        message and an optional title keyword argument.
+      prompt_fn: Function that asks the user for a str. Called with a message.
+        Returns the str, or None.
+      s3_client: Optional S3 client to use instead of the one created from the
+        AWS profile, e.g., a local_object_store.LocalS3Client.
+      call_stats: Optional cloud_call_stats.CallStats that records the calls
+        made to S3. The GCS calls are recorded via
+        gcloud_utils.set_call_stats().
+      session_info_cache_size: Maximum number of sessions whose details and
+        claims are cached in memory. See `prefetch_session_info()`.
+      num_prefetch_workers: Number of threads that prefetch session info.
+      write_session_archives: Whether to upload packed archives of the raw
+        data files of sessions (see session_archive.py) after uploading their
+        preprocessing results.
+      flac_audio: Whether preprocessing writes a FLAC copy of the concatenated
+        audio and uploads it instead of the WAV file.
+    """
+    if max_workers < 1:
+      raise ValueError(
+          "max_workers must be a positive integer, got %s" % max_workers)
+    if s3_client is None:
+      self._s3_session = boto3.Session(profile_name=aws_profile_name)
+      s3_client = self._s3_session.client("s3")
+    if call_stats is not None:
+      s3_client = cloud_call_stats.InstrumentedS3Client(s3_client, call_stats)
+    self._s3_client = s3_client
+    self._call_stats = call_stats
     self._s3_bucket_name = s3_bucket_name
     self._gcs_bucket_name = gcs_bucket_name
     self._local_data_root = local_data_root
+    self._max_workers = max_workers
+    self._transfer_engine = s3_transfer.S3TransferEngine(
+        self._s3_client, s3_bucket_name, max_workers=max_workers)
+    self._session_index = session_index.SessionIndex(
+        os.path.join(local_data_root, SESSION_INDEX_FILENAME))
     self._speaker_id_config_json_path = find_speaker_id_config_json()
+    self._remote_state_ttl_s = remote_state_ttl_s
+    # Maps container prefix to RemoteStateSnapshot.
+    self._remote_states = dict()
+    self._remote_states_lock = threading.Lock()
+    # Maps claim.json object key to (ETag, claiming username).
+    self._claim_cache = dict()
+    self._claim_cache_lock = threading.Lock()
+    # Maps local session directory to (modification time in ns, status).
+    self._local_status_cache = dict()
+    self._local_status_cache_lock = threading.Lock()
+    self._session_info_cache = session_info_cache.SessionInfoCache(
+        max_size=session_info_cache_size, ttl_s=remote_state_ttl_s)
+    self._prefetch_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=num_prefetch_workers)
+    # Maps session prefix to the Future of its SessionInfo, for the sessions
+    # being prefetched.
+    self._prefetch_futures = dict()
+    self._prefetch_lock = threading.Lock()
+    self._write_session_archives = write_session_archives
+    self._flac_audio = flac_audio
     self._session_keypresses_per_second = None
     self._session_gcs_status = None
     self._manual_timezone_name = None
-    self._check_aws_cli()
-    self._curator_username = os.getlogin()
+    # Held while the user is asked for the time zone, so that concurrent
+    # workers ask only once.
+    self._manual_timezone_lock = threading.Lock()
+    self._confirm = confirm_fn
+    self._notify = notify_fn
+    self._prompt = prompt_fn
+    self._curator_username = curator.get_curator_username()
     if self._curator_username:
       print("Determined username: %s" % self._curator_username)
     else:
       raise ValueError("Unable to determine username of curator")
     self._session_prefix_to_claiming_username = {}
 
-  def _check_aws_cli(self):
-    try:
-      self._run_command_line(["aws", "--version"])
-    except subprocess.CalledProcessError:
-      raise ValueError(
-          "It appears that you don't have aws cli installed and on the path. "
-          "Please install it and make sure it is on the path.")
-
   @property
   def gcs_bucket_name(self):
     return self._gcs_bucket_name
 
+  @property
+  def call_stats(self):
+    """The cloud_call_stats.CallStats of the S3 calls, or None."""
+    return self._call_stats
+
+  def _list_child_prefixes(self, prefix):
+    """List the immediate child prefixes of a prefix."""
+    paginator = self._s3_client.get_paginator("list_objects")
+    results = paginator.paginate(
+        Bucket=self._s3_bucket_name,
+        Delimiter="/",
+        Prefix=prefix)
+    child_prefixes = []
+    for result in results:
+      if "CommonPrefixes" in result:
+        for common_prefix in result["CommonPrefixes"]:
+          if common_prefix["Prefix"].endswith("//"):
+            continue
+          child_prefixes.append(common_prefix["Prefix"])
+    return child_prefixes
+
+  def _get_container_prefixes_cache_path(self):
+    return os.path.join(
+        self._local_data_root, CONTAINER_PREFIXES_CACHE_FILENAME)
+
   def get_session_container_prefixes(self):
     """Find the prefixes that hold the session folders as children.
 
+    The prefixes of each level are listed concurrently. The result is saved
+    to a local cache file (see `get_cached_session_container_prefixes()`).
+
     Returns:
       A list of prefixes, each of which ends with '/'. The bucket name
       itself is not included.
     """
-    prefixes = []
     current_prefixes = [OBSERVER_DATA_PREFIX + "/" + DATA_SCHEMA_NAME + "/"]
-    for i in range(3):
-      new_prefixes = []
-      for current_prefix in current_prefixes:
-        paginator = self._s3_client.get_paginator("list_objects")
-        results = list(paginator.paginate(
-            Bucket=self._s3_bucket_name,
-            Delimiter="/",
-            Prefix=current_prefix))
-        if not results:
-          break
-        for result in results:
-          if "CommonPrefixes" in result:
-            for common_prefix in result["CommonPrefixes"]:
-              if common_prefix["Prefix"].endswith("//"):
-                continue
-              new_prefixes.append(common_prefix["Prefix"])
-      current_prefixes = new_prefixes
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self._max_workers) as executor:
+      for _ in range(3):
+        new_prefixes = []
+        for child_prefixes in executor.map(
+            self._list_child_prefixes, current_prefixes):
+          new_prefixes.extend(child_prefixes)
+        current_prefixes = new_prefixes
+    try:
+      with open(self._get_container_prefixes_cache_path(), "wt") as f:
+        json.dump({
+            "s3_bucket_name": self._s3_bucket_name,
+            "container_prefixes": current_prefixes,
+        }, f, indent=2)
+    except OSError as e:
+      print("Failed to write the cache of container prefixes: %s" % e)
     return current_prefixes
 
+  def get_cached_session_container_prefixes(self):
+    """Get the container prefixes saved by `get_session_container_prefixes()`.
+
+    Returns:
+      The list of prefixes, or None if no cache is available for the current
+      S3 bucket.
+    """
+    cache_path = self._get_container_prefixes_cache_path()
+    if not os.path.isfile(cache_path):
+      return None
+    try:
+      with open(cache_path, "rt") as f:
+        cache = json.load(f)
+    except (OSError, ValueError) as e:
+      print("Failed to read the cache of container prefixes: %s" % e)
+      return None
+    if cache.get("s3_bucket_name") != self._s3_bucket_name:
+      return None
+    return cache.get("container_prefixes")
+
   def get_session_prefixes(self, session_container_prefix):
     """Get the prefixes that correspond to the sessions."""
     paginator = self._s3_client.get_paginator("list_objects")
@@ -267,26 +543,103 @@ class DataManager(object):
       objects.extend(page["Contents"])
     return objects
 
-  def get_session_details(self, session_prefix):
-    """Get the details about a session."""
-    utc_timezone = pytz.timezone("UTC")
+  def _read_session_end_facts(self, object_key):
+    tmp_filepath = self._download_to_temp_file(object_key)
+    session_metadata = metadata_pb2.SessionMetadata()
+    with open(tmp_filepath, "rb") as f:
+      session_metadata.ParseFromString(f.read())
+    os.remove(tmp_filepath)
+    return {"timezone": session_metadata.timezone}
+
+  def _read_keypresses_facts(self, object_key):
+    tmp_filepath = self._download_to_temp_file(object_key)
+    keypresses = process_keypresses.load_keypresses_from_protobuf_file(
+        tmp_filepath)
+    os.remove(tmp_filepath)
+    return {"num_keypresses": len(keypresses.keyPresses)}
+
+  def _get_object_facts(self, obj, read_facts):
+    """Get the facts derived from a remote object.
+
+    The local session index is consulted first, so that the object is
+    downloaded only if it is new or has changed (i.e., has a different ETag).
+
+    Args:
+      obj: The object, as an item from the "Contents" of a list_objects_v2
+        response.
+      read_facts: A function that downloads the object given its key and
+        returns the derived facts as a JSON-serializable dict.
+
+    Returns:
+      The facts as a dict.
+    """
+    facts = self._session_index.get(obj["Key"], obj["ETag"])
+    if facts is None:
+      facts = read_facts(obj["Key"])
+      self._session_index.put(obj["Key"], obj["ETag"], facts)
+    return facts
+
+  def _read_manifest_facts(self, object_key):
+    f = io.BytesIO()
+    self._s3_client.download_fileobj(self._s3_bucket_name, object_key, f)
+    return session_manifest.parse_manifest(f.getvalue())
+
+  def _scan_session(self, session_prefix):
+    """Scan the remote objects of a session and extract the basic facts.
+
+    If the session has a manifest (see session_manifest.py), the facts are
+    read from it. Otherwise, the raw data objects are examined.
+
+    This method does not interact with the user and is safe to call from
+    worker threads.
+
+    Returns:
+      A dict with the following keys:
+        is_session_complete: Whether the SessionEnd.bin file exists.
+        time_zone: The time zone recorded in SessionEnd.bin, or None if
+          unavailable.
+        first_timestamp: Earliest data timestamp, in seconds since the epoch.
+        last_timestamp: Latest data timestamp, in seconds since the epoch.
+        num_keypresses: Total number of keypresses.
+        num_audio_files: Number of audio files.
+        num_screenshots: Number of screenshot files.
+        object_keys: Keys of the objects, relative to session_prefix.
+    """
     objects = self._list_session_objects(session_prefix)
+    manifest_key = session_prefix + file_naming.MANIFEST_JSON_FILENAME
+    manifest_objects = [obj for obj in objects if obj["Key"] == manifest_key]
+    if manifest_objects:
+      manifest = self._get_object_facts(
+          manifest_objects[0], self._read_manifest_facts)
+      return {
+          "is_session_complete": manifest["is_session_complete"],
+          "time_zone": manifest["timezone"],
+          "first_timestamp": manifest["first_timestamp"],
+          "last_timestamp": manifest["last_timestamp"],
+          "num_keypresses": manifest["num_keypresses"],
+          "num_audio_files": manifest["num_audio_files"],
+          "num_screenshots": manifest["num_screenshots"],
+          "object_keys": [
+              obj["Key"][len(session_prefix):] for obj in objects],
+      }
     # This is determined by whether the SessionEnd.bin file exists.
     is_session_complete = False
     object_keys = []
     time_zone = None
     first_timestamp = -1
     last_timestamp = 0
-    start_time = None
-    duration_s = None
     num_keypresses = 0
     num_audio_files = 0
     num_screenshots = 0
+    archive_prefix = session_prefix + file_naming.SESSION_ARCHIVE_DIRNAME + "/"
     for obj in objects:
       obj_key = obj["Key"]
       object_keys.append(obj_key[len(session_prefix):])
       if os.path.basename(obj_key).endswith((".tsv", ".wav", ".mp4", ".json")):
         continue
+      if (obj_key.startswith(archive_prefix) or
+          obj_key.endswith(file_naming.CONCATENATED_AUDIO_FLAC_FILENAME)):
+        continue
       data_stream_name = file_naming.get_data_stream_name(obj_key)
       if data_stream_name == "MicWaveIn":
         num_audio_files += 1
@@ -296,51 +649,224 @@ class DataManager(object):
           obj_key)
       if not is_utc:
         raise NotImplemented("Support for non-UTC timezone is not implemented")
-      timestamp = timestamp.timestamp()
+      timestamp = pytz.utc.localize(timestamp).timestamp()
       if first_timestamp < 0 or timestamp < first_timestamp:
         first_timestamp = timestamp
       if timestamp > last_timestamp:
         last_timestamp = timestamp
       if obj_key.endswith("-SessionEnd.bin"):
-        tmp_filepath = self._download_to_temp_file(obj_key)
-        session_metadata = metadata_pb2.SessionMetadata()
-        with open(tmp_filepath, "rb") as f:
-          session_metadata.ParseFromString(f.read())
-        time_zone = session_metadata.timezone
+        time_zone = self._get_object_facts(
+            obj, self._read_session_end_facts)["timezone"]
         is_session_complete = True
-        os.remove(tmp_filepath)
       elif obj_key.endswith("-Keypresses.protobuf"):
-        tmp_filepath = self._download_to_temp_file(obj_key)
-        keypresses = process_keypresses.load_keypresses_from_protobuf_file(tmp_filepath)
-        num_keypresses += len(keypresses.keyPresses)
-        os.remove(tmp_filepath)
-    if not time_zone:
-      # Time zone is not found. Ask for it with a PySimpleGUI get-text dialog.
-      if not self._manual_timezone_name:
-        self._manual_timezone_name = self._get_manual_timezone()
+        num_keypresses += self._get_object_facts(
+            obj, self._read_keypresses_facts)["num_keypresses"]
+    return {
+        "is_session_complete": is_session_complete,
+        "time_zone": time_zone,
+        "first_timestamp": first_timestamp,
+        "last_timestamp": last_timestamp,
+        "num_keypresses": num_keypresses,
+        "num_audio_files": num_audio_files,
+        "num_screenshots": num_screenshots,
+        "object_keys": object_keys,
+    }
+
+  def _get_session_details_from_facts(self, facts):
+    """Convert the result of `_scan_session()` into session details.
+
+    May prompt the user for the time zone, once, if it is not available in
+    the facts.
+    """
+    if not facts["time_zone"]:
+      # Time zone is not found. Ask for it with the prompt function.
+      with self._manual_timezone_lock:
         if not self._manual_timezone_name:
-          self._manual_timezone_name = DEFAULT_TIMEZONE_NAME
+          self._manual_timezone_name = (
+              self._get_manual_timezone() or DEFAULT_TIMEZONE_NAME)
       tz = pytz.timezone(self._manual_timezone_name)
     else:
-      tz = pytz.timezone(_get_timezone(time_zone))
-    start_time = utc_timezone.localize(
-        datetime.datetime.fromtimestamp(first_timestamp)).astimezone(tz)
-    duration_s = last_timestamp - first_timestamp
-    return (is_session_complete,
-            str(tz), start_time, duration_s, num_keypresses, num_audio_files,
-            num_screenshots, object_keys)
+      tz = pytz.timezone(_get_timezone(facts["time_zone"]))
+    first_timestamp = facts["first_timestamp"]
+    start_time = datetime.datetime.fromtimestamp(first_timestamp, tz)
+    duration_s = facts["last_timestamp"] - first_timestamp
+    return (facts["is_session_complete"],
+            str(tz), start_time, duration_s, facts["num_keypresses"],
+            facts["num_audio_files"], facts["num_screenshots"],
+            facts["object_keys"])
+
+  def get_session_details(self, session_prefix, use_cached=True):
+    """Get the details about a session.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+      use_cached: Whether to use the session info cached or being prefetched
+        by `prefetch_session_info()`.
+
+    Returns:
+      A (is_session_complete, time_zone, start_time, duration_s,
+      num_keypresses, num_audio_files, num_screenshots, object_keys) tuple.
+    """
+    return self._get_session_details_from_facts(
+        self._get_session_info(session_prefix, use_cached=use_cached).facts)
+
+  def _load_session_info(self, session_prefix):
+    """Fetch the info of a session and cache it. Safe to call from workers."""
+    session_info = session_info_cache.SessionInfo(
+        self._scan_session(session_prefix),
+        self._get_remote_session_claim_username(session_prefix))
+    self._session_info_cache.put(session_prefix, session_info)
+    return session_info
+
+  def _get_session_info(self, session_prefix, use_cached=True):
+    """Get the SessionInfo of a session.
+
+    If use_cached is True, the cached info is used if available, and a
+    prefetch of the session in progress is waited for instead of fetching the
+    info again.
+    """
+    if not session_prefix.endswith("/"):
+      session_prefix += "/"
+    if use_cached:
+      session_info = self._session_info_cache.get(session_prefix)
+      if session_info is not None:
+        return session_info
+      with self._prefetch_lock:
+        future = self._prefetch_futures.get(session_prefix)
+      # A prefetch that hasn't started yet is cancelled in favor of fetching
+      # right away.
+      if future is not None and not future.cancel():
+        try:
+          return future.result()
+        except Exception as e:
+          print("Prefetching session %s failed: %s" % (session_prefix, e))
+    return self._load_session_info(session_prefix)
+
+  def prefetch_session_info(self, session_prefixes):
+    """Fetch the details and claims of sessions in the background.
+
+    The results are kept in a bounded LRU cache that `get_session_details()`
+    and `get_remote_session_claim_username(use_cached=True)` consult. Pending
+    prefetches of sessions that are not in session_prefixes are cancelled, so
+    that only the latest neighborhood of the selected session is fetched.
+
+    Args:
+      session_prefixes: The prefixes of the sessions to prefetch, including
+        the container prefix, in order of priority.
+    """
+    session_prefixes = [
+        prefix if prefix.endswith("/") else prefix + "/"
+        for prefix in session_prefixes]
+    with self._prefetch_lock:
+      for session_prefix, future in list(self._prefetch_futures.items()):
+        if future.done() or (session_prefix not in session_prefixes and
+                             future.cancel()):
+          del self._prefetch_futures[session_prefix]
+      for session_prefix in session_prefixes:
+        if (session_prefix in self._prefetch_futures or
+            session_prefix in self._session_info_cache):
+          continue
+        self._prefetch_futures[session_prefix] = self._prefetch_executor.submit(
+            self._load_session_info, session_prefix)
+
+  def invalidate_session_info(self, session_prefix=None):
+    """Remove the cached info of a session, or of all sessions if None."""
+    if session_prefix is not None and not session_prefix.endswith("/"):
+      session_prefix += "/"
+    self._session_info_cache.invalidate(session_prefix)
 
   def _get_manual_timezone(self):
-    manual_timezone_name = sg.popup_get_text(
+    manual_timezone_name = self._prompt(
         "Time zone is not available in the session's data files. "
         "Please enter (will use default %s if empty): " %
         DEFAULT_TIMEZONE_NAME)
     return manual_timezone_name
 
+  def _get_session_stats(self, session_prefix, facts):
+    """Get the per-session stats for container_summary from scanned facts."""
+    (is_session_complete, time_zone, start_time, duration_s, num_keypresses,
+     num_audio_files, num_screenshots,
+     object_keys) = self._get_session_details_from_facts(facts)
+    return {
+        "session": get_base_session_prefix(session_prefix),
+        "is_session_complete": is_session_complete,
+        "time_zone": time_zone,
+        "start_timestamp": start_time.timestamp(),
+        "duration_s": duration_s,
+        "num_keypresses": num_keypresses,
+        "num_audio_files": num_audio_files,
+        "num_screenshots": num_screenshots,
+        "num_objects": len(object_keys),
+    }
+
+  def _get_container_summary_blob_name(self, container_prefix):
+    return "/".join(
+        [GCS_SUMMARY_PREFIX] +
+        [item for item in container_prefix.split("/") if item] +
+        [container_summary.SUMMARY_FILENAME])
+
+  def _load_published_session_stats(self, container_prefix):
+    """Load the per-session stats published for a container.
+
+    Returns:
+      A dict mapping base session prefixes to per-session stats. Empty if no
+      summary has been published or it can't be loaded.
+    """
+    blob_name = self._get_container_summary_blob_name(container_prefix)
+    try:
+      summary_json = gcloud_utils.download_text_from_object(
+          self.gcs_bucket_name, blob_name)
+      if summary_json is None:
+        print("No published summary found at gs://%s/%s" %
+              (self.gcs_bucket_name, blob_name))
+        return dict()
+      return container_summary.parse_summary(summary_json)
+    except Exception as e:
+      print("Failed to load published summary gs://%s/%s: %s" %
+            (self.gcs_bucket_name, blob_name, e))
+      return dict()
+
+  def _publish_session_stats(self,
+                             container_prefix,
+                             session_stats,
+                             start_time_table):
+    blob_name = self._get_container_summary_blob_name(container_prefix)
+    summary = container_summary.make_summary(
+        container_prefix, session_stats, start_time_table.tolist(),
+        WEEKDAYS, HOUR_RANGES,
+        datetime.datetime.now(pytz.timezone("UTC")).isoformat())
+    try:
+      gcloud_utils.upload_text_to_object(
+          json.dumps(summary), self.gcs_bucket_name, blob_name)
+    except Exception as e:
+      print("Failed to publish summary to gs://%s/%s: %s" %
+            (self.gcs_bucket_name, blob_name, e))
+
   def get_sessions_stats(self,
                          container_prefix,
-                         session_prefixes):
-    """Get the summary statistics of the given sessions."""
+                         session_prefixes,
+                         use_published_stats=False,
+                         publish_stats=False):
+    """Get the summary statistics of the given sessions.
+
+    Args:
+      container_prefix: The container prefix.
+      session_prefixes: Session prefixes, relative to container_prefix.
+      use_published_stats: Whether to reuse the per-session stats of the
+        summary published for the container (see container_summary.py), so
+        that only the sessions that are not in it, or were incomplete, are
+        scanned. The objects of the other sessions are still counted, as
+        derived objects (e.g., preprocessing results) are added to complete
+        sessions over time, but from the cached listing of the container (see
+        remote_state.py) rather than by listing each session.
+      publish_stats: Whether to publish the per-session stats to GCS
+        afterwards, if any session was scanned.
+
+    Returns:
+      A (num_sessions, num_complete_sessions, total_duration_s,
+      total_keypresses, total_audio_files, total_screenshots, total_objects,
+      session_keypresses_per_second, start_time_table) tuple.
+    """
     num_sessions = 0
     num_complete_sessions = 0
     total_duration_s = 0
@@ -349,34 +875,75 @@ class DataManager(object):
     total_screenshots = 0
     total_objects = 0
     session_keypresses_per_second = dict()
-    session_gcs_status = dict()
     start_time_table = np.zeros([7, len(HOUR_RANGES)])
 
+    published_stats = (
+        self._load_published_session_stats(container_prefix)
+        if use_published_stats else dict())
+    prefixes_to_scan = []
+    reused_prefixes = []
     for session_prefix in session_prefixes:
-      (is_session_complete, _,
-       start_time, duration_s, num_keypresses, num_audio_files,
-       num_screenshots, object_keys) = self.get_session_details(
-          container_prefix + session_prefix)
+      stats = published_stats.get(get_base_session_prefix(session_prefix))
+      if stats is None or not stats["is_session_complete"]:
+        prefixes_to_scan.append(session_prefix)
+      else:
+        reused_prefixes.append(session_prefix)
+    if use_published_stats:
+      print("Reusing the published stats of %d sessions; scanning %d sessions" %
+            (len(session_prefixes) - len(prefixes_to_scan),
+             len(prefixes_to_scan)))
+
+    # The sessions are scanned concurrently with a bounded pool of workers.
+    # The results are consumed in the original order of session_prefixes.
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self._max_workers) as executor:
+      facts_futures = [
+          executor.submit(self._scan_session, container_prefix + session_prefix)
+          for session_prefix in prefixes_to_scan]
+      remote_state_future = (
+          executor.submit(self._get_remote_state, container_prefix)
+          if reused_prefixes else None)
+      gcs_future = executor.submit(
+          self.get_sessions_gcs_status, container_prefix, session_prefixes)
+      session_facts = [future.result() for future in facts_futures]
+      snapshot = (remote_state_future.result()
+                  if remote_state_future else None)
+      session_gcs_status = gcs_future.result()
+    for session_prefix, facts in zip(prefixes_to_scan, session_facts):
+      published_stats[get_base_session_prefix(session_prefix)] = (
+          self._get_session_stats(session_prefix, facts))
+    for session_prefix in reused_prefixes:
+      base_session_prefix = get_base_session_prefix(session_prefix)
+      published_stats[base_session_prefix] = dict(
+          published_stats[base_session_prefix],
+          num_objects=snapshot.get_num_objects(
+              container_prefix + base_session_prefix + "/"))
+
+    session_stats = [
+        published_stats[get_base_session_prefix(session_prefix)]
+        for session_prefix in session_prefixes]
+    for stats in session_stats:
+      start_time = datetime.datetime.fromtimestamp(
+          stats["start_timestamp"], pytz.timezone(stats["time_zone"]))
       start_time_table[
           start_time.weekday(), get_hour_index(start_time.hour)] += 1
       num_sessions += 1
-      if is_session_complete:
+      if stats["is_session_complete"]:
         num_complete_sessions += 1
+      duration_s = stats["duration_s"]
       total_duration_s += duration_s
-      total_keypresses += num_keypresses
-      total_audio_files += num_audio_files
-      total_screenshots += num_screenshots
-      total_objects += len(object_keys)
-      session_keypresses_per_second[
-          get_base_session_prefix(session_prefix)] = (
-              None if duration_s == 0 else num_keypresses / duration_s)
-      session_gcs_status[get_base_session_prefix(session_prefix)] = (
-          STATE_UPLOADED if self.is_session_uploaded_to_gcs(
-              container_prefix + session_prefix)
-          else STATE_NOT_UPLOADED)
+      total_keypresses += stats["num_keypresses"]
+      total_audio_files += stats["num_audio_files"]
+      total_screenshots += stats["num_screenshots"]
+      total_objects += stats["num_objects"]
+      session_keypresses_per_second[stats["session"]] = (
+          None if duration_s == 0 else stats["num_keypresses"] / duration_s)
     self._session_keypresses_per_second = session_keypresses_per_second
     self._session_gcs_status = session_gcs_status
     _print_time_summary_table(start_time_table)
+    if publish_stats and prefixes_to_scan:
+      self._publish_session_stats(
+          container_prefix, session_stats, start_time_table)
     return (num_sessions, num_complete_sessions, total_duration_s,
             total_keypresses, total_audio_files, total_screenshots,
             total_objects, session_keypresses_per_second, start_time_table)
@@ -395,24 +962,113 @@ class DataManager(object):
       return False
     return os.path.getsize(file_path) > 0
 
-  def sync_to_local(self, session_prefix):
+  def sync_to_local(self,
+                    session_prefix,
+                    progress_callback=None,
+                    cancel_event=None,
+                    profile=SYNC_PROFILE_FULL):
+    """Download the objects of a session to the local session directory.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+      progress_callback: Optional function to be called with an
+        s3_transfer.TransferStats whenever progress is made.
+      cancel_event: Optional threading.Event that cancels the download of the
+        files that haven't started downloading once it is set.
+      profile: One of the keys of SYNC_PROFILES, determining which objects are
+        downloaded. Unless the session has already been downloaded in full,
+        a partial profile leaves a PARTIAL_SYNC_FILENAME marker in the session
+        directory, so that its local status remains STATE_NOT_DOWNLOADED. A
+        full sync removes the marker.
+
+    Returns:
+      A (message, sessions_changed) tuple.
+
+    Raises:
+      ValueError: if profile is invalid.
+    """
+    if profile not in SYNC_PROFILES:
+      raise ValueError("Invalid sync profile: %s" % profile)
     local_dest_dir = self.get_local_session_dir(session_prefix)
     if not os.path.isdir(local_dest_dir):
       os.makedirs(local_dest_dir)
       print("Created session directory: %s" % local_dest_dir)
-    print("Sync'ing session to local: %s --> %s" %
-          (session_prefix, local_dest_dir))
-    command_args = [
-        "aws", "s3", "sync", "--profile=%s" % self._aws_profile_name,
-        "s3://" + self._s3_bucket_name + "/" + session_prefix, local_dest_dir]
-    self._run_command_line(command_args)
+    partial_sync_path = os.path.join(
+        local_dest_dir, file_naming.PARTIAL_SYNC_FILENAME)
+    if (profile != SYNC_PROFILE_FULL and
+        self._compute_local_session_folder_status(local_dest_dir) ==
+        STATE_NOT_DOWNLOADED):
+      with open(partial_sync_path, "wt") as f:
+        f.write(profile)
+    print("Sync'ing session to local (%s): %s --> %s" %
+          (profile, session_prefix, local_dest_dir))
+    stats = self._transfer_engine.download_prefix(
+        session_prefix, local_dest_dir, filters=SYNC_PROFILES[profile],
+        progress_callback=progress_callback, cancel_event=cancel_event,
+        archive_dir=file_naming.SESSION_ARCHIVE_DIRNAME)
+    self.invalidate_local_session_folder_status(session_prefix)
+    if stats.cancelled:
+      print("Download cancelled.")
+      return "Download cancelled.", "session"
+    if profile == SYNC_PROFILE_FULL and os.path.isfile(partial_sync_path):
+      os.remove(partial_sync_path)
+    # If only the FLAC copy of the concatenated audio was uploaded, regenerate
+    # the WAV file, which ELAN needs. An existing WAV file is regenerated only
+    # if this sync downloaded the FLAC file. The other profiles don't need
+    # the audio.
+    if profile == SYNC_PROFILE_FULL:
+      concatenated_audio.ensure_wav(
+          local_dest_dir,
+          force=(file_naming.CONCATENATED_AUDIO_FLAC_FILENAME in
+                 stats.transferred_paths))
     print("Download complete.")
     return "Download complete.", "session"
 
-  def get_local_session_folder_status(self, session_prefix):
+  def get_local_session_folder_status(self, session_prefix, use_cached=False):
+    """Get local session folder status.
+
+    Args:
+      session_prefix: Session prefix.
+      use_cached: Whether to use the status cached for the session directory,
+        as long as the modification time of the directory hasn't changed.
+        Files modified in place (as opposed to created, deleted or renamed)
+        don't change the modification time of the directory, so this should be
+        False when the status determines what operation is performed.
+
+    Returns:
+      The status string.
+    """
     local_dest_dir = self.get_local_session_dir(session_prefix)
+    try:
+      mtime_ns = os.stat(local_dest_dir).st_mtime_ns
+    except OSError:
+      mtime_ns = None
+    if use_cached:
+      with self._local_status_cache_lock:
+        cached = self._local_status_cache.get(local_dest_dir)
+      if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    status = self._compute_local_session_folder_status(local_dest_dir)
+    with self._local_status_cache_lock:
+      self._local_status_cache[local_dest_dir] = (mtime_ns, status)
+    return status
+
+  def invalidate_local_session_folder_status(self, session_prefix=None):
+    """Discard the cached local status of a session, or of all sessions."""
+    with self._local_status_cache_lock:
+      if session_prefix is None:
+        self._local_status_cache.clear()
+      else:
+        self._local_status_cache.pop(
+            self.get_local_session_dir(session_prefix), None)
+
+  def _compute_local_session_folder_status(self, local_dest_dir):
     if not os.path.isdir(local_dest_dir):
       return STATE_NOT_DOWNLOADED
+    elif os.path.isfile(
+        os.path.join(local_dest_dir, file_naming.PARTIAL_SYNC_FILENAME)):
+      # Only the files for post-hoc analysis have been downloaded.
+      return STATE_NOT_DOWNLOADED
     else:
       if (self._nonempty_file_exists(
               local_dest_dir, file_naming.CURATED_PROCESSED_JSON_FILENAME) and
@@ -426,8 +1082,7 @@ class DataManager(object):
         return STATE_CURATED
       elif (self._nonempty_file_exists(
               local_dest_dir, file_naming.MERGED_TSV_FILENAME) and
-          self._nonempty_file_exists(
-              local_dest_dir, file_naming.CONCATENATED_AUDIO_FILENAME) and
+          concatenated_audio.has_concatenated_audio(local_dest_dir) and
           self._nonempty_file_exists(
               local_dest_dir, file_naming.SCREENSHOTS_MP4_FILENAME)):
         return STATE_PREPROCESSED
@@ -469,31 +1124,53 @@ class DataManager(object):
       status_string += " " + gcs_string
     return status_string
 
-  def _remote_object_exists(self, session_prefix, filename):
-    merged_key = session_prefix + filename
-    response = self._s3_client.list_objects_v2(
-        Bucket=self._s3_bucket_name, Prefix=merged_key)
-    return "KeyCount" in response and response["KeyCount"] > 0
+  def _get_remote_state(self, container_prefix, load=True):
+    """Get the RemoteStateSnapshot of a container.
+
+    Args:
+      container_prefix: The container prefix.
+      load: Whether to refresh the snapshot if it hasn't been loaded or has
+        expired.
+
+    Returns:
+      The RemoteStateSnapshot.
+    """
+    with self._remote_states_lock:
+      snapshot = self._remote_states.get(container_prefix)
+      if snapshot is None:
+        snapshot = remote_state.RemoteStateSnapshot(
+            self._s3_client, self._s3_bucket_name, container_prefix,
+            ttl_s=self._remote_state_ttl_s)
+        self._remote_states[container_prefix] = snapshot
+    if load and snapshot.is_expired():
+      snapshot.refresh()
+    return snapshot
+
+  def _get_remote_state_of_session(self, session_prefix, load=True):
+    """Get the RemoteStateSnapshot and normalized prefix of a session."""
+    if not session_prefix.endswith("/"):
+      session_prefix += "/"
+    container_prefix = session_prefix[:session_prefix.rindex(
+        "/", 0, len(session_prefix) - 1) + 1]
+    return self._get_remote_state(container_prefix, load=load), session_prefix
+
+  def _record_uploaded_files(self, session_prefix, local_dir, filters):
+    """Record the tracked files uploaded from a local session directory."""
+    self.invalidate_session_info(session_prefix)
+    snapshot, session_prefix = self._get_remote_state_of_session(
+        session_prefix, load=False)
+    snapshot.record_objects(session_prefix, [
+        filename for filename in remote_state.TRACKED_FILENAMES
+        if (s3_transfer.matches_filters(filename, filters) and
+            os.path.isfile(os.path.join(local_dir, filename)))])
 
   def update_remote_session_objects_status(self, session_container_prefix):
-    """Update the status of key remote objects."""
-    paginator = self._s3_client.get_paginator("list_objects_v2")
-    pages = paginator.paginate(
-        Bucket=self._s3_bucket_name, Prefix=session_container_prefix)
-    query_string = (
-        "Contents[?ends_with(Key, `/%s`) || ends_with(Key, `/%s`)][]" %
-        (file_naming.MERGED_TSV_FILENAME,
-         file_naming.CURATED_PROCESSED_TSV_FILENAME))
-    objects = pages.search(query_string)
-    self._sessions_with_merged_tsv = []
-    self._sessions_with_curated_processed_tsv = []
-    for obj in objects:
-      obj_key = obj["Key"]
-      session = obj_key[:obj_key.rindex("/") + 1]
-      if obj_key.endswith(file_naming.MERGED_TSV_FILENAME):
-        self._sessions_with_merged_tsv.append(session)
-      elif obj_key.endswith(file_naming.CURATED_PROCESSED_TSV_FILENAME):
-        self._sessions_with_curated_processed_tsv.append(session)
+    """Update the status of key remote objects.
+
+    Lists only the objects added since the last update, unless the cached
+    state has expired.
+    """
+    self._get_remote_state(session_container_prefix, load=False).refresh()
 
   def get_remote_session_folder_status(self, session_prefix, use_cached=False):
     """Get remote session folder status.
@@ -505,41 +1182,103 @@ class DataManager(object):
     Returns:
       The status string.
     """
-    if use_cached:
-      if session_prefix in self._sessions_with_curated_processed_tsv:
-        return STATE_POSTPROCESSED
-      elif session_prefix in self._sessions_with_merged_tsv:
-        return STATE_PREPROCESSED
-      else:
-        return STATE_NOT_PREPROCESSED
+    snapshot, session_prefix = self._get_remote_state_of_session(
+        session_prefix, load=use_cached)
+    if not use_cached:
+      snapshot.refresh_session(session_prefix)
+    if snapshot.has_object(
+        session_prefix, file_naming.CURATED_PROCESSED_TSV_FILENAME):
+      return STATE_POSTPROCESSED
+    elif snapshot.has_object(session_prefix, file_naming.MERGED_TSV_FILENAME):
+      return STATE_PREPROCESSED
     else:
-      if self._remote_object_exists(
-         session_prefix, file_naming.CURATED_PROCESSED_TSV_FILENAME):
-        return STATE_POSTPROCESSED
-      elif self._remote_object_exists(
-        session_prefix, file_naming.MERGED_TSV_FILENAME):
-        return STATE_PREPROCESSED
-      else:
-        return STATE_NOT_PREPROCESSED
+      return STATE_NOT_PREPROCESSED
 
-  def get_remote_session_claim_username(self, session_prefix):
+  def _get_claim_username(self, claim_object):
+    """Get the username in a claim.json object, using the cache if possible.
+
+    Args:
+      claim_object: The listing entry of the claim.json object. May lack the
+        "ETag" if the claim was made by this process.
+
+    Returns:
+      The claiming username, or None if the session is unclaimed.
+    """
+    object_key = claim_object["Key"]
+    etag = claim_object.get("ETag")
+    with self._claim_cache_lock:
+      cached = self._claim_cache.get(object_key)
+    if cached is not None and cached[0] == etag:
+      return cached[1]
     f = io.BytesIO()
-    if self._remote_object_exists(session_prefix, CLAIM_JSON_FILENAME):
-      self._s3_client.download_fileobj(
-          self._s3_bucket_name, session_prefix + CLAIM_JSON_FILENAME, f)
-      json_obj = json.loads(f.getvalue())
-      return json_obj.get("username", None)
-    else:
+    self._s3_client.download_fileobj(self._s3_bucket_name, object_key, f)
+    username = json.loads(f.getvalue()).get("username", None)
+    with self._claim_cache_lock:
+      self._claim_cache[object_key] = (etag, username)
+    return username
+
+  def get_remote_session_claim_username(self, session_prefix,
+                                        use_cached=False):
+    """Get the username of the curator who claimed a session.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+      use_cached: Whether to use the session info cached or being prefetched
+        by `prefetch_session_info()`. Otherwise, the claim is looked up in S3.
+
+    Returns:
+      The claiming username, or None if the session is unclaimed.
+    """
+    if use_cached:
+      return self._get_session_info(session_prefix).claiming_username
+    return self._get_remote_session_claim_username(session_prefix)
+
+  def _get_remote_session_claim_username(self, session_prefix):
+    snapshot, session_prefix = self._get_remote_state_of_session(
+        session_prefix, load=False)
+    snapshot.refresh_session(session_prefix)
+    claim_object = snapshot.get_object(session_prefix, CLAIM_JSON_FILENAME)
+    if claim_object is None:
       return None
+    return self._get_claim_username(claim_object)
+
+  def get_sessions_claim_usernames(self, container_prefix):
+    """Get the claiming usernames of all claimed sessions in a container.
+
+    The claim.json objects are found in the cached listing of the container
+    and are fetched concurrently. Objects whose ETags haven't changed since
+    they were last fetched are not fetched again.
+
+    Args:
+      container_prefix: The container prefix.
+
+    Returns:
+      A dict mapping base session prefixes to claiming usernames. Unclaimed
+      sessions are not included.
+    """
+    snapshot = self._get_remote_state(container_prefix)
+    claim_objects = [
+        snapshot.get_object(session_prefix, CLAIM_JSON_FILENAME)
+        for session_prefix in sorted(
+            snapshot.get_sessions_with_object(CLAIM_JSON_FILENAME))]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self._max_workers) as executor:
+      usernames = list(executor.map(self._get_claim_username, claim_objects))
+    claim_usernames = dict()
+    for claim_object, username in zip(claim_objects, usernames):
+      if username:
+        claim_usernames[get_base_session_prefix(
+            claim_object["Key"][:-len(CLAIM_JSON_FILENAME)])] = username
+    return claim_usernames
 
   def claim_session(self, session_prefix, unclaim=False):
     """Upload a file to the session prefix in S3 to claim this session."""
     existing_claim = self.get_remote_session_claim_username(session_prefix)
     if existing_claim:
       if existing_claim != self._curator_username:
-        sg.Popup(
+        self._notify(
           "The session %s is already claimed by somenoe else: %s" %
-          (session_prefix, existing_claim), modal=True)
+          (session_prefix, existing_claim))
       if not unclaim:
         return
     remote_json_path = self._get_remote_claim_json_path(session_prefix)
@@ -552,6 +1291,13 @@ class DataManager(object):
     self._s3_client.upload_file(
         tmp_json_path, self._s3_bucket_name, remote_json_path)
     os.remove(tmp_json_path)
+    snapshot, session_prefix = self._get_remote_state_of_session(
+        session_prefix, load=False)
+    snapshot.record_objects(session_prefix, [CLAIM_JSON_FILENAME])
+    with self._claim_cache_lock:
+      self._claim_cache[session_prefix + CLAIM_JSON_FILENAME] = (
+          None, None if unclaim else self._curator_username)
+    self.invalidate_session_info(session_prefix)
 
   def _get_remote_claim_json_path(self, session_prefix):
     remote_json_path = session_prefix
@@ -569,14 +1315,99 @@ class DataManager(object):
         self.gcs_bucket_name, destination_blob_prefix,
         POSTPROCESSING_FILES_TO_UPLOAD)
 
-  def preprocess_session(self, session_prefix):
+  def get_sessions_gcs_status(self, container_prefix, session_prefixes):
+    """Get the GCS upload status of multiple sessions in a container.
+
+    Unlike calling `is_session_uploaded_to_gcs()` for each session, this lists
+    the GCS objects of the container only once.
+
+    Args:
+      container_prefix: The container prefix.
+      session_prefixes: Session prefixes, relative to container_prefix.
+
+    Returns:
+      A dict mapping base session prefixes to STATE_UPLOADED or
+      STATE_NOT_UPLOADED.
+    """
+    container_blob_prefix = "/".join(
+        [GCS_POSTPROCESSED_UPLOAD_PREFIX] +
+        [item for item in container_prefix.split("/") if item])
+    uploaded_sessions = gcloud_utils.get_prefixes_with_all_objects(
+        self.gcs_bucket_name, container_blob_prefix,
+        POSTPROCESSING_FILES_TO_UPLOAD)
+    session_gcs_status = dict()
+    for session_prefix in session_prefixes:
+      base_session_prefix = get_base_session_prefix(session_prefix)
+      session_gcs_status[base_session_prefix] = (
+          STATE_UPLOADED if base_session_prefix in uploaded_sessions
+          else STATE_NOT_UPLOADED)
+    return session_gcs_status
+
+  def update_sessions_gcs_status(self, container_prefix, session_prefixes):
+    """Refresh the cached GCS upload status of the sessions in a container."""
+    session_gcs_status = self.get_sessions_gcs_status(
+        container_prefix, session_prefixes)
+    if self._session_gcs_status is None:
+      self._session_gcs_status = dict()
+    self._session_gcs_status.update(session_gcs_status)
+
+  def get_sessions_status(self, container_prefix):
+    """Get the remote, local and GCS status of all sessions in a container.
+
+    Args:
+      container_prefix: The container prefix.
+
+    Returns:
+      session_prefixes: The list of session prefixes, relative to
+        container_prefix.
+      sessions_status: A list of dicts of the same length as session_prefixes,
+        each with the keys "remote_status", "local_status", "gcs_status" and
+        "claiming_username". "gcs_status" is None if the GCS status cannot be
+        determined. "claiming_username" is None for unclaimed sessions.
+    """
+    session_prefixes = self.get_session_prefixes(container_prefix)
+    self.update_remote_session_objects_status(container_prefix)
+    try:
+      self.update_sessions_gcs_status(container_prefix, session_prefixes)
+    except Exception as e:
+      print("Failed to get the GCS upload status of sessions: %s" % e)
+    try:
+      claim_usernames = self.get_sessions_claim_usernames(container_prefix)
+    except Exception as e:
+      print("Failed to get the claims of sessions: %s" % e)
+      claim_usernames = dict()
+    sessions_status = []
+    for session_prefix in session_prefixes:
+      sessions_status.append({
+          "remote_status": self.get_remote_session_folder_status(
+              container_prefix + session_prefix, use_cached=True),
+          "local_status": self.get_local_session_folder_status(
+              container_prefix + session_prefix, use_cached=True),
+          "gcs_status": self.get_session_gcs_status(session_prefix),
+          "claiming_username": claim_usernames.get(
+              get_base_session_prefix(session_prefix)),
+      })
+    return session_prefixes, sessions_status
+
+  def preprocess_session(self, session_prefix, redo=None):
+    """Preprocess a downloaded session by running elan_format_raw.py.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+      redo: Whether to preprocess again a session that has already been
+        preprocessed locally. If None, the user is asked.
+
+    Returns:
+      A (message, sessions_changed) tuple. sessions_changed is False if
+      preprocessing was skipped.
+    """
     to_run_preproc = True
     if self.get_local_session_folder_status(session_prefix) in (
         STATE_PREPROCESSED, STATE_CURATED, STATE_POSTPROCESSED):
-      answer = sg.popup_yes_no(
+      to_run_preproc = redo if redo is not None else self._confirm(
+          CONFIRM_REDO,
           "Session %s has already been preprocessed locally. "
           "Do you want to run preprocessing again?" % session_prefix)
-      to_run_preproc = answer == "Yes"
     if not to_run_preproc:
       return "Preprocessing was not run.", False
 
@@ -585,58 +1416,211 @@ class DataManager(object):
      _, _, _, _, _, _) = self.get_session_details(session_prefix)
     timezone = _get_timezone(readable_timezone_name)
     command_args = ["python", "elan_format_raw.py", local_dest_dir, timezone]
+    if self._flac_audio:
+      command_args.append("--flac_audio")
     self._run_command_line(command_args)
+    session_manifest.write_manifest(local_dest_dir)
+    self.invalidate_local_session_folder_status(session_prefix)
     message = "Preprocessing complete."
     print(message)
     return message, "session"
 
-  def upload_sesssion_preproc_results(self, session_prefix):
+  def upload_sesssion_preproc_results(self,
+                                      session_prefix,
+                                      progress_callback=None,
+                                      cancel_event=None,
+                                      redo=None):
+    """Upload the preprocessing results of a session to S3.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+      progress_callback: Optional function to be called with an
+        s3_transfer.TransferStats whenever progress is made.
+      cancel_event: Optional threading.Event that cancels the upload.
+      redo: Whether to upload again if the session already contains
+        preprocessing results remotely. If None, the user is asked.
+
+    Returns:
+      A (message, sessions_changed) tuple. sessions_changed is False if the
+      upload was skipped or cancelled.
+
+    Raises:
+      ValueError: if the session has no local preprocessing results.
+    """
     if self.get_local_session_folder_status(session_prefix) not in  (
         STATE_PREPROCESSED, STATE_CURATED, STATE_POSTPROCESSED):
-      sg.Popup(
+      raise ValueError(
           "Cannot upload the preprocessing results of session %s, "
-          "because no preprocessing results are found" % session_prefix,
-          modal=True)
-      return "Not uploading preprocessing results", False
+          "because no preprocessing results are found" % session_prefix)
     to_upload = True
     if self.get_remote_session_folder_status(session_prefix) != STATE_NOT_PREPROCESSED:
-      answer = sg.popup_yes_no(
+      to_upload = redo if redo is not None else self._confirm(
+          CONFIRM_REDO,
           "Session %s already contains preprocessing results remotely. "
           "Do you want to upload preprocessing results again?" % session_prefix)
-      to_upload = answer == "Yes"
     if not to_upload:
       return "Uploading of preprocessing results canceled", False
 
     local_dest_dir = self.get_local_session_dir(session_prefix)
-    command_args = [
-        "aws", "s3", "sync", "--profile=%s" % self._aws_profile_name,
-        local_dest_dir, "s3://" + self._s3_bucket_name + "/" + session_prefix,
-        "--exclude=*", "--include=*.tsv",
-        "--include=%s" % file_naming.CONCATENATED_AUDIO_FILENAME,
-        "--include=%s" % file_naming.SCREENSHOTS_MP4_FILENAME]
-    self._run_command_line(command_args)
+    if not os.path.isfile(os.path.join(
+        local_dest_dir, file_naming.MANIFEST_JSON_FILENAME)):
+      # The session may have been preprocessed before manifests were
+      # introduced.
+      session_manifest.write_manifest(local_dest_dir)
+    upload_filters = PREPROCESSING_UPLOAD_FILTERS
+    if self._flac_audio:
+      # The session may have been preprocessed without FLAC audio.
+      concatenated_audio.compress_to_flac(local_dest_dir)
+      upload_filters = PREPROCESSING_FLAC_UPLOAD_FILTERS
+    stats = self._transfer_engine.upload_dir(
+        local_dest_dir, session_prefix, filters=upload_filters,
+        progress_callback=progress_callback, cancel_event=cancel_event)
+    if stats.cancelled:
+      # Some of the files may have been uploaded.
+      self.get_remote_session_folder_status(session_prefix)
+      self.invalidate_session_info(session_prefix)
+      return "Uploading of preprocessing results cancelled", False
+    self._record_uploaded_files(session_prefix, local_dest_dir, upload_filters)
     print("Done uploading the preprocessing results for session %s" %
           session_prefix)
+    if self._write_session_archives:
+      self.upload_session_archives(
+          session_prefix, progress_callback=progress_callback,
+          cancel_event=cancel_event)
     return "Uploading of preprocessing results complete", "session"
 
-  def postprocess_curation(self, session_prefix):
+  def upload_session_archives(self,
+                              session_prefix,
+                              progress_callback=None,
+                              cancel_event=None):
+    """Pack the local raw data files of a session and upload the archives.
+
+    The archives are uploaded to the SESSION_ARCHIVE_DIRNAME subdirectory of
+    the session, from which `sync_to_local()` fetches the packed files with
+    range reads. The index is uploaded after the tar files, so that a partial
+    upload is never used.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+      progress_callback: Optional function to be called with an
+        s3_transfer.TransferStats whenever progress is made.
+      cancel_event: Optional threading.Event that cancels the upload.
+
+    Returns:
+      The s3_transfer.TransferStats of the upload of the index.
+
+    Raises:
+      ValueError: if the local session directory has no raw data files.
+    """
     local_dest_dir = self.get_local_session_dir(session_prefix)
+    archive_prefix = session_prefix + file_naming.SESSION_ARCHIVE_DIRNAME
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      session_archive.write_archives(local_dest_dir, tmp_dir)
+      stats = self._transfer_engine.upload_dir(
+          tmp_dir, archive_prefix,
+          filters=[(s3_transfer.EXCLUDE, session_archive.INDEX_FILENAME)],
+          progress_callback=progress_callback, cancel_event=cancel_event)
+      if not stats.cancelled:
+        stats = self._transfer_engine.upload_dir(
+            tmp_dir, archive_prefix,
+            filters=[(s3_transfer.EXCLUDE, "*"),
+                     (s3_transfer.INCLUDE, session_archive.INDEX_FILENAME)],
+            progress_callback=progress_callback, cancel_event=cancel_event)
+    finally:
+      shutil.rmtree(tmp_dir)
+    self.invalidate_session_info(session_prefix)
+    return stats
+
+  def download_preprocess_upload_sessions(
+      self,
+      session_prefixes,
+      num_download_workers=DEFAULT_BATCH_DOWNLOAD_WORKERS,
+      num_preprocess_workers=DEFAULT_BATCH_PREPROCESS_WORKERS,
+      num_upload_workers=DEFAULT_BATCH_UPLOAD_WORKERS,
+      progress_callback=None,
+      cancel_event=None,
+      redo=False):
+    """Download, preprocess and upload sessions in a pipelined fashion.
+
+    The three stages run concurrently on different sessions, so that the
+    network isn't idle while a session is being preprocessed and vice versa.
+    The stages run on worker threads and don't ask for confirmations: whether
+    to redo existing results is decided up front by the redo argument.
+
+    Args:
+      session_prefixes: Prefixes of the sessions, including the container
+        prefix.
+      num_download_workers: Number of sessions downloaded concurrently.
+      num_preprocess_workers: Number of sessions preprocessed concurrently.
+      num_upload_workers: Number of sessions uploaded concurrently.
+      progress_callback: Optional function to be called with the
+        batch_pipeline.PipelineReport whenever a session is done.
+      cancel_event: Optional threading.Event. Once it is set, no more
+        sessions are started and the ongoing transfers stop after their
+        current files.
+      redo: Whether to upload the preprocessing results of sessions that
+        already contain preprocessing results remotely. If False, those
+        sessions are reported as failures.
+
+    Returns:
+      A batch_pipeline.PipelineReport.
+    """
+    def download(session_prefix):
+      if (self.get_local_session_folder_status(session_prefix) ==
+          STATE_NOT_DOWNLOADED):
+        print("Downloading %s ..." % session_prefix)
+        self.sync_to_local(session_prefix, cancel_event=cancel_event)
+
+    def preprocess(session_prefix):
+      if (self.get_local_session_folder_status(session_prefix) ==
+          STATE_DOWNLOADED):
+        print("Preprocessing %s ..." % session_prefix)
+        self.preprocess_session(session_prefix, redo=redo)
+
+    def upload(session_prefix):
+      print("Uploading preprocessing results for %s..." % session_prefix)
+      _, success = self.upload_sesssion_preproc_results(
+          session_prefix, cancel_event=cancel_event, redo=redo)
+      if not success:
+        raise ValueError("Preprocessing results were not uploaded")
+
+    report = batch_pipeline.run_pipeline(session_prefixes, [
+        batch_pipeline.Stage("download", download, num_download_workers),
+        batch_pipeline.Stage("preprocess", preprocess, num_preprocess_workers),
+        batch_pipeline.Stage("upload", upload, num_upload_workers),
+    ], cancel_event=cancel_event, progress_callback=progress_callback)
+    print(report)
+    return report
+
+  def postprocess_curation(self, session_prefix):
+    """Postprocess the curation results of a session.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix.
+
+    Returns:
+      A (message, sessions_changed) tuple. sessions_changed is False if
+      postprocessing was skipped.
+
+    Raises:
+      ValueError: if the session has no local curation results, or if
+        postprocessing fails, including when misspelled words are not
+        ignored.
+    """
     local_status = self.get_local_session_folder_status(session_prefix)
     if local_status not in (STATE_CURATED, STATE_POSTPROCESSED):
-      sg.Popup(
+      raise ValueError(
           "Cannot postprocess the curation results of session %s, "
           "because the local directory for the session doesn't contain "
           "the expected file from ELAN: %s" %
-          (session_prefix, file_naming.CURATED_TSV_FILENAME),
-          modal=True)
-      return ("Not postprocessing curation results: Cannot find %s" %
-              file_naming.CURATED_TSV_FILENAME), False
+          (session_prefix, file_naming.CURATED_TSV_FILENAME))
     to_postprocess = True
     if local_status == STATE_POSTPROCESSED:
-      answer = sg.popup_yes_no(
+      to_postprocess = self._confirm(
+          CONFIRM_REDO,
           "Session is %s already postprocessed successfully. "
           "Do you want to do postprocessing again?" % session_prefix)
-      to_postprocess = answer == "Yes"
     if not to_postprocess:
       return "Not performing postprocessing", False
 
@@ -644,51 +1628,62 @@ class DataManager(object):
     try:
       misspelled_words = elan_process_curated.postprocess_curated(
           local_dest_dir, self._speaker_id_config_json_path)
-      if misspelled_words:
-        answer = sg.popup_yes_no(
-            "Found misspelled words: " +
-            ", ".join(("\"%s\"" % w) for w in misspelled_words) +
-            "\n\nDo you want to ignore them?"
-            "\n\nClick Yes to ignore them. Click No to go back and fix them.")
-        if answer != "Yes":
-          raise ValueError(
-              "There are misspelled word(s) that you decided not to ignore. "
-              "Please fix them in ELAN or curated.tsv.")
-
-      message = "Postprocessing succeeded!"
-      print(message)
-      sg.Popup(message, modal=True)
-      return message, "session"
-    except Exception as e:
-      failure_message = "Postprocessing failed with error message:\n\n%s" % e
-      print(failure_message)
-      sg.Popup(failure_message, title="Postprocessing failed", modal=True)
-      return "Postprocessing failed", False
+    finally:
+      self.invalidate_local_session_folder_status(session_prefix)
+    if misspelled_words:
+      to_ignore = self._confirm(
+          CONFIRM_IGNORE_MISSPELLED,
+          "Found misspelled words: " +
+          ", ".join(("\"%s\"" % w) for w in misspelled_words) +
+          "\n\nDo you want to ignore them?"
+          "\n\nClick Yes to ignore them. Click No to go back and fix them.")
+      if not to_ignore:
+        raise ValueError(
+            "There are misspelled word(s) that you decided not to ignore. "
+            "Please fix them in ELAN or curated.tsv.")
+
+    message = "Postprocessing succeeded!"
+    print(message)
+    self._notify(message)
+    return message, "session"
+
+  def upload_session_postproc_results(self,
+                                      session_prefix,
+                                      to_gcs=False,
+                                      progress_callback=None,
+                                      cancel_event=None):
+    """Upload post processing results to S3 or GCS.
+
+    progress_callback and cancel_event apply to uploads to S3, in the same way
+    as for sync_to_local().
+
+    Returns:
+      A (message, sessions_changed) tuple. sessions_changed is False if the
+      upload was skipped or cancelled.
 
-  def upload_session_postproc_results(self, session_prefix, to_gcs=False):
-    """Upload post processing results to S3 or GCS."""
+    Raises:
+      ValueError: if the session has no local postprocessing results.
+    """
     if self.get_local_session_folder_status(session_prefix) != STATE_POSTPROCESSED:
-      sg.Popup(
+      raise ValueError(
           "Cannot upload the postprocessing results of session %s, "
-          "because no postprocessing results are found" % session_prefix,
-          modal=True)
-      return "Not uploading postprocessing results", False
+          "because no postprocessing results are found" % session_prefix)
     to_upload = True
     if (not to_gcs and
         self.get_remote_session_folder_status(session_prefix) == STATE_POSTPROCESSED):
-      answer = sg.popup_yes_no(
+      to_upload = self._confirm(
+          CONFIRM_REDO,
           "Session %s already contains postprocessing results remotely. "
           "Do you want to upload postprocessing results again?" % session_prefix)
-      to_upload = answer == "Yes"
     if not to_upload:
       return "Uploading of postprocessing results canceled.", False
 
     local_session_dir = self.get_local_session_dir(session_prefix)
     if to_gcs:
-      answer = sg.popup_yes_no(
+      to_upload = self._confirm(
+          CONFIRM_PROCEED,
           "Are you sure you want to upload proprocessing results from session %s "
           "to GCS bucket %s?" % (session_prefix, self.gcs_bucket_name))
-      to_upload = answer == "Yes"
       if not to_upload:
         return "Not uploading postprocessing results to GCS", False
       destination_blob_prefix = "/".join(
@@ -696,26 +1691,29 @@ class DataManager(object):
             [item for item in session_prefix.split("/") if item])
       print("Destination blob prefix: %s" % destination_blob_prefix)
       if self.is_session_uploaded_to_gcs(session_prefix):
-        answer = sg.popup_yes_no(
+        to_upload = self._confirm(
+            CONFIRM_REDO,
             "This session has already been uploaded to GCS. "
             "Do you want to uploade it again, overwriting files?")
-        to_upload = answer == "Yes"
         if not to_upload:
           return "Not uploading postprocessing results to GCS", False
       gcloud_utils.upload_files_as_objects(
           local_session_dir, POSTPROCESSING_FILES_TO_UPLOAD,
           self.gcs_bucket_name, destination_blob_prefix)
-      return "Done uploading postprocessing results to GCS", False
+      return "Done uploading postprocessing results to GCS", "session"
     else:
       # Upload to S3.
-      command_args = [
-          "aws", "s3", "sync", "--profile=%s" % self._aws_profile_name,
-          local_session_dir, "s3://" + self._s3_bucket_name + "/" + session_prefix,
-          "--exclude=*", "--include=*.tsv",
-          "--include=%s" % file_naming.CURATED_PROCESSED_JSON_FILENAME,
-          "--include=%s" % file_naming.CURATED_PROCESSED_TSV_FILENAME,
-          "--include=%s" % file_naming.CURATED_PROCESSED_SPEECH_ONLY_TSV_FILENAME]
-      self._run_command_line(command_args)
+      stats = self._transfer_engine.upload_dir(
+          local_session_dir, session_prefix,
+          filters=POSTPROCESSING_UPLOAD_FILTERS,
+          progress_callback=progress_callback, cancel_event=cancel_event)
+      if stats.cancelled:
+        # Some of the files may have been uploaded.
+        self.get_remote_session_folder_status(session_prefix)
+        self.invalidate_session_info(session_prefix)
+        return "Uploading of postprocessing results cancelled", False
+      self._record_uploaded_files(
+          session_prefix, local_session_dir, POSTPROCESSING_UPLOAD_FILTERS)
       print("Done uploading the postprocessing results for session %s to S3" %
             session_prefix)
       return "Done uploading postprocessing results to S3", "session"
@@ -725,6 +1723,19 @@ class DataManager(object):
     subprocess.check_call(command_args)
 
 
+def _refresh_container_prefixes(window, data_manager):
+  """Discover the container prefixes and send them to the window as an event.
+
+  To be run on a background thread.
+  """
+  try:
+    container_prefixes = data_manager.get_session_container_prefixes()
+  except Exception as e:
+    print("Failed to refresh the session containers: %s" % e)
+    return
+  window.write_event_value("CONTAINER_PREFIXES_REFRESHED", container_prefixes)
+
+
 def _get_container_prefix(window, session_container_prefixes):
   if not session_container_prefixes:
     raise ValueError("Found no session container prefixes")
@@ -743,89 +1754,91 @@ def _get_container_prefix(window, session_container_prefixes):
   return session_container_prefixes[selection]
 
 
-def _get_session_prefix(window, session_container_prefixes, session_prefixes):
-  container_prefix = _get_container_prefix(window, session_container_prefixes)
-  if not container_prefix:
-    sg.Popup("Please select exactly 1 container first", modal=True)
-    return
-  selection = window.Element("SESSION_LIST").Widget.curselection()
-  if not selection:
-    sg.Popup("Please select exactly 1 session first", modal=True)
-    return
-  return container_prefix + session_prefixes[selection[0]]
-
-
 # UI state remembered between operations.
 _UI_STATE = {
     "session_select_index": None,
     "session_yview": None,
     "session_colors": None,
+    # Shown in the status bar when no background task is running.
+    "idle_status_message": "",
 }
 
-def _disable_all_buttons(window):
+
+def _remember_session_list_view(window):
+  """Remember the selection and the scroll position of the session list."""
   session_list = window.Element("SESSION_LIST")
   session_selection = session_list.Widget.curselection()
   if session_selection:
     _UI_STATE["session_select_index"] = session_selection[0]
-    _UI_STATE["session_yview"] = session_list.Widget.yview()[0]
-  window.Element("LIST_SESSIONS").Update(disabled=True)
-  window.Element("SUMMARIZE_SESSIONS").Update(disabled=True)
-  window.Element("OPEN_SESSION_FOLDER").Update(disabled=True)
-  window.Element("REFRESH_SESSION_STATE").Update(disabled=True)
-  window.Element("DOWNLOAD_SESSION_TO_LOCAL").Update(disabled=True)
-  window.Element("PREPROCESS_SESSION").Update(disabled=True)
-  window.Element("UPLOAD_PREPROC").Update(disabled=True)
-  window.Element("DOWNLOAD_PREPROCESS_UPLOAD_SESSIONS_BATCH").Update(disabled=True)
-  window.Element("POSTPROC_CURATION").Update(disabled=True)
-  window.Element("UPLOAD_POSTPROC").Update(disabled=True)
-  window.Element("UPLOAD_TO_GCS").Update(disabled=True)
-  window.Element("SESSION_CONTAINER_LIST").Update(disabled=True)
-  window.Element("SESSION_LIST").Update(disabled=True)
-  window.Element("OBJECT_LIST").Update(disabled=True)
-
-
-def _enable_all_buttons(window):
-  window.Element("LIST_SESSIONS").Update(disabled=False)
-  window.Element("SUMMARIZE_SESSIONS").Update(disabled=False)
-  window.Element("OPEN_SESSION_FOLDER").Update(disabled=False)
-  window.Element("REFRESH_SESSION_STATE").Update(disabled=False)
-  window.Element("DOWNLOAD_SESSION_TO_LOCAL").Update(disabled=False)
-  window.Element("PREPROCESS_SESSION").Update(disabled=False)
-  window.Element("UPLOAD_PREPROC").Update(disabled=False)
-  window.Element("DOWNLOAD_PREPROCESS_UPLOAD_SESSIONS_BATCH").Update(disabled=False)
-  window.Element("POSTPROC_CURATION").Update(disabled=False)
-  window.Element("UPLOAD_POSTPROC").Update(disabled=False)
-  window.Element("UPLOAD_TO_GCS").Update(disabled=False)
-  window.Element("SESSION_CONTAINER_LIST").Update(disabled=False)
-  window.Element("SESSION_LIST").Update(disabled=False)
-  window.Element("OBJECT_LIST").Update(disabled=False)
-
-
-def _list_sessions(window,
-                   data_manager,
-                   session_container_prefixes,
-                   restore_session_selection=False):
-  t0 = time.time()
-  window.Element("STATUS_MESSAGE").Update("Listing sessions. Please wait...")
-  window.Element("STATUS_MESSAGE").Update(text_color="yellow")
-  window.Element("SESSION_LIST").Update(disabled=True)
-  window.refresh()
-  container_prefix = _get_container_prefix(window, session_container_prefixes)
-  if not container_prefix:
+  _UI_STATE["session_yview"] = session_list.Widget.yview()[0]
+
+
+def _get_selected_session_index(window):
+  selection = window.Element("SESSION_LIST").Widget.curselection()
+  return selection[0] if selection else None
+
+
+def _update_task_status(window, task_runner):
+  """Show the running background tasks and their progress."""
+  tasks = task_runner.get_running_tasks()
+  window.Element("CANCEL_TASKS").Update(disabled=not tasks)
+  if not tasks:
+    window.Element("STATUS_MESSAGE").Update(
+        _UI_STATE["idle_status_message"], text_color="white")
     return
-  session_prefixes = data_manager.get_session_prefixes(container_prefix)
+  window.Element("STATUS_MESSAGE").Update(
+      "; ".join("%s: %s%s" % (
+          task.name, task.progress_message or "Please wait...",
+          " (cancelling)" if task.is_cancelled() else "") for task in tasks),
+      text_color="yellow")
+
+
+def _start_task(window, task_runner, name, fn, locked_prefixes=(),
+                on_done=None):
+  """Start a background task. See background_tasks.TaskRunner.submit().
+
+  Returns:
+    The background_tasks.Task, or None if the task can't be started because
+    it conflicts with a running task.
+  """
+  try:
+    task = task_runner.submit(
+        name, fn, locked_prefixes=locked_prefixes, on_done=on_done)
+  except ValueError as e:
+    sg.Popup(str(e), modal=True)
+    return None
+  _update_task_status(window, task_runner)
+  return task
+
+
+def _get_transfer_progress_callback(task):
+  """Get a progress callback that reports S3 transfer progress of a task."""
+  def progress_callback(stats):
+    task.report_progress("%.1f of %.1f MB" % (
+        stats.transferred_bytes / 1e6, stats.total_bytes / 1e6))
+  return progress_callback
+
+
+def _fetch_sessions_status(data_manager, container_prefix):
+  """Get the content of the session list. Runs on a background thread.
+
+  Returns:
+    A (session_prefixes, session_prefixes_with_status, session_colors) tuple.
+  """
+  t0 = time.time()
+  num_calls_before = (data_manager.call_stats.get_total_calls()
+                      if data_manager.call_stats else 0)
+  session_prefixes, sessions_status = data_manager.get_sessions_status(
+      container_prefix)
   session_prefixes_with_status = []
   session_colors = []
-  data_manager.update_remote_session_objects_status(container_prefix)
-  for session_prefix in session_prefixes:
-    remote_status = data_manager.get_remote_session_folder_status(
-        container_prefix + session_prefix, use_cached=True)
-    local_status = data_manager.get_local_session_folder_status(
-        container_prefix + session_prefix)
+  for session_prefix, session_status in zip(session_prefixes, sessions_status):
+    remote_status = session_status["remote_status"]
     session_prefixes_with_status.append(data_manager.get_session_status_string(
-        session_prefix, remote_status, local_status))
+        session_prefix, remote_status, session_status["local_status"],
+        session_status["claiming_username"]))
     if remote_status == STATE_POSTPROCESSED:
-      if data_manager.get_session_gcs_status(session_prefix) == STATE_UPLOADED:
+      if session_status["gcs_status"] == STATE_UPLOADED:
         session_color = "gray"
       else:
         session_color = "green"
@@ -834,24 +1847,32 @@ def _list_sessions(window,
     else:
       session_color = "black"
     session_colors.append(session_color)
+  if data_manager.call_stats:
+    print("Listing sessions took %.3f seconds and %d cloud calls" % (
+        time.time() - t0,
+        data_manager.call_stats.get_total_calls() - num_calls_before))
+  else:
+    print("Listing sessions took %.3f seconds" % (time.time() - t0))
+  return session_prefixes, session_prefixes_with_status, session_colors
+
+
+def _show_sessions(window,
+                   session_prefixes_with_status,
+                   session_colors,
+                   restore_session_selection=False):
+  """Show the content of the session list. Runs on the main thread."""
   session_list = window.Element("SESSION_LIST")
-  session_list.Update(disabled=False)
   session_list.Update(session_prefixes_with_status)
   _UI_STATE["session_colors"] = session_colors
   _apply_session_colors(window)
   window.Element("SESSION_TITLE").Update(
-      "Sessions:\n%d sessions" % len(session_prefixes))
-  window.Element("STATUS_MESSAGE").Update("")
-  window.Element("STATUS_MESSAGE").Update(text_color="white")
-  session_list = window.Element("SESSION_LIST")
+      "Sessions:\n%d sessions" % len(session_prefixes_with_status))
   if (restore_session_selection and
       _UI_STATE["session_select_index"] is not None):
     selection_index = _UI_STATE["session_select_index"]
     session_list.update(set_to_index=[selection_index])
   if _UI_STATE["session_yview"] is not None:
     session_list.Widget.yview_moveto(_UI_STATE["session_yview"])
-  print("Listing sessions took %.3f seconds" % (time.time() - t0))
-  return session_prefixes
 
 
 def get_base_session_prefix(session_prefix):
@@ -864,85 +1885,234 @@ def get_base_session_prefix(session_prefix):
   return session_prefix
 
 
-def _download_preprocess_upload_sessions_from(window,
-                                              data_manager,
-                                              session_container_prefixes,
-                                              session_prefixes):
-  """Preprocess & upload sessions that aren't remotely preprocessed, in batch."""
-  container_prefix = _get_container_prefix(window, session_container_prefixes)
-  session_prefix = _get_session_prefix(
-      window, session_container_prefixes, session_prefixes)
+def _get_session_prefixes_from(container_prefix,
+                               session_prefix,
+                               session_prefixes):
+  """Get the full prefixes of the sessions from the given one on.
+
+  Args:
+    container_prefix: The container prefix.
+    session_prefix: The full prefix of the first session.
+    session_prefixes: Session prefixes relative to container_prefix, in the
+      order of the session list.
+  """
+  start_index = session_prefixes.index(session_prefix[len(container_prefix):])
+  return [container_prefix + prefix
+          for prefix in session_prefixes[start_index:]]
+
+
+def _download_preprocess_upload_sessions_from(
+    task,
+    data_manager,
+    container_prefix,
+    session_prefixes,
+    num_download_workers=DEFAULT_BATCH_DOWNLOAD_WORKERS,
+    num_preprocess_workers=DEFAULT_BATCH_PREPROCESS_WORKERS,
+    num_upload_workers=DEFAULT_BATCH_UPLOAD_WORKERS):
+  """Preprocess & upload sessions that aren't remotely preprocessed, in batch.
+
+  Runs on a background thread.
+  """
   task_session_prefixes = []
-  start_index = -1
-  for i, prefix in enumerate(session_prefixes):
-    if container_prefix + prefix == session_prefix:
-      start_index = i
-      break
-  assert start_index >= 0
-  session_prefixes = session_prefixes[start_index:]
+  data_manager.update_remote_session_objects_status(container_prefix)
   print("List of sessions to run:")
   for session_prefix in session_prefixes:
+    if task.is_cancelled():
+      return "Batch preprocessing and uploading is canceled.", False
     if data_manager.get_remote_session_folder_status(
-        container_prefix + session_prefix) != STATE_NOT_PREPROCESSED:
+        session_prefix, use_cached=True) != STATE_NOT_PREPROCESSED:
       continue
     (_, _, _, _, num_keypresses, num_audio_files,
-     _, _) = data_manager.get_session_details(container_prefix + session_prefix)
+     _, _) = data_manager.get_session_details(session_prefix)
     if num_keypresses == 0 or num_audio_files == 0:
       continue
-    task_session_prefixes.append(container_prefix + session_prefix)
+    task_session_prefixes.append(session_prefix)
     print("  %s" % session_prefix)
   if not task_session_prefixes:
     print("There are no sessions to preprocess or upload")
     return "No sessions to preprocess or upload", False
-  while True:
-    answer = input("Do you want to run %d sessions? (y/n): " %
-                   len(task_session_prefixes)).strip()
-    if answer in ("y", "n"):
-      break
-  if answer == "n":
+  if not data_manager._confirm(  # pylint: disable=protected-access
+      CONFIRM_PROCEED,
+      "Do you want to download, preprocess and upload %d sessions? "
+      "(See the list in the console.)" % len(task_session_prefixes)):
     return "Batch preprocessing and uploading is canceled.", False
-  for session_prefix in task_session_prefixes:
-    print("")
-    local_status = data_manager.get_local_session_folder_status(session_prefix)
-    if local_status == STATE_NOT_DOWNLOADED:
-      print("Downloading %s ..." % session_prefix)
-      data_manager.sync_to_local(session_prefix)
-    local_status = data_manager.get_local_session_folder_status(session_prefix)
-    if local_status == STATE_DOWNLOADED:
-      print("Preprocessing %s ..." % session_prefix)
-      data_manager.preprocess_session(session_prefix)
-    print("Uploading preprocessing results for %s..." % session_prefix)
-    data_manager.upload_sesssion_preproc_results(session_prefix)
-  return ("Done preprocessing and uploading %d sessions" %
-          len(task_session_prefixes), True)
-
-
-def _process_from(window,
+
+  def report_progress(report):
+    task.report_progress("%d of %d sessions done" % (
+        report.num_completed + len(report.failures) + report.num_cancelled,
+        report.num_items), force=True)
+
+  report = data_manager.download_preprocess_upload_sessions(
+      task_session_prefixes,
+      num_download_workers=num_download_workers,
+      num_preprocess_workers=num_preprocess_workers,
+      num_upload_workers=num_upload_workers,
+      progress_callback=report_progress,
+      cancel_event=task.cancel_event)
+  return ("Done preprocessing and uploading %d of %d sessions "
+          "(%.2f sessions/hour)" % (
+              report.num_completed, report.num_items,
+              report.items_per_hour), True)
+
+
+def _process_from(task,
                   data_manager,
-                  session_container_prefixes,
                   session_prefixes,
                   processing_type="CHECK_KEYPRESSES"):
-  container_prefix = _get_container_prefix(window, session_container_prefixes)
-  session_prefix = _get_session_prefix(
-      window, session_container_prefixes, session_prefixes)
-  task_session_prefixes = []
-  start_index = -1
-  for i, prefix in enumerate(session_prefixes):
-    if container_prefix + prefix == session_prefix:
-      start_index = i
-      break
-  assert start_index >= 0
-  session_prefixes = session_prefixes[start_index:]
-  for session_prefix in session_prefixes:
-    if not session_prefix.startswith(container_prefix):
-      session_prefix = (container_prefix if container_prefix.endswith("/")
-                        else (container_prefix + "/")) + session_prefix
+  """Run post-hoc analysis on sessions. Runs on a background thread."""
+  for i, session_prefix in enumerate(session_prefixes):
+    if task.is_cancelled():
+      return "Batch processing is canceled.", False
+    task.report_progress(
+        "%d of %d sessions done" % (i, len(session_prefixes)), force=True)
     if processing_type == "CHECK_KEYPRESSES":
       _check_keypresses(data_manager, session_prefix)
     elif processing_type == "ANALYZE_TRANSCRIPTS":
       _analyze_transcripts(data_manager, session_prefix)
     else:
       raise ValueError("Unsupported processing type: %s" % processing_type)
+  return "Done processing %d sessions" % len(session_prefixes), False
+
+
+def _summarize_sessions(task, data_manager, container_prefix, gcs_bucket_name):
+  """Summarize all sessions in a container. Runs on a background thread.
+
+  The summary is uploaded to GCS.
+
+  Returns:
+    A (summary_text, num_sessions) tuple.
+  """
+  del task  # Unused.
+  session_prefixes = data_manager.get_session_prefixes(container_prefix)
+  (num_sessions, num_complete_sessions, total_duration_s,
+   total_keypresses, total_audio_files, total_screenshots, total_objects,
+   session_keypresses_per_second,
+   start_time_table) = data_manager.get_sessions_stats(
+      container_prefix, session_prefixes, use_published_stats=True,
+      publish_stats=True)
+  report = {
+      "report_generated": datetime.datetime.now(pytz.timezone("UTC")).isoformat(),
+      "num_sessions": num_sessions,
+      "num_complete_sessions": num_complete_sessions,
+      "total_duration_s": total_duration_s,
+      "total_keypresses": total_keypresses,
+      "total_audio_files": total_audio_files,
+      "total_screenshots": total_screenshots,
+      "total_objects": total_objects,
+  }
+  summary_text = json.dumps(report, indent=2)
+  print("Summary of sessions:\n%s" % summary_text)
+  report["session_prefixes"] = session_prefixes
+  report["start_time_table"] = start_time_table.tolist()
+  report["weekdays"] = WEEKDAYS
+  report["hour_ranges"] = HOUR_RANGES
+  destination_blob_name = "/".join(
+      [GCS_SUMMARY_PREFIX] +
+      [item for item in container_prefix.split("/") if item] +
+      [datetime.datetime.now().isoformat() + ".json"])
+  try:
+    gcloud_utils.upload_text_to_object(json.dumps(report, indent=2),
+                                       gcs_bucket_name,
+                                       destination_blob_name)
+  except Exception as e:
+    print("Failed to upload report to bucket %s: %s" %
+          (gcs_bucket_name, str(e)))
+  return summary_text, num_sessions
+
+
+def _get_session_operation(event,
+                           data_manager,
+                           args,
+                           container_prefix,
+                           session_prefix,
+                           session_prefixes):
+  """Get the background operation triggered by a session button.
+
+  Args:
+    event: The button event.
+    data_manager: The DataManager.
+    args: Parsed command-line arguments.
+    container_prefix: The selected container prefix.
+    session_prefix: Full prefix of the selected session.
+    session_prefixes: Session prefixes relative to container_prefix, in the
+      order of the session list.
+
+  Returns:
+    A (name, fn, locked_prefixes) tuple, to be passed to _start_task(). fn
+    returns a (status_message, sessions_changed) tuple.
+  """
+  session_name = get_base_session_prefix(session_prefix)
+  if event == "DOWNLOAD_SESSION_TO_LOCAL":
+    return ("Downloading %s" % session_name,
+            lambda task: data_manager.sync_to_local(
+                session_prefix,
+                progress_callback=_get_transfer_progress_callback(task),
+                cancel_event=task.cancel_event),
+            (session_prefix,))
+  elif event == "PREPROCESS_SESSION":
+    return ("Preprocessing %s" % session_name,
+            lambda task: data_manager.preprocess_session(session_prefix),
+            (session_prefix,))
+  elif event == "UPLOAD_PREPROC":
+    return ("Uploading preprocessing results of %s" % session_name,
+            lambda task: data_manager.upload_sesssion_preproc_results(
+                session_prefix,
+                progress_callback=_get_transfer_progress_callback(task),
+                cancel_event=task.cancel_event),
+            (session_prefix,))
+  elif event == "POSTPROC_CURATION":
+    return ("Postprocessing curation results of %s" % session_name,
+            lambda task: data_manager.postprocess_curation(session_prefix),
+            (session_prefix,))
+  elif event in ("UPLOAD_POSTPROC", "UPLOAD_TO_GCS"):
+    to_gcs = event == "UPLOAD_TO_GCS"
+    name = ("Uploading postprocessing results of %s to %s" % (
+        session_name,
+        ("GCS (%s)" % data_manager.gcs_bucket_name) if to_gcs else "S3"))
+    return (name,
+            lambda task: data_manager.upload_session_postproc_results(
+                session_prefix, to_gcs=to_gcs,
+                progress_callback=_get_transfer_progress_callback(task),
+                cancel_event=task.cancel_event),
+            (session_prefix,))
+  elif event in ("CLAIM_SESSION", "UNCLAIM_SESSION"):
+    unclaim = event == "UNCLAIM_SESSION"
+
+    def claim_session(task):
+      data_manager.claim_session(session_prefix, unclaim=unclaim)
+      return ("Unclaimed" if unclaim else "Claimed") + " session", "session"
+
+    return ("%s %s" % ("Unclaiming" if unclaim else "Claiming", session_name),
+            claim_session, (session_prefix,))
+  elif event in ("CHECK_KEYPRESSES", "ANALYZE_TRANSCRIPTS"):
+    return ("%s of %s" % (
+                "Checking keypresses" if event == "CHECK_KEYPRESSES"
+                else "Analyzing speech transcripts", session_name),
+            lambda task: _process_from(
+                task, data_manager, [session_prefix], processing_type=event),
+            (session_prefix,))
+  elif event == "DOWNLOAD_PREPROCESS_UPLOAD_SESSIONS_BATCH":
+    batch_session_prefixes = _get_session_prefixes_from(
+        container_prefix, session_prefix, session_prefixes)
+    return ("Batch downloading, preprocessing and uploading sessions",
+            lambda task: _download_preprocess_upload_sessions_from(
+                task, data_manager, container_prefix, batch_session_prefixes,
+                num_download_workers=args.batch_download_workers,
+                num_preprocess_workers=args.batch_preprocess_workers,
+                num_upload_workers=args.batch_upload_workers),
+            (container_prefix,))
+  elif event in ("CHECK_KEYPRESSES_BATCH", "ANALYZE_TRANSCRIPTS_BATCH"):
+    processing_type = event[:-len("_BATCH")]
+    batch_session_prefixes = _get_session_prefixes_from(
+        container_prefix, session_prefix, session_prefixes)
+    return ("Batch checking keypresses"
+            if processing_type == "CHECK_KEYPRESSES"
+            else "Batch analyzing speech transcripts",
+            lambda task: _process_from(
+                task, data_manager, batch_session_prefixes,
+                processing_type=processing_type),
+            (container_prefix,))
+  raise ValueError("Unsupported session operation: %s" % event)
 
 
 def _apply_session_colors(window):
@@ -954,20 +2124,82 @@ def _apply_session_colors(window):
     session_widget.itemconfigure(i, {"fg": session_color})
 
 
+def _get_neighbor_session_prefixes(container_prefix,
+                                   session_prefixes,
+                                   session_index,
+                                   num_neighbors):
+  """Get the full prefixes of the sessions around a session.
+
+  Args:
+    container_prefix: The container prefix.
+    session_prefixes: Session prefixes relative to container_prefix, in the
+      order of the session list.
+    session_index: Index of the selected session in session_prefixes.
+    num_neighbors: Number of sessions to get on each side.
+
+  Returns:
+    The full prefixes of the following and then the preceding sessions, each
+    in the order of increasing distance from the selected session.
+  """
+  indices = (
+      list(range(session_index + 1,
+                 min(session_index + 1 + num_neighbors,
+                     len(session_prefixes)))) +
+      list(range(session_index - 1,
+                 max(session_index - 1 - num_neighbors, -1), -1)))
+  return [container_prefix + session_prefixes[i] for i in indices]
+
+
+def _fetch_session_info(data_manager, session_prefix, use_cached=True):
+  """Get the info of a session. Runs on a background thread.
+
+  Returns:
+    A (session_details, session_status_string) tuple, where session_details
+    is the return value of DataManager.get_session_details().
+  """
+  session_details = data_manager.get_session_details(
+      session_prefix, use_cached=use_cached)
+  remote_status = data_manager.get_remote_session_folder_status(
+      session_prefix, use_cached=use_cached)
+  claiming_username = data_manager.get_remote_session_claim_username(
+      session_prefix, use_cached=use_cached)
+  local_status = data_manager.get_local_session_folder_status(
+      session_prefix, use_cached=use_cached)
+  return session_details, data_manager.get_session_status_string(
+      session_prefix, remote_status, local_status, claiming_username)
+
+
 def _show_session_info(window,
                        data_manager,
-                       session_container_prefixes,
-                       session_prefixes,
-                       user_cached=True):
-  session_prefix = _get_session_prefix(
-      window, session_container_prefixes, session_prefixes)
-  if not session_prefix:
-    return
+                       session_prefix,
+                       session_index,
+                       session_details,
+                       session_status_string):
+  """Show the info of a session. Runs on the main thread.
+
+  Args:
+    window: The main window.
+    data_manager: The DataManager.
+    session_prefix: Full prefix of the session.
+    session_index: Index of the session in the session list.
+    session_details: Return value of DataManager.get_session_details().
+    session_status_string: The status string shown in the session list.
+  """
   session_list = window.Element("SESSION_LIST")
-  _UI_STATE["session_yview"] = session_list.Widget.yview()[0]
+  selection_index = _get_selected_session_index(window)
+  yview = session_list.Widget.yview()[0]
+  new_list = session_list.Values[:]
+  new_list[session_index] = session_status_string
+  session_list.Update(new_list)
+  if selection_index is not None:
+    session_list.update(set_to_index=[selection_index])
+  _apply_session_colors(window)
+  session_list.Widget.yview_moveto(yview)
+  if selection_index != session_index:
+    # Another session has been selected in the meantime.
+    return
   (is_session_complete, time_zone, start_time, duration_s, num_keypresses,
-   num_audio_files, num_screenshots,
-   object_keys) = data_manager.get_session_details(session_prefix)
+   num_audio_files, num_screenshots, object_keys) = session_details
   window.Element("SESSION_NAME").Update(
       data_manager.get_session_basename(session_prefix))
   window.Element("IS_SESSION_COMPLETE").Update(
@@ -983,21 +2215,6 @@ def _show_session_info(window,
   window.Element("OBJECTS_TITLE").Update(
       "Remote objects:\n%d objects" % len(object_keys))
 
-  selection_index = session_list.Widget.curselection()
-  new_list = session_list.Values[:]
-  remote_status = data_manager.get_remote_session_folder_status(
-      session_prefix, use_cached=user_cached)
-  claiming_username = data_manager.get_remote_session_claim_username(
-      session_prefix)
-  local_status = data_manager.get_local_session_folder_status(session_prefix)
-  new_list[selection_index[0]] = data_manager.get_session_status_string(
-      session_prefix, remote_status, local_status, claiming_username)
-  session_list.Update(new_list)
-  session_list.update(set_to_index=[selection_index])
-  _apply_session_colors(window)
-  if _UI_STATE["session_yview"] is not None:
-    session_list.Widget.yview_moveto(_UI_STATE["session_yview"])
-
 
 def _open_file_or_folder(file_or_dir_path):
   """Open a file or folder using operating system-specific affordance."""
@@ -1051,14 +2268,15 @@ def upload_curated_freeform_text(window,
       gcs_bucket_name, destination_blob_prefix, uploaded_file_names))
 
 
-def _prep_for_posthoc_analysis(data_manager, session_prefix):
+def _prep_for_posthoc_analysis(data_manager, session_prefix, sync_profile):
   remote_status = data_manager.get_remote_session_folder_status(
       session_prefix, use_cached=True)
   local_status = data_manager.get_local_session_folder_status(
        session_prefix)
   if (remote_status == STATE_POSTPROCESSED and
       local_status not in (STATE_POSTPROCESSED,)):
-    data_manager.sync_to_local(session_prefix)
+    # Only the files needed for the analysis are downloaded.
+    data_manager.sync_to_local(session_prefix, profile=sync_profile)
   session_dir_path = data_manager.get_local_session_dir(session_prefix)
   merged_path = os.path.join(
       session_dir_path, file_naming.MERGED_TSV_FILENAME)
@@ -1080,13 +2298,12 @@ def _prep_for_posthoc_analysis(data_manager, session_prefix):
 
 def _check_keypresses(data_manager, session_prefix):
   merged_path, _, processed_path, session_dir_path = _prep_for_posthoc_analysis(
-      data_manager, session_prefix)
+      data_manager, session_prefix, SYNC_PROFILE_CHECK_KEYPRESSES)
   if not merged_path or not processed_path:
     return
   print("Comparing %s vs. %s" % (merged_path, processed_path))
-  merged_keypresses = process_keypresses.load_keypresses_from_tsv_file(
-      merged_path)
-  processed_keypresses = process_keypresses.load_keypresses_from_tsv_file(
+  merged_keypresses = keypress_table.KeypressTable.from_tsv_file(merged_path)
+  processed_keypresses = keypress_table.KeypressTable.from_tsv_file(
       processed_path)
   (extra_keypresses,
     missing_keypresses) = process_keypresses.check_keypresses(
@@ -1108,7 +2325,7 @@ def _check_keypresses(data_manager, session_prefix):
 
 def _analyze_transcripts(data_manager, session_prefix):
   merged_path, curated_path, _, session_dir_path = _prep_for_posthoc_analysis(
-      data_manager, session_prefix)
+      data_manager, session_prefix, SYNC_PROFILE_ANALYZE_TRANSCRIPTS)
   if not merged_path or not curated_path:
     return
   merged_transcripts = transcript_lib.load_transcripts_from_tsv_file(
@@ -1146,12 +2363,36 @@ LIST_BOX_WIDTH = 100
 def main():
   args = parse_args()
   local_data_root = infer_local_data_root()
+  call_stats = cloud_call_stats.CallStats()
+  gcloud_utils.set_call_stats(call_stats)
+  # The data manager operations run on background threads, but their popups
+  # must be shown on the main thread.
+  main_thread_caller = background_tasks.MainThreadCaller()
   data_manager = DataManager(args.aws_profile_name,
                              args.s3_bucket_name,
                              args.gcs_bucket_name,
-                             local_data_root)
+                             local_data_root,
+                             max_workers=args.max_workers,
+                             confirm_fn=main_thread_caller.wrap(_gui_confirm),
+                             notify_fn=main_thread_caller.wrap(_gui_notify),
+                             prompt_fn=main_thread_caller.wrap(_gui_prompt),
+                             call_stats=call_stats,
+                             write_session_archives=args.write_session_archives,
+                             flac_audio=args.flac_audio)
+  atexit.register(
+      call_stats.write_json,
+      args.call_stats_json or
+      os.path.join(local_data_root, CALL_STATS_JSON_FILENAME))
   print("Inferred local data root: %s" % local_data_root)
-  session_container_prefixes = data_manager.get_session_container_prefixes()
+  session_container_prefixes = None
+  if not args.no_container_prefix_cache:
+    session_container_prefixes = (
+        data_manager.get_cached_session_container_prefixes())
+  # If cached container prefixes are available, show the window right away
+  # and refresh the prefixes in the background.
+  refresh_container_prefixes = session_container_prefixes is not None
+  if not refresh_container_prefixes:
+    session_container_prefixes = data_manager.get_session_container_prefixes()
   session_container_listbox = sg.Listbox(
       session_container_prefixes,
       size=(LIST_BOX_WIDTH, 3),
@@ -1171,6 +2412,8 @@ def main():
       [
           sg.Text("", size=(15, 1)),
           sg.Text(key="STATUS_MESSAGE", font=("Arial", 16)),
+          sg.Button("Cancel running operations", key="CANCEL_TASKS",
+                    disabled=True),
       ],
       [
           sg.Text("Local data root:", size=(15, 1)),
@@ -1248,67 +2491,126 @@ def main():
           sg.Button("Upload curated free-form text",
                     key="UPLOAD_CURATED_FREEFORM_TEXT"),
       ],
+      [
+          sg.Text("Cloud calls:", size=(15, 1)),
+          sg.Text(call_stats.summary(), key="CALL_STATS",
+                  size=(LIST_BOX_WIDTH, 1)),
+      ],
   ]
   session_prefixes = None
+  # The container prefix that session_prefixes belong to.
+  listed_container_prefix = None
   window = sg.Window(
-      "SpeakFaster Data Manager", layout)
+      "SpeakFaster Data Manager", layout, finalize=True)
+  main_thread_caller.set_post_event(window.write_event_value)
+  task_runner = background_tasks.TaskRunner(window.write_event_value)
+  if refresh_container_prefixes:
+    threading.Thread(
+        target=_refresh_container_prefixes,
+        args=(window, data_manager),
+        daemon=True).start()
+
+  def list_sessions(container_prefix, restore_session_selection=False):
+    _remember_session_list_view(window)
+
+    def on_sessions_listed(task):
+      nonlocal session_prefixes, listed_container_prefix
+      (session_prefixes, session_prefixes_with_status,
+       session_colors) = task.result
+      listed_container_prefix = container_prefix
+      _show_sessions(window, session_prefixes_with_status, session_colors,
+                     restore_session_selection=restore_session_selection)
+
+    _start_task(window, task_runner, "Listing sessions",
+                lambda task: _fetch_sessions_status(
+                    data_manager, container_prefix),
+                on_done=on_sessions_listed)
+
+  def show_session_info(session_prefix, use_cached=True):
+    session_index = _get_selected_session_index(window)
+
+    def on_session_info_fetched(task):
+      session_details, session_status_string = task.result
+      _show_session_info(window, data_manager, session_prefix, session_index,
+                         session_details, session_status_string)
+
+    _start_task(window, task_runner,
+                "Loading %s" % get_base_session_prefix(session_prefix),
+                lambda task: _fetch_session_info(
+                    data_manager, session_prefix, use_cached=use_cached),
+                on_done=on_session_info_fetched)
+    if session_index is not None and args.prefetch_sessions > 0:
+      data_manager.prefetch_session_info(_get_neighbor_session_prefixes(
+          listed_container_prefix, session_prefixes, session_index,
+          args.prefetch_sessions))
+
+  def on_session_operation_done(container_prefix, session_prefix, task):
+    status_message, sessions_changed = task.result
+    _UI_STATE["idle_status_message"] = status_message
+    if sessions_changed == "session":
+      # The value of "session" means only refresh the operated session.
+      show_session_info(session_prefix, use_cached=False)
+    elif sessions_changed == True:
+      # Refresh all sessions, e.g., after a session has finished downloading.
+      list_sessions(container_prefix, restore_session_selection=True)
+
+  def on_sessions_summarized(container_prefix, task):
+    if task.is_cancelled():
+      return
+    summary_text, num_sessions = task.result
+    sg.Popup(summary_text,
+             title="Summary of %d sessions" % num_sessions,
+             modal=True)
+    list_sessions(container_prefix)
+
   while True:
-    event, values = window.read()
+    event, values = window.read(timeout=CALL_STATS_REFRESH_INTERVAL_MS)
     if event == sg.WIN_CLOSED:
+      # Let the running tasks stop at the next file or session.
+      task_runner.cancel()
       break
+    window.Element("CALL_STATS").Update(call_stats.summary())
+    if event == sg.TIMEOUT_KEY:
+      continue
+    elif event == background_tasks.TASK_PROGRESS_EVENT:
+      _update_task_status(window, task_runner)
+    elif event == background_tasks.TASK_DONE_EVENT:
+      task = values[event]
+      if task.error is not None:
+        _UI_STATE["idle_status_message"] = "%s failed" % task.name
+        sg.Popup("%s failed: %s" % (task.name, task.error), modal=True)
+      elif task.result is not None and task.on_done:
+        task.on_done(task)
+      _update_task_status(window, task_runner)
+    elif event == background_tasks.MAIN_THREAD_CALL_EVENT:
+      background_tasks.MainThreadCaller.run_pending_call(values[event])
+    elif event == "CANCEL_TASKS":
+      task_runner.cancel()
+      _update_task_status(window, task_runner)
+    elif event == "CONTAINER_PREFIXES_REFRESHED":
+      if values[event] != session_container_prefixes:
+        print("Session containers changed. Updating the list.")
+        session_container_prefixes = values[event]
+        window.Element("SESSION_CONTAINER_LIST").Update(
+            session_container_prefixes)
     elif event == "LIST_SESSIONS":
-      session_prefixes = _list_sessions(
-          window, data_manager, session_container_prefixes)
+      container_prefix = _get_container_prefix(
+          window, session_container_prefixes)
+      if container_prefix:
+        list_sessions(container_prefix)
     elif event == "SUMMARIZE_SESSIONS":
       # Summarize all sessions in a given container.
-      _disable_all_buttons(window)
       container_prefix = _get_container_prefix(
           window, session_container_prefixes)
       if container_prefix:
-        session_prefixes = _list_sessions(
-            window, data_manager, session_container_prefixes)
-        window.Element("STATUS_MESSAGE").Update(
-            "Generating summary of %d sessions... Please wait." %
-            len(session_prefixes), text_color="yellow")
-        (num_sessions, num_complete_sessions, total_duration_s,
-         total_keypresses, total_audio_files, total_screenshots, total_objects,
-         session_keypresses_per_second,
-         start_time_table) = data_manager.get_sessions_stats(
-            container_prefix, session_prefixes)
-        report = {
-            "report_generated": datetime.datetime.now(pytz.timezone("UTC")).isoformat(),
-            "num_sessions": num_sessions,
-            "num_complete_sessions": num_complete_sessions,
-            "total_duration_s": total_duration_s,
-            "total_keypresses": total_keypresses,
-            "total_audio_files": total_audio_files,
-            "total_screenshots": total_screenshots,
-            "total_objects": total_objects,
-        }
-        summary_text = json.dumps(report, indent=2)
-        print("Summary of sessions:\n%s" % summary_text)
-        report["session_prefixes"] = session_prefixes
-        report["start_time_table"] = start_time_table.tolist()
-        report["weekdays"] = WEEKDAYS
-        report["hour_ranges"] = HOUR_RANGES
-        destination_blob_name = "/".join(
-            [GCS_SUMMARY_PREFIX] +
-            [item for item in container_prefix.split("/") if item] +
-            [datetime.datetime.now().isoformat() + ".json"])
-        try:
-          gcloud_utils.upload_text_to_object(json.dumps(report, indent=2),
-                                             args.gcs_bucket_name,
-                                             destination_blob_name)
-        except Exception as e:
-          print("Failed to upload report to bucket %s: %s" %
-                (args.gcs_bucket_name, str(e)))
-        sg.Popup(summary_text,
-                 title="Summary of %d sessions" % num_sessions,
-                 modal=True)
-        session_prefixes = _list_sessions(
-            window, data_manager, session_container_prefixes)
-      _enable_all_buttons(window)
-      window.Element("STATUS_MESSAGE").Update("")
+        _start_task(
+            window, task_runner, "Summarizing sessions",
+            functools.partial(_summarize_sessions,
+                              data_manager=data_manager,
+                              container_prefix=container_prefix,
+                              gcs_bucket_name=args.gcs_bucket_name),
+            on_done=functools.partial(on_sessions_summarized,
+                                      container_prefix))
     elif event in ("SESSION_LIST",
                    "OPEN_SESSION_FOLDER",
                    "REFRESH_SESSION_STATE",
@@ -1329,14 +2631,17 @@ def main():
       if not session_prefixes:
         sg.Popup("Please list sessions first", modal=True)
         continue
-      session_prefix = _get_session_prefix(
-          window, session_container_prefixes, session_prefixes)
-      if not session_prefix:
+      container_prefix = listed_container_prefix
+      selection_index = _get_selected_session_index(window)
+      if selection_index is None:
         sg.Popup("Please select exactly 1 session first", modal=True)
         continue
-      _show_session_info(
-          window, data_manager, session_container_prefixes, session_prefixes)
-      if event == "OPEN_SESSION_FOLDER":
+      session_prefix = container_prefix + session_prefixes[selection_index]
+      if event == "SESSION_LIST":
+        show_session_info(session_prefix)
+      elif event == "REFRESH_SESSION_STATE":
+        show_session_info(session_prefix, use_cached=False)
+      elif event == "OPEN_SESSION_FOLDER":
         session_dir_path = data_manager.get_local_session_dir(session_prefix)
         if os.path.isdir(session_dir_path):
           _open_file_or_folder(session_dir_path)
@@ -1344,11 +2649,6 @@ def main():
           sg.Popup(
               "Local session directory not found. Download the session first",
               modal=True)
-        continue
-      elif event == "REFRESH_SESSION_STATE":
-        _show_session_info(window, data_manager, session_container_prefixes,
-                           session_prefixes)
-        continue
       elif event == "OPEN_RAW_ASR":
         session_dir_path = data_manager.get_local_session_dir(session_prefix)
         asr_tsv_path = os.path.join(session_dir_path, file_naming.ASR_TSV_FILENAME)
@@ -1359,98 +2659,16 @@ def main():
               "Local file not found: %s. "
               "Make sure the session is preprocessed and downloaded." % asr_tsv_path,
               modal=True)
-        continue
-      elif event == "CHECK_KEYPRESSES":
-        _check_keypresses(data_manager, session_prefix)
-        continue
-      elif event == "ANALYZE_TRANSCRIPTS":
-        _analyze_transcripts(data_manager, session_prefix)
-        continue
-      elif event == "CLAIM_SESSION":
-        data_manager.claim_session(session_prefix)
-        _show_session_info(window, data_manager, session_container_prefixes,
-                           session_prefixes, user_cached=False)
-        continue
-      elif event == "UNCLAIM_SESSION":
-        data_manager.claim_session(session_prefix, unclaim=True)
-        _show_session_info(window, data_manager, session_container_prefixes,
-                           session_prefixes, user_cached=False)
-        continue
-      elif event == "SESSION_LIST":
-        continue
-      sessions_changed = True
-      status_message = ""
-      if event == "DOWNLOAD_SESSION_TO_LOCAL":
-        status_message = "Downloading session. Please wait..."
-      elif event == "PREPROCESS_SESSION":
-        status_message = "Preprocessing session. Please wait..."
-      elif event == "UPLOAD_PREPROC":
-        status_message = "Uploading session preprocessing results. Please wait..."
-      elif event == "DOWNLOAD_PREPROCESS_UPLOAD_SESSIONS_BATCH":
-        status_message = "Batch downloading, preprocessing and uploading sessions. Please wait..."
-      elif event == "CHECK_KEYPRESSES_BATCH":
-        status_message = "Batch checking keypresses. Please wait..."
-      elif event == "ANALYZE_TRANSCRIPTS_BATCH":
-        status_message = "Batch analyzing speech transcripts. Please wait..."
-      elif event == "POSTPROC_CURATION":
-        status_message = "Postprocessing curation results. Please wait..."
-      elif event == "UPLOAD_POSTPROC":
-        status_message = "Uploading session postprocessing results. Please wait..."
-      elif event == "UPLOAD_TO_GCS":
-        status_message = ("Uploading postprocessing results to GCS (%s). "
-                          "Please wait..." % data_manager.gcs_bucket_name)
-
-      window.Element("STATUS_MESSAGE").Update(status_message)
-      window.Element("STATUS_MESSAGE").Update(text_color="yellow")
-      _disable_all_buttons(window)
-      window.refresh()
-      if event == "DOWNLOAD_SESSION_TO_LOCAL":
-        (status_message,
-         sessions_changed) = data_manager.sync_to_local(session_prefix)
-        status_message = "Session downloading complete."
-      elif event == "PREPROCESS_SESSION":
-        (status_message,
-         sessions_changed) = data_manager.preprocess_session(session_prefix)
-      elif event == "UPLOAD_PREPROC":
-        (status_message,
-         sessions_changed) = data_manager.upload_sesssion_preproc_results(
-            session_prefix)
-      elif event == "DOWNLOAD_PREPROCESS_UPLOAD_SESSIONS_BATCH":
-        _download_preprocess_upload_sessions_from(
-           window, data_manager, session_container_prefixes, session_prefixes)
-        status_message = ""
-        sessions_changed = True
-      elif event == "CHECK_KEYPRESSES_BATCH":
-        _process_from(
-            window, data_manager, session_container_prefixes, session_prefixes,
-            processing_type="CHECK_KEYPRESSES")
-        sessions_changed = False
-      elif event == "ANALYZE_TRANSCRIPTS_BATCH":
-        _process_from(
-            window, data_manager, session_container_prefixes, session_prefixes,
-            processing_type="ANALYZE_TRANSCRIPTS")
-        sessions_changed = False
-      elif event == "POSTPROC_CURATION":
-        (status_message,
-         sessions_changed) = data_manager.postprocess_curation(session_prefix)
-      elif event in ("UPLOAD_POSTPROC", "UPLOAD_TO_GCS"):
-        (status_message,
-         sessions_changed) = data_manager.upload_session_postproc_results(
-            session_prefix, to_gcs=(event == "UPLOAD_TO_GCS"))
-      window.Element("STATUS_MESSAGE").Update(status_message)
-      window.Element("STATUS_MESSAGE").Update(text_color="white")
-      _enable_all_buttons(window)
-      if sessions_changed == "session":
-        # The value of "session" means only refresh the selected session.
-        _show_session_info(window, data_manager, session_container_prefixes,
-                           session_prefixes)
-      elif sessions_changed == True:
-        # Refresh all sessions after the selected session has finished downloading.
-        session_prefixes = _list_sessions(
-            window,
-            data_manager,
-            session_container_prefixes,
-            restore_session_selection=True)
+      else:
+        _remember_session_list_view(window)
+        name, fn, locked_prefixes = _get_session_operation(
+            event, data_manager, args, container_prefix, session_prefix,
+            session_prefixes)
+        _start_task(
+            window, task_runner, name, fn,
+            locked_prefixes=locked_prefixes,
+            on_done=functools.partial(on_session_operation_done,
+                                      container_prefix, session_prefix))
     elif event == "UPLOAD_CURATED_FREEFORM_TEXT":
       upload_curated_freeform_text(window,
                                    session_container_prefixes,
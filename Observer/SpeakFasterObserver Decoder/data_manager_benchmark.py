@@ -0,0 +1,313 @@
+"""Scale benchmark of the data manager against local object stores.
+
+Generates a synthetic S3 bucket with a container of N sessions in the SPO-2111
+key layout (plus a GCS bucket with the postprocessed results of some of them)
+on the local file system, then times the main data manager operations and
+counts the API requests that each of them makes. No cloud resources are used.
+
+Command line example:
+
+```sh
+python data_manager_benchmark.py --num_sessions=10000 \
+    --output_json=/tmp/benchmark.json
+```
+"""
+import argparse
+import collections
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import data_manager
+import file_naming
+import gcloud_utils
+import keypresses_pb2
+import local_object_store
+import metadata_pb2
+import session_manifest
+
+S3_BUCKET_NAME = "benchmark-s3-bucket"
+GCS_BUCKET_NAME = "benchmark-gcs-bucket"
+TIMEZONE = "(UTC-06:00) Central Time (US & Canada)"
+
+
+def parse_args():
+  parser = argparse.ArgumentParser("Data Manager benchmark")
+  parser.add_argument(
+      "--num_sessions",
+      type=int,
+      default=1000,
+      help="Number of sessions in the benchmarked container")
+  parser.add_argument(
+      "--num_other_containers",
+      type=int,
+      default=20,
+      help="Number of additional containers, with one session each")
+  parser.add_argument("--num_keypresses_per_session", type=int, default=200)
+  parser.add_argument("--num_audio_files_per_session", type=int, default=4)
+  parser.add_argument("--num_screenshots_per_session", type=int, default=10)
+  parser.add_argument(
+      "--preprocessed_fraction",
+      type=float,
+      default=0.6,
+      help="Fraction of sessions with preprocessing results")
+  parser.add_argument(
+      "--postprocessed_fraction",
+      type=float,
+      default=0.3,
+      help="Fraction of sessions with postprocessing results")
+  parser.add_argument(
+      "--claimed_fraction",
+      type=float,
+      default=0.3,
+      help="Fraction of sessions claimed by a curator")
+  parser.add_argument(
+      "--gcs_uploaded_fraction",
+      type=float,
+      default=0.5,
+      help="Fraction of postprocessed sessions uploaded to GCS")
+  parser.add_argument(
+      "--max_workers",
+      type=int,
+      default=data_manager.DEFAULT_MAX_WORKERS)
+  parser.add_argument(
+      "--work_dir",
+      type=str,
+      default=None,
+      help="Directory for the synthetic buckets and the local data root. "
+      "A temporary directory is used and deleted if not specified")
+  parser.add_argument(
+      "--output_json",
+      type=str,
+      default=None,
+      help="Path to write the results to, as JSON")
+  parser.add_argument("--seed", type=int, default=42)
+  return parser.parse_args()
+
+
+def _format_timestamp(dt):
+  return dt.strftime("%Y%m%dT%H%M%S") + "%03dZ" % (dt.microsecond // 1000)
+
+
+def _make_keypresses(start_time, num_keypresses):
+  keypresses = keypresses_pb2.KeyPresses()
+  for i in range(num_keypresses):
+    keypress = keypresses.keyPresses.add()
+    keypress.KeyPress = "A" if i % 5 else "Space"
+    keypress.Timestamp.FromDatetime(
+        start_time + datetime.timedelta(milliseconds=250 * i))
+  return keypresses.SerializeToString()
+
+
+def _make_session_end(end_time):
+  session_metadata = metadata_pb2.SessionMetadata()
+  session_metadata.session_end_timestamp.FromDatetime(end_time)
+  session_metadata.timezone = TIMEZONE
+  return session_metadata.SerializeToString()
+
+
+def generate_session(s3_client, gcs_client, container_prefix, start_time,
+                     args, rng):
+  """Write the objects of a synthetic session.
+
+  Returns:
+    The session prefix, relative to container_prefix.
+  """
+  session_prefix = "session-%s/" % _format_timestamp(start_time)
+  full_prefix = container_prefix + session_prefix
+
+  def put(filename, data):
+    s3_client.put_object_data(S3_BUCKET_NAME, full_prefix + filename, data)
+
+  put("%s-Keypresses.protobuf" % _format_timestamp(start_time),
+      _make_keypresses(start_time, args.num_keypresses_per_session))
+  for i in range(args.num_audio_files_per_session):
+    t = start_time + datetime.timedelta(seconds=60 * i)
+    put("%s-MicWaveIn.flac" % _format_timestamp(t), b"fLaC" + bytes(64))
+  for i in range(args.num_screenshots_per_session):
+    t = start_time + datetime.timedelta(seconds=30 * i + 1)
+    put("%s-Screenshot.jpg" % _format_timestamp(t), b"\xff\xd8" + bytes(256))
+  end_time = start_time + datetime.timedelta(minutes=20)
+  put("%s-SessionEnd.bin" % _format_timestamp(end_time),
+      _make_session_end(end_time))
+
+  if rng.random() < args.preprocessed_fraction:
+    put(file_naming.MERGED_TSV_FILENAME, b"Start\tEnd\tTier\tContent\n")
+    put(file_naming.CONCATENATED_AUDIO_FILENAME, b"RIFF" + bytes(1024))
+    put(file_naming.SCREENSHOTS_MP4_FILENAME, bytes(512))
+    put(file_naming.MANIFEST_JSON_FILENAME, json.dumps({
+        "version": session_manifest.MANIFEST_VERSION,
+        "is_session_complete": True,
+        "timezone": TIMEZONE,
+        "first_timestamp": start_time.timestamp(),
+        "last_timestamp": end_time.timestamp(),
+        "num_keypresses": args.num_keypresses_per_session,
+        "num_audio_files": args.num_audio_files_per_session,
+        "num_screenshots": args.num_screenshots_per_session,
+        "stream_file_counts": {
+            "Keypresses": 1,
+            "MicWaveIn": args.num_audio_files_per_session,
+            "Screenshot": args.num_screenshots_per_session,
+            "SessionEnd": 1,
+        },
+        "stream_bytes": {},
+    }).encode("utf-8"))
+    if rng.random() < args.postprocessed_fraction / args.preprocessed_fraction:
+      for filename in data_manager.POSTPROCESSING_FILES_TO_UPLOAD:
+        put(filename, b"{}")
+      if rng.random() < args.gcs_uploaded_fraction:
+        blob_prefix = "/".join(
+            [data_manager.GCS_POSTPROCESSED_UPLOAD_PREFIX] +
+            [item for item in full_prefix.split("/") if item])
+        for filename in data_manager.POSTPROCESSING_FILES_TO_UPLOAD:
+          gcs_client.put_object_data(
+              GCS_BUCKET_NAME, blob_prefix + "/" + filename, b"{}")
+  if rng.random() < args.claimed_fraction:
+    put(file_naming.CLAIM_JSON_FILENAME,
+        json.dumps({"username": "curator%d" % rng.randint(1, 5)}).encode(
+            "utf-8"))
+  return session_prefix
+
+
+def generate_data(s3_client, gcs_client, args):
+  """Generate the synthetic buckets.
+
+  Returns:
+    The prefix of the benchmarked container.
+  """
+  rng = random.Random(args.seed)
+  root_prefix = "/".join(
+      [data_manager.OBSERVER_DATA_PREFIX, data_manager.DATA_SCHEMA_NAME]) + "/"
+  container_prefix = root_prefix + "Surface/user00/device00/"
+  start_time = datetime.datetime(
+      2021, 11, 1, 15, 0, 0, tzinfo=datetime.timezone.utc)
+  for i in range(args.num_sessions):
+    generate_session(
+        s3_client, gcs_client, container_prefix,
+        start_time + datetime.timedelta(hours=3 * i), args, rng)
+  for i in range(args.num_other_containers):
+    generate_session(
+        s3_client, gcs_client,
+        root_prefix + "Surface/user%02d/device00/" % (i + 1),
+        start_time, args, rng)
+  return container_prefix
+
+
+class Benchmark(object):
+  """Times operations and counts the API calls that they make."""
+
+  def __init__(self, s3_client, gcs_client):
+    self._s3_client = s3_client
+    self._gcs_client = gcs_client
+    self.results = collections.OrderedDict()
+
+  def run(self, name, fn):
+    s3_counts_before = collections.Counter(self._s3_client.call_counts)
+    gcs_counts_before = collections.Counter(self._gcs_client.call_counts)
+    t0 = time.time()
+    result = fn()
+    elapsed_s = time.time() - t0
+    s3_calls = collections.Counter(self._s3_client.call_counts)
+    s3_calls.subtract(s3_counts_before)
+    gcs_calls = collections.Counter(self._gcs_client.call_counts)
+    gcs_calls.subtract(gcs_counts_before)
+    self.results[name] = {
+        "elapsed_s": elapsed_s,
+        "s3_calls": {k: v for k, v in s3_calls.items() if v},
+        "gcs_calls": {k: v for k, v in gcs_calls.items() if v},
+    }
+    print("%s: %.3f s, S3 calls: %s, GCS calls: %s" % (
+        name, elapsed_s, dict(self.results[name]["s3_calls"]),
+        dict(self.results[name]["gcs_calls"])))
+    return result
+
+
+def run_benchmark(args, work_dir):
+  s3_client = local_object_store.LocalS3Client(os.path.join(work_dir, "s3"))
+  gcs_client = local_object_store.LocalGcsClient(os.path.join(work_dir, "gcs"))
+  local_data_root = os.path.join(work_dir, "local_data")
+  os.makedirs(local_data_root, exist_ok=True)
+
+  t0 = time.time()
+  container_prefix = generate_data(s3_client, gcs_client, args)
+  print("Generated %d sessions in %.1f s" %
+        (args.num_sessions + args.num_other_containers, time.time() - t0))
+
+  gcloud_utils.set_storage_client(gcs_client)
+  try:
+    manager = data_manager.DataManager(
+        None, S3_BUCKET_NAME, GCS_BUCKET_NAME, local_data_root,
+        max_workers=args.max_workers,
+        confirm_fn=lambda kind, message: False,
+        notify_fn=lambda message, title=None: print(message),
+        prompt_fn=lambda message: None,
+        s3_client=s3_client)
+    benchmark = Benchmark(s3_client, gcs_client)
+    benchmark.run("get_session_container_prefixes",
+                  manager.get_session_container_prefixes)
+    session_prefixes = benchmark.run(
+        "get_session_prefixes",
+        lambda: manager.get_session_prefixes(container_prefix))
+    # The data that _list_sessions() displays.
+    benchmark.run(
+        "list_sessions_cold",
+        lambda: manager.get_sessions_status(container_prefix))
+    benchmark.run(
+        "list_sessions_warm",
+        lambda: manager.get_sessions_status(container_prefix))
+    benchmark.run(
+        "get_sessions_gcs_status",
+        lambda: manager.get_sessions_gcs_status(
+            container_prefix, session_prefixes))
+    benchmark.run(
+        "get_sessions_stats_cold",
+        lambda: manager.get_sessions_stats(container_prefix, session_prefixes))
+    benchmark.run(
+        "get_sessions_stats_warm",
+        lambda: manager.get_sessions_stats(container_prefix, session_prefixes))
+    benchmark.run(
+        "get_sessions_stats_publish",
+        lambda: manager.get_sessions_stats(
+            container_prefix, session_prefixes, publish_stats=True))
+    # As another curator would, with a fresh session index.
+    other_manager = data_manager.DataManager(
+        None, S3_BUCKET_NAME, GCS_BUCKET_NAME,
+        tempfile.mkdtemp(dir=work_dir),
+        max_workers=args.max_workers,
+        confirm_fn=lambda kind, message: False,
+        notify_fn=lambda message, title=None: print(message),
+        prompt_fn=lambda message: None,
+        s3_client=s3_client)
+    benchmark.run(
+        "get_sessions_stats_published",
+        lambda: other_manager.get_sessions_stats(
+            container_prefix, session_prefixes, use_published_stats=True))
+  finally:
+    gcloud_utils.set_storage_client(None)
+  return {
+      "num_sessions": len(session_prefixes),
+      "max_workers": args.max_workers,
+      "results": benchmark.results,
+  }
+
+
+def main():
+  args = parse_args()
+  work_dir = args.work_dir or tempfile.mkdtemp()
+  try:
+    output = run_benchmark(args, work_dir)
+  finally:
+    if not args.work_dir:
+      shutil.rmtree(work_dir)
+  if args.output_json:
+    with open(args.output_json, "wt") as f:
+      json.dump(output, f, indent=2)
+    print("Wrote results to %s" % args.output_json)
+
+
+if __name__ == "__main__":
+  main()
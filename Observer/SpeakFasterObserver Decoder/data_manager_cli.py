@@ -0,0 +1,416 @@
+"""Headless command-line front end of the SpeakFaster data manager.
+
+Runs the same operations as the data manager GUI (data_manager.py) without a
+display, e.g., as a nightly job on a Linux server. Confirmations that the GUI
+asks for are answered by non-interactive policies given as flags. Progress
+messages are written to stderr and the results are written to stdout as JSON.
+The exit code is 1 if the operation failed on any session, e.g., because the
+session lacks the results to upload. Sessions skipped by policy (e.g., already
+preprocessed ones without --redo) don't count as failures.
+
+Command line examples:
+
+```sh
+# List the session containers.
+python data_manager_cli.py list
+
+# List the sessions of a container, with their status.
+python data_manager_cli.py list --container=user01
+
+# Download, then preprocess all sessions of a container, 4 at a time.
+python data_manager_cli.py sync --container=user01 --all --jobs=4
+python data_manager_cli.py preprocess --container=user01 --all --jobs=4
+
+# Upload the preprocessing results of two sessions.
+python data_manager_cli.py upload --container=user01 --stage=preproc \
+    session-20211117T202235498Z session-20211118T091011123Z
+```
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sys
+
+import cloud_call_stats
+import data_manager
+import gcloud_utils
+
+COMMANDS = ("list", "summarize", "sync", "preprocess", "postprocess", "upload")
+
+UPLOAD_STAGE_PREPROC = "preproc"
+UPLOAD_STAGE_POSTPROC = "postproc"
+
+# Statuses of the results of session operations.
+RESULT_SUCCEEDED = "succeeded"
+# The operation decided not to do anything, e.g., as a redo was declined.
+RESULT_SKIPPED = "skipped"
+RESULT_FAILED = "failed"
+
+
+def parse_args(argv=None):
+  parser = argparse.ArgumentParser("Data Manager CLI")
+  parser.add_argument("command", type=str, choices=COMMANDS)
+  parser.add_argument(
+      "sessions",
+      type=str,
+      nargs="*",
+      help="Sessions to operate on. Either session basenames (e.g., "
+      "session-20211117T202235498Z) in the container specified with "
+      "--container, or full session prefixes")
+  parser.add_argument(
+      "--aws_profile_name",
+      type=str,
+      default=data_manager.DEFAULT_PROFILE_NAME,
+      help="AWS profile name")
+  parser.add_argument(
+      "--s3_bucket_name",
+      type=str,
+      default=data_manager.DEFAULT_S3_BUCKET_NAME)
+  parser.add_argument(
+      "--gcs_bucket_name",
+      type=str,
+      default=data_manager.DEFAULT_GCS_BUCKET_NAME)
+  parser.add_argument(
+      "--local_data_root",
+      type=str,
+      default=None,
+      help="Local data root directory. If not specified, will be inferred in "
+      "the same way as the GUI")
+  parser.add_argument(
+      "--max_workers",
+      type=int,
+      default=data_manager.DEFAULT_MAX_WORKERS,
+      help="Maximum number of concurrent requests to S3 and GCS when scanning "
+      "sessions")
+  parser.add_argument(
+      "--container",
+      type=str,
+      default=None,
+      help="Session container prefix, or a substring that identifies exactly "
+      "one container")
+  parser.add_argument(
+      "--all",
+      action="store_true",
+      help="Operate on all sessions of the container")
+  parser.add_argument(
+      "--jobs",
+      type=int,
+      default=1,
+      help="Number of sessions operated on concurrently")
+  parser.add_argument(
+      "--stage",
+      type=str,
+      choices=(UPLOAD_STAGE_PREPROC, UPLOAD_STAGE_POSTPROC),
+      default=None,
+      help="For the upload command: which results to upload")
+  parser.add_argument(
+      "--to_gcs",
+      action="store_true",
+      help="For the upload command with --stage=postproc: upload to GCS "
+      "instead of S3")
+  parser.add_argument(
+      "--redo",
+      action="store_true",
+      help="Redo operations whose results already exist (e.g., preprocess "
+      "a session that has been preprocessed already). By default, such "
+      "sessions are skipped")
+  parser.add_argument(
+      "--ignore_misspelled",
+      action="store_true",
+      help="During postprocessing, ignore misspelled words instead of "
+      "failing")
+  parser.add_argument(
+      "--default_timezone",
+      type=str,
+      default=data_manager.DEFAULT_TIMEZONE_NAME,
+      help="Time zone of sessions whose data files don't specify one")
+  parser.add_argument(
+      "--flac_audio",
+      action="store_true",
+      help="During preprocessing and upload, write and upload a lossless "
+      "FLAC copy of the concatenated audio instead of the WAV file")
+  parser.add_argument(
+      "--call_stats_json",
+      type=str,
+      default=None,
+      help="If specified, path to write the statistics of the calls to S3 "
+      "and GCS to")
+  return parser.parse_intermixed_args(argv)
+
+
+class NonInteractivePolicy(object):
+  """Answers the confirmations and prompts of DataManager without a user."""
+
+  def __init__(self, redo=False, ignore_misspelled=False,
+               default_timezone=data_manager.DEFAULT_TIMEZONE_NAME):
+    self._redo = redo
+    self._ignore_misspelled = ignore_misspelled
+    self._default_timezone = default_timezone
+
+  def confirm(self, kind, message):
+    if kind == data_manager.CONFIRM_REDO:
+      answer = self._redo
+    elif kind == data_manager.CONFIRM_IGNORE_MISSPELLED:
+      answer = self._ignore_misspelled
+    elif kind == data_manager.CONFIRM_PROCEED:
+      # The command itself expresses the intent to proceed.
+      answer = True
+    else:
+      raise ValueError("Unsupported confirmation kind: %s" % kind)
+    print("%s [Answered %s by policy]" % (message, "Yes" if answer else "No"),
+          file=sys.stderr)
+    return answer
+
+  def notify(self, message, title=None):
+    if title:
+      message = "%s: %s" % (title, message)
+    print(message, file=sys.stderr)
+
+  def prompt(self, message):
+    print("%s [Using %s]" % (message, self._default_timezone),
+          file=sys.stderr)
+    return self._default_timezone
+
+
+def resolve_container_prefix(container, container_prefixes):
+  """Find the container prefix specified on the command line.
+
+  Args:
+    container: A container prefix, or a substring that identifies exactly
+      one of container_prefixes.
+    container_prefixes: All container prefixes.
+
+  Returns:
+    The container prefix.
+  """
+  if container in container_prefixes:
+    return container
+  matches = [prefix for prefix in container_prefixes if container in prefix]
+  if len(matches) != 1:
+    raise ValueError(
+        "Expected --container=%s to match exactly one container, "
+        "but it matched %d: %s" % (container, len(matches), matches))
+  return matches[0]
+
+
+def resolve_session_prefixes(sessions, container_prefix, all_session_prefixes):
+  """Get the full prefixes of the sessions specified on the command line.
+
+  Args:
+    sessions: Session basenames or full session prefixes.
+    container_prefix: The container prefix, or None.
+    all_session_prefixes: If not None, all session prefixes of the container,
+      relative to container_prefix. Used in lieu of sessions.
+
+  Returns:
+    A list of full session prefixes, each ending with "/".
+  """
+  if all_session_prefixes is not None:
+    return [container_prefix + prefix for prefix in all_session_prefixes]
+  session_prefixes = []
+  for session in sessions:
+    if not session.endswith("/"):
+      session += "/"
+    if "/" not in session[:-1]:
+      if not container_prefix:
+        raise ValueError(
+            "--container is required for session basename %s" % session)
+      session = container_prefix + session
+    session_prefixes.append(session)
+  return session_prefixes
+
+
+def _get_session_operation(args, manager):
+  if args.command == "sync":
+    return manager.sync_to_local
+  elif args.command == "preprocess":
+    return manager.preprocess_session
+  elif args.command == "postprocess":
+    return manager.postprocess_curation
+  elif args.command == "upload":
+    if args.stage == UPLOAD_STAGE_PREPROC:
+      if args.to_gcs:
+        raise ValueError("--to_gcs is supported only for --stage=postproc")
+      return manager.upload_sesssion_preproc_results
+    elif args.stage == UPLOAD_STAGE_POSTPROC:
+      return lambda session_prefix: manager.upload_session_postproc_results(
+          session_prefix, to_gcs=args.to_gcs)
+    else:
+      raise ValueError("--stage is required for the upload command")
+  raise ValueError("Unsupported session command: %s" % args.command)
+
+
+def run_session_operation(operation, session_prefixes, jobs):
+  """Run an operation on sessions concurrently.
+
+  Args:
+    operation: A DataManager method that takes a session prefix and returns
+      a (message, changed) tuple, with a false changed if it skipped the
+      session. It raises an exception if it fails.
+    session_prefixes: Full session prefixes.
+    jobs: Number of sessions operated on concurrently.
+
+  Returns:
+    A list of result dicts, in the same order as session_prefixes. Each has
+    the keys "session", "status" (one of the RESULT_* values), "message" and
+    "changed", plus "error" if the operation failed.
+  """
+  if jobs < 1:
+    raise ValueError("jobs must be a positive integer, got %s" % jobs)
+
+  def run(session_prefix):
+    result = {"session": session_prefix}
+    try:
+      message, changed = operation(session_prefix)
+      result["status"] = RESULT_SUCCEEDED if changed else RESULT_SKIPPED
+      result["message"] = message
+      result["changed"] = bool(changed)
+    except Exception as e:
+      print("Failed to run operation on %s: %s" % (session_prefix, e),
+            file=sys.stderr)
+      result["status"] = RESULT_FAILED
+      result["message"] = "Failed"
+      result["changed"] = False
+      result["error"] = str(e)
+    return result
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+    return list(executor.map(run, session_prefixes))
+
+
+def run_command(args, manager):
+  """Run a command.
+
+  Args:
+    args: Parsed command-line arguments.
+    manager: A DataManager.
+
+  Returns:
+    The JSON-serializable output of the command.
+  """
+  container_prefixes = manager.get_session_container_prefixes()
+  container_prefix = None
+  if args.container:
+    container_prefix = resolve_container_prefix(
+        args.container, container_prefixes)
+  if args.command == "list":
+    if not container_prefix:
+      return {"containers": container_prefixes}
+    session_prefixes, sessions_status = manager.get_sessions_status(
+        container_prefix)
+    sessions = []
+    for session_prefix, session_status in zip(
+        session_prefixes, sessions_status):
+      session = {"session": container_prefix + session_prefix}
+      session.update(session_status)
+      sessions.append(session)
+    return {"container": container_prefix, "sessions": sessions}
+
+  if not container_prefix and (args.command == "summarize" or args.all):
+    raise ValueError("--container is required")
+  if args.command == "summarize":
+    session_prefixes = manager.get_session_prefixes(container_prefix)
+    (num_sessions, num_complete_sessions, total_duration_s, total_keypresses,
+     total_audio_files, total_screenshots, total_objects,
+     session_keypresses_per_second,
+     start_time_table) = manager.get_sessions_stats(
+         container_prefix, session_prefixes)
+    return {
+        "container": container_prefix,
+        "num_sessions": num_sessions,
+        "num_complete_sessions": num_complete_sessions,
+        "total_duration_s": total_duration_s,
+        "total_keypresses": total_keypresses,
+        "total_audio_files": total_audio_files,
+        "total_screenshots": total_screenshots,
+        "total_objects": total_objects,
+        "session_keypresses_per_second": session_keypresses_per_second,
+        "start_time_table": {
+            "weekdays": list(data_manager.WEEKDAYS),
+            "hour_ranges": [list(r) for r in data_manager.HOUR_RANGES],
+            "counts": start_time_table.tolist(),
+        },
+    }
+
+  operation = _get_session_operation(args, manager)
+  if args.all and args.sessions:
+    raise ValueError("Sessions must not be specified along with --all")
+  if not args.all and not args.sessions:
+    raise ValueError("Specify sessions or --all")
+  session_prefixes = resolve_session_prefixes(
+      args.sessions, container_prefix,
+      manager.get_session_prefixes(container_prefix) if args.all else None)
+  results = run_session_operation(operation, session_prefixes, args.jobs)
+  return {"command": args.command, "results": results}
+
+
+@contextlib.contextmanager
+def _redirect_stdout_to_stderr():
+  """Redirect stdout to stderr, including the stdout of child processes.
+
+  contextlib.redirect_stdout() only replaces sys.stdout, whereas child
+  processes (e.g., elan_format_raw.py run for preprocessing) write to file
+  descriptor 1. So the file descriptor is redirected as well, if stdout has
+  one.
+  """
+  try:
+    stdout_fd = sys.stdout.fileno()
+    stderr_fd = sys.stderr.fileno()
+  except (AttributeError, io.UnsupportedOperation):
+    stdout_fd = None
+  saved_stdout_fd = None
+  if stdout_fd is not None:
+    sys.stdout.flush()
+    saved_stdout_fd = os.dup(stdout_fd)
+    os.dup2(stderr_fd, stdout_fd)
+  try:
+    with contextlib.redirect_stdout(sys.stderr):
+      yield
+  finally:
+    if saved_stdout_fd is not None:
+      sys.stderr.flush()
+      os.dup2(saved_stdout_fd, stdout_fd)
+      os.close(saved_stdout_fd)
+
+
+def main(argv=None):
+  args = parse_args(argv)
+  policy = NonInteractivePolicy(
+      redo=args.redo,
+      ignore_misspelled=args.ignore_misspelled,
+      default_timezone=args.default_timezone)
+  call_stats = None
+  if args.call_stats_json:
+    call_stats = cloud_call_stats.CallStats()
+    gcloud_utils.set_call_stats(call_stats)
+  # Progress messages from the DataManager and the processes it runs go to
+  # stderr, so that stdout holds only the JSON output.
+  with _redirect_stdout_to_stderr():
+    manager = data_manager.DataManager(
+        args.aws_profile_name,
+        args.s3_bucket_name,
+        args.gcs_bucket_name,
+        args.local_data_root or data_manager.infer_local_data_root(),
+        max_workers=args.max_workers,
+        confirm_fn=policy.confirm,
+        notify_fn=policy.notify,
+        prompt_fn=policy.prompt,
+        call_stats=call_stats,
+        flac_audio=args.flac_audio)
+    output = run_command(args, manager)
+    if call_stats:
+      print("Cloud calls: %s" % call_stats.summary())
+      call_stats.write_json(args.call_stats_json)
+  json.dump(output, sys.stdout, indent=2)
+  sys.stdout.write("\n")
+  if any(result["status"] == RESULT_FAILED
+         for result in output.get("results", [])):
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,275 @@
+"""Unit tests for data_manager_cli.py."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+import data_manager
+import data_manager_cli
+
+_CONTAINERS = [
+    "observer_data/SPO-2111/Surface/user01/",
+    "observer_data/SPO-2111/Surface/user02/",
+]
+
+
+class NonInteractivePolicyTest(tf.test.TestCase):
+
+  def testDefaultPolicy_skipsRedoAndMisspelledWords(self):
+    policy = data_manager_cli.NonInteractivePolicy()
+    self.assertFalse(policy.confirm(data_manager.CONFIRM_REDO, "Again?"))
+    self.assertFalse(
+        policy.confirm(data_manager.CONFIRM_IGNORE_MISSPELLED, "Ignore?"))
+    self.assertTrue(policy.confirm(data_manager.CONFIRM_PROCEED, "Sure?"))
+
+  def testRedoAndIgnoreMisspelledPolicy(self):
+    policy = data_manager_cli.NonInteractivePolicy(
+        redo=True, ignore_misspelled=True)
+    self.assertTrue(policy.confirm(data_manager.CONFIRM_REDO, "Again?"))
+    self.assertTrue(
+        policy.confirm(data_manager.CONFIRM_IGNORE_MISSPELLED, "Ignore?"))
+
+  def testUnsupportedConfirmationKind_raisesValueError(self):
+    policy = data_manager_cli.NonInteractivePolicy()
+    with self.assertRaisesRegex(ValueError, "Unsupported"):
+      policy.confirm("FOO", "Foo?")
+
+  def testPrompt_returnsDefaultTimezone(self):
+    policy = data_manager_cli.NonInteractivePolicy(
+        default_timezone="US/Pacific")
+    self.assertEqual(policy.prompt("Time zone?"), "US/Pacific")
+
+
+class ResolvePrefixesTest(tf.test.TestCase):
+
+  def testResolveContainerPrefix(self):
+    self.assertEqual(
+        data_manager_cli.resolve_container_prefix("user02", _CONTAINERS),
+        _CONTAINERS[1])
+    self.assertEqual(
+        data_manager_cli.resolve_container_prefix(_CONTAINERS[0], _CONTAINERS),
+        _CONTAINERS[0])
+    with self.assertRaisesRegex(ValueError, "matched 2"):
+      data_manager_cli.resolve_container_prefix("user0", _CONTAINERS)
+    with self.assertRaisesRegex(ValueError, "matched 0"):
+      data_manager_cli.resolve_container_prefix("user03", _CONTAINERS)
+
+  def testResolveSessionPrefixes(self):
+    self.assertEqual(
+        data_manager_cli.resolve_session_prefixes(
+            ["session-1", "other/container/session-2/"], _CONTAINERS[0], None),
+        [_CONTAINERS[0] + "session-1/", "other/container/session-2/"])
+    self.assertEqual(
+        data_manager_cli.resolve_session_prefixes(
+            [], _CONTAINERS[0], ["session-1/", "session-2/"]),
+        [_CONTAINERS[0] + "session-1/", _CONTAINERS[0] + "session-2/"])
+    with self.assertRaisesRegex(ValueError, "--container"):
+      data_manager_cli.resolve_session_prefixes(["session-1"], None, None)
+
+
+class RunCommandTest(tf.test.TestCase):
+
+  def _create_manager(self):
+    manager = mock.MagicMock()
+    manager.get_session_container_prefixes.return_value = _CONTAINERS
+    manager.get_session_prefixes.return_value = ["session-1/", "session-2/"]
+    return manager
+
+  def testListContainers(self):
+    args = data_manager_cli.parse_args(["list"])
+    output = data_manager_cli.run_command(args, self._create_manager())
+    self.assertEqual(output, {"containers": _CONTAINERS})
+
+  def testListSessions(self):
+    manager = self._create_manager()
+    manager.get_sessions_status.return_value = (
+        ["session-1/"],
+        [{"remote_status": data_manager.STATE_PREPROCESSED,
+          "local_status": data_manager.STATE_NOT_DOWNLOADED,
+          "gcs_status": None}])
+    args = data_manager_cli.parse_args(["list", "--container=user01"])
+    output = data_manager_cli.run_command(args, manager)
+    self.assertEqual(output["container"], _CONTAINERS[0])
+    self.assertEqual(output["sessions"], [{
+        "session": _CONTAINERS[0] + "session-1/",
+        "remote_status": data_manager.STATE_PREPROCESSED,
+        "local_status": data_manager.STATE_NOT_DOWNLOADED,
+        "gcs_status": None}])
+
+  def testSummarize_outputsJsonSerializableStats(self):
+    manager = self._create_manager()
+    table = np.zeros([len(data_manager.WEEKDAYS),
+                      len(data_manager.HOUR_RANGES)], dtype=np.int32)
+    table[1, 2] = 2
+    manager.get_sessions_stats.return_value = (
+        2, 1, 120.0, 100, 3, 4, 50, {"session-1": 1.5, "session-2": None},
+        table)
+    args = data_manager_cli.parse_args(["summarize", "--container=user01"])
+    output = data_manager_cli.run_command(args, manager)
+    self.assertEqual(output["num_sessions"], 2)
+    self.assertEqual(output["start_time_table"]["counts"][1][2], 2)
+    self.assertEqual(output["session_keypresses_per_second"]["session-1"], 1.5)
+
+  def testPreprocessAll_runsConcurrentlyAndKeepsOrder(self):
+    manager = self._create_manager()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def preprocess_session(session_prefix):
+      barrier.wait()
+      return "Preprocessing complete.", "session"
+
+    manager.preprocess_session.side_effect = preprocess_session
+    args = data_manager_cli.parse_args(
+        ["preprocess", "--container=user01", "--all", "--jobs=2"])
+    output = data_manager_cli.run_command(args, manager)
+    self.assertEqual(
+        [result["session"] for result in output["results"]],
+        [_CONTAINERS[0] + "session-1/", _CONTAINERS[0] + "session-2/"])
+    self.assertTrue(all(result["changed"] for result in output["results"]))
+    self.assertTrue(all(result["status"] == data_manager_cli.RESULT_SUCCEEDED
+                        for result in output["results"]))
+
+  def testUploadPostproc_toGcsAndErrorIsReported(self):
+    manager = self._create_manager()
+    manager.upload_session_postproc_results.side_effect = [
+        ("Done uploading postprocessing results to GCS", "session"),
+        ValueError("Network error"),
+    ]
+    args = data_manager_cli.parse_args(
+        ["upload", "--container=user01", "--stage=postproc", "--to_gcs",
+         "session-1", "session-2"])
+    output = data_manager_cli.run_command(args, manager)
+    manager.upload_session_postproc_results.assert_any_call(
+        _CONTAINERS[0] + "session-1/", to_gcs=True)
+    self.assertNotIn("error", output["results"][0])
+    self.assertEqual(output["results"][0]["status"],
+                     data_manager_cli.RESULT_SUCCEEDED)
+    self.assertEqual(output["results"][1]["status"],
+                     data_manager_cli.RESULT_FAILED)
+    self.assertEqual(output["results"][1]["error"], "Network error")
+
+  def testDeclinedRedo_isReportedAsSkipped(self):
+    manager = self._create_manager()
+    manager.preprocess_session.return_value = (
+        "Preprocessing was not run.", False)
+    args = data_manager_cli.parse_args(
+        ["preprocess", "--container=user01", "session-1"])
+    output = data_manager_cli.run_command(args, manager)
+    self.assertEqual(output["results"][0]["status"],
+                     data_manager_cli.RESULT_SKIPPED)
+    self.assertNotIn("error", output["results"][0])
+
+  def testUploadWithoutStage_raisesValueError(self):
+    args = data_manager_cli.parse_args(
+        ["upload", "--container=user01", "session-1"])
+    with self.assertRaisesRegex(ValueError, "--stage"):
+      data_manager_cli.run_command(args, self._create_manager())
+
+  def testSessionCommandWithoutSessions_raisesValueError(self):
+    args = data_manager_cli.parse_args(["sync", "--container=user01"])
+    with self.assertRaisesRegex(ValueError, "--all"):
+      data_manager_cli.run_command(args, self._create_manager())
+
+
+# Runs the CLI with a fake DataManager, whose preprocessing runs a child
+# process that prints to stdout, like elan_format_raw.py does.
+_MAIN_WITH_CHILD_PROCESS_SCRIPT = """
+import sys
+from unittest import mock
+
+import data_manager
+import data_manager_cli
+
+run_command_line = data_manager.DataManager._run_command_line
+
+
+class FakeDataManager(object):
+
+  def __init__(self, *args, **kwargs):
+    del args, kwargs  # Unused.
+
+  def get_session_container_prefixes(self):
+    return ["observer_data/user01/"]
+
+  def preprocess_session(self, session_prefix):
+    run_command_line(
+        self, [sys.executable, "-c", "print('Preprocessing ' + %r)" %
+               session_prefix])
+    return "Preprocessing complete.", "session"
+
+
+with mock.patch.object(data_manager, "DataManager", FakeDataManager):
+  sys.exit(data_manager_cli.main(sys.argv[1:]))
+"""
+
+# Runs the CLI with a DataManager whose postprocessing fails.
+_MAIN_WITH_FAILING_POSTPROCESSING_SCRIPT = """
+import sys
+from unittest import mock
+
+import data_manager
+import data_manager_cli
+
+with mock.patch.object(data_manager.boto3, "Session"), \\
+    mock.patch.object(
+        data_manager.DataManager, "get_session_container_prefixes",
+        return_value=["observer_data/user01/"]), \\
+    mock.patch.object(
+        data_manager.elan_process_curated, "postprocess_curated",
+        side_effect=ValueError("Invalid curated.tsv")):
+  sys.exit(data_manager_cli.main(sys.argv[1:]))
+"""
+
+
+class MainTest(tf.test.TestCase):
+
+  def _run_main(self, script, args):
+    return subprocess.run(
+        [sys.executable, "-c", script] + args,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+  def testChildProcessOutput_doesNotGoToStdout(self):
+    result = self._run_main(
+        _MAIN_WITH_CHILD_PROCESS_SCRIPT,
+        ["preprocess", "--container=user01", "--local_data_root",
+         tempfile.mkdtemp(), "session-1"])
+    self.assertEqual(result.returncode, 0)
+    output = json.loads(result.stdout)
+    self.assertEqual(output["results"][0]["session"],
+                     "observer_data/user01/session-1/")
+    self.assertIn(b"Preprocessing observer_data/user01/session-1/",
+                  result.stderr)
+
+  def testFailedPostprocessing_exitsWithError(self):
+    local_data_root = tempfile.mkdtemp()
+    for session_name, filenames in (
+        ("session-1", ["curated.tsv"]),
+        ("session-2", ["curated.tsv", "curated_processed.json",
+                       "curated_processed.tsv",
+                       "curated_processed_speech_only.tsv"])):
+      os.makedirs(os.path.join(local_data_root, session_name))
+      for filename in filenames:
+        with open(os.path.join(local_data_root, session_name, filename),
+                  "wt") as f:
+          f.write("Start\tEnd\tTier\tContent\n")
+    result = self._run_main(
+        _MAIN_WITH_FAILING_POSTPROCESSING_SCRIPT,
+        ["postprocess", "--container=user01", "--local_data_root",
+         local_data_root, "session-1", "session-2"])
+    self.assertEqual(result.returncode, 1)
+    results = json.loads(result.stdout)["results"]
+    self.assertEqual(results[0]["status"], data_manager_cli.RESULT_FAILED)
+    self.assertEqual(results[0]["error"], "Invalid curated.tsv")
+    # Already postprocessed, and --redo is not set.
+    self.assertEqual(results[1]["status"], data_manager_cli.RESULT_SKIPPED)
+
+
+if __name__ == "__main__":
+  tf.test.main()
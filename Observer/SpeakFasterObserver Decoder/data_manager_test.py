@@ -1,7 +1,31 @@
 """Unit tests for data_manager.py."""
+import concurrent.futures
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
 import tensorflow as tf
 
+import cloud_call_stats
 import data_manager
+import gcloud_utils
+import local_object_store
+import remote_state_test
+import s3_transfer
+
+
+def _create_data_manager(**kwargs):
+  """Create a DataManager without touching AWS or the local file system."""
+  with mock.patch.object(data_manager.boto3, "Session"), \
+      mock.patch.object(data_manager.DataManager, "_run_command_line"), \
+      mock.patch.object(data_manager.os, "getlogin", return_value="tester"):
+    return data_manager.DataManager(
+        "test_profile", "test-s3-bucket", "test-gcs-bucket", tempfile.mkdtemp(),
+        **kwargs)
 
 
 class DataManagerTest(tf.test.TestCase):
@@ -34,6 +58,34 @@ class DataManagerTest(tf.test.TestCase):
     self.assertLen(set(data_manager.POSTPROCESSING_FILES_TO_UPLOAD),
                    len(data_manager.POSTPROCESSING_FILES_TO_UPLOAD))
 
+  def testPreprocessingUploadFilters(self):
+    for file_name in ("merged.tsv", "asr.tsv", "concatenated_audio.wav",
+                      "screenshots.mp4", "manifest.json"):
+      self.assertTrue(s3_transfer.matches_filters(
+          file_name, data_manager.PREPROCESSING_UPLOAD_FILTERS))
+    for file_name in ("20211117T202235498Z-Screenshot.jpg",
+                      "20211117T202235498Z-MicWaveIn.flac", "session.eaf"):
+      self.assertFalse(s3_transfer.matches_filters(
+          file_name, data_manager.PREPROCESSING_UPLOAD_FILTERS))
+
+  def testPreprocessingFlacUploadFilters(self):
+    self.assertTrue(s3_transfer.matches_filters(
+        "concatenated_audio.flac",
+        data_manager.PREPROCESSING_FLAC_UPLOAD_FILTERS))
+    self.assertFalse(s3_transfer.matches_filters(
+        "concatenated_audio.wav",
+        data_manager.PREPROCESSING_FLAC_UPLOAD_FILTERS))
+    self.assertFalse(s3_transfer.matches_filters(
+        "20211117T202235498Z-MicWaveIn.flac",
+        data_manager.PREPROCESSING_FLAC_UPLOAD_FILTERS))
+
+  def testPostprocessingUploadFilters(self):
+    for file_name in data_manager.POSTPROCESSING_FILES_TO_UPLOAD:
+      self.assertTrue(s3_transfer.matches_filters(
+          file_name, data_manager.POSTPROCESSING_UPLOAD_FILTERS))
+    self.assertFalse(s3_transfer.matches_filters(
+        "concatenated_audio.wav", data_manager.POSTPROCESSING_UPLOAD_FILTERS))
+
   def testGetBaseSessionPrefix_returnsCorrectValue(self):
     self.assertEqual(
         data_manager.get_base_session_prefix(
@@ -60,5 +112,779 @@ class DataManagerTest(tf.test.TestCase):
       data_manager.get_base_session_prefix(None)
 
 
+class GetSessionsStatsTest(tf.test.TestCase):
+
+  def _fake_facts(self, session_prefix):
+    # Session names encode the start hour and number of keypresses.
+    _, hour, num_keypresses = session_prefix.rstrip("/").split("-")
+    first_timestamp = datetime.datetime(
+        2021, 11, 15, int(hour), tzinfo=datetime.timezone.utc).timestamp()
+    return {
+        "is_session_complete": True,
+        "time_zone": "US/Central",
+        "first_timestamp": first_timestamp,
+        "last_timestamp": first_timestamp + 100,
+        "num_keypresses": int(num_keypresses),
+        "num_audio_files": 2,
+        "num_screenshots": 3,
+        "object_keys": ["a", "b"],
+    }
+
+  def testConcurrentScanning_preservesOrderAndAggregates(self):
+    manager = _create_data_manager(max_workers=4)
+    lock = threading.Lock()
+    in_flight = [0]
+    max_in_flight = [0]
+
+    def fake_scan_session(session_prefix):
+      with lock:
+        in_flight[0] += 1
+        max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+      # Later sessions finish earlier.
+      time.sleep(0.01 * (10 - int(session_prefix.rstrip("/").split("-")[-1])))
+      with lock:
+        in_flight[0] -= 1
+      return self._fake_facts(session_prefix)
+
+    session_prefixes = ["session-%d-%d/" % (18, i) for i in range(10)]
+    with mock.patch.object(manager, "_scan_session",
+                           side_effect=fake_scan_session), \
+        mock.patch.object(data_manager.gcloud_utils,
+                          "get_prefixes_with_all_objects",
+                          return_value={"session-18-3"}) as get_uploaded:
+      (num_sessions, num_complete_sessions, total_duration_s,
+       total_keypresses, total_audio_files, total_screenshots, total_objects,
+       session_keypresses_per_second,
+       start_time_table) = manager.get_sessions_stats(
+           "container/", session_prefixes)
+    get_uploaded.assert_called_once_with(
+        "test-gcs-bucket", "postprocessed/container",
+        data_manager.POSTPROCESSING_FILES_TO_UPLOAD)
+    self.assertEqual(num_sessions, 10)
+    self.assertEqual(num_complete_sessions, 10)
+    self.assertEqual(total_duration_s, 1000)
+    self.assertEqual(total_keypresses, sum(range(10)))
+    self.assertEqual(total_audio_files, 20)
+    self.assertEqual(total_screenshots, 30)
+    self.assertEqual(total_objects, 20)
+    self.assertEqual(list(session_keypresses_per_second.keys()),
+                     ["session-18-%d" % i for i in range(10)])
+    self.assertEqual(session_keypresses_per_second["session-18-5"], 0.05)
+    self.assertEqual(
+        manager.get_session_gcs_status("container/session-18-3/"),
+        data_manager.STATE_UPLOADED)
+    self.assertEqual(
+        manager.get_session_gcs_status("container/session-18-4/"),
+        data_manager.STATE_NOT_UPLOADED)
+    # 18:00 UTC on a Monday is 12:00 US/Central.
+    self.assertEqual(start_time_table[0, 4], 10)
+    self.assertEqual(start_time_table.sum(), 10)
+    self.assertLessEqual(max_in_flight[0], 4)
+
+  def testPublishedStats_onlyNewAndIncompleteSessionsAreScanned(self):
+    s3_client = local_object_store.LocalS3Client(tempfile.mkdtemp(), page_size=4)
+    for session_name, num_objects in (("session-19-2", 5), ("session-21-4", 3)):
+      for i in range(num_objects):
+        s3_client.put_object_data(
+            "test-s3-bucket",
+            "container/%s/20211117T20223%dZ-Screenshot.jpg" % (session_name, i),
+            b"")
+    manager = _create_data_manager(s3_client=s3_client)
+    gcloud_utils.set_storage_client(
+        local_object_store.LocalGcsClient(tempfile.mkdtemp()))
+    self.addCleanup(gcloud_utils.set_storage_client, None)
+    scanned_prefixes = []
+
+    def fake_scan_session(session_prefix):
+      scanned_prefixes.append(session_prefix)
+      facts = self._fake_facts(session_prefix)
+      if session_prefix.endswith("-1/"):
+        facts["is_session_complete"] = False
+      return facts
+
+    with mock.patch.object(manager, "_scan_session",
+                           side_effect=fake_scan_session):
+      stats_1 = manager.get_sessions_stats(
+          "container/", ["session-18-1/", "session-19-2/", "session-21-4/"],
+          use_published_stats=True, publish_stats=True)
+      self.assertLen(scanned_prefixes, 3)
+      self.assertEqual(s3_client.call_counts["ListObjectsV2"], 0)
+      del scanned_prefixes[:]
+      stats_2 = manager.get_sessions_stats(
+          "container/",
+          ["session-18-1/", "session-19-2/", "session-20-3/", "session-21-4/"],
+          use_published_stats=True)
+    self.assertCountEqual(
+        scanned_prefixes, ["container/session-18-1/", "container/session-20-3/"])
+    # The objects of the reused sessions are counted again, as derived objects
+    # may have been added since the stats were published, but from a single
+    # listing of the container: 8 objects in pages of 4.
+    self.assertEqual(s3_client.call_counts["ListObjectsV2"], 2)
+    self.assertEqual(stats_1[:2], (3, 2))
+    self.assertEqual(stats_2[:4], (4, 3, 400, 10))
+    self.assertEqual(stats_2[6], 2 + 5 + 2 + 3)
+    self.assertEqual(list(stats_2[7].keys()),
+                     ["session-18-1", "session-19-2", "session-20-3",
+                      "session-21-4"])
+    self.assertEqual(stats_2[8].sum(), 4)
+
+  def testInvalidMaxWorkers_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, r"max_workers"):
+      _create_data_manager(max_workers=0)
+
+
+class ScanSessionTest(tf.test.TestCase):
+
+  def _set_remote_objects(self, manager, objects):
+    paginator = manager._s3_client.get_paginator.return_value
+    paginator.paginate.return_value = [{"Contents": objects}]
+
+  def testScanSession_usesSessionIndexForUnchangedObjects(self):
+    manager = _create_data_manager()
+    session_prefix = "container/session-20211117T202235498Z/"
+    objects = [
+        {"Key": session_prefix + "20211117T202235498Z-Keypresses.protobuf",
+         "ETag": "\"etag1\""},
+        {"Key": session_prefix + "20211117T203235498Z-SessionEnd.bin",
+         "ETag": "\"etag2\""},
+    ]
+    self._set_remote_objects(manager, objects)
+    with mock.patch.object(
+        manager, "_read_keypresses_facts",
+        return_value={"num_keypresses": 12}) as read_keypresses, \
+        mock.patch.object(
+            manager, "_read_session_end_facts",
+            return_value={"timezone": "US/Eastern"}) as read_session_end:
+      facts_1 = manager._scan_session(session_prefix)
+      facts_2 = manager._scan_session(session_prefix)
+      self.assertEqual(read_keypresses.call_count, 1)
+      self.assertEqual(read_session_end.call_count, 1)
+      # A changed object is read again.
+      objects[0]["ETag"] = "\"etag3\""
+      manager._scan_session(session_prefix)
+      self.assertEqual(read_keypresses.call_count, 2)
+      self.assertEqual(read_session_end.call_count, 1)
+    self.assertEqual(facts_1, facts_2)
+    self.assertTrue(facts_1["is_session_complete"])
+    self.assertEqual(facts_1["time_zone"], "US/Eastern")
+    self.assertEqual(facts_1["num_keypresses"], 12)
+    self.assertEqual(facts_1["last_timestamp"] - facts_1["first_timestamp"],
+                     600)
+
+  def testScanSession_ignoresDerivedAudioAndArchives(self):
+    manager = _create_data_manager()
+    session_prefix = "container/session-20211117T202235498Z/"
+    self._set_remote_objects(manager, [
+        {"Key": session_prefix + "20211117T202235498Z-MicWaveIn.flac",
+         "ETag": "\"etag1\""},
+        {"Key": session_prefix + "archive/raw-000.tar", "ETag": "\"etag2\""},
+        {"Key": session_prefix + "concatenated_audio.flac",
+         "ETag": "\"etag3\""},
+    ])
+    facts = manager._scan_session(session_prefix)
+    self.assertEqual(facts["num_audio_files"], 1)
+    self.assertLen(facts["object_keys"], 3)
+
+
+  def testScanSession_prefersManifest(self):
+    manager = _create_data_manager()
+    session_prefix = "container/session-20211117T202235498Z/"
+    self._set_remote_objects(manager, [
+        {"Key": session_prefix + "20211117T202235498Z-Keypresses.protobuf",
+         "ETag": "\"etag1\""},
+        {"Key": session_prefix + "manifest.json", "ETag": "\"etag2\""},
+    ])
+    manifest = {
+        "version": 1,
+        "is_session_complete": True,
+        "timezone": "US/Pacific",
+        "first_timestamp": 1637180555.0,
+        "last_timestamp": 1637181155.0,
+        "num_keypresses": 1234,
+        "num_audio_files": 5,
+        "num_screenshots": 6,
+        "stream_file_counts": {},
+        "stream_bytes": {},
+    }
+
+    def fake_download_fileobj(bucket_name, object_key, f):
+      self.assertEqual(object_key, session_prefix + "manifest.json")
+      f.write(json.dumps(manifest).encode("utf-8"))
+
+    manager._s3_client.download_fileobj.side_effect = fake_download_fileobj
+    with mock.patch.object(
+        manager, "_read_keypresses_facts") as read_keypresses:
+      (is_session_complete, time_zone, start_time, duration_s, num_keypresses,
+       num_audio_files, num_screenshots,
+       object_keys) = manager.get_session_details(session_prefix)
+      read_keypresses.assert_not_called()
+    self.assertTrue(is_session_complete)
+    self.assertEqual(time_zone, "US/Pacific")
+    self.assertEqual(start_time.hour, 12)
+    self.assertEqual(duration_s, 600)
+    self.assertEqual(num_keypresses, 1234)
+    self.assertEqual(num_audio_files, 5)
+    self.assertEqual(num_screenshots, 6)
+    self.assertEqual(object_keys,
+                     ["20211117T202235498Z-Keypresses.protobuf",
+                      "manifest.json"])
+
+
+class GetSessionContainerPrefixesTest(tf.test.TestCase):
+
+  def _set_tree(self, manager, tree):
+    """Set the child prefixes of each prefix for the delimited listings."""
+    def paginate(Bucket, Delimiter, Prefix):
+      self.assertEqual(Delimiter, "/")
+      return [{"CommonPrefixes": [
+          {"Prefix": Prefix + child + "/"} for child in tree.get(Prefix, [])]}]
+
+    manager._s3_client.get_paginator.return_value.paginate.side_effect = (
+        paginate)
+
+  def testDiscoversThreeLevelsInOrderAndCaches(self):
+    manager = _create_data_manager(max_workers=4)
+    root = "observer_data/SPO-2111/"
+    self._set_tree(manager, {
+        root: ["Surface", "Tablet", ""],
+        root + "Surface/": ["user01", "user02"],
+        root + "Tablet/": ["user03"],
+        root + "Surface/user01/": ["device1"],
+        root + "Surface/user02/": ["device2", "device3"],
+        root + "Tablet/user03/": ["device4"],
+    })
+    self.assertIsNone(manager.get_cached_session_container_prefixes())
+    prefixes = manager.get_session_container_prefixes()
+    self.assertEqual(prefixes, [
+        root + "Surface/user01/device1/",
+        root + "Surface/user02/device2/",
+        root + "Surface/user02/device3/",
+        root + "Tablet/user03/device4/",
+    ])
+    self.assertEqual(manager.get_cached_session_container_prefixes(), prefixes)
+
+  def testCacheOfOtherBucket_isIgnored(self):
+    manager = _create_data_manager()
+    self._set_tree(manager, {})
+    manager.get_session_container_prefixes()
+    manager._s3_bucket_name = "other-bucket"
+    self.assertIsNone(manager.get_cached_session_container_prefixes())
+
+
+class CallStatsTest(tf.test.TestCase):
+
+  def testS3Calls_areRecorded(self):
+    call_stats = cloud_call_stats.CallStats()
+    s3_client = local_object_store.LocalS3Client(tempfile.mkdtemp())
+    s3_client.put_object_data(
+        "test-s3-bucket",
+        "observer_data/SPO-2111/Surface/user01/device1/session-1/a.bin", b"")
+    manager = _create_data_manager(s3_client=s3_client, call_stats=call_stats)
+    self.assertIs(manager.call_stats, call_stats)
+    manager.get_session_container_prefixes()
+    self.assertEqual(
+        call_stats.to_dict()["operations"]["s3"]["list_objects"]["num_calls"],
+        s3_client.call_counts["ListObjects"])
+    self.assertGreater(call_stats.get_total_calls(), 0)
+
+
+class SyncToLocalTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(SyncToLocalTest, self).setUp()
+    self._s3_client = local_object_store.LocalS3Client(tempfile.mkdtemp())
+    for filename in ("20211117T202235498Z-MicWaveIn.flac",
+                     "20211117T202236498Z-Screenshot.jpg",
+                     "20211117T203235498Z-SessionEnd.bin",
+                     "merged.tsv", "curated.tsv", "curated_processed.tsv",
+                     "concatenated_audio.wav"):
+      self._s3_client.put_object_data(
+          "test-s3-bucket", "c/session-1/" + filename, filename.encode("utf-8"))
+    self._manager = _create_data_manager(s3_client=self._s3_client)
+
+  def _get_local_filenames(self):
+    return sorted(os.listdir(self._manager.get_local_session_dir(
+        "c/session-1/")))
+
+  def testFullProfile_downloadsAllObjects(self):
+    self._manager.sync_to_local("c/session-1/")
+    self.assertLen(self._get_local_filenames(), 7)
+
+  def testCheckKeypressesProfile_downloadsOnlyNeededObjects(self):
+    self._manager.sync_to_local(
+        "c/session-1/", profile=data_manager.SYNC_PROFILE_CHECK_KEYPRESSES)
+    self.assertEqual(self._get_local_filenames(),
+                     ["curated_processed.tsv", "merged.tsv",
+                      "partial_sync.txt"])
+    self._manager.sync_to_local(
+        "c/session-1/", profile=data_manager.SYNC_PROFILE_ANALYZE_TRANSCRIPTS)
+    self.assertEqual(self._get_local_filenames(),
+                     ["curated.tsv", "curated_processed.tsv", "merged.tsv",
+                      "partial_sync.txt"])
+    # Files already downloaded are not downloaded again.
+    self.assertEqual(self._s3_client.call_counts["GetObject"], 3)
+
+  def testPartialProfile_isNotReportedAsCurated(self):
+    self._manager.sync_to_local(
+        "c/session-1/", profile=data_manager.SYNC_PROFILE_ANALYZE_TRANSCRIPTS)
+    self.assertEqual(
+        self._manager.get_local_session_folder_status("c/session-1/"),
+        data_manager.STATE_NOT_DOWNLOADED)
+    self._manager.sync_to_local("c/session-1/")
+    self.assertNotIn("partial_sync.txt", self._get_local_filenames())
+    self.assertEqual(
+        self._manager.get_local_session_folder_status("c/session-1/"),
+        data_manager.STATE_CURATED)
+
+  def testPartialProfile_afterFullSyncLeavesNoMarker(self):
+    self._manager.sync_to_local("c/session-1/")
+    self._manager.sync_to_local(
+        "c/session-1/", profile=data_manager.SYNC_PROFILE_CHECK_KEYPRESSES)
+    self.assertNotIn("partial_sync.txt", self._get_local_filenames())
+
+  def testFullProfile_regeneratesWavOnlyFromDownloadedFlac(self):
+    self._s3_client.put_object_data(
+        "test-s3-bucket", "c/session-1/concatenated_audio.flac", b"flac")
+    with mock.patch.object(
+        data_manager.concatenated_audio, "ensure_wav") as ensure_wav:
+      self._manager.sync_to_local("c/session-1/")
+      ensure_wav.assert_called_once_with(mock.ANY, force=True)
+      ensure_wav.reset_mock()
+      # The FLAC file is up to date, e.g., as compressed from the WAV file.
+      self._manager.sync_to_local("c/session-1/")
+      ensure_wav.assert_called_once_with(mock.ANY, force=False)
+      ensure_wav.reset_mock()
+      self._manager.sync_to_local(
+          "c/session-1/", profile=data_manager.SYNC_PROFILE_CHECK_KEYPRESSES)
+      ensure_wav.assert_not_called()
+
+  def testInvalidProfile_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, r"Invalid sync profile"):
+      self._manager.sync_to_local("c/session-1/", profile="nonexistent")
+
+  def testUploadSessionArchives_thenSyncFetchesPackedFiles(self):
+    self._manager.sync_to_local("c/session-1/")
+    self._manager.upload_session_archives("c/session-1/")
+    self.assertTrue(self._s3_client.get_object(
+        Bucket="test-s3-bucket", Key="c/session-1/archive/index.json"))
+    local_dir = self._manager.get_local_session_dir("c/session-1/")
+    for filename in ("20211117T202235498Z-MicWaveIn.flac",
+                     "20211117T202236498Z-Screenshot.jpg",
+                     "20211117T203235498Z-SessionEnd.bin"):
+      os.remove(os.path.join(local_dir, filename))
+    self._s3_client.call_counts.clear()
+    self._manager.sync_to_local("c/session-1/")
+    # The archives are not downloaded as files.
+    self.assertLen(self._get_local_filenames(), 7)
+    # The index and a single range read.
+    self.assertEqual(self._s3_client.call_counts["GetObject"], 2)
+    with open(os.path.join(
+        local_dir, "20211117T202235498Z-MicWaveIn.flac"), "rb") as f:
+      self.assertEqual(f.read(), b"20211117T202235498Z-MicWaveIn.flac")
+
+
+class RemoteSessionFolderStatusTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(RemoteSessionFolderStatusTest, self).setUp()
+    self._manager = _create_data_manager()
+    self._client = remote_state_test.FakeS3Client([
+        "c/session-1/20211117T202235498Z-Keypresses.protobuf",
+        "c/session-1/merged.tsv",
+        "c/session-2/20211117T202235498Z-Keypresses.protobuf",
+        "c/session-2/curated_processed.tsv",
+        "c/session-2/merged.tsv",
+        "c/session-3/20211117T202235498Z-Keypresses.protobuf",
+    ])
+    self._manager._s3_client = self._client
+
+  def testCachedStatus_listsContainerOnce(self):
+    statuses = [
+        self._manager.get_remote_session_folder_status(
+            "c/session-%d/" % i, use_cached=True) for i in (1, 2, 3)]
+    self.assertEqual(statuses, [data_manager.STATE_PREPROCESSED,
+                                data_manager.STATE_POSTPROCESSED,
+                                data_manager.STATE_NOT_PREPROCESSED])
+    self.assertEqual(self._client.list_calls, [("c/", None)])
+
+  def testUncachedStatus_listsOnlyDerivedObjectsOfSession(self):
+    self.assertEqual(
+        self._manager.get_remote_session_folder_status("c/session-2/"),
+        data_manager.STATE_POSTPROCESSED)
+    self.assertEqual(self._client.list_calls,
+                     [("c/session-2/", "c/session-2/:")])
+
+  def testUpdateRemoteSessionObjectsStatus_isIncremental(self):
+    self._manager.update_remote_session_objects_status("c/")
+    self._client.keys.add("c/session-4/merged.tsv")
+    self._manager.update_remote_session_objects_status("c/")
+    self.assertEqual(self._client.list_calls[-1],
+                     ("c/", "c/session-3/20211117T202235498Z-Keypresses.protobuf"))
+    self.assertEqual(
+        self._manager.get_remote_session_folder_status(
+            "c/session-4/", use_cached=True),
+        data_manager.STATE_PREPROCESSED)
+
+
+class ClaimsTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(ClaimsTest, self).setUp()
+    self._manager = _create_data_manager()
+    self._client = remote_state_test.FakeS3Client([
+        "c/session-1/claim.json",
+        "c/session-1/merged.tsv",
+        "c/session-2/merged.tsv",
+        "c/session-3/claim.json",
+        "c/session-4/claim.json",
+    ])
+    self._claims = {
+        "c/session-1/claim.json": {"username": "alice"},
+        "c/session-3/claim.json": {"username": "bob"},
+        "c/session-4/claim.json": {"username": None},
+    }
+    self._fetched_keys = []
+
+    def download_fileobj(bucket_name, object_key, f):
+      self._fetched_keys.append(object_key)
+      f.write(json.dumps(self._claims[object_key]).encode("utf-8"))
+
+    self._client.download_fileobj = download_fileobj
+    self._manager._s3_client = self._client
+
+  def testBulkClaims_fetchesOnlyChangedClaims(self):
+    self.assertEqual(self._manager.get_sessions_claim_usernames("c/"),
+                     {"session-1": "alice", "session-3": "bob"})
+    self.assertCountEqual(self._fetched_keys, [
+        "c/session-1/claim.json", "c/session-3/claim.json",
+        "c/session-4/claim.json"])
+    self._claims["c/session-4/claim.json"] = {"username": "carol"}
+    self._client.etags["c/session-4/claim.json"] = "\"etag2\""
+    self._manager._get_remote_state("c/").refresh(full=True)
+    self.assertEqual(self._manager.get_sessions_claim_usernames("c/"),
+                     {"session-1": "alice", "session-3": "bob",
+                      "session-4": "carol"})
+    self.assertLen(self._fetched_keys, 4)
+    self.assertEqual(self._fetched_keys[-1], "c/session-4/claim.json")
+
+  def testSingleSessionClaim(self):
+    self.assertEqual(
+        self._manager.get_remote_session_claim_username("c/session-3/"), "bob")
+    self.assertIsNone(
+        self._manager.get_remote_session_claim_username("c/session-2/"))
+    self.assertEqual(self._fetched_keys, ["c/session-3/claim.json"])
+
+  def testClaimSession_updatesCache(self):
+    self._client.upload_file = mock.MagicMock()
+    self._manager.get_sessions_claim_usernames("c/")
+    self._manager.claim_session("c/session-2/")
+    self.assertEqual(self._manager.get_sessions_claim_usernames("c/"),
+                     {"session-1": "alice", "session-2": "tester",
+                      "session-3": "bob"})
+    self.assertNotIn("c/session-2/claim.json", self._fetched_keys)
+
+
+class SessionInfoPrefetchTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(SessionInfoPrefetchTest, self).setUp()
+    self._manager = _create_data_manager(
+        session_info_cache_size=3, notify_fn=mock.MagicMock())
+    self._scanned_prefixes = []
+    self._scan_lock = threading.Lock()
+
+    def scan_session(session_prefix):
+      with self._scan_lock:
+        self._scanned_prefixes.append(session_prefix)
+      return {
+          "is_session_complete": True,
+          "time_zone": "(UTC-05:00) Eastern Time (US & Canada)",
+          "first_timestamp": 1637180555.0,
+          "last_timestamp": 1637181155.0,
+          "num_keypresses": 10,
+          "num_audio_files": 1,
+          "num_screenshots": 2,
+          "object_keys": ["manifest.json"],
+      }
+
+    self._manager._scan_session = scan_session
+    self._manager._get_remote_session_claim_username = mock.MagicMock(
+        return_value="alice")
+
+  def _wait_for_prefetches(self):
+    with self._manager._prefetch_lock:
+      futures = list(self._manager._prefetch_futures.values())
+    for future in futures:
+      future.result()
+
+  def testPrefetchedSessions_areNotScannedAgain(self):
+    self._manager.prefetch_session_info(["c/session-2/", "c/session-3"])
+    self._wait_for_prefetches()
+    self.assertCountEqual(self._scanned_prefixes,
+                          ["c/session-2/", "c/session-3/"])
+    (_, _, _, duration_s, num_keypresses,
+     _, _, _) = self._manager.get_session_details("c/session-3/")
+    self.assertEqual(duration_s, 600)
+    self.assertEqual(num_keypresses, 10)
+    self.assertEqual(
+        self._manager.get_remote_session_claim_username(
+            "c/session-2/", use_cached=True), "alice")
+    self.assertLen(self._scanned_prefixes, 2)
+    # Prefetching the same sessions again is a no-op.
+    self._manager.prefetch_session_info(["c/session-2/", "c/session-3/"])
+    self._wait_for_prefetches()
+    self.assertLen(self._scanned_prefixes, 2)
+
+  def testUseCachedFalse_scansAgain(self):
+    self._manager.get_session_details("c/session-1/")
+    self._manager.get_session_details("c/session-1/", use_cached=False)
+    self.assertEqual(self._scanned_prefixes,
+                     ["c/session-1/", "c/session-1/"])
+
+  def testCacheIsBounded(self):
+    self._manager.prefetch_session_info(
+        ["c/session-%d/" % i for i in range(1, 5)])
+    self._wait_for_prefetches()
+    self.assertLen(self._manager._session_info_cache, 3)
+
+  def testClaimSession_invalidatesSessionInfo(self):
+    self._manager._s3_client.upload_file = mock.MagicMock()
+    self._manager.get_session_details("c/session-1/")
+    with mock.patch.object(
+        self._manager, "_get_remote_state_of_session") as get_remote_state:
+      get_remote_state.return_value = (mock.MagicMock(), "c/session-1/")
+      self._manager.claim_session("c/session-1/", unclaim=True)
+    self._manager.get_session_details("c/session-1/")
+    self.assertEqual(self._scanned_prefixes,
+                     ["c/session-1/", "c/session-1/"])
+
+
+class LocalSessionFolderStatusTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(LocalSessionFolderStatusTest, self).setUp()
+    self._manager = _create_data_manager()
+    self._session_prefix = "c/session-1/"
+    self._session_dir = self._manager.get_local_session_dir(
+        self._session_prefix)
+
+  def _write_file(self, filename, content="foo"):
+    with open(os.path.join(self._session_dir, filename), "wt") as f:
+      f.write(content)
+
+  def testStatusProgression(self):
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(self._session_prefix),
+        data_manager.STATE_NOT_DOWNLOADED)
+    os.makedirs(self._session_dir)
+    self._write_file("20211117T202235498Z-SessionEnd.bin")
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(self._session_prefix),
+        data_manager.STATE_DOWNLOADED)
+    self._write_file("merged.tsv")
+    self._write_file("concatenated_audio.wav")
+    self._write_file("screenshots.mp4")
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(self._session_prefix),
+        data_manager.STATE_PREPROCESSED)
+    self._write_file("curated.tsv")
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(self._session_prefix),
+        data_manager.STATE_CURATED)
+
+  def testFlacAudioOnly_isPreprocessed(self):
+    os.makedirs(self._session_dir)
+    self._write_file("20211117T202235498Z-SessionEnd.bin")
+    self._write_file("merged.tsv")
+    self._write_file("concatenated_audio.flac")
+    self._write_file("screenshots.mp4")
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(self._session_prefix),
+        data_manager.STATE_PREPROCESSED)
+
+  def testCachedStatus_isReusedUntilDirectoryChanges(self):
+    os.makedirs(self._session_dir)
+    self._write_file("20211117T202235498Z-SessionEnd.bin")
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(
+            self._session_prefix, use_cached=True),
+        data_manager.STATE_DOWNLOADED)
+    with mock.patch.object(
+        self._manager, "_compute_local_session_folder_status") as compute:
+      self.assertEqual(
+          self._manager.get_local_session_folder_status(
+              self._session_prefix, use_cached=True),
+          data_manager.STATE_DOWNLOADED)
+      compute.assert_not_called()
+    # Adding a file changes the modification time of the directory.
+    mtime_ns = os.stat(self._session_dir).st_mtime_ns
+    self._write_file("curated.tsv")
+    os.utime(self._session_dir, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(
+            self._session_prefix, use_cached=True),
+        data_manager.STATE_CURATED)
+
+  def testInvalidate(self):
+    os.makedirs(self._session_dir)
+    self._write_file("curated.tsv", content="")
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(
+            self._session_prefix, use_cached=True),
+        data_manager.STATE_NOT_DOWNLOADED)
+    # Modified in place: the directory's modification time doesn't change.
+    self._write_file("curated.tsv")
+    self._manager.invalidate_local_session_folder_status(self._session_prefix)
+    self.assertEqual(
+        self._manager.get_local_session_folder_status(
+            self._session_prefix, use_cached=True),
+        data_manager.STATE_CURATED)
+
+
+class InteractionTest(tf.test.TestCase):
+
+  def testPreprocessSession_declinedRedoIsNotRun(self):
+    confirm_fn = mock.MagicMock(return_value=False)
+    manager = _create_data_manager(confirm_fn=confirm_fn)
+    with mock.patch.object(
+        manager, "get_local_session_folder_status",
+        return_value=data_manager.STATE_PREPROCESSED):
+      message, changed = manager.preprocess_session("c/session-1/")
+    self.assertEqual(confirm_fn.call_args[0][0], data_manager.CONFIRM_REDO)
+    self.assertFalse(changed)
+    self.assertEqual(message, "Preprocessing was not run.")
+
+  def testUploadPreprocResults_raisesWhenNotPreprocessed(self):
+    manager = _create_data_manager()
+    with mock.patch.object(
+        manager, "get_local_session_folder_status",
+        return_value=data_manager.STATE_DOWNLOADED), \
+        self.assertRaisesRegex(ValueError, "no preprocessing results"):
+      manager.upload_sesssion_preproc_results("c/session-1/")
+
+  def testManualTimezone_isAskedOnceByConcurrentCallers(self):
+    prompt_fn = mock.MagicMock(return_value="US/Pacific")
+    manager = _create_data_manager(prompt_fn=prompt_fn)
+    facts = {
+        "is_session_complete": True,
+        "time_zone": None,
+        "first_timestamp": 1637180555.0,
+        "last_timestamp": 1637180655.0,
+        "num_keypresses": 10,
+        "num_audio_files": 2,
+        "num_screenshots": 3,
+        "object_keys": [],
+    }
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+      time_zones = list(executor.map(
+          lambda _: manager._get_session_details_from_facts(facts)[1],
+          range(16)))
+    prompt_fn.assert_called_once()
+    self.assertEqual(set(time_zones), {"US/Pacific"})
+
+class DownloadPreprocessUploadSessionsTest(tf.test.TestCase):
+
+  def testRunsStagesDependingOnLocalStatus(self):
+    manager = _create_data_manager()
+    local_statuses = {
+        "c/session-1/": [data_manager.STATE_NOT_DOWNLOADED,
+                         data_manager.STATE_DOWNLOADED],
+        "c/session-2/": [data_manager.STATE_DOWNLOADED,
+                         data_manager.STATE_DOWNLOADED],
+        "c/session-3/": [data_manager.STATE_PREPROCESSED,
+                         data_manager.STATE_PREPROCESSED],
+    }
+    lock = threading.Lock()
+
+    def get_local_status(session_prefix):
+      with lock:
+        return local_statuses[session_prefix].pop(0)
+
+    with mock.patch.object(
+        manager, "get_local_session_folder_status",
+        side_effect=get_local_status), \
+        mock.patch.object(manager, "sync_to_local") as sync_to_local, \
+        mock.patch.object(manager, "preprocess_session") as preprocess, \
+        mock.patch.object(
+            manager, "upload_sesssion_preproc_results",
+            side_effect=lambda p, cancel_event, redo: ("Done", "session")
+        ) as upload:
+      report = manager.download_preprocess_upload_sessions(
+          ["c/session-1/", "c/session-2/", "c/session-3/"],
+          num_download_workers=2, num_preprocess_workers=2,
+          num_upload_workers=2)
+
+    sync_to_local.assert_called_once_with("c/session-1/", cancel_event=None)
+    self.assertCountEqual(
+        [call[0][0] for call in preprocess.call_args_list],
+        ["c/session-1/", "c/session-2/"])
+    self.assertCountEqual(
+        [call[0][0] for call in upload.call_args_list],
+        ["c/session-1/", "c/session-2/", "c/session-3/"])
+    self.assertEqual(report.num_completed, 3)
+    self.assertEqual(set(report.stage_busy_s.keys()),
+                     {"download", "preprocess", "upload"})
+
+  def testUnsuccessfulUpload_isReportedAsFailure(self):
+    manager = _create_data_manager()
+    with mock.patch.object(
+        manager, "get_local_session_folder_status",
+        return_value=data_manager.STATE_PREPROCESSED), \
+        mock.patch.object(
+            manager, "upload_sesssion_preproc_results",
+            return_value=("Not uploading preprocessing results", False)):
+      report = manager.download_preprocess_upload_sessions(["c/session-1/"])
+    self.assertEqual(report.num_completed, 0)
+    self.assertIn("c/session-1/", report.failures)
+
+  def testDoesNotAskForConfirmations(self):
+    confirm_fn = mock.MagicMock(return_value=True)
+    manager = _create_data_manager(confirm_fn=confirm_fn)
+    with mock.patch.object(
+        manager, "get_local_session_folder_status",
+        return_value=data_manager.STATE_PREPROCESSED), \
+        mock.patch.object(
+            manager, "get_remote_session_folder_status",
+            return_value=data_manager.STATE_PREPROCESSED), \
+        mock.patch.object(manager._transfer_engine, "upload_dir") as upload_dir:
+      report = manager.download_preprocess_upload_sessions(["c/session-1/"])
+    confirm_fn.assert_not_called()
+    upload_dir.assert_not_called()
+    self.assertIn("c/session-1/", report.failures)
+
+  def testBatchTask_asksForConfirmationWithConfirmFn(self):
+    confirm_fn = mock.MagicMock(return_value=False)
+    manager = _create_data_manager(confirm_fn=confirm_fn)
+    task = mock.MagicMock()
+    task.is_cancelled.return_value = False
+    with mock.patch.object(manager, "update_remote_session_objects_status"), \
+        mock.patch.object(
+            manager, "get_remote_session_folder_status",
+            return_value=data_manager.STATE_NOT_PREPROCESSED), \
+        mock.patch.object(
+            manager, "get_session_details",
+            return_value=(True, "US/Central", None, 100.0, 10, 2, 3, [])), \
+        mock.patch.object(
+            manager, "download_preprocess_upload_sessions") as run_sessions:
+      _, changed = data_manager._download_preprocess_upload_sessions_from(
+          task, manager, "c/", ["c/session-1/", "c/session-2/"])
+    self.assertEqual(confirm_fn.call_args[0][0], data_manager.CONFIRM_PROCEED)
+    self.assertIn("2 sessions", confirm_fn.call_args[0][1])
+    run_sessions.assert_not_called()
+    self.assertFalse(changed)
+
+  def testCancelled_skipsRemainingSessions(self):
+    manager = _create_data_manager()
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with mock.patch.object(
+        manager, "upload_sesssion_preproc_results") as upload:
+      report = manager.download_preprocess_upload_sessions(
+          ["c/session-1/", "c/session-2/"], cancel_event=cancel_event)
+    upload.assert_not_called()
+    self.assertEqual(report.num_completed, 0)
+    self.assertEqual(report.num_cancelled, 2)
+
+
 if __name__ == "__main__":
   tf.test.main()
@@ -11,8 +11,9 @@ import numpy as np
 import pytz
 
 import audio_asr
+import concatenated_audio
 import file_naming
-import keypresses_pb2
+import keypress_table
 import process_keypresses
 import tsv_data
 import video
@@ -24,7 +25,8 @@ def format_raw_data(input_dir,
                     gcs_bucket_name,
                     dummy_video_frame_image_path=None,
                     skip_screenshots=False,
-                    keypresses_only=False):
+                    keypresses_only=False,
+                    flac_audio=False):
   """Processes a raw Observer data session.
 
   Args:
@@ -41,6 +43,9 @@ def format_raw_data(input_dir,
       duration of the audio files. This must be provided if there are not
       screenshot image files in input_dir.
     skip_screenshots: Skip the processing of screenshots.
+    keypresses_only: Process only the keypresses.
+    flac_audio: Also write a lossless FLAC copy of the concatenated audio, to
+      be uploaded in lieu of the WAV file (see concatenated_audio.py).
   """
   if not os.path.isdir(input_dir):
     raise ValueError("%s is not an existing directory" % input_dir)
@@ -49,13 +54,14 @@ def format_raw_data(input_dir,
 
   if keypresses_only:
     # Keypresses-only: The start timestamp will be from the first keypress.
-    keypresses_data = process_keypresses.load_keypresses_from_directory(
+    keypresses_data = process_keypresses.load_keypress_table_from_directory(
         input_dir)
-    if not keypresses_data.keyPresses:
+    if not len(keypresses_data):
       raise ValueError(
           "No keypress data is available in directory %s" % input_dir)
-    first_timestamp = keypresses_data.keyPresses[0].Timestamp
-    start_time_epoch = first_timestamp.seconds + first_timestamp.nanos / 1e9
+    first_seconds, first_nanos = divmod(
+        int(keypresses_data.timestamps_ns[0]), _NANOS_PER_SECOND)
+    start_time_epoch = first_seconds + first_nanos / 1e9
     print("Determined start timestamp: %.3f" % start_time_epoch)
     keypresses_phrases_tsv_path = os.path.join(
         input_dir, "keypresses_phrases.tsv")
@@ -69,6 +75,8 @@ def format_raw_data(input_dir,
      concatenated_audio_path,
      start_time_epoch,
      audio_duration_s) = read_and_concatenate_audio_files(input_dir, timezone)
+    if flac_audio:
+      concatenated_audio.compress_to_flac(input_dir)
 
   keypresses_paths = glob.glob(os.path.join(input_dir, "*-Keypresses.protobuf"))
   if not keypresses_paths:
@@ -171,6 +179,8 @@ def get_epoch_time_from_file_path(file_path, timezone):
 
 
 DUMMY_KEYPRESS_DURATION_SEC = 0.1
+_NANOS_PER_SECOND = 1000000000
+_NANOS_PER_MILLISECOND = 1000000
 
 
 def format_keypresses(keypresses_paths,
@@ -193,27 +203,27 @@ def format_keypresses(keypresses_paths,
     ValueError, if there are no keypresses.
   """
   first_keypress_time_sec = None
+  first_keypress_epoch_ms = None
   with open(output_tsv_path, "w") as f:
     f.write(tsv_data.HEADER + "\n")
     for keypresses_path in keypresses_paths:
-      keypresses = keypresses_pb2.KeyPresses()
-      with open(keypresses_path, "rb") as file:
-        keypresses.ParseFromString(file.read())
-      num_keypresses = len(keypresses.keyPresses)
-      first_keypress_epoch_ms = (
-          keypresses.keyPresses[0].Timestamp.ToMilliseconds())
+      keypresses = keypress_table.KeypressTable.from_keypresses(
+          process_keypresses.load_keypresses_from_protobuf_file(
+              keypresses_path))
+      # Truncated to milliseconds, as by Timestamp.ToMilliseconds().
+      epoch_ms = (keypresses.timestamps_ns // _NANOS_PER_MILLISECOND).tolist()
+      first_keypress_epoch_ms = epoch_ms[0]
       print("First keypress epoch time in file %s: %.3f" %
             (keypresses_path, first_keypress_epoch_ms / 1e3))
-      for keypress in keypresses.keyPresses:
-        relative_time = (keypress.Timestamp.ToMilliseconds() / 1e3
-                         - start_epoch_time)
+      for keypress_epoch_ms, key in zip(epoch_ms, keypresses.get_keys()):
+        relative_time = keypress_epoch_ms / 1e3 - start_epoch_time
         if first_keypress_time_sec is None:
           first_keypress_time_sec = relative_time
         f.write("%.3f\t%.3f\t%s\t%s\n" % (
             relative_time, relative_time + DUMMY_KEYPRESS_DURATION_SEC,
-            tsv_data.KEYPRESS_TIER, keypress.KeyPress))
+            tsv_data.KEYPRESS_TIER, key))
   print("Saved data for %d keypresses to %s" % (
-      len(keypresses.keyPresses), output_tsv_path))
+      len(keypresses), output_tsv_path))
   if first_keypress_epoch_ms is None:
     raise ValueError("Found no keypress data at paths: %s" % keypresses_paths)
   return first_keypress_time_sec
@@ -236,6 +246,10 @@ def extract_audio_events(concatenated_audio_path, output_tsv_path):
       concatenated_audio_path
       if pure_path.suffix.lower() == ".wav"
       else pure_path.with_suffix(".wav"))
+  if (not os.path.isfile(wav_path) and
+      os.path.basename(wav_path) == file_naming.CONCATENATED_AUDIO_FILENAME):
+    # Only the FLAC copy may have been downloaded.
+    concatenated_audio.ensure_wav(os.path.dirname(wav_path))
   if not os.path.isfile(wav_path):
     raise ValueError("Cannot find concated .wav file")
   subprocess.check_call([
@@ -298,6 +312,10 @@ def parse_args():
       type=str,
       default=None,
       help="Path to the frame of image used to make dummy videos.")
+  parser.add_argument(
+      "--flac_audio",
+      action="store_true",
+      help="Also write a lossless FLAC copy of the concatenated audio.")
   return parser.parse_args()
 
 
@@ -310,7 +328,8 @@ def main():
       args.gcs_bucket_name,
       dummy_video_frame_image_path=args.dummy_video_frame_image_path,
       skip_screenshots=args.skip_screenshots,
-      keypresses_only=args.keypresses_only)
+      keypresses_only=args.keypresses_only,
+      flac_audio=args.flac_audio)
 
 
 if __name__ == "__main__":
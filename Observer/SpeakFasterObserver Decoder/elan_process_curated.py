@@ -21,7 +21,9 @@ import re
 import numpy as np
 import spellchecker
 
+import curator
 import file_naming
+import keypress_table
 import metadata_pb2
 import nlp
 import transcript_lib
@@ -30,7 +32,7 @@ import tsv_data
 
 SPEAKER_MAP_DELIMITER = "\t"
 SPEKAER_MAP_COLUMN_HEADS = ("RealName", "Pseudonym")
-REDACTED_KEY = "[RedactedKey]"
+REDACTED_KEY = keypress_table.REDACTED_KEY
 REDACTED_SPEKAER_ID = "redacted"
 EXPECTED_BACKGROUND_SPEECH_KEY = "[BackgroundSpeech]"
 UNINTELLIGIBLE_LABEL_STRING = "Unintelligible"
@@ -208,12 +210,14 @@ def check_keypresses(merged_tsv_path, curated_rows):
   column_order, has_header = infer_columns(merged_tsv_path)
   original_rows = load_rows(
       merged_tsv_path, column_order, has_header=has_header)
-  original_keypress_rows = [(row[0], row[3]) for row in original_rows if
-                            row[2] == tsv_data.KEYPRESS_TIER]
-  curated_keypress_rows = [(row[0], row[3]) for row in curated_rows if
-                           row[2] == tsv_data.KEYPRESS_TIER]
+  original_keypress_rows = keypress_table.KeypressTable.from_rows(
+      original_rows).to_tuples()
+  curated_keypress_rows = keypress_table.KeypressTable.from_rows(
+      curated_rows).to_tuples()
+  original_keypress_set = set(original_keypress_rows)
+  curated_keypress_set = set(curated_keypress_rows)
   missing_from_original = [row for row in curated_keypress_rows
-                           if (row not in original_keypress_rows)]
+                           if row not in original_keypress_set]
   if missing_from_original:
     raise ValueError(
         "The keypress row %s is presented in the curated data but missing "
@@ -221,7 +225,7 @@ def check_keypresses(merged_tsv_path, curated_rows):
         "keypress row or change any keypress rows inadvertently." %
         (missing_from_original[0],))
   missing_from_curated = [row for row in original_keypress_rows
-                          if (row not in curated_keypress_rows)]
+                          if row not in curated_keypress_set]
   if missing_from_curated:
     raise ValueError(
         "The keypress row %s is presented in the original data but missing "
@@ -422,21 +426,13 @@ def redact_keypresses(rows, time_ranges):
       be redacted. This list is modified in place.
     time_ranges: A list of (t0, t1) time ranges.
   """
-  time_range_use_count = []
-  for _ in time_ranges:
-    time_range_use_count.append(0)
-  for i, row in enumerate(rows):
-    tbegin, _, tier, content = row
-    if tier != tsv_data.KEYPRESS_TIER:
-      continue
-    index_use = -1
-    for j, time_range in enumerate(time_ranges):
-      if time_range[0] <= tbegin and time_range[1] > tbegin:
-        index_use = j
-        break
-    if index_use != -1:
-      rows[i][3] = REDACTED_KEY
-      time_range_use_count[index_use] += 1
+  keypress_row_indices = [i for i, row in enumerate(rows)
+                          if row[2] == tsv_data.KEYPRESS_TIER]
+  keypresses = keypress_table.KeypressTable.from_rows(rows)
+  redaction_mask, time_range_use_count = keypresses.get_time_range_mask(
+      time_ranges)
+  for keypress_index in np.flatnonzero(redaction_mask).tolist():
+    rows[keypress_row_indices[keypress_index]][3] = REDACTED_KEY
   indices_unused = np.where(np.array(time_range_use_count) == 0)[0].tolist()
   if indices_unused:
     unused_ranges = []
@@ -544,7 +540,7 @@ def postprocess_curated(input_dir, speaker_id_config_json_path):
   with open(out_json_path, "wt") as f:
     out_json["proprocessing_timestamp"] = (
         str(datetime.utcnow().strftime("%Y%m%dT%H%M%S.%fZ")))
-    out_json["curator_username"] = os.getlogin()
+    out_json["curator_username"] = curator.get_curator_username()
     out_json["speech_curation_stats"] = speech_curation_stats
     json.dump(out_json, f, indent=2)
     print("\nWrote additional info to JSON file: %s" % out_json_path)
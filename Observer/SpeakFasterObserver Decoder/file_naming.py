@@ -12,6 +12,8 @@ ASR_TSV_FILENAME = "asr.tsv"
 
 MERGED_TSV_FILENAME = "merged.tsv"
 CONCATENATED_AUDIO_FILENAME = "concatenated_audio.wav"
+# Lossless compressed copy of the concatenated audio. See concatenated_audio.py.
+CONCATENATED_AUDIO_FLAC_FILENAME = "concatenated_audio.flac"
 SCREENSHOTS_MP4_FILENAME = "screenshots.mp4"
 
 # Assumed name of the file from manual curation in ELAN.
@@ -24,6 +26,17 @@ CURATED_PROCESSED_SPEECH_ONLY_TSV_FILENAME = (
 
 SPEAKER_ID_CONFIG_JSON_FILENAME = "speaker_id_config.json"
 
+# Compact summary of the raw data files of a session.
+MANIFEST_JSON_FILENAME = "manifest.json"
+# Records which curator has claimed a session.
+CLAIM_JSON_FILENAME = "claim.json"
+# Subdirectory of a session that holds packed archives of its raw data files.
+# See session_archive.py.
+SESSION_ARCHIVE_DIRNAME = "archive"
+# Marks a local session directory that holds only the files of a selective
+# download profile (e.g., for post-hoc analysis). Contains the profile name.
+PARTIAL_SYNC_FILENAME = "partial_sync.txt"
+
 KEYPRESS_CHECKS_TSV_FILENAME = "keypress_checks.tsv"
 TRANSCIPRT_ANALYSIS_JSON_FILENAME = "transcript_analysis.json"
 
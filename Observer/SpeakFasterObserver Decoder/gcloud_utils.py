@@ -1,10 +1,59 @@
 """Google Cloud-related utilites."""
 import os
 import tempfile
+import threading
 import uuid
 
 from google.cloud import storage
 
+import cloud_call_stats
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+# Optional cloud_call_stats.CallStats that records the calls to GCS.
+_call_stats = None
+
+
+def _get_storage_client():
+  """Get the GCS client shared by the functions in this module.
+
+  The client is created lazily on first use. If call statistics are enabled
+  (see `set_call_stats()`), the returned client records the calls made
+  through it.
+  """
+  global _storage_client
+  with _storage_client_lock:
+    if _storage_client is None:
+      _storage_client = storage.Client()
+    if _call_stats is not None:
+      return cloud_call_stats.InstrumentedStorageClient(
+          _storage_client, _call_stats)
+    return _storage_client
+
+
+def set_storage_client(storage_client):
+  """Replace the GCS client shared by the functions in this module.
+
+  Args:
+    storage_client: An object with the same API as google.cloud.storage.Client
+      (e.g., a local_object_store.LocalGcsClient), or None to go back to a
+      lazily created google.cloud.storage.Client.
+  """
+  global _storage_client
+  with _storage_client_lock:
+    _storage_client = storage_client
+
+
+def set_call_stats(call_stats):
+  """Record the GCS calls made by the functions in this module.
+
+  Args:
+    call_stats: A cloud_call_stats.CallStats, or None to stop recording.
+  """
+  global _call_stats
+  with _storage_client_lock:
+    _call_stats = call_stats
+
 
 def create_temp_gcs_bucket(prefix):
   """Creates a temporary GCS bucket.
@@ -16,7 +65,7 @@ def create_temp_gcs_bucket(prefix):
   Returns:
     Name of the bucket created by this call.
   """
-  storage_client = storage.Client()
+  storage_client = _get_storage_client()
   bucket_name = prefix + "_" + str(uuid.uuid4())
   bucket = storage_client.bucket(bucket_name)
   bucket.storage_class = "COLDLINE"
@@ -27,7 +76,7 @@ def create_temp_gcs_bucket(prefix):
 
 def delete_gcs_bucket(bucket_name):
   """Delete a GCS bucket."""
-  storage_client = storage.Client()
+  storage_client = _get_storage_client()
   bucket = storage_client.get_bucket(bucket_name)
   bucket.delete()
   print("Deleted GCS bucket %s" % bucket_name)
@@ -41,7 +90,7 @@ def upload_text_to_object(text, bucket_name, destination_blob_name):
     bucket_name: Name of the bucket to upload to.
     destination_blob_name: Blob path under the bucket.
   """
-  storage_client = storage.Client()
+  storage_client = _get_storage_client()
   bucket = storage_client.bucket(bucket_name)
   blob = bucket.blob(destination_blob_name)
   temp_path = tempfile.mktemp()
@@ -54,9 +103,26 @@ def upload_text_to_object(text, bucket_name, destination_blob_name):
     os.remove(temp_path)
 
 
+def download_text_from_object(bucket_name, blob_name):
+  """Download the text content of a GCS object.
+
+  Args:
+    bucket_name: Name of the bucket.
+    blob_name: Blob path under the bucket.
+
+  Returns:
+    The text content, or None if the object doesn't exist.
+  """
+  storage_client = _get_storage_client()
+  blob = storage_client.bucket(bucket_name).blob(blob_name)
+  if not blob.exists():
+    return None
+  return blob.download_as_bytes().decode("utf-8")
+
+
 def remote_objects_exist(bucket_name, destination_blob_prefix, file_names):
   """Determine whether all remote file objects exist."""
-  storage_client = storage.Client()
+  storage_client = _get_storage_client()
   bucket = storage_client.bucket(bucket_name)
   for file_name in file_names:
     destination_blob_name = (
@@ -84,7 +150,7 @@ def upload_files_as_objects(local_dir,
     bucket_name: Name of the GCS bucket to upload the files to.
     destination_blob_prefix: Destination blobl prefix.
   """
-  storage_client = storage.Client()
+  storage_client = _get_storage_client()
   bucket = storage_client.bucket(bucket_name)
   for file_name in file_names:
     file_path = os.path.join(local_dir, file_name)
@@ -99,3 +165,39 @@ def upload_files_as_objects(local_dir,
           (file_path, bucket_name, destination_blob_name))
     blob = bucket.blob(destination_blob_name)
     blob.upload_from_filename(file_path)
+
+
+def get_prefixes_with_all_objects(bucket_name,
+                                  parent_blob_prefix,
+                                  file_names):
+  """Find the child prefixes under which all specified objects exist.
+
+  Unlike calling `remote_objects_exist()` for each child prefix, this lists
+  the objects under parent_blob_prefix only once.
+
+  Args:
+    bucket_name: Name of the GCS bucket.
+    parent_blob_prefix: The parent blob prefix, e.g., "postprocessed/foo/bar".
+    file_names: Names of the files that must all exist under a child prefix,
+      relative to the child prefix.
+
+  Returns:
+    A set of the names of the child prefixes (without the parent prefix or
+    any slashes) under which all objects named in file_names exist.
+  """
+  storage_client = _get_storage_client()
+  if not parent_blob_prefix.endswith("/"):
+    parent_blob_prefix += "/"
+  required_names = set(
+      "/".join([item for item in os.path.split(file_name) if item])
+      for file_name in file_names)
+  child_to_names = dict()
+  for blob in storage_client.list_blobs(
+      bucket_name, prefix=parent_blob_prefix):
+    relative_name = blob.name[len(parent_blob_prefix):]
+    if "/" not in relative_name:
+      continue
+    child, name = relative_name.split("/", 1)
+    child_to_names.setdefault(child, set()).add(name)
+  return set(child for child, names in child_to_names.items()
+             if required_names.issubset(names))
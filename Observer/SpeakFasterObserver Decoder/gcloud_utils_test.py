@@ -0,0 +1,78 @@
+"""Unit tests for the gcloud_utils module."""
+import tempfile
+from unittest import mock
+
+import tensorflow as tf
+
+import gcloud_utils
+import local_object_store
+
+
+class FakeBlob(object):
+
+  def __init__(self, name):
+    self.name = name
+
+
+class GetPrefixesWithAllObjectsTest(tf.test.TestCase):
+
+  def _mock_blobs(self, blob_names):
+    storage_client = mock.MagicMock()
+    storage_client.list_blobs.return_value = [
+        FakeBlob(name) for name in blob_names]
+    return mock.patch.object(
+        gcloud_utils, "_get_storage_client", return_value=storage_client)
+
+  def testReturnsOnlyPrefixesWithAllObjects(self):
+    with self._mock_blobs([
+        "postprocessed/c1/session-1/a.json",
+        "postprocessed/c1/session-1/b.tsv",
+        "postprocessed/c1/session-1/extra.tsv",
+        "postprocessed/c1/session-2/a.json",
+        "postprocessed/c1/session-3/b.tsv",
+        "postprocessed/c1/session-3/a.json",
+        "postprocessed/c1/stray.txt",
+    ]) as get_client:
+      prefixes = gcloud_utils.get_prefixes_with_all_objects(
+          "test-bucket", "postprocessed/c1", ["a.json", "b.tsv"])
+    self.assertEqual(prefixes, {"session-1", "session-3"})
+    get_client.return_value.list_blobs.assert_called_once_with(
+        "test-bucket", prefix="postprocessed/c1/")
+
+  def testNestedFileNames(self):
+    with self._mock_blobs([
+        "postprocessed/c1/session-1/sub/a.json",
+        "postprocessed/c1/session-2/a.json",
+    ]):
+      prefixes = gcloud_utils.get_prefixes_with_all_objects(
+          "test-bucket", "postprocessed/c1/", ["sub/a.json"])
+    self.assertEqual(prefixes, {"session-1"})
+
+  def testNoBlobs_returnsEmptySet(self):
+    with self._mock_blobs([]):
+      prefixes = gcloud_utils.get_prefixes_with_all_objects(
+          "test-bucket", "postprocessed/c1", ["a.json"])
+    self.assertEqual(prefixes, set())
+
+
+class DownloadTextFromObjectTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(DownloadTextFromObjectTest, self).setUp()
+    gcloud_utils.set_storage_client(
+        local_object_store.LocalGcsClient(tempfile.mkdtemp()))
+    self.addCleanup(gcloud_utils.set_storage_client, None)
+
+  def testDownloadsUploadedText(self):
+    gcloud_utils.upload_text_to_object("{\"a\": 1}", "test-bucket", "s/x.json")
+    self.assertEqual(
+        gcloud_utils.download_text_from_object("test-bucket", "s/x.json"),
+        "{\"a\": 1}")
+
+  def testNonexistentObject_returnsNone(self):
+    self.assertIsNone(
+        gcloud_utils.download_text_from_object("test-bucket", "s/y.json"))
+
+
+if __name__ == "__main__":
+  tf.test.main()
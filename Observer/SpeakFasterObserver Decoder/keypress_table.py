@@ -0,0 +1,242 @@
+"""Compact columnar representation of a sequence of keypresses.
+
+A multi-hour session has hundreds of thousands of keypresses. Held as
+KeyPress protos, or as lists of (timestamp, key) tuples, each keypress costs
+several Python objects. A KeypressTable holds the same data in a few columns:
+
+  timestamps_ns: int64 array of the timestamps, in nanoseconds.
+  key_codes: uint16 array of indices into `vocab`.
+  vocab: Tuple of the distinct key strings (e.g., "A", "Space", "LShiftKey").
+  redacted: Optional bool array. Whether each key is redacted.
+
+The timestamps are relative to the epoch for keypresses loaded from protos and
+relative to the start of the session for keypresses loaded from TSV files, as
+in those formats.
+
+Slicing a table (e.g., `table[10:20]`) returns a view that shares the arrays
+and the vocabulary with the original table, without copying.
+"""
+import csv
+
+import numpy as np
+
+import tsv_data
+
+# Content of redacted keypress rows in TSV files.
+REDACTED_KEY = "[RedactedKey]"
+
+_NANOS_PER_SECOND = 1000000000
+_MAX_VOCAB_SIZE = np.iinfo(np.uint16).max + 1
+
+
+def _seconds_to_nanos(seconds):
+  return int(round(float(seconds) * _NANOS_PER_SECOND))
+
+
+class KeypressTable(object):
+  """A sequence of keypresses, stored column-wise."""
+
+  def __init__(self, timestamps_ns, key_codes, vocab, redacted=None):
+    """Create a KeypressTable.
+
+    Args:
+      timestamps_ns: The timestamps of the keypresses, in nanoseconds, as a
+        sequence of ints.
+      key_codes: Indices into `vocab` of the keys, as a sequence of ints.
+      vocab: The distinct key strings, as a sequence.
+      redacted: Optional sequence of bools of whether each key is redacted.
+
+    Raises:
+      ValueError: if the columns have different lengths, or the vocabulary is
+        too large for uint16 key codes.
+    """
+    if len(vocab) > _MAX_VOCAB_SIZE:
+      raise ValueError(
+          "Vocabulary of %d keys exceeds the maximum of %d" %
+          (len(vocab), _MAX_VOCAB_SIZE))
+    self.timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+    self.key_codes = np.asarray(key_codes, dtype=np.uint16)
+    self.vocab = tuple(vocab)
+    self.redacted = (
+        None if redacted is None else np.asarray(redacted, dtype=bool))
+    if len(self.key_codes) != len(self.timestamps_ns):
+      raise ValueError(
+          "Lengths of timestamps (%d) and key codes (%d) differ" %
+          (len(self.timestamps_ns), len(self.key_codes)))
+    if self.redacted is not None and len(self.redacted) != len(self):
+      raise ValueError(
+          "Lengths of timestamps (%d) and redaction mask (%d) differ" %
+          (len(self.timestamps_ns), len(self.redacted)))
+
+  @classmethod
+  def from_keys(cls, timestamps_ns, keys, redacted=None):
+    """Create a KeypressTable from timestamps and key strings.
+
+    Args:
+      timestamps_ns: The timestamps of the keypresses, in nanoseconds, as a
+        sequence of ints.
+      keys: The key strings, as an iterable of the same length.
+      redacted: Optional sequence of bools of whether each key is redacted.
+    """
+    code_by_key = dict()
+    key_codes = [code_by_key.setdefault(key, len(code_by_key)) for key in keys]
+    return cls(timestamps_ns, key_codes, list(code_by_key), redacted=redacted)
+
+  @classmethod
+  def from_keypresses(cls, keypresses):
+    """Create a KeypressTable from a KeyPresses proto, in a single pass.
+
+    Args:
+      keypresses: A keypresses_pb2.KeyPresses proto.
+
+    Returns:
+      A KeypressTable with timestamps in nanoseconds since the epoch.
+    """
+    timestamps_ns = []
+    keys = []
+    for keypress in keypresses.keyPresses:
+      timestamps_ns.append(keypress.Timestamp.seconds * _NANOS_PER_SECOND +
+                           keypress.Timestamp.nanos)
+      keys.append(keypress.KeyPress)
+    return cls.from_keys(timestamps_ns, keys)
+
+  @classmethod
+  def from_rows(cls, rows):
+    """Create a KeypressTable from the keypress rows among TSV rows.
+
+    Args:
+      rows: An iterable of (tBegin, tEnd, tier, content) rows, with tBegin in
+        seconds as a float or str. Rows of tiers other than the Keypress tier
+        are skipped.
+
+    Returns:
+      A KeypressTable with the tBegin timestamps. Keys with the REDACTED_KEY
+      content are marked in the redaction mask.
+    """
+    timestamps_ns = []
+    keys = []
+    for row in rows:
+      if row[2] != tsv_data.KEYPRESS_TIER:
+        continue
+      timestamps_ns.append(_seconds_to_nanos(row[0]))
+      keys.append(row[3])
+    redacted = [key == REDACTED_KEY for key in keys]
+    return cls.from_keys(timestamps_ns, keys, redacted=redacted)
+
+  @classmethod
+  def from_tsv_file(cls, tsv_path):
+    """Load the keypresses in a TSV file (e.g., merged.tsv).
+
+    Args:
+      tsv_path: Path to the TSV file, with the tBegin, tEnd, Tier and Content
+        columns.
+
+    Returns:
+      A KeypressTable, as from `from_rows()`.
+    """
+    with open(tsv_path, "rt") as f:
+      return cls.from_rows(csv.reader(f, delimiter=tsv_data.DELIMITER))
+
+  @classmethod
+  def concatenate(cls, tables):
+    """Concatenate tables, merging their vocabularies.
+
+    Args:
+      tables: A sequence of KeypressTables.
+
+    Returns:
+      A new KeypressTable. It has a redaction mask if any of the tables does.
+    """
+    code_by_key = dict()
+    key_codes = []
+    for table in tables:
+      code_map = np.array(
+          [code_by_key.setdefault(key, len(code_by_key))
+           for key in table.vocab] or [0], dtype=np.uint16)
+      key_codes.append(code_map[table.key_codes])
+    redacted = None
+    if any(table.redacted is not None for table in tables):
+      redacted = np.concatenate(
+          [np.zeros(len(table), dtype=bool) if table.redacted is None
+           else table.redacted for table in tables] or [[]])
+    return cls(
+        np.concatenate([table.timestamps_ns for table in tables] or [[]]),
+        np.concatenate(key_codes or [[]]),
+        list(code_by_key),
+        redacted=redacted)
+
+  def __len__(self):
+    return len(self.timestamps_ns)
+
+  def __getitem__(self, index):
+    """Get a view of a range of the keypresses.
+
+    Args:
+      index: A slice with a step of 1 (or None).
+
+    Returns:
+      A KeypressTable sharing the arrays and vocabulary of this table.
+    """
+    if not isinstance(index, slice) or index.step not in (None, 1):
+      raise ValueError("KeypressTable supports only contiguous slices")
+    return KeypressTable(
+        self.timestamps_ns[index], self.key_codes[index], self.vocab,
+        redacted=None if self.redacted is None else self.redacted[index])
+
+  def key_at(self, index):
+    """Get the key string of a keypress."""
+    return self.vocab[self.key_codes[index]]
+
+  def get_keys(self, start=0, stop=None):
+    """Get the key strings of a range of keypresses, as a list of str."""
+    vocab = self.vocab
+    return [vocab[code] for code in self.key_codes[start:stop].tolist()]
+
+  def timestamps_s(self):
+    """Get the timestamps in seconds, as a float64 array."""
+    return self.timestamps_ns / _NANOS_PER_SECOND
+
+  def sorted_by_time(self):
+    """Get a copy sorted by timestamp, keeping the order of equal timestamps."""
+    order = np.argsort(self.timestamps_ns, kind="stable")
+    return KeypressTable(
+        self.timestamps_ns[order], self.key_codes[order], self.vocab,
+        redacted=None if self.redacted is None else self.redacted[order])
+
+  def get_time_range_mask(self, time_ranges):
+    """Find the keypresses that fall in time ranges.
+
+    Args:
+      time_ranges: A sequence of (t0, t1) time ranges, in seconds. A keypress
+        at time t falls in a range if t0 <= t < t1. A keypress in multiple
+        ranges is assigned to the first one.
+
+    Returns:
+      1. A bool array of whether each keypress falls in any of the ranges.
+      2. A list of the number of keypresses assigned to each range.
+    """
+    mask = np.zeros(len(self), dtype=bool)
+    counts = []
+    for t0, t1 in time_ranges:
+      in_range = ((self.timestamps_ns >= _seconds_to_nanos(t0)) &
+                  (self.timestamps_ns < _seconds_to_nanos(t1)) & ~mask)
+      counts.append(int(np.count_nonzero(in_range)))
+      mask |= in_range
+    return mask, counts
+
+  def to_tuples(self):
+    """Get the keypresses as a list of (timestamp_s, key) tuples.
+
+    The timestamps are the correctly rounded quotients of the integer
+    nanoseconds, so that they compare equal to the floats parsed from TSV
+    files.
+    """
+    return [(timestamp_ns / _NANOS_PER_SECOND, key) for timestamp_ns, key
+            in zip(self.timestamps_ns.tolist(), self.get_keys())]
+
+
+def as_keypress_table(keypresses):
+  """Convert a KeyPresses proto to a KeypressTable, unless it is one already."""
+  if isinstance(keypresses, KeypressTable):
+    return keypresses
+  return KeypressTable.from_keypresses(keypresses)
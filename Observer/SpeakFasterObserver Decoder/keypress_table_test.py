@@ -0,0 +1,96 @@
+"""Unit tests for the keypress_table module."""
+import os
+import tempfile
+
+from google import protobuf
+import numpy as np
+import tensorflow as tf
+
+import keypress_table
+import keypresses_pb2
+import tsv_data
+
+
+def _create_keypresses(keys, timestamps_millis):
+  keypresses = keypresses_pb2.KeyPresses()
+  for key, timestamp_millis in zip(keys, timestamps_millis):
+    timestamp = protobuf.timestamp_pb2.Timestamp()
+    timestamp.FromMilliseconds(timestamp_millis)
+    keypresses.keyPresses.append(
+        keypresses_pb2.KeyPress(KeyPress=key, Timestamp=timestamp))
+  return keypresses
+
+
+class KeypressTableTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(KeypressTableTest, self).setUp()
+    self._temp_dir = tempfile.mkdtemp()
+
+  def testFromKeypresses_internsKeys(self):
+    keypresses = _create_keypresses(
+        ["H", "I", "Space", "H", "I"],
+        [1637180555000, 1637180555400, 1637180555800, 1637180556200,
+         1637180556250])
+    table = keypress_table.KeypressTable.from_keypresses(keypresses)
+    self.assertLen(table, 5)
+    self.assertEqual(table.vocab, ("H", "I", "Space"))
+    self.assertEqual(table.key_codes.dtype, np.uint16)
+    self.assertAllEqual(table.key_codes, [0, 1, 2, 0, 1])
+    self.assertEqual(table.timestamps_ns[1], 1637180555400 * 1000000)
+    self.assertEqual(table.get_keys(), ["H", "I", "Space", "H", "I"])
+    self.assertEqual(table.key_at(2), "Space")
+    self.assertIsNone(table.redacted)
+
+  def testSlice_isViewSharingVocab(self):
+    table = keypress_table.KeypressTable.from_keys(
+        [0, 10, 20, 30], ["a", "b", "a", "c"])
+    view = table[1:3]
+    self.assertLen(view, 2)
+    self.assertIs(view.vocab, table.vocab)
+    self.assertTrue(np.shares_memory(view.timestamps_ns, table.timestamps_ns))
+    self.assertEqual(view.get_keys(), ["b", "a"])
+    with self.assertRaisesRegex(ValueError, "only contiguous slices"):
+      table[::2]
+
+  def testFromTsvFile_keepsKeypressRowsAndMarksRedactions(self):
+    tsv_path = os.path.join(self._temp_dir, "merged.tsv")
+    with open(tsv_path, "w") as f:
+      f.write(tsv_data.HEADER + "\n")
+      f.write("0.100\t0.200\tKeypress\tb\n")
+      f.write("0.500\t2.000\tSpeechTranscript\tHello [Speaker:Tom]\n")
+      f.write("1.100\t1.200\tKeypress\t[RedactedKey]\n")
+      f.write("1.100\t1.200\tKeypress\tr\n")
+    table = keypress_table.KeypressTable.from_tsv_file(tsv_path)
+    self.assertEqual(
+        table.to_tuples(),
+        [(0.1, "b"), (1.1, keypress_table.REDACTED_KEY), (1.1, "r")])
+    self.assertAllEqual(table.redacted, [False, True, False])
+
+  def testConcatenateAndSortByTime_isStable(self):
+    table1 = keypress_table.KeypressTable.from_keys([30, 10], ["x", "y"])
+    table2 = keypress_table.KeypressTable.from_keys([10, 20], ["z", "x"])
+    table = keypress_table.KeypressTable.concatenate(
+        [table1, table2]).sorted_by_time()
+    self.assertEqual(table.vocab, ("x", "y", "z"))
+    self.assertAllEqual(table.timestamps_ns, [10, 10, 20, 30])
+    self.assertEqual(table.get_keys(), ["y", "z", "x", "x"])
+
+  def testGetTimeRangeMask_assignsToFirstMatchingRange(self):
+    table = keypress_table.KeypressTable.from_rows([
+        (0.1, 0.2, tsv_data.KEYPRESS_TIER, "a"),
+        (1.0, 1.1, tsv_data.KEYPRESS_TIER, "b"),
+        (1.5, 1.6, tsv_data.KEYPRESS_TIER, "c"),
+        (2.0, 2.1, tsv_data.KEYPRESS_TIER, "d")])
+    mask, counts = table.get_time_range_mask(
+        [(1.0, 2.0), (1.5, 1.8), (5.0, 6.0)])
+    self.assertAllEqual(mask, [False, True, True, False])
+    self.assertEqual(counts, [2, 0, 0])
+
+  def testTooManyDistinctKeys_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "exceeds the maximum"):
+      keypress_table.KeypressTable([], [], ["k%d" % i for i in range(65537)])
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,358 @@
+"""In-process object stores backed by the local file system.
+
+Provide the subsets of the boto3 S3 client API and the google-cloud-storage
+client API that the data manager uses, so that `DataManager` (see the
+`s3_client` argument of its constructor) and `gcloud_utils` (see
+`gcloud_utils.set_storage_client()`) can run against synthetic data, e.g., in
+tests and benchmarks, without touching the production buckets.
+
+Objects are stored as files under <root_dir>/<bucket_name>/<key>. Every API
+request is counted in `call_counts`, by the name of the corresponding S3 or GCS
+operation.
+"""
+import bisect
+import collections
+import datetime
+import hashlib
+import io
+import os
+import shutil
+import threading
+
+# Maximum number of keys returned in a page of a listing, same as S3.
+DEFAULT_PAGE_SIZE = 1000
+
+
+class _Bucket(object):
+  """Sorted index of the objects of a bucket directory. Thread-safe."""
+
+  def __init__(self, bucket_dir):
+    self._bucket_dir = bucket_dir
+    self._lock = threading.Lock()
+    self._keys = None
+    # Maps key to object dict (Key, Size, ETag, LastModified).
+    self._objects = dict()
+
+  def _object_path(self, key):
+    return os.path.join(self._bucket_dir, *key.split("/"))
+
+  def _make_object(self, key):
+    file_path = self._object_path(key)
+    with open(file_path, "rb") as f:
+      etag = hashlib.md5(f.read()).hexdigest()
+    stat = os.stat(file_path)
+    return {
+        "Key": key,
+        "Size": stat.st_size,
+        "ETag": "\"%s\"" % etag,
+        "LastModified": datetime.datetime.fromtimestamp(
+            stat.st_mtime, tz=datetime.timezone.utc),
+    }
+
+  def _load(self):
+    """Build the index. Must be called with the lock held."""
+    if self._keys is not None:
+      return
+    keys = []
+    for dir_path, _, file_names in os.walk(self._bucket_dir):
+      for file_name in file_names:
+        relative_path = os.path.relpath(
+            os.path.join(dir_path, file_name), self._bucket_dir)
+        key = "/".join(relative_path.split(os.sep))
+        keys.append(key)
+        self._objects[key] = self._make_object(key)
+    self._keys = sorted(keys)
+
+  def list(self, prefix, start_after=None):
+    """Get the objects whose keys start with prefix, in lexicographic order."""
+    with self._lock:
+      self._load()
+      start = bisect.bisect_left(self._keys, prefix)
+      if start_after is not None:
+        start = max(start, bisect.bisect_right(self._keys, start_after))
+      objects = []
+      for key in self._keys[start:]:
+        if not key.startswith(prefix):
+          break
+        objects.append(self._objects[key])
+      return objects
+
+  def get(self, key):
+    with self._lock:
+      self._load()
+      return self._objects.get(key)
+
+  def path(self, key):
+    if self.get(key) is None:
+      raise KeyError("No such object: %s" % key)
+    return self._object_path(key)
+
+  def put(self, key, data):
+    file_path = self._object_path(key)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+      f.write(data)
+    with self._lock:
+      self._load()
+      if key not in self._objects:
+        bisect.insort(self._keys, key)
+      self._objects[key] = self._make_object(key)
+
+  def delete(self, key):
+    file_path = self._object_path(key)
+    if os.path.isfile(file_path):
+      os.remove(file_path)
+    with self._lock:
+      self._load()
+      if key in self._objects:
+        del self._objects[key]
+        self._keys.remove(key)
+
+
+class _ObjectStore(object):
+  """Base class of the local object stores."""
+
+  def __init__(self, root_dir):
+    self._root_dir = root_dir
+    self._buckets = dict()
+    self._buckets_lock = threading.Lock()
+    self._call_counts_lock = threading.Lock()
+    self.call_counts = collections.Counter()
+
+  def _count_call(self, operation_name):
+    with self._call_counts_lock:
+      self.call_counts[operation_name] += 1
+
+  def _get_bucket(self, bucket_name):
+    with self._buckets_lock:
+      if bucket_name not in self._buckets:
+        self._buckets[bucket_name] = _Bucket(
+            os.path.join(self._root_dir, bucket_name))
+      return self._buckets[bucket_name]
+
+  def put_object_data(self, bucket_name, key, data):
+    """Write an object directly, without counting it as an API call."""
+    self._get_bucket(bucket_name).put(key, data)
+
+
+class LocalS3Client(_ObjectStore):
+  """Local stand-in for the boto3 S3 client."""
+
+  def __init__(self, root_dir, page_size=DEFAULT_PAGE_SIZE):
+    super(LocalS3Client, self).__init__(root_dir)
+    self._page_size = page_size
+
+  def _list_page(self, bucket_name, prefix, delimiter, start_after,
+                 continuation_key):
+    """Get a page of a listing and the key to continue after, if any."""
+    if continuation_key is not None:
+      start_after = continuation_key
+    objects = self._get_bucket(bucket_name).list(prefix, start_after)
+    contents = []
+    common_prefixes = []
+    last_key = None
+    for obj in objects:
+      if len(contents) + len(common_prefixes) >= self._page_size:
+        return contents, common_prefixes, last_key
+      key = obj["Key"]
+      if last_key is not None and key <= last_key:
+        # Within the last common prefix.
+        continue
+      if delimiter:
+        index = key.find(delimiter, len(prefix))
+        if index >= 0:
+          common_prefix = key[:index + len(delimiter)]
+          common_prefixes.append({"Prefix": common_prefix})
+          # Skip the remaining keys under the common prefix.
+          last_key = common_prefix + "\U0010ffff"
+          continue
+      contents.append(dict(obj))
+      last_key = key
+    return contents, common_prefixes, None
+
+  def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, StartAfter=None,
+                      ContinuationToken=None, **kwargs):
+    del kwargs  # Unused.
+    self._count_call("ListObjectsV2")
+    contents, common_prefixes, next_key = self._list_page(
+        Bucket, Prefix, Delimiter, StartAfter, ContinuationToken)
+    response = {"KeyCount": len(contents) + len(common_prefixes),
+                "IsTruncated": next_key is not None}
+    if contents:
+      response["Contents"] = contents
+    if common_prefixes:
+      response["CommonPrefixes"] = common_prefixes
+    if next_key is not None:
+      response["NextContinuationToken"] = next_key
+    return response
+
+  def list_objects(self, Bucket, Prefix="", Delimiter=None, Marker=None,
+                   **kwargs):
+    del kwargs  # Unused.
+    self._count_call("ListObjects")
+    contents, common_prefixes, next_key = self._list_page(
+        Bucket, Prefix, Delimiter, Marker, None)
+    response = {"IsTruncated": next_key is not None}
+    if contents:
+      response["Contents"] = contents
+    if common_prefixes:
+      response["CommonPrefixes"] = common_prefixes
+    if next_key is not None:
+      response["NextMarker"] = next_key
+    return response
+
+  def get_paginator(self, operation_name):
+    if operation_name == "list_objects_v2":
+      return _Paginator(self.list_objects_v2, "ContinuationToken",
+                        "NextContinuationToken")
+    elif operation_name == "list_objects":
+      return _Paginator(self.list_objects, "Marker", "NextMarker")
+    raise ValueError("Unsupported operation: %s" % operation_name)
+
+  def download_file(self, Bucket, Key, Filename, Callback=None, **kwargs):
+    del kwargs  # Unused.
+    self._count_call("GetObject")
+    shutil.copyfile(self._get_bucket(Bucket).path(Key), Filename)
+    if Callback:
+      Callback(os.path.getsize(Filename))
+
+  def download_fileobj(self, Bucket, Key, Fileobj, Callback=None, **kwargs):
+    del kwargs  # Unused.
+    self._count_call("GetObject")
+    with open(self._get_bucket(Bucket).path(Key), "rb") as f:
+      data = f.read()
+    Fileobj.write(data)
+    if Callback:
+      Callback(len(data))
+
+  def get_object(self, Bucket, Key, Range=None, **kwargs):
+    """Get an object. Supports single byte ranges, e.g., "bytes=0-99"."""
+    del kwargs  # Unused.
+    self._count_call("GetObject")
+    with open(self._get_bucket(Bucket).path(Key), "rb") as f:
+      if Range:
+        if not Range.startswith("bytes="):
+          raise ValueError("Unsupported range: %s" % Range)
+        first, last = Range[len("bytes="):].split("-")
+        f.seek(int(first))
+        data = f.read(int(last) - int(first) + 1) if last else f.read()
+      else:
+        data = f.read()
+    return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+  def upload_file(self, Filename, Bucket, Key, Callback=None, **kwargs):
+    del kwargs  # Unused.
+    self._count_call("PutObject")
+    with open(Filename, "rb") as f:
+      data = f.read()
+    self._get_bucket(Bucket).put(Key, data)
+    if Callback:
+      Callback(len(data))
+
+  def put_object(self, Bucket, Key, Body, **kwargs):
+    del kwargs  # Unused.
+    self._count_call("PutObject")
+    if isinstance(Body, str):
+      Body = Body.encode("utf-8")
+    elif not isinstance(Body, bytes):
+      Body = Body.read()
+    self._get_bucket(Bucket).put(Key, Body)
+
+  def delete_object(self, Bucket, Key, **kwargs):
+    del kwargs  # Unused.
+    self._count_call("DeleteObject")
+    self._get_bucket(Bucket).delete(Key)
+
+
+class _Paginator(object):
+  """Local stand-in for a boto3 paginator."""
+
+  def __init__(self, list_fn, token_arg_name, next_token_name):
+    self._list_fn = list_fn
+    self._token_arg_name = token_arg_name
+    self._next_token_name = next_token_name
+
+  def paginate(self, **kwargs):
+    return _PageIterator(self, kwargs)
+
+  def _iter_pages(self, kwargs):
+    kwargs = dict(kwargs)
+    while True:
+      page = self._list_fn(**kwargs)
+      yield page
+      if not page.get("IsTruncated"):
+        break
+      kwargs[self._token_arg_name] = page[self._next_token_name]
+
+
+class _PageIterator(object):
+
+  def __init__(self, paginator, kwargs):
+    self._paginator = paginator
+    self._kwargs = kwargs
+
+  def __iter__(self):
+    return self._paginator._iter_pages(self._kwargs)
+
+
+class LocalBlob(object):
+  """Local stand-in for google.cloud.storage.Blob."""
+
+  def __init__(self, client, bucket_name, name, size=None):
+    self._client = client
+    self._bucket_name = bucket_name
+    self.name = name
+    self.size = size
+
+  def exists(self):
+    self._client._count_call("objects.get")
+    return self._client._get_bucket(self._bucket_name).get(
+        self.name) is not None
+
+  def upload_from_filename(self, filename):
+    self._client._count_call("objects.insert")
+    with open(filename, "rb") as f:
+      self._client._get_bucket(self._bucket_name).put(self.name, f.read())
+
+  def upload_from_string(self, data):
+    self._client._count_call("objects.insert")
+    if isinstance(data, str):
+      data = data.encode("utf-8")
+    self._client._get_bucket(self._bucket_name).put(self.name, data)
+
+  def download_as_bytes(self):
+    self._client._count_call("objects.get")
+    with open(self._client._get_bucket(self._bucket_name).path(self.name),
+              "rb") as f:
+      return f.read()
+
+
+class LocalGcsBucket(object):
+  """Local stand-in for google.cloud.storage.Bucket."""
+
+  def __init__(self, client, name):
+    self._client = client
+    self.name = name
+
+  def blob(self, blob_name):
+    return LocalBlob(self._client, self.name, blob_name)
+
+
+class LocalGcsClient(_ObjectStore):
+  """Local stand-in for google.cloud.storage.Client."""
+
+  def __init__(self, root_dir, page_size=DEFAULT_PAGE_SIZE):
+    super(LocalGcsClient, self).__init__(root_dir)
+    self._page_size = page_size
+
+  def bucket(self, bucket_name):
+    return LocalGcsBucket(self, bucket_name)
+
+  def list_blobs(self, bucket_or_name, prefix=None):
+    bucket_name = getattr(bucket_or_name, "name", bucket_or_name)
+    objects = self._get_bucket(bucket_name).list(prefix or "")
+    # One request per page of results.
+    for _ in range(max(1, -(-len(objects) // self._page_size))):
+      self._count_call("objects.list")
+    return [LocalBlob(self, bucket_name, obj["Key"], size=obj["Size"])
+            for obj in objects]
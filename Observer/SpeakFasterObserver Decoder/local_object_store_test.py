@@ -0,0 +1,114 @@
+"""Unit tests for the local_object_store module."""
+import io
+import os
+import tempfile
+
+import tensorflow as tf
+
+import local_object_store
+
+_BUCKET = "test-bucket"
+
+
+class LocalS3ClientTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(LocalS3ClientTest, self).setUp()
+    self._root_dir = tempfile.mkdtemp()
+    self._client = local_object_store.LocalS3Client(
+        self._root_dir, page_size=2)
+    for key in ("a/s1/k1", "a/s1/k2", "a/s2/k1", "a/x", "b/s1/k1"):
+      self._client.put_object_data(_BUCKET, key, key.encode("utf-8"))
+
+  def _list_keys(self, **kwargs):
+    keys = []
+    prefixes = []
+    paginator = self._client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=_BUCKET, **kwargs):
+      keys.extend(obj["Key"] for obj in page.get("Contents", []))
+      prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+    return keys, prefixes
+
+  def testPaginatedListing(self):
+    keys, prefixes = self._list_keys(Prefix="a/")
+    self.assertEqual(keys, ["a/s1/k1", "a/s1/k2", "a/s2/k1", "a/x"])
+    self.assertEqual(prefixes, [])
+    self.assertEqual(self._client.call_counts["ListObjectsV2"], 2)
+
+  def testListingWithDelimiter(self):
+    keys, prefixes = self._list_keys(Prefix="a/", Delimiter="/")
+    self.assertEqual(keys, ["a/x"])
+    self.assertEqual(prefixes, ["a/s1/", "a/s2/"])
+    keys, prefixes = self._list_keys(Prefix="", Delimiter="/")
+    self.assertEqual(keys, [])
+    self.assertEqual(prefixes, ["a/", "b/"])
+
+  def testListingWithStartAfter(self):
+    keys, _ = self._list_keys(Prefix="a/", StartAfter="a/s1/k2")
+    self.assertEqual(keys, ["a/s2/k1", "a/x"])
+
+  def testListObjectsWithMarker(self):
+    paginator = self._client.get_paginator("list_objects")
+    keys = []
+    for page in paginator.paginate(Bucket=_BUCKET, Prefix="a/s1/"):
+      keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    self.assertEqual(keys, ["a/s1/k1", "a/s1/k2"])
+    self.assertEqual(self._client.call_counts["ListObjects"], 1)
+
+  def testETagChangesWithContent(self):
+    etag = self._client.list_objects_v2(
+        Bucket=_BUCKET, Prefix="a/x")["Contents"][0]["ETag"]
+    self._client.put_object(Bucket=_BUCKET, Key="a/x", Body=b"new content")
+    new_etag = self._client.list_objects_v2(
+        Bucket=_BUCKET, Prefix="a/x")["Contents"][0]["ETag"]
+    self.assertNotEqual(new_etag, etag)
+
+  def testGetObjectWithRange(self):
+    response = self._client.get_object(
+        Bucket=_BUCKET, Key="a/s1/k2", Range="bytes=2-4")
+    self.assertEqual(response["Body"].read(), b"s1/")
+    self.assertEqual(self._client.call_counts["GetObject"], 1)
+
+  def testDownloadAndUpload(self):
+    local_path = os.path.join(self._root_dir, "downloaded")
+    self._client.download_file(_BUCKET, "b/s1/k1", local_path)
+    with open(local_path, "rb") as f:
+      self.assertEqual(f.read(), b"b/s1/k1")
+    self._client.upload_file(local_path, _BUCKET, "b/s2/k1")
+    data = io.BytesIO()
+    self._client.download_fileobj(_BUCKET, "b/s2/k1", data)
+    self.assertEqual(data.getvalue(), b"b/s1/k1")
+    self.assertEqual(self._client.call_counts["PutObject"], 1)
+
+  def testDeleteObject(self):
+    self._client.delete_object(Bucket=_BUCKET, Key="a/x")
+    keys, _ = self._list_keys(Prefix="a/")
+    self.assertNotIn("a/x", keys)
+
+  def testIndexIsLoadedFromExistingFiles(self):
+    client = local_object_store.LocalS3Client(self._root_dir)
+    response = client.list_objects_v2(Bucket=_BUCKET, Prefix="b/")
+    self.assertEqual([obj["Key"] for obj in response["Contents"]], ["b/s1/k1"])
+
+
+class LocalGcsClientTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(LocalGcsClientTest, self).setUp()
+    self._client = local_object_store.LocalGcsClient(tempfile.mkdtemp())
+
+  def testUploadListAndExists(self):
+    bucket = self._client.bucket(_BUCKET)
+    bucket.blob("p/s1/f.json").upload_from_string("{}")
+    bucket.blob("p/s2/f.json").upload_from_string(b"[]")
+    self.assertTrue(bucket.blob("p/s1/f.json").exists())
+    self.assertFalse(bucket.blob("p/s3/f.json").exists())
+    blobs = self._client.list_blobs(_BUCKET, prefix="p/s2/")
+    self.assertEqual([blob.name for blob in blobs], ["p/s2/f.json"])
+    self.assertEqual(blobs[0].download_as_bytes(), b"[]")
+    self.assertEqual(self._client.call_counts["objects.insert"], 2)
+    self.assertEqual(self._client.call_counts["objects.list"], 1)
+
+
+if __name__ == "__main__":
+  tf.test.main()
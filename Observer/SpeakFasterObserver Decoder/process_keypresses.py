@@ -4,7 +4,7 @@ Can generate various statistics (WPM, KSR, Error Rate) as well
 as output files capable of being used in other tools.
 """
 import argparse
-import csv
+import concurrent.futures
 import datetime
 import glob
 import jsonpickle
@@ -13,7 +13,9 @@ import re
 import string
 import sys
 
-import elan_process_curated
+import numpy as np
+
+import keypress_table
 import keypresses_pb2
 import transcript_lib
 import tsv_data
@@ -28,6 +30,19 @@ MIN_GAZE_TIME = datetime.timedelta(milliseconds=300)
 # Assume that after 90 seconds of inactivity we are doing a new utterance
 LONG_DELTA_TIME = datetime.timedelta(seconds=90)
 
+_NANOS_PER_SECOND = 1000000000
+_NANOS_PER_MICROSECOND = 1000
+MIN_GAZE_TIME_NS = (
+    MIN_GAZE_TIME // datetime.timedelta(microseconds=1) * _NANOS_PER_MICROSECOND
+)
+LONG_DELTA_TIME_NS = (
+    LONG_DELTA_TIME // datetime.timedelta(microseconds=1) * _NANOS_PER_MICROSECOND
+)
+
+# Matches a whitespace or punctuation character, which ends a word for the
+# purpose of backward word deletion.
+_WORD_DELIMITER_REGEX = re.compile(r"[\s%s]" % re.escape(string.punctuation))
+
 CONTROL_KEYS = {
     "Left": "↶",  # Back one word
     "Right": "↷",  # Forward one word
@@ -121,6 +136,114 @@ SHIFTED_SPECIAL_KEYS = {
 }
 
 
+def _classify_keypress_deltas(deltas_ns, is_first):
+    """Classifies keypresses by the time since their prior keypress.
+
+    The comparisons work elementwise on NumPy arrays as well as on single
+    values, so that `KeypressTimings` and `PhraseSegmenter` share one
+    definition of the thresholds.
+
+    Args:
+      deltas_ns: Time since the prior keypress in nanoseconds, as an int or an
+        int array.
+      is_first: Whether the keypress is the first one, as a bool or a bool
+        array. The first keypress is assumed to be gaze initiated.
+
+    Returns:
+      A (gaze_initiated, long_pause) tuple of bools or bool arrays.
+    """
+    gaze_initiated = (deltas_ns >= MIN_GAZE_TIME_NS) | is_first
+    long_pause = deltas_ns > LONG_DELTA_TIME_NS
+    return gaze_initiated, long_pause
+
+
+class KeypressTimings:
+    """Timing arrays of a sequence of keypresses, computed once.
+
+    Segmenting keypresses into phrases and predictions looks up whether each
+    keypress is gaze initiated several times. Instead of converting the
+    protobuf timestamps to `datetime` objects on every lookup, the timestamps
+    are converted once into NumPy arrays, from which the inter-key deltas and
+    the "gaze-initiated" / "long-pause" masks are computed in vectorized form.
+
+    Attributes:
+      timestamps_ns: int64 array of the timestamps, in nanoseconds since the
+        epoch.
+      deltas_ns: int64 array of the time since the prior keypress, in
+        nanoseconds. 0 for the first keypress.
+      gaze_initiated: bool array. Whether each keypress is gaze initiated,
+        i.e., comes at least MIN_GAZE_TIME after the prior keypress. The first
+        keypress is assumed to be gaze initiated.
+      long_pause: bool array. Whether each keypress comes more than
+        LONG_DELTA_TIME after the prior keypress.
+    """
+
+    def __init__(self, timestamps_ns):
+        """Creates a `KeypressTimings` instance.
+
+        Args:
+          timestamps_ns: The timestamps of the keypresses in nanoseconds since
+            the epoch, as a sequence of ints.
+        """
+        self.timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        num_keypresses = len(self.timestamps_ns)
+        self.deltas_ns = np.zeros(num_keypresses, dtype=np.int64)
+        self.deltas_ns[1:] = np.diff(self.timestamps_ns)
+        self.gaze_initiated, self.long_pause = _classify_keypress_deltas(
+            self.deltas_ns, np.arange(num_keypresses) == 0
+        )
+        # Index of the first gaze-initiated keypress after each keypress, or
+        # num_keypresses if there is none: the reversed running minimum of the
+        # indices of the gaze-initiated keypresses.
+        gaze_indices = np.where(
+            self.gaze_initiated, np.arange(num_keypresses), num_keypresses
+        )
+        self._next_gaze_indices = np.full(num_keypresses, num_keypresses)
+        if num_keypresses > 1:
+            self._next_gaze_indices[:-1] = np.minimum.accumulate(
+                gaze_indices[:0:-1]
+            )[::-1]
+
+    @classmethod
+    def from_keypresses(cls, keypresses):
+        """Computes the timings of a KeyPresses proto or a `KeypressTable`."""
+        return cls(keypress_table.as_keypress_table(keypresses).timestamps_ns)
+
+    def __len__(self):
+        return len(self.timestamps_ns)
+
+    def is_gaze_initiated(self, index):
+        """Whether a keypress is gaze initiated.
+
+        Same as `is_key_gaze_initiated()`: out-of-range indices are treated as
+        gaze initiated.
+        """
+        return not 0 < index < len(self.timestamps_ns) or bool(
+            self.gaze_initiated[index]
+        )
+
+    def is_long_pause(self, index):
+        """Whether a keypress comes after a long pause. False if out of range."""
+        return 0 < index < len(self.timestamps_ns) and bool(self.long_pause[index])
+
+    def delta_seconds(self, index):
+        """Time since the prior keypress in seconds, 0.0 if out of range."""
+        if not 0 < index < len(self.timestamps_ns):
+            return 0.0
+        return int(self.deltas_ns[index]) / _NANOS_PER_SECOND
+
+    def next_gaze_initiated_index(self, index):
+        """Index of the first gaze-initiated keypress after a keypress.
+
+        Returns the number of keypresses if there is no such keypress.
+        """
+        return int(self._next_gaze_indices[index])
+
+    def datetime_at(self, index):
+        """The timestamp of a keypress, as by `datetime_from_protobuf_timestamp()`."""
+        return _datetime_from_nanos(int(self.timestamps_ns[index]))
+
+
 # pylint: disable=too-few-public-methods
 class Prediction:
     """
@@ -129,47 +252,64 @@ class Prediction:
     be the prediction provided after typing "HIL".
     """
 
-    def __init__(self, keypresses, current_key_index, total_keyspresses):
+    def __init__(self, keypresses, current_key_index, total_keyspresses, timings=None):
         """
         Creates a `Prediction` instance starting at current_key_index.
 
         The prediction continues up to, but not including, the next gaze initiated keypress.
 
         Args:
-          keypresses: keypresses_pb2 object to be processed
+          keypresses: keypresses_pb2 object or `KeypressTable` to be processed
           current_key_index: index into the keypresses object where the prediction begins
           total_keyspresses: size of the keypresses object
+          timings: Optional `KeypressTimings` of keypresses. Computed if None.
+        """
+        keypresses = keypress_table.as_keypress_table(keypresses)
+        if timings is None:
+            timings = KeypressTimings.from_keypresses(keypresses)
+        # Just keep processing automatic keypresses until next gaze initiated key
+        end_index = min(
+            timings.next_gaze_initiated_index(current_key_index), total_keyspresses
+        )
+        self._set_keys(
+            current_key_index,
+            keypresses.get_keys(current_key_index, end_index),
+            timings.delta_seconds(current_key_index),
+            [timings.datetime_at(idx) for idx in range(current_key_index, end_index - 1)],
+        )
+
+    @classmethod
+    def from_keys(cls, start_index, keys, timedelta, keystroke_datetimes):
+        """
+        Creates a `Prediction` instance from the keys it consists of.
+
+        Args:
+          start_index: index of the first keypress of the prediction
+          keys: the keys from start_index up to, but not including, the next
+            gaze initiated keypress, as a list of strings
+          timedelta: time since the keypress before start_index, in seconds
+          keystroke_datetimes: timestamps of the keypresses but the last one,
+            as datetime objects
         """
+        prediction = cls.__new__(cls)
+        prediction._set_keys(start_index, keys, timedelta, keystroke_datetimes)
+        return prediction
+
+    def _set_keys(self, start_index, keys, timedelta, keystroke_datetimes):
         self.length = 0  # the number of keypresses used in the prediction, 8 in the case of "🗩🠠🠠HELLO "
         self.gain = (
             -1  # the number of extra characters contributed to the actual output, 3 in the case of "🗩🠠🠠HELLO "
         )
-        self.start_index = current_key_index
+        self.start_index = start_index
         self.end_index = 0  # Inclusive end index.
         self.prediction_string = ""
         self.keystrokes = []
+        prediction_chars = []
 
-        index = current_key_index
-        is_next_gaze_initiated = False
-
-        _is_current_gaze_initiated, delta_time = is_key_gaze_initiated(
-            keypresses, current_key_index, total_keyspresses
-        )
-
-        self.timedelta = delta_time.total_seconds()
-
-        while index < total_keyspresses and not is_next_gaze_initiated:
-            current_keypress = keypresses.keyPresses[index]
+        self.timedelta = timedelta
 
-            self.prediction_string += output_for_keypress(
-                current_keypress.KeyPress, shift_on=False
-            )
-
-            # Just keep processing automatic keypresses until next gaze initiated key
-            is_next_gaze_initiated, _datetime_delta = is_key_gaze_initiated(
-                keypresses, index + 1, total_keyspresses
-            )
-            index += 1
+        for key in keys:
+            prediction_chars.append(output_for_keypress(key, shift_on=False))
             self.length += 1
 
             # Predictions can start with 0 or more backspace characters.
@@ -182,25 +322,16 @@ class Prediction:
             # 🗩↑A↑L↑S
             # 🗩🠠🠠🠠🠠↑CUBS
             # 🗩ELLO
-            if current_keypress.KeyPress == "Back":
+            if key == "Back":
                 self.gain -= 1
-            elif (
-                current_keypress.KeyPress == "LShiftKey"
-                or is_character(current_keypress.KeyPress)
-                or current_keypress.KeyPress == "Space"
-            ):
+            elif key == "LShiftKey" or is_character(key) or key == "Space":
                 self.gain += 1
 
-        self.end_index = index - 1
+        self.prediction_string = "".join(prediction_chars)
+        self.end_index = start_index + len(keys) - 1
 
-        for idx in range(self.start_index, self.end_index):
-            current_keypress = keypresses.keyPresses[idx]
-            self.keystrokes.append(
-                {
-                    current_keypress.KeyPress,
-                    datetime_from_protobuf_timestamp(current_keypress.Timestamp),
-                }
-            )
+        for key, keystroke_datetime in zip(keys, keystroke_datetimes):
+            self.keystrokes.append({key, keystroke_datetime})
 
     def __str__(self):
         return f"🗩{self.prediction_string}"
@@ -222,10 +353,10 @@ class Phrase:
         self.end_index = 0  # Index of the last keypress in the phrase
         self._start_timestamp = start_timestamp
         self._end_timestamp = None
-        # A string used for visualizing the key sequences. It includes
-        # the gaze-initiated and machine-predicted characters, backspaces,
-        # and so forth.
-        self.visualized_string = ""
+        # Pieces of the string used for visualizing the key sequences. It
+        # includes the gaze-initiated and machine-predicted characters,
+        # backspaces, and so forth. See the visualized_string property.
+        self._visualized_pieces = []
         # Reconstructed string. This is the text that shows up in the target
         # text box or text editor. Takes into control keys including but not
         # limited to Back, word deletion, etc.
@@ -242,7 +373,10 @@ class Phrase:
         self.wpm = 0.0
         self.ksr = 0.0
         self.error = 0.0
-        self._recon_string = ""
+        # Characters of the reconstructed string. See the recon_string
+        # property. Edits happen at the end of the text, so that appending and
+        # deleting characters take amortized constant time.
+        self._recon_chars = []
 
     def add_control_key(self, control_key, num_gaze_keypresses):
         """Add a control key (i.e., a key entered with the Ctrl key on).
@@ -250,11 +384,11 @@ class Phrase:
         Args:
           control_key: The control key to be added. This is the second of
             the keypresses used to enter the control key, represented as
-            a KeyPress proto.
+            a KeyPress proto or a key string.
           num_gaze_keypresses: Number of gaze keypreses used to enter this
             control key.
         """
-        self.visualized_string += CONTROL_KEYS[control_key.KeyPress]
+        self._visualized_pieces.append(CONTROL_KEYS[_get_key(control_key)])
         self.gaze_keypress_count += num_gaze_keypresses
         # TODO(cais): Process control keys including cut, paste, undo, and redo.
 
@@ -265,21 +399,23 @@ class Phrase:
         """Add a non-control key (i.e., a key entered without the Ctrl key).
 
         Args:
-          keypress: The non-control key, represented as a KeyPress proto.
+          keypress: The non-control key, represented as a KeyPress proto or a
+            key string.
           shift_on: Whether the Shift key is held when `key` is entered.
           is_gaze_initiazted: Whether the keypress is gaze-initiated (as versus
             automatically entered such as a selected word prediction).
         """
-        char = output_for_keypress(keypress.KeyPress, shift_on=shift_on)
+        key = _get_key(keypress)
+        char = output_for_keypress(key, shift_on=shift_on)
         if is_gaze_initiated:
             self.gaze_keypress_count += 2 if shift_on else 1
-        if keypress.KeyPress == "Back":
+        if key == "Back":
             self.backspace_count += 1
-            if self._recon_string:
-                self._recon_string = self._recon_string[:-1]
+            if self._recon_chars:
+                self._recon_chars.pop()
         else:
-            self._recon_string += char.upper() if shift_on else char.lower()
-        self.visualized_string += char
+            self._recon_chars.extend(char.upper() if shift_on else char.lower())
+        self._visualized_pieces.append(char)
         # TODO: This is based on the assumption of CapsLock is off. Maybe find
         # a way to determine if CapsLock is on.
 
@@ -289,25 +425,21 @@ class Phrase:
         It is assumed that the backward word deletion is initiated by gaze
         clicking the "Delete word" button of the eye gaze keyboard.
         """
-        self.visualized_string += "↞"
+        self._visualized_pieces.append("↞")
         self.delword_count += 1
         self.gaze_keypress_count += 1
-        if not self._recon_string:
+        recon_chars = self._recon_chars
+        if not recon_chars:
             return
         self.machine_keypress_count += 3
-        last_char = self._recon_string[-1]
-        i = len(self._recon_string) - 1
-        if last_char in string.punctuation or re.match("\s", last_char):
-            while i >= 0 and (self._recon_string[i] in string.punctuation or
-                              re.match("\s", self._recon_string[i])):
-                i -= 1
-        while i >= 0:
-            char = self._recon_string[i]
-            if re.match("\s", char) or char in string.punctuation:
-                break
+        # Delete the trailing whitespace and punctuation (if any), and then the
+        # last word.
+        i = len(recon_chars) - 1
+        while i >= 0 and _WORD_DELIMITER_REGEX.match(recon_chars[i]):
+            i -= 1
+        while i >= 0 and not _WORD_DELIMITER_REGEX.match(recon_chars[i]):
             i -= 1
-        if i + 1 >= 0:
-            self._recon_string = self._recon_string[:i + 1]
+        del recon_chars[i + 1:]
 
     def add_prediction(self, prediction):
         """Register a prediction.
@@ -323,27 +455,32 @@ class Phrase:
         self.gaze_keypress_count += 1
         self.machine_keypress_count += prediction.length - 1
         for prediction_char in prediction.prediction_string:
-            if prediction_char == "🠠" and self._recon_string:
-                self._recon_string = self._recon_string[:-1]
+            if prediction_char == "🠠" and self._recon_chars:
+                self._recon_chars.pop()
             elif is_character(prediction_char):
                 # TODO Find a way to determine whether prediction contains upper
                 # or lower case letters.
-                self._recon_string += prediction_char.lower()
+                self._recon_chars.extend(prediction_char.lower())
             else:
                 raise ValueError(
                     "Unable to process character '%s' in prediction" %
                     prediction_char)
-        self.visualized_string += str(prediction)
+        self._visualized_pieces.append(str(prediction))
         self.predictions.append(prediction)
 
+    @property
+    def visualized_string(self):
+        """Get the string used for visualizing the key sequences."""
+        return "".join(self._visualized_pieces)
+
     @property
     def recon_string(self):
         """Get the reconstructed string."""
-        return self._recon_string
+        return "".join(self._recon_chars)
 
     @property
     def character_count(self):
-        return len(self._recon_string)
+        return len(self._recon_chars)
 
     @property
     def start_timestamp(self):
@@ -353,34 +490,50 @@ class Phrase:
     def end_timestamp(self):
         return self._end_timestamp
 
-    def finalize(self, keypresses, end_index):
+    def finalize(self, keypresses, end_index, timings=None):
         """
         When the phrase is complete, we want to run various calculations for
         WPM, KSR, and Error rate.  We also validate to ensure there are no
         missing Keypresses in the range.
 
         Args:
-          keypresses: A KeyPresses proto that the phrase belong to.
-            self.start_index is assumed to belong to `keypresses`.
+          keypresses: A KeyPresses proto or `KeypressTable` that the phrase
+            belong to. self.start_index is assumed to belong to `keypresses`.
           end_index: Inclusive ending index among `keypresses`.
+          timings: Optional `KeypressTimings` of keypresses. Computed if None.
+        """
+        keypresses = keypress_table.as_keypress_table(keypresses)
+        assert end_index >= 0 and end_index < len(keypresses)
+        if timings is None:
+            timings = KeypressTimings.from_keypresses(keypresses)
+        self.finalize_with_keystrokes(
+            end_index,
+            timings.datetime_at(end_index),
+            [
+                (keypresses.key_at(idx), timings.datetime_at(idx))
+                for idx in range(self.start_index, end_index)
+            ],
+        )
+
+    def finalize_with_keystrokes(self, end_index, end_timestamp, keystrokes):
+        """
+        Same as `finalize()`, given the data of the keypresses of the phrase.
+
+        Args:
+          end_index: Inclusive ending index of the phrase.
+          end_timestamp: Timestamp of the keypress at end_index, as a datetime.
+          keystrokes: (key, datetime) pairs of the keypresses from
+            self.start_index up to, but not including, end_index.
         """
-        assert end_index >= 0 and end_index < len(keypresses.keyPresses)
         self.end_index = end_index
-        self._end_timestamp = datetime_from_protobuf_timestamp(
-            keypresses.keyPresses[end_index].Timestamp)
+        self._end_timestamp = end_timestamp
         self.calculate_wpm()
         self.calculate_ksr()
         self.calculate_error()
         self.validate()
 
-        for idx in range(self.start_index, self.end_index):
-            current_keypress = keypresses.keyPresses[idx]
-            self.keystrokes.append(
-                {
-                    current_keypress.KeyPress,
-                    datetime_from_protobuf_timestamp(current_keypress.Timestamp),
-                }
-            )
+        for key, keystroke_datetime in keystrokes:
+            self.keystrokes.append({key, keystroke_datetime})
 
     def calculate_error(self):
         """
@@ -441,7 +594,7 @@ class Phrase:
         End phrase via a Cancellation keypress.
         """
         self.was_cancelled = True
-        key = keypress.KeyPress if hasattr(keypress, "KeyPress") else keypress
+        key = _get_key(keypress)
         if key in CANCEL_KEYS:
             self.ending_string = CANCEL_KEYS[key]
             self.gaze_keypress_count += 2  # Includes the Ctrl key.
@@ -502,262 +655,659 @@ class Phrase:
 
         return return_string
 
+    def get_json_state(self):
+        """Gets the attributes to be serialized, with the text as strings."""
+        state = {}
+        for name, value in vars(self).items():
+            if name in _PHRASE_TEXT_BUFFERS:
+                name = _PHRASE_TEXT_BUFFERS[name]
+                value = "".join(value)
+            state[name] = value
+        return state
+
+    def set_json_state(self, state):
+        """Sets the attributes from the output of `get_json_state()`."""
+        buffer_names = {
+            string_name: buffer_name
+            for buffer_name, string_name in _PHRASE_TEXT_BUFFERS.items()
+        }
+        for name, value in state.items():
+            if name in buffer_names:
+                name = buffer_names[name]
+                value = list(value)
+            setattr(self, name, value)
+
+
+# Maps the text buffers of Phrase to the names under which their strings are
+# serialized. The JSON output has the same fields as when the strings were
+# Phrase attributes.
+_PHRASE_TEXT_BUFFERS = {
+    "_visualized_pieces": "visualized_string",
+    "_recon_chars": "_recon_string",
+}
 
-# pylint: disable=too-many-branches
-# pylint: disable=too-many-statements
-# pylint: disable=too-many-locals
-def visualize_keypresses(keypresses,
-                         visualize_path=None,
-                         prediction_path=None,
-                         phrases_path=None,
-                         tsv_path=None,
-                         start_time_epoch=None):
-    """
-    Processes the keypresses object, breaking it down into Phrases.
 
-    Raises:
-        Exceptions based on parsing logic errors.
+@jsonpickle.handlers.register(Phrase)
+class _PhraseHandler(jsonpickle.handlers.BaseHandler):
+    """Serializes Phrases with their text buffers as strings."""
+
+    def flatten(self, obj, data):
+        for name, value in obj.get_json_state().items():
+            data[name] = self.context.flatten(value, reset=False)
+        return data
+
+    def restore(self, obj):
+        phrase = Phrase.__new__(Phrase)
+        phrase.set_json_state({
+            name: self.context.restore(value, reset=False)
+            for name, value in obj.items()
+            if name != jsonpickle.tags.OBJECT
+        })
+        return phrase
+
+
+class PhraseSegmenter:
+    """Incrementally segments a stream of keypresses into Phrases.
+
+    Keypresses are pushed one at a time, e.g., while a session is still being
+    recorded or uploaded, and each `Phrase` is returned as soon as it ends
+    (spoken, cancelled or timed out). Only the keypresses of the current phrase
+    and a small lookahead window are kept in memory, so that sessions of any
+    length can be processed in bounded memory.
+
+    The phrases are the same as those that `visualize_keypresses()` finds in
+    the whole sequence of keypresses.
+
+    Example:
+        segmenter = PhraseSegmenter()
+        for keypress in keypresses.keyPresses:
+            for phrase in segmenter.push_keypress(keypress):
+                print(phrase)
+        for phrase in segmenter.finish():
+            print(phrase)
     """
-    phrases = []
-    current_phrase = None
-    is_phrase_start = True
-    is_phrase_end = False
 
-    total_keyspresses = len(keypresses.keyPresses)
+    # Number of keypresses after the current one that are looked at to
+    # recognize key combinations, e.g., LControlKey LShiftKey Left Back.
+    LOOKAHEAD = 3
 
-    current_key_index = 0
+    def __init__(self, start_index=0, previous_timestamp_ns=None):
+        """Creates a `PhraseSegmenter` instance.
 
-    # Assume the first key is gaze initialized.
-    while current_key_index < total_keyspresses:
-        keypress = keypresses.keyPresses[current_key_index]
-        current_timestamp = datetime_from_protobuf_timestamp(keypress.Timestamp)
-        is_current_gaze_initiated, _ = is_key_gaze_initiated(
-            keypresses, current_key_index, total_keyspresses
+        Args:
+          start_index: Index of the first keypress to be pushed. Must be the
+            start of a phrase. The indices of the Phrases and Predictions
+            count from the beginning of the stream.
+          previous_timestamp_ns: Timestamp of the keypress before start_index,
+            in nanoseconds since the epoch, if start_index is not 0.
+        """
+        # Keys, timestamps and timings of the buffered keypresses, starting
+        # from the keypress at index self._offset.
+        self._keys = []
+        self._timestamps_ns = []
+        self._deltas_ns = []
+        self._gaze_initiated = []
+        self._long_pause = []
+        self._offset = start_index
+        self._num_keypresses = start_index
+        self._last_timestamp_ns = previous_timestamp_ns
+        # Index of the next keypress to be processed.
+        self._current_key_index = start_index
+        # Index of the first gaze-initiated keypress after the current one,
+        # as far as it has been searched.
+        self._gaze_search_index = start_index
+        self._current_phrase = None
+        self._is_finished = False
+
+    @property
+    def num_keypresses(self):
+        """Number of keypresses so far, including any before start_index."""
+        return self._num_keypresses
+
+    def push(self, key, timestamp_ns):
+        """Adds a keypress to the end of the stream.
+
+        Args:
+          key: The key, e.g., "A" or "LShiftKey".
+          timestamp_ns: The timestamp of the keypress, in nanoseconds since
+            the epoch.
+
+        Returns:
+          The Phrases that ended, as a list.
+
+        Raises:
+          ValueError: if `finish()` has been called.
+        """
+        if self._is_finished:
+            raise ValueError("Cannot push keypresses after finish()")
+        is_first = self._last_timestamp_ns is None
+        delta_ns = 0 if is_first else timestamp_ns - self._last_timestamp_ns
+        gaze_initiated, long_pause = _classify_keypress_deltas(delta_ns, is_first)
+        self._deltas_ns.append(delta_ns)
+        self._gaze_initiated.append(gaze_initiated)
+        self._long_pause.append(long_pause)
+        self._keys.append(key)
+        self._timestamps_ns.append(timestamp_ns)
+        self._last_timestamp_ns = timestamp_ns
+        self._num_keypresses += 1
+        return self._advance(is_final=False)
+
+    def push_keypress(self, keypress):
+        """Adds a KeyPress proto to the end of the stream. See `push()`."""
+        return self.push(
+            keypress.KeyPress,
+            keypress.Timestamp.seconds * _NANOS_PER_SECOND + keypress.Timestamp.nanos,
         )
-        is_next_gaze_initiated, next_character_delta = is_key_gaze_initiated(
-            keypresses, current_key_index + 1, total_keyspresses
+
+    def finish(self):
+        """Ends the stream.
+
+        Returns:
+          The remaining Phrases, as a list. If the keypresses run out before
+          the last phrase ends otherwise, it is ended as cancelled.
+        """
+        self._is_finished = True
+        phrases = self._advance(is_final=True)
+        if self._current_phrase is not None:
+            # If we have run out of keypresses, but have not otherwise ended
+            # the phrase, ensure the phrase is ended
+            self._current_phrase.cancel("␘")
+            phrases.append(self._end_phrase())
+        return phrases
+
+    def _key(self, index):
+        return self._keys[index - self._offset]
+
+    def _is_gaze_initiated(self, index):
+        # Out-of-range keypresses are treated as gaze initiated, as by
+        # KeypressTimings.
+        return index >= self._num_keypresses or self._gaze_initiated[index - self._offset]
+
+    def _is_long_pause(self, index):
+        return index < self._num_keypresses and self._long_pause[index - self._offset]
+
+    def _delta_seconds(self, index):
+        return self._deltas_ns[index - self._offset] / _NANOS_PER_SECOND
+
+    def _datetime_at(self, index):
+        return _datetime_from_nanos(self._timestamps_ns[index - self._offset])
+
+    def _find_next_gaze_initiated_index(self, index):
+        """Index of the first gaze-initiated keypress after index, if pushed.
+
+        Returns the number of keypresses if there is no such keypress yet.
+        """
+        next_index = max(index + 1, self._gaze_search_index)
+        while (
+            next_index < self._num_keypresses
+            and not self._gaze_initiated[next_index - self._offset]
+        ):
+            next_index += 1
+        self._gaze_search_index = next_index
+        return next_index
+
+    def _end_phrase(self):
+        """Finalizes the current phrase and drops its keypresses."""
+        phrase = self._current_phrase
+        # The current_key_index is pointing to the beginning of the next
+        # phrase. Grab the timestamp from the keypress just before it,
+        # which is the end of the current phrase.
+        end_index = self._current_key_index - 1
+        phrase.finalize_with_keystrokes(
+            end_index,
+            self._datetime_at(end_index),
+            [
+                (self._key(idx), self._datetime_at(idx))
+                for idx in range(phrase.start_index, end_index)
+            ],
         )
+        num_dropped = self._current_key_index - self._offset
+        for column in (
+            self._keys,
+            self._timestamps_ns,
+            self._deltas_ns,
+            self._gaze_initiated,
+            self._long_pause,
+        ):
+            del column[:num_dropped]
+        self._offset = self._current_key_index
+        self._current_phrase = None
+        return phrase
+
+    # pylint: disable=too-many-branches
+    # pylint: disable=too-many-statements
+    def _advance(self, is_final):
+        """Processes the pushed keypresses as far as possible.
 
-        if is_phrase_start:
-            current_phrase = Phrase(current_timestamp, current_key_index)
-            is_phrase_start = False
+        Args:
+          is_final: Whether no more keypresses will be pushed. If False, a
+            keypress is processed only when the keypresses that decide how it
+            is processed have been pushed.
+
+        Returns:
+          The Phrases that ended, as a list.
+        """
+        phrases = []
+        total_keyspresses = self._num_keypresses
+        while self._current_key_index < total_keyspresses:
+            current_key_index = self._current_key_index
+            if not is_final and current_key_index + self.LOOKAHEAD >= total_keyspresses:
+                break
+            key = self._key(current_key_index)
+            is_current_gaze_initiated = self._is_gaze_initiated(current_key_index)
+            is_next_gaze_initiated = self._is_gaze_initiated(current_key_index + 1)
+            is_next_long_pause = self._is_long_pause(current_key_index + 1)
             is_phrase_end = False
-        if (
-            keypress.KeyPress == "LControlKey" or keypress.KeyPress == "RControlKey"
-        ) and (
-            is_current_gaze_initiated or is_next_gaze_initiated
-        ) and current_key_index + 1 < total_keyspresses:
-            # TODO How does the user erase the state of the previously spoken phrase
-            # before entering the next phrase? Without the state erasure, the previous
-            # phrase will be spoken alongside the next one, which is undesirable.
-            next_keypress = keypresses.keyPresses[current_key_index + 1]
+
+            # The phrase is started before it is known whether the keypress
+            # can be processed yet. If not, it is processed on a later call
+            # with the same phrase.
+            if self._current_phrase is None:
+                self._current_phrase = Phrase(
+                    self._datetime_at(current_key_index), current_key_index
+                )
+            current_phrase = self._current_phrase
             if (
-                current_key_index + 3 < total_keyspresses
-                and next_keypress.KeyPress == "LShiftKey"
-                and keypresses.keyPresses[current_key_index + 2].KeyPress == "Left"
-                and keypresses.keyPresses[current_key_index + 3].KeyPress == "Back"
-                and not is_next_gaze_initiated
+                key == "LControlKey" or key == "RControlKey"
+            ) and (
+                is_current_gaze_initiated or is_next_gaze_initiated
+            ) and current_key_index + 1 < total_keyspresses:
+                # TODO How does the user erase the state of the previously spoken phrase
+                # before entering the next phrase? Without the state erasure, the previous
+                # phrase will be spoken alongside the next one, which is undesirable.
+                next_key = self._key(current_key_index + 1)
+                if (
+                    current_key_index + 3 < total_keyspresses
+                    and next_key == "LShiftKey"
+                    and self._key(current_key_index + 2) == "Left"
+                    and self._key(current_key_index + 3) == "Back"
+                    and not is_next_gaze_initiated
+                ):
+                    current_phrase.delete_word_backward()
+                    current_key_index += 4
+                elif next_key == "W":
+                    # Ctrl-W == Speak
+                    is_phrase_end = True
+                    current_key_index += 2
+                    current_phrase.speak(gaze_keypress_count=2)
+                elif next_key in CANCEL_KEYS:
+                    # TODO If ctrl-A is followed by ctrl-W, was phrase cancelled?
+                    is_phrase_end = True
+                    current_key_index += 2
+                    current_phrase.cancel(next_key)
+                elif next_key in CONTROL_KEYS:
+                    current_phrase.add_control_key(
+                        next_key, num_gaze_keypresses=2)
+                    current_key_index += 2
+                else:
+                    # Handle the control key in isolation
+                    current_phrase.add_non_control_key(
+                        key, shift_on=False, is_gaze_initiated=True)
+                    current_key_index += 1
+            elif key == "LShiftKey" and (
+                is_current_gaze_initiated or is_next_gaze_initiated
             ):
-                current_phrase.delete_word_backward()
-                current_key_index += 4
-            elif next_keypress.KeyPress == "W":
-                # Ctrl-W == Speak
-                is_phrase_end = True
-                current_key_index += 2
-                current_phrase.speak(gaze_keypress_count=2)
-            elif next_keypress.KeyPress in CANCEL_KEYS:
-                # TODO If ctrl-A is followed by ctrl-W, was phrase cancelled?
-                is_phrase_end = True
-                current_key_index += 2
-                current_phrase.cancel(next_keypress)
-            elif next_keypress.KeyPress in CONTROL_KEYS:
-                current_phrase.add_control_key(
-                    next_keypress, num_gaze_keypresses=2)
-                current_key_index += 2
-            else:
-                # Handle the control key in isolation
+                if (
+                    current_key_index + 1 < total_keyspresses
+                    and self._key(current_key_index + 1) != "LShiftKey"
+                    and self._key(current_key_index + 1) != "LControlKey"
+                ):
+                    current_phrase.add_non_control_key(
+                        self._key(current_key_index + 1),
+                        shift_on=True,
+                        is_gaze_initiated=True)
+                    current_key_index += 2
+                else:
+                    current_phrase.add_non_control_key(
+                        key,
+                        shift_on=False,
+                        is_gaze_initiated=True)
+                    current_key_index += 1
+            elif is_next_gaze_initiated:
                 current_phrase.add_non_control_key(
-                    keypress, shift_on=False, is_gaze_initiated=True)
+                    key, shift_on=False, is_gaze_initiated=True)
                 current_key_index += 1
-        elif keypress.KeyPress == "LShiftKey" and (
-            is_current_gaze_initiated or is_next_gaze_initiated
-        ):
-            if (
-                current_key_index + 1 < total_keyspresses
-                and keypresses.keyPresses[current_key_index + 1].KeyPress
-                != "LShiftKey"
-                and keypresses.keyPresses[current_key_index + 1].KeyPress
-                != "LControlKey"
-            ):
-                current_phrase.add_non_control_key(
-                    keypresses.keyPresses[current_key_index + 1],
-                    shift_on=True,
-                    is_gaze_initiated=True)
-                current_key_index += 2
             else:
-                current_phrase.add_non_control_key(
-                    keypress,
-                    shift_on=False,
-                    is_gaze_initiated=True)
-                current_key_index += 1
-        elif is_next_gaze_initiated:
-            current_phrase.add_non_control_key(
-                keypress, shift_on=False, is_gaze_initiated=True)
-            current_key_index += 1
-        else:
-            # next character is not gaze initiated.
-            if (
-                keypress.KeyPress == "LWin"
-                and current_key_index + 1 < total_keyspresses
-            ):
-                # Automated windows hotkeys
-                next_keypress = keypresses.keyPresses[current_key_index + 1]
-                if next_keypress.KeyPress in WINDOWS_KEYS:
-                    is_phrase_end = True
-                    current_key_index += 2
-                    current_phrase.cancel(next_keypress)
+                # next character is not gaze initiated.
+                if (
+                    key == "LWin"
+                    and current_key_index + 1 < total_keyspresses
+                ):
+                    # Automated windows hotkeys
+                    next_key = self._key(current_key_index + 1)
+                    if next_key in WINDOWS_KEYS:
+                        is_phrase_end = True
+                        current_key_index += 2
+                        current_phrase.cancel(next_key)
+                    else:
+                        raise Exception(
+                            f"Unknown windows key combo Win+{next_key}"
+                        )
                 else:
-                    raise Exception(
-                        f"Unknown windows key combo Win+{next_keypress.KeyPress}"
+                    # Prediction. It continues up to the next gaze initiated
+                    # keypress: wait until that has been pushed.
+                    prediction_end_index = self._find_next_gaze_initiated_index(
+                        current_key_index
+                    )
+                    if not is_final and prediction_end_index >= total_keyspresses:
+                        break
+                    current_prediction = Prediction.from_keys(
+                        current_key_index,
+                        [
+                            self._key(idx)
+                            for idx in range(current_key_index, prediction_end_index)
+                        ],
+                        self._delta_seconds(current_key_index),
+                        [
+                            self._datetime_at(idx)
+                            for idx in range(current_key_index, prediction_end_index - 1)
+                        ],
                     )
+                    current_key_index += current_prediction.length
+                    current_phrase.add_prediction(current_prediction)
+
+            self._current_key_index = current_key_index
+
+            if is_next_long_pause:
+                is_phrase_end = True
+                current_phrase.timeout()
+
+            if is_phrase_end:
+                phrases.append(self._end_phrase())
+        return phrases
+
+
+def _segment_chunk(keys, timestamps_ns, start_index, previous_timestamp_ns,
+                   end_index, is_final):
+    """Segments a chunk of keypresses into Phrases. Runs in worker processes.
+
+    Args:
+      keys: The keys from start_index up to end_index, plus the lookahead
+        after end_index.
+      timestamps_ns: The timestamps of the keys, in nanoseconds.
+      start_index: Index of the first key, which must start a phrase.
+      previous_timestamp_ns: Timestamp of the keypress before start_index, or
+        None if start_index is 0.
+      end_index: Index of the end of the chunk.
+      is_final: Whether the keys reach the end of the stream.
+
+    Returns:
+      The Phrases that end before end_index, as a list.
+    """
+    segmenter = PhraseSegmenter(
+        start_index=start_index, previous_timestamp_ns=previous_timestamp_ns
+    )
+    phrases = []
+    for key, timestamp_ns in zip(keys, timestamps_ns):
+        phrases.extend(segmenter.push(key, timestamp_ns))
+    if is_final:
+        phrases.extend(segmenter.finish())
+    return [phrase for phrase in phrases if phrase.end_index < end_index]
+
+
+def _find_split_indices(timings, num_chunks):
+    """Finds where to split keypresses into about num_chunks equal chunks.
+
+    The keypresses are split before keypresses that follow a long pause. Such a
+    keypress usually starts a new phrase, as the previous phrase times out. The
+    previous keypress must be gaze initiated, i.e., not part of a prediction,
+    which doesn't time out.
+
+    Returns:
+      Sorted list of the indices of the first keypresses of the chunks but
+      the first one.
+    """
+    num_keypresses = len(timings)
+    candidates = (
+        np.flatnonzero(timings.long_pause[1:] & timings.gaze_initiated[:-1]) + 1
+    )
+    if not len(candidates):
+        return []
+    split_indices = set()
+    for i in range(1, num_chunks):
+        target_index = num_keypresses * i // num_chunks
+        j = min(np.searchsorted(candidates, target_index), len(candidates) - 1)
+        if j > 0 and target_index - candidates[j - 1] < candidates[j] - target_index:
+            j -= 1
+        split_indices.add(int(candidates[j]))
+    return sorted(split_indices)
+
+
+def _segment_phrases(keypresses, num_workers=1):
+    """Segments a `KeypressTable` into Phrases.
+
+    With more than one worker, the keypresses are split into chunks after long
+    pauses (see `_find_split_indices()`), which are segmented in parallel in a
+    process pool. A split is only assumed to start a phrase: if the phrases of
+    a chunk don't end right before the next split, the segmentation continues
+    from the end of the last phrase in the current process.
+
+    Returns:
+      The Phrases, as a list. Same as those from segmenting all keypresses
+      with a `PhraseSegmenter`.
+    """
+    keys = keypresses.get_keys()
+    timestamps_ns = keypresses.timestamps_ns.tolist()
+    num_keypresses = len(keys)
+    split_indices = []
+    if num_workers > 1:
+        split_indices = _find_split_indices(
+            KeypressTimings(keypresses.timestamps_ns), num_workers
+        )
+    chunk_ends = split_indices + [num_keypresses]
+
+    def get_chunk_args(start_index, end_index):
+        window_end = min(num_keypresses, end_index + PhraseSegmenter.LOOKAHEAD + 1)
+        return (
+            keys[start_index:window_end],
+            timestamps_ns[start_index:window_end],
+            start_index,
+            timestamps_ns[start_index - 1] if start_index else None,
+            end_index,
+            window_end == num_keypresses,
+        )
+
+    if not split_indices:
+        return _segment_chunk(*get_chunk_args(0, num_keypresses))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(_segment_chunk, *get_chunk_args(start_index, end_index))
+            for start_index, end_index in zip([0] + split_indices, chunk_ends)
+        ]
+        phrases = []
+        # Index of the start of the next phrase.
+        start_index = 0
+        for chunk_start, chunk_end, future in zip(
+            [0] + split_indices, chunk_ends, futures
+        ):
+            if start_index == chunk_start:
+                chunk_phrases = future.result()
             else:
-                # Prediction
-                current_prediction = Prediction(
-                    keypresses, current_key_index, total_keyspresses
+                # The previous split didn't start a phrase.
+                future.cancel()
+                chunk_phrases = _segment_chunk(*get_chunk_args(start_index, chunk_end))
+            phrases.extend(chunk_phrases)
+            if chunk_phrases:
+                start_index = chunk_phrases[-1].end_index + 1
+    return phrases
+
+
+# pylint: disable=too-many-instance-attributes
+class SegmentationStats:
+    """Summary statistics of the Phrases of a sequence of keypresses.
+
+    Attributes:
+      keypress_count: Total number of keypresses.
+      gaze_keypress_count: Number of gaze-initiated keypresses in the phrases.
+      machine_keypress_count: Number of keypresses of predictions.
+      character_count: Number of characters of the reconstructed phrases.
+      phrase_count: Number of phrases.
+      spoken_count, cancelled_count, timeout_count: Number of phrases that
+        ended in each way.
+      average_wpm, top_wpm: Average and top WPM of the spoken phrases.
+      prediction_count: Number of predictions.
+      average_prediction_length, average_prediction_gain: Averages over the
+        predictions, 0.0 if there are none.
+    """
+
+    # pylint: disable=too-many-branches
+    # pylint: disable=too-many-statements
+    def __init__(self, keypress_count, phrases):
+        """Computes the statistics of Phrases.
+
+        Args:
+          keypress_count: Total number of keypresses that were segmented.
+          phrases: The Phrases, in order.
+
+        Raises:
+          Exceptions if the phrases don't account for all keypresses.
+        """
+        self.keypress_count = keypress_count
+        self.gaze_keypress_count = 0
+        self.machine_keypress_count = 0
+        self.character_count = 0
+        self.phrase_count = len(phrases)
+        self.spoken_count = 0
+        self.cancelled_count = 0
+        self.timeout_count = 0
+        self.prediction_count = 0
+        self.average_prediction_length = 0.0
+        self.average_prediction_gain = 0.0
+
+        key_index = 0
+        phrase_keypress_count = 0
+        wpms = []
+        for phrase in phrases:
+            self.gaze_keypress_count += phrase.gaze_keypress_count
+            self.machine_keypress_count += phrase.machine_keypress_count
+            self.character_count += phrase.character_count
+            phrase_keypress_count += phrase.keypress_count()
+
+            if phrase.start_index != key_index:
+                raise Exception(
+                    f"Index mismatch. Expected {key_index} but got {phrase.start_index}"
                 )
-                current_key_index += current_prediction.length
-                current_phrase.add_prediction(current_prediction)
 
-        if next_character_delta > LONG_DELTA_TIME:
-            is_phrase_end = True
-            current_phrase.timeout()
+            key_index = phrase.end_index + 1
 
-        if not is_phrase_end and current_key_index >= total_keyspresses:
-            # If we have run out of keypresses, but have not otherwise ended
-            # the phrase, ensure the phrase is ended
-            is_phrase_end = True
-            current_phrase.cancel("␘")
+            if phrase.was_cancelled:
+                self.cancelled_count += 1
+            elif phrase.was_timeout:
+                self.timeout_count += 1
+            elif phrase.was_spoken:
+                self.spoken_count += 1
+                wpms.append(phrase.wpm)
+            else:
+                raise Exception(
+                    "Phrase end error. Phrase was not Cancelled, Timeout, or Spoken!"
+                )
 
-        if is_phrase_end:
-            # The current_key_index is pointing to the beginning of the next
-            # phrase. Grab the timestamp from the keypress just before it,
-            # which is the end of the current phrase.
-            current_phrase.finalize(keypresses, end_index=(current_key_index - 1))
+            for pred in phrase.predictions:
+                self.prediction_count += 1
+                self.average_prediction_length += pred.length
+                self.average_prediction_gain += pred.gain
 
-            phrases.append(current_phrase)
+        self.average_wpm, self.top_wpm = average_wpm(wpms)
+        if self.prediction_count:
+            self.average_prediction_length /= self.prediction_count
+            self.average_prediction_gain /= self.prediction_count
 
-            current_phrase = None
-            is_phrase_end = False
-            is_phrase_start = True
-
-    key_index = 0
-    total_gaze_keypress_count = 0
-    total_machine_keypress_count = 0
-    total_character_count = 0
-    total_phrase_keypress_count = 0
-    timeout_count = 0
-    cancelled_count = 0
-    spoken_count = 0
-    phrase_count = len(phrases)
-    wpms = []
-
-    visualization_string = ""
-
-    for phrase in phrases:
-        total_gaze_keypress_count += phrase.gaze_keypress_count
-        total_machine_keypress_count += phrase.machine_keypress_count
-        total_character_count += phrase.character_count
-        total_phrase_keypress_count += phrase.keypress_count()
-
-        if phrase.start_index != key_index:
+        # The phrase keypress count is a bug check, it MUST equal
+        # keypress_count.  Otherwise we have lost keypresses somehow
+        if phrase_keypress_count != keypress_count:
             raise Exception(
-                f"Index mismatch. Expected {key_index} but got {phrase.start_index}"
+                f"Keypress mismatch, {keypress_count - phrase_keypress_count} keypresses missing from phrases. PhraseKeypressCount:{phrase_keypress_count} KeypressCount:{keypress_count}"
             )
 
-        key_index = phrase.end_index + 1
+        if (
+            phrase_keypress_count
+            != self.gaze_keypress_count + self.machine_keypress_count
+        ):
+            raise Exception(
+                f"Missing Keypresses KeyPress:{phrase_keypress_count} Gaze:{self.gaze_keypress_count} Machine:{self.machine_keypress_count}"
+            )
 
-        if phrase.was_cancelled:
-            cancelled_count += 1
-        elif phrase.was_timeout:
-            timeout_count += 1
-        elif phrase.was_spoken:
-            spoken_count += 1
-            wpms.append(phrase.wpm)
-        else:
+        if self.phrase_count != (
+            self.spoken_count + self.timeout_count + self.cancelled_count
+        ):
             raise Exception(
-                "Phrase end error. Phrase was not Cancelled, Timeout, or Spoken!"
+                f"Phrase mismatch, {self.phrase_count - (self.spoken_count + self.timeout_count + self.cancelled_count)} phrases missing."
             )
 
-        visualization_string += f"{phrase}\n"
+    def summary_string(self):
+        """Formats the statistics as the summary lines of the visualization."""
+        phrase_count = self.phrase_count
+        summary = f"🗪[Speak: {self.spoken_count}, AverageWPM: {self.average_wpm:5.1f}, TopWPM: {self.top_wpm:5.1f}]\n"
+        summary += f"Total Keypresses: {self.keypress_count} Gaze: {self.gaze_keypress_count} Characters: {self.character_count}\n"
+        summary += f"Total Phrases:{phrase_count} Spoken:{self.spoken_count}({self.spoken_count/phrase_count:0.2%}) Cancelled:{self.cancelled_count}({self.cancelled_count/phrase_count:0.2%}) Timeouts:{self.timeout_count}({self.timeout_count/phrase_count:0.2%})\n"
+        summary += f"Total Predictions: {self.prediction_count} Average Length: {self.average_prediction_length:0.3f} Average Gain: {self.average_prediction_gain:0.3f}\n"
+        return summary
 
-    average_wpms, top_wpm = average_wpm(wpms)
 
-    predictions = []
-    predictions_count = 0
-    average_prediction_length = 0.0
-    average_prediction_gain = 0.0
+def segment_keypresses(keypresses, num_workers=1):
+    """Breaks keypresses down into Phrases, without writing any output.
 
-    for phrase in phrases:
-        predictions_count += len(phrase.predictions)
-        predictions.extend(phrase.predictions)
-    for pred in predictions:
-        average_prediction_length += pred.length
-        average_prediction_gain += pred.gain
+    Args:
+        keypresses: A KeyPresses proto or a `KeypressTable`.
+        num_workers: Number of processes to segment the keypresses with. See
+            `_segment_phrases()`.
 
-    average_prediction_length /= predictions_count
-    average_prediction_gain /= predictions_count
+    Returns:
+        phrases: The Phrases, as a list.
+        stats: A `SegmentationStats` of the phrases.
 
-    # The totalPhraseKeypressCount is a bug check, it MUST equal
-    # totalKeyspresses.  Otherwise we have lost keypresses somehow
-    if total_phrase_keypress_count != total_keyspresses:
-        raise Exception(
-            f"Keypress mismatch, {total_keyspresses - total_phrase_keypress_count} keypresses missing from phrases. PhraseKeypressCount:{total_phrase_keypress_count} KeypressCount:{total_keyspresses}"
-        )
+    Raises:
+        Exceptions based on parsing logic errors.
+    """
+    keypresses = keypress_table.as_keypress_table(keypresses)
+    phrases = _segment_phrases(keypresses, num_workers=num_workers)
+    return phrases, SegmentationStats(len(keypresses), phrases)
 
-    if (
-        total_phrase_keypress_count
-        != total_gaze_keypress_count + total_machine_keypress_count
-    ):
-        raise Exception(
-            f"Missing Keypresses KeyPress:{total_phrase_keypress_count} Gaze:{total_gaze_keypress_count} Machine:{total_machine_keypress_count}"
-        )
 
-    if phrase_count != spoken_count + timeout_count + cancelled_count:
-        raise Exception(
-            f"Phrase mismatch, {phrase_count - (spoken_count + timeout_count + cancelled_count)} phrases missing."
-        )
+def visualize_keypresses(keypresses,
+                         visualize_path=None,
+                         prediction_path=None,
+                         phrases_path=None,
+                         tsv_path=None,
+                         start_time_epoch=None,
+                         num_workers=1):
+    """
+    Processes the keypresses object, breaking it down into Phrases.
 
-    if predictions_count != len(predictions):
-        raise Exception(
-            f"Predictions mismatch, {predictions_count} predicitons but found {len(predictions)}"
-        )
+    Only the requested outputs are built: e.g., the JSON encoding of the
+    phrases is skipped if phrases_path is None.
 
-    visualization_string += "\n"
-    visualization_string += f"🗪[Speak: {spoken_count}, AverageWPM: {average_wpms:5.1f}, TopWPM: {top_wpm:5.1f}]\n"
-    visualization_string += f"Total Keypresses: {total_keyspresses} Gaze: {total_gaze_keypress_count} Characters: {total_character_count}\n"
-    visualization_string += f"Total Phrases:{phrase_count} Spoken:{spoken_count}({spoken_count/phrase_count:0.2%}) Cancelled:{cancelled_count}({cancelled_count/phrase_count:0.2%}) Timeouts:{timeout_count}({timeout_count/phrase_count:0.2%})\n"
-    visualization_string += f"Total Predictions: {predictions_count} Average Length: {average_prediction_length:0.3f} Average Gain: {average_prediction_gain:0.3f}\n"
+    Args:
+        keypresses: A KeyPresses proto or a `KeypressTable`.
+        num_workers: Number of processes to segment the keypresses with. See
+            `_segment_phrases()`.
 
-    predictions_string = jsonpickle.encode(predictions)
-    phrases_string = jsonpickle.encode(phrases)
+    Raises:
+        Exceptions based on parsing logic errors.
+    """
+    if tsv_path and start_time_epoch is None:
+        raise ValueError(
+            "If tsv_path is specified, start_time_epoch is required, "
+            "but got None")
+    phrases, stats = segment_keypresses(keypresses, num_workers=num_workers)
 
     if visualize_path:
-        save_string_to_file(visualize_path, visualization_string)
+        visualization_pieces = [f"{phrase}\n" for phrase in phrases]
+        visualization_pieces.append("\n")
+        visualization_pieces.append(stats.summary_string())
+        save_string_to_file(visualize_path, "".join(visualization_pieces))
         print(f"Visualization saved to {visualize_path}")
 
     if prediction_path:
-        save_string_to_file(prediction_path, predictions_string)
+        predictions = [pred for phrase in phrases for pred in phrase.predictions]
+        save_string_to_file(prediction_path, jsonpickle.encode(predictions))
         print(f"Predictions saved to {prediction_path}")
 
     if phrases_path:
-        save_string_to_file(phrases_path, phrases_string)
+        save_string_to_file(phrases_path, jsonpickle.encode(phrases))
         print(f"Phrases saved to {phrases_path}")
 
     if tsv_path:
-        if start_time_epoch is None:
-            raise ValueError(
-                "If tsv_path is specified, start_time_epoch is required, "
-                "but got None")
         save_recon_strings_to_tsv_file(tsv_path, phrases, start_time_epoch)
         print(f"Reconstructed strings saved to {tsv_path}")
 
@@ -766,49 +1316,24 @@ def list_keypresses(keypresses, args):
     """
     Generates basic human readable data from keypresses.
     """
-    total_keys_pressed = len(keypresses.keyPresses)
-
-    current_key_index = 0
-    gaze_keypress_count = 0
+    keypresses = keypress_table.as_keypress_table(keypresses)
+    timings = KeypressTimings.from_keypresses(keypresses)
     keypresses_objects = []
 
-    while current_key_index < total_keys_pressed:
-        keypress = keypresses.keyPresses[current_key_index]
-
-        is_gaze_typed = False
-
-        is_gaze_typed, delta_timestamp = is_key_gaze_initiated(
-            keypresses, current_key_index, total_keys_pressed
-        )
-
-        is_next_gaze_typed, _ = is_key_gaze_initiated(
-            keypresses, current_key_index + 1, total_keys_pressed
-        )
-
-        if is_gaze_typed:
-            gaze_keypress_count += 1
-
-        is_long_pause = False
-        if delta_timestamp > LONG_DELTA_TIME:
-            is_long_pause = True
-
+    for current_key_index, key in enumerate(keypresses.get_keys()):
         keypresses_objects.append(
             {
                 "Index": current_key_index,
-                "Keypress": keypress.KeyPress,
-                "Timestamp": datetime_from_protobuf_timestamp(
-                    keypress.Timestamp
-                ).isoformat(),
-                "Timedelta": delta_timestamp.total_seconds(),
-                "Gaze": is_gaze_typed,
-                "IsLongPause": is_long_pause,
-                "IsCharacter": is_character(keypress.KeyPress),
-                "IsNextGazeTyped": not is_next_gaze_typed
+                "Keypress": key,
+                "Timestamp": timings.datetime_at(current_key_index).isoformat(),
+                "Timedelta": timings.delta_seconds(current_key_index),
+                "Gaze": timings.is_gaze_initiated(current_key_index),
+                "IsLongPause": timings.is_long_pause(current_key_index),
+                "IsCharacter": is_character(key),
+                "IsNextGazeTyped": not timings.is_gaze_initiated(current_key_index + 1)
             }
         )
 
-        current_key_index += 1
-
     keypresses_string = jsonpickle.encode(keypresses_objects)
 
     if args.stream_path:
@@ -876,6 +1401,11 @@ def is_character(keypress):
     return len(keypress) == 1
 
 
+def _get_key(keypress):
+    """Gets the key string of a KeyPress proto or a key string."""
+    return keypress.KeyPress if hasattr(keypress, "KeyPress") else keypress
+
+
 def output_for_keypress(keypress, shift_on):
     """Generates the matching string output for a given keypress.
 
@@ -898,6 +1428,12 @@ def output_for_keypress(keypress, shift_on):
     return "👽"
 
 
+def _datetime_from_nanos(timestamp_ns):
+    """Same as `datetime_from_protobuf_timestamp()`, given nanoseconds."""
+    seconds, nanos = divmod(timestamp_ns, _NANOS_PER_SECOND)
+    return datetime.datetime.fromtimestamp(seconds + nanos / 1e9)
+
+
 def datetime_from_protobuf_timestamp(protobuf_timestamp):
     """Converts a protobuf_timestamp into a standard python datetime object.
 
@@ -929,12 +1465,30 @@ def load_keypresses_from_directory(keypress_directorypath):
         merged_keypresses.keyPresses.extend(keypresses.keyPresses)
 
     merged_keypresses.keyPresses.sort(
-        key=lambda x: datetime_from_protobuf_timestamp(x.Timestamp)
+        key=lambda x: (x.Timestamp.seconds, x.Timestamp.nanos)
     )
 
     return merged_keypresses
 
 
+def load_keypress_table_from_directory(keypress_directorypath):
+    """Loads multiple keypress protobuffers into a `KeypressTable`.
+
+    Same as `load_keypresses_from_directory()`, but without holding the
+    merged protos in memory.
+
+    Returns:
+        A `KeypressTable` sorted by timestamp
+    """
+    files = glob.glob(os.path.join(keypress_directorypath, "*." + "protobuf"))
+    tables = [
+        keypress_table.KeypressTable.from_keypresses(
+            load_keypresses_from_protobuf_file(filename))
+        for filename in sorted(files)
+    ]
+    return keypress_table.KeypressTable.concatenate(tables).sorted_by_time()
+
+
 def load_keypresses_from_protobuf_file(keypress_filepath):
     """Loads keypress protobuffer from keypress_filepath.
 
@@ -959,15 +1513,7 @@ def load_keypresses_from_tsv_file(tsv_filepath):
     Returns:
       A list of (timestamp_s, key_content) tuples.
     """
-    timestamps_s = []
-    key_contents = []
-    with open(tsv_filepath, "rt") as f:
-        for t_begin, t_end, tier, content in csv.reader(f, delimiter="\t"):
-            if tier != tsv_data.KEYPRESS_TIER:
-                continue
-            timestamps_s.append(float(t_begin))
-            key_contents.append(content)
-    return list(zip(timestamps_s, key_contents))
+    return keypress_table.KeypressTable.from_tsv_file(tsv_filepath).to_tuples()
 
 
 def check_keypresses(ref_keypresses, proc_keypresses):
@@ -976,7 +1522,8 @@ def check_keypresses(ref_keypresses, proc_keypresses):
     Detect keypresses that are missing and return them (if any).
 
     Args:
-      ref_keypresses: A list of (timestamp_s, content) tuples.
+      ref_keypresses: A list of (timestamp_s, content) tuples, or a
+        `KeypressTable`.
       proc_keypresses: Same format as ref_keypresses.
 
     Returns:
@@ -990,9 +1537,10 @@ def check_keypresses(ref_keypresses, proc_keypresses):
       ValueError, if the first entry in proc_keypresses cannot be found in
         ref_keypresses.
     """
+    ref_keypresses = _as_keypress_tuples(ref_keypresses)
+    proc_keypresses = _as_keypress_tuples(proc_keypresses)
     proc_extra_keypresses = []
     proc_missing_keypresses = []
-    proc_ts = [item[0] for item in proc_keypresses]
     # NOTE: Special case: in a small number of sessions, the timestamp of
     # the first keypress is negative, which becomes timestamp == 0.0 after
     # ELAN and postprocessing.
@@ -1008,7 +1556,7 @@ def check_keypresses(ref_keypresses, proc_keypresses):
         for i, ref_keypress in enumerate(ref_keypresses):
             if (first_proc_key[0] == ref_keypress[0] and
                 (first_proc_key[1] == ref_keypress[1] or
-                first_proc_key[1] == elan_process_curated.REDACTED_KEY)):
+                first_proc_key[1] == keypress_table.REDACTED_KEY)):
                 ref_start_idx = i
                 break
         if ref_start_idx is None:
@@ -1022,20 +1570,29 @@ def check_keypresses(ref_keypresses, proc_keypresses):
     ref_keypresses = ref_keypresses[ref_start_idx:]
     proc_idx = 0
     # Detect any proc keypresses that are missing from ref keypress.
-    # I.e., extraneous keypresses in proc that somehow got added.
+    # I.e., extraneous keypresses in proc that somehow got added. Redacted
+    # keypresses only need to match the timestamp of a ref keypress.
+    ref_keypress_set = set(ref_keypresses)
+    ref_timestamp_set = set(timestamp for timestamp, _ in ref_keypresses)
     for i, proc_keypress in enumerate(proc_keypresses):
-        if not keypress_in_keypresses(proc_keypress, ref_keypresses):
+        if proc_keypress[1] == keypress_table.REDACTED_KEY:
+            is_in_ref = proc_keypress[0] in ref_timestamp_set
+        else:
+            is_in_ref = proc_keypress in ref_keypress_set
+        if not is_in_ref:
             proc_extra_keypresses.append((
                 i, proc_keypress[0], proc_keypress[1]))
-    for extra_index, _, _ in reversed(proc_extra_keypresses):
-        del proc_keypresses[extra_index]
+    extra_indices = set(index for index, _, _ in proc_extra_keypresses)
+    proc_keypresses = [
+        proc_keypress for i, proc_keypress in enumerate(proc_keypresses)
+        if i not in extra_indices]
     # Detect missing keypresses in proc_keypresses.
     for i, ref_keypress in enumerate(ref_keypresses):
         if (proc_idx < len(proc_keypresses) and
             ref_keypress == proc_keypresses[proc_idx]):
             proc_idx += 1
         elif (proc_idx < len(proc_keypresses) and
-              proc_keypresses[proc_idx][1] == elan_process_curated.REDACTED_KEY and
+              proc_keypresses[proc_idx][1] == keypress_table.REDACTED_KEY and
               proc_keypresses[proc_idx][0] == ref_keypress[0]):
             proc_idx += 1
         else:
@@ -1044,12 +1601,11 @@ def check_keypresses(ref_keypresses, proc_keypresses):
     return proc_extra_keypresses, proc_missing_keypresses
 
 
-def keypress_in_keypresses(keypress, keypresses):
-    """Check whether keypress is in keypresses, taking into account redaction."""
-    if keypress[1] == elan_process_curated.REDACTED_KEY:
-        timestamps = [item[0] for item in keypresses]
-        return keypress[0] in timestamps
-    return keypress in keypresses
+def _as_keypress_tuples(keypresses):
+    """Copies keypresses to a list of (timestamp_s, content) tuples."""
+    if isinstance(keypresses, keypress_table.KeypressTable):
+        return keypresses.to_tuples()
+    return list(keypresses)
 
 
 def write_extra_and_missing_keypresses_to_tsv(
@@ -1146,6 +1702,13 @@ def parse_arguments():
         help="Path to output json phrase results.",
         dest="phrases_path",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="Number of processes to segment the keypresses into phrases with.",
+        dest="num_workers",
+    )
 
     # Parse and print the results
     args = parser.parse_args()
@@ -1180,6 +1743,7 @@ if __name__ == "__main__":
         KEYPRESSES,
         visualize_path=parsed_args.visualize_path,
         prediction_path=parsed_args.prediction_path,
-        phrases_path=parsed_args.phrases_path)
+        phrases_path=parsed_args.phrases_path,
+        num_workers=parsed_args.num_workers)
 
     print("Processing Complete")
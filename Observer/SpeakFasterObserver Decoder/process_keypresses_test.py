@@ -1,12 +1,16 @@
 """Unit tests for the process_keypresses module."""
 import csv
 from datetime import datetime
+import json
 import os
 import tempfile
 import unittest
+from unittest import mock
 
 from google import protobuf
+import jsonpickle
 
+import keypress_table
 import keypresses_pb2
 import process_keypresses
 
@@ -49,6 +53,59 @@ def create_prediction(chars, timestamps_millis=1):
       0, len(chars))
 
 
+class KeypressTimingsTest(unittest.TestCase):
+  """Unit tests for the KeypressTimings class."""
+
+  def testMasksAndDeltas(self):
+    keypresses = create_keypresses(
+        ["a", "b", "c", "d", "e"], timestamps_millis=[0, 500, 510, 520, 100520])
+    timings = process_keypresses.KeypressTimings.from_keypresses(keypresses)
+    self.assertEqual(len(timings), 5)
+    self.assertEqual(timings.timestamps_ns.tolist(),
+                     [0, 500000000, 510000000, 520000000, 100520000000])
+    self.assertEqual(timings.deltas_ns.tolist(),
+                     [0, 500000000, 10000000, 10000000, 100000000000])
+    self.assertEqual(timings.gaze_initiated.tolist(),
+                     [True, True, False, False, True])
+    self.assertEqual(timings.long_pause.tolist(),
+                     [False, False, False, False, True])
+    self.assertEqual(timings.delta_seconds(1), 0.5)
+    self.assertTrue(timings.is_long_pause(4))
+
+  def testAgreesWithIsKeyGazeInitiated(self):
+    keypresses = create_keypresses(
+        ["a", "b", "c", "d"], timestamps_millis=[0, 299, 600, 601])
+    timings = process_keypresses.KeypressTimings.from_keypresses(keypresses)
+    for i in range(-1, 6):
+      is_gaze_initiated, delta = process_keypresses.is_key_gaze_initiated(
+          keypresses, i, 4)
+      self.assertEqual(timings.is_gaze_initiated(i), is_gaze_initiated)
+      self.assertEqual(timings.delta_seconds(i), delta.total_seconds())
+
+  def testNextGazeInitiatedIndex(self):
+    keypresses = create_keypresses(
+        ["a", "b", "c", "d", "e"], timestamps_millis=[0, 1, 2, 1000, 1001])
+    timings = process_keypresses.KeypressTimings.from_keypresses(keypresses)
+    self.assertEqual(
+        [timings.next_gaze_initiated_index(i) for i in range(5)],
+        [3, 3, 3, 5, 5])
+
+  def testDatetimeAt(self):
+    keypresses = create_keypresses(["a", "b"], timestamps_millis=[0, 1234])
+    timings = process_keypresses.KeypressTimings.from_keypresses(keypresses)
+    self.assertEqual(
+        timings.datetime_at(1),
+        process_keypresses.datetime_from_protobuf_timestamp(
+            keypresses.keyPresses[1].Timestamp))
+
+  def testEmpty(self):
+    timings = process_keypresses.KeypressTimings.from_keypresses(
+        keypresses_pb2.KeyPresses())
+    self.assertEqual(len(timings), 0)
+    self.assertTrue(timings.is_gaze_initiated(0))
+    self.assertFalse(timings.is_long_pause(0))
+
+
 class PredictionTest(unittest.TestCase):
   """Unit tests for the Prediction class."""
 
@@ -67,6 +124,189 @@ class PredictionTest(unittest.TestCase):
     self.assertEqual(prediction.prediction_string, "gg")
     self.assertEqual(prediction.end_index,  5)
 
+  def testAcceptsKeypressTable(self):
+    keypresses = create_keypresses(
+        ["e", "g", "g", "s"], timestamps_millis=[0, 1, 2, 5000])
+    prediction = process_keypresses.Prediction(
+        keypress_table.KeypressTable.from_keypresses(keypresses), 0, 4)
+    self.assertEqual(prediction.prediction_string, "egg")
+    self.assertEqual(prediction.end_index, 2)
+
+
+class PhraseSegmenterTest(unittest.TestCase):
+  """Unit tests for the PhraseSegmenter class."""
+
+  def _push_all(self, segmenter, keys, timestamps_millis):
+    phrases_by_push = []
+    for key, timestamp_millis in zip(keys, timestamps_millis):
+      phrases_by_push.append(segmenter.push(key, timestamp_millis * 1000000))
+    return phrases_by_push
+
+  def testEmitsSpokenPhraseBeforeEndOfStream(self):
+    segmenter = process_keypresses.PhraseSegmenter()
+    phrases_by_push = self._push_all(
+        segmenter,
+        ["h", "i", "LControlKey", "W", "n", "o", "LControlKey", "W"],
+        [0, 1000, 2000, 2100, 4000, 5000, 6000, 6100])
+    # The first phrase ends once the lookahead after Ctrl+W is available.
+    self.assertEqual([len(phrases) for phrases in phrases_by_push],
+                     [0, 0, 0, 0, 0, 1, 0, 0])
+    first_phrase = phrases_by_push[5][0]
+    self.assertTrue(first_phrase.was_spoken)
+    self.assertEqual(first_phrase.recon_string, "hi")
+    self.assertEqual((first_phrase.start_index, first_phrase.end_index), (0, 3))
+    phrases = segmenter.finish()
+    self.assertEqual(len(phrases), 1)
+    self.assertTrue(phrases[0].was_spoken)
+    self.assertEqual(phrases[0].recon_string, "no")
+    self.assertEqual(segmenter.num_keypresses, 8)
+
+  def testWaitsForEndOfPrediction(self):
+    segmenter = process_keypresses.PhraseSegmenter()
+    phrases_by_push = self._push_all(
+        segmenter,
+        ["h", "e", "l", "l", "o", "Space", "LControlKey", "W"],
+        [0, 1000, 1010, 1020, 1030, 1040, 3000, 3100])
+    self.assertEqual(sum(len(phrases) for phrases in phrases_by_push), 0)
+    phrases = segmenter.finish()
+    self.assertEqual(len(phrases), 1)
+    self.assertEqual(phrases[0].recon_string, "hello ")
+    self.assertEqual(len(phrases[0].predictions), 1)
+    self.assertEqual(phrases[0].predictions[0].prediction_string, "ello ")
+
+  def testSegmentsKeyCombinationsAndLongPauses(self):
+    keys = ["h", "LShiftKey", "i", "Space", "LControlKey", "LShiftKey",
+            "Left", "Back", "y", "o", "LControlKey", "W", "a", "b", "c"]
+    timestamps_millis = [0, 1000, 1010, 2000, 3000, 3010, 3020, 3030, 4000,
+                         5000, 6000, 6010, 7000, 8000, 300000]
+    keypresses = create_keypresses(keys, timestamps_millis=timestamps_millis)
+    segmenter = process_keypresses.PhraseSegmenter()
+    phrases = []
+    for keypress in keypresses.keyPresses:
+      phrases.extend(segmenter.push_keypress(keypress))
+    phrases.extend(segmenter.finish())
+    self.assertEqual(
+        [(phrase.start_index, phrase.end_index, phrase.recon_string)
+         for phrase in phrases],
+        [(0, 11, "yo"), (12, 13, "ab"), (14, 14, "c")])
+    self.assertTrue(phrases[0].was_spoken)
+    self.assertEqual(phrases[0].delword_count, 1)
+    self.assertTrue(phrases[1].was_timeout)
+    self.assertTrue(phrases[2].was_cancelled)
+
+  def testClassifiesKeypressesLikeKeypressTimings(self):
+    # Deltas just below, at and just above the gaze and long-pause thresholds.
+    timestamps_millis = [0, 299, 599, 900, 90900, 180901, 180902]
+    timings = process_keypresses.KeypressTimings(
+        [timestamp_millis * 1000000 for timestamp_millis in timestamps_millis])
+    segmenter = process_keypresses.PhraseSegmenter()
+    self._push_all(segmenter, ["a"] * len(timestamps_millis), timestamps_millis)
+    # pylint: disable=protected-access
+    self.assertEqual(segmenter._gaze_initiated, list(timings.gaze_initiated))
+    self.assertEqual(segmenter._long_pause, list(timings.long_pause))
+    self.assertEqual(segmenter._deltas_ns, list(timings.deltas_ns))
+    self.assertEqual(list(timings.gaze_initiated),
+                     [True, False, True, True, True, True, False])
+    self.assertEqual(list(timings.long_pause),
+                     [False, False, False, False, False, True, False])
+
+  def testSegmentPhrases_parallelMatchesSerial(self):
+    keys = ["h", "i", "LControlKey", "W", "n", "o", "LControlKey", "W", "a",
+            "b"]
+    timestamps_millis = [0, 1000, 2000, 400000, 401000, 402000, 403000,
+                         403400, 900000, 901000]
+    table = keypress_table.KeypressTable.from_keys(
+        [timestamp_millis * 1000000 for timestamp_millis in timestamps_millis],
+        keys)
+    # The pause before the first W is within a key combination and doesn't
+    # end a phrase, so the split at index 3 is not a phrase boundary.
+    self.assertEqual(
+        process_keypresses._find_split_indices(
+            process_keypresses.KeypressTimings(table.timestamps_ns), 3),
+        [3, 8])
+    serial_phrases = process_keypresses._segment_phrases(table)
+    parallel_phrases = process_keypresses._segment_phrases(
+        table, num_workers=3)
+    self.assertEqual(
+        [(phrase.start_index, phrase.end_index, phrase.recon_string)
+         for phrase in serial_phrases],
+        [(0, 3, "hi"), (4, 7, "no"), (8, 9, "ab")])
+    self.assertEqual(
+        [(phrase.start_index, phrase.end_index, phrase.recon_string,
+          phrase.was_spoken, phrase.was_timeout, phrase.was_cancelled)
+         for phrase in parallel_phrases],
+        [(phrase.start_index, phrase.end_index, phrase.recon_string,
+          phrase.was_spoken, phrase.was_timeout, phrase.was_cancelled)
+         for phrase in serial_phrases])
+
+  def testPushAfterFinish_raisesValueError(self):
+    segmenter = process_keypresses.PhraseSegmenter()
+    self.assertEqual(segmenter.finish(), [])
+    with self.assertRaisesRegex(ValueError, "after finish"):
+      segmenter.push("a", 0)
+
+
+class SegmentKeypressesTest(unittest.TestCase):
+  """Unit tests for segment_keypresses and visualize_keypresses."""
+
+  def setUp(self):
+    super(SegmentKeypressesTest, self).setUp()
+    self._temp_dir = tempfile.mkdtemp()
+    self._keypresses = create_keypresses(
+        ["h", "e", "l", "l", "o", "Space", "LControlKey", "W", "n", "o",
+         "LControlKey", "W"],
+        timestamps_millis=[0, 1000, 1010, 1020, 1030, 1040, 3000, 3100, 5000,
+                           6000, 7000, 7100])
+
+  def testSegmentKeypresses_returnsPhrasesAndStats(self):
+    phrases, stats = process_keypresses.segment_keypresses(self._keypresses)
+    self.assertEqual([phrase.recon_string for phrase in phrases],
+                     ["hello ", "no"])
+    self.assertEqual(stats.keypress_count, 12)
+    self.assertEqual(stats.phrase_count, 2)
+    self.assertEqual(stats.spoken_count, 2)
+    self.assertEqual(
+        stats.gaze_keypress_count + stats.machine_keypress_count, 12)
+    self.assertEqual(stats.prediction_count, 1)
+    self.assertEqual(stats.average_prediction_length, 5.0)
+    self.assertIn("Total Phrases:2 Spoken:2(100.00%)", stats.summary_string())
+
+  def testSegmentKeypresses_withoutPredictions(self):
+    _, stats = process_keypresses.segment_keypresses(
+        create_keypresses(["n", "o", "LControlKey", "W"],
+                          timestamps_millis=[0, 1000, 2000, 2100]))
+    self.assertEqual(stats.prediction_count, 0)
+    self.assertEqual(stats.average_prediction_length, 0.0)
+    self.assertEqual(stats.average_prediction_gain, 0.0)
+
+  def testVisualizeKeypresses_tsvOnly_skipsJsonEncoding(self):
+    tsv_path = os.path.join(self._temp_dir, "phrases.tsv")
+    with mock.patch.object(jsonpickle, "encode") as mock_encode:
+      process_keypresses.visualize_keypresses(
+          self._keypresses, tsv_path=tsv_path, start_time_epoch=0.0)
+    mock_encode.assert_not_called()
+    with open(tsv_path, "r") as f:
+      self.assertEqual(len(f.read().splitlines()), 3)
+
+  def testVisualizeKeypresses_writesRequestedOutputs(self):
+    visualize_path = os.path.join(self._temp_dir, "phrases.txt")
+    phrases_path = os.path.join(self._temp_dir, "phrases.json")
+    process_keypresses.visualize_keypresses(
+        self._keypresses, visualize_path=visualize_path,
+        phrases_path=phrases_path)
+    with open(visualize_path, "r") as f:
+      self.assertIn("Total Predictions: 1", f.read())
+    with open(phrases_path, "r") as f:
+      self.assertEqual(len(json.load(f)), 2)
+    self.assertEqual(sorted(os.listdir(self._temp_dir)),
+                     ["phrases.json", "phrases.txt"])
+
+  def testVisualizeKeypresses_tsvWithoutStartTime_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "start_time_epoch is required"):
+      process_keypresses.visualize_keypresses(
+          self._keypresses,
+          tsv_path=os.path.join(self._temp_dir, "phrases.tsv"))
+
 
 class PhraseTest(unittest.TestCase):
   """Unit tests for the Phrase class."""
@@ -274,6 +514,31 @@ class PhraseTest(unittest.TestCase):
     phrase.speak(gaze_keypress_count=2)
     phrase.finalize(keypresses, 5)
 
+  def testDelWord_inLongPhrase(self):
+    phrase = process_keypresses.Phrase(datetime.now(), 0)
+    for _ in range(2000):
+      for key in ("a", "b", "Space"):
+        phrase.add_non_control_key(get_keypress(key), is_gaze_initiated=True)
+    phrase.delete_word_backward()
+    phrase.delete_word_backward()
+    self.assertEqual(phrase.character_count, 3 * 1998)
+    self.assertEqual(phrase.recon_string, "ab " * 1998)
+    self.assertTrue(phrase.visualized_string.endswith("ab ↞↞"))
+
+  def testJsonEncoding_hasTextAsStrings(self):
+    phrase = process_keypresses.Phrase(datetime.now(), 0)
+    phrase.add_non_control_key(get_keypress("h"), is_gaze_initiated=True)
+    phrase.add_non_control_key(get_keypress("i"), is_gaze_initiated=True)
+    phrase.add_non_control_key(get_keypress("Back"), is_gaze_initiated=True)
+    encoded = json.loads(jsonpickle.encode(phrase))
+    self.assertEqual(encoded["visualized_string"], "hi🠠")
+    self.assertEqual(encoded["_recon_string"], "h")
+    self.assertNotIn("_recon_chars", encoded)
+    decoded = jsonpickle.decode(jsonpickle.encode(phrase))
+    self.assertEqual(decoded.recon_string, "h")
+    self.assertEqual(decoded.visualized_string, "hi🠠")
+    self.assertEqual(decoded.backspace_count, 1)
+
   def testCheckKeypresses_noMissingOrExtra(self):
     ref_keypresses = [(0.100, "b"), (1.100, "a"), (1.100, "r")]
     proc_keypresses = [(0.100, "b"), (1.100, "a"), (1.100, "r")]
@@ -441,6 +706,16 @@ class PhraseTest(unittest.TestCase):
     self.assertEqual(missing_keypresses,
                      [(0, 0.100, "b"), (1, 0.200, "l"), (3, 1.1, "r")])
 
+  def testCheckKeypresses_acceptsKeypressTables(self):
+    ref_keypresses = keypress_table.KeypressTable.from_keys(
+        [100000000, 1100000000, 1100000000], ["b", "a", "r"])
+    proc_keypresses = keypress_table.KeypressTable.from_keys(
+        [100000000, 1100000000], ["[RedactedKey]", "r"])
+    extra_keypresses, missing_keypresses = process_keypresses.check_keypresses(
+        ref_keypresses, proc_keypresses)
+    self.assertEqual(extra_keypresses, [])
+    self.assertEqual(missing_keypresses, [(1, 1.100, "a")])
+
   def testWriteExtraAndMissingKeypressesToTsv(self):
     extra_keypresses = [(10, 0.800, "z")]
     missing_keypresses = [(20, 10.800, "b"), (20, 10.800, "c"), (20, 10.801, "d")]
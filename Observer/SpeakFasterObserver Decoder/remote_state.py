@@ -0,0 +1,225 @@
+"""Snapshot of the state of the sessions of a container in S3.
+
+The snapshot records which sessions of a session container hold the remote
+objects that determine the remote state of a session (e.g., merged.tsv after
+preprocessing and curated_processed.tsv after postprocessing). Lookups are
+hash-based.
+
+Keys are listed by S3 in lexicographic order and new sessions (named after
+their start timestamps) are added at the end, so after an initial full
+listing, the snapshot is refreshed incrementally by listing only the keys
+after the last key seen (via `StartAfter`). Changes to the existing sessions
+are picked up by `refresh_session()`, by `record_objects()` for uploads made
+by this process, and by a full refresh once the snapshot is older than its
+TTL.
+
+The snapshot also counts the objects of each session, so that summary
+statistics don't need a listing per session.
+"""
+import collections
+import threading
+import time
+
+import file_naming
+
+# Time-to-live of a snapshot, in seconds. Beyond that, a full listing is done
+# on the next refresh.
+DEFAULT_TTL_S = 15 * 60
+
+# Names of the objects tracked in each session.
+TRACKED_FILENAMES = (
+    file_naming.MERGED_TSV_FILENAME,
+    file_naming.CURATED_PROCESSED_TSV_FILENAME,
+    file_naming.CLAIM_JSON_FILENAME,
+)
+
+# The raw data objects of a session are named after their timestamps and
+# start with a digit (e.g., 20211117T202235498Z-Keypresses.protobuf), while the
+# derived objects (e.g., merged.tsv) start with a letter. Listing after this
+# suffix skips all the raw data objects of a session.
+_AFTER_RAW_OBJECTS_SUFFIX = ":"
+
+
+def _split_key(object_key):
+  """Split an object key into the session prefix and the file name."""
+  index = object_key.rfind("/")
+  return object_key[:index + 1], object_key[index + 1:]
+
+
+def _is_raw_object_key(session_prefix, object_key):
+  """Whether an object of a session is a raw data object (see above)."""
+  return object_key[len(session_prefix):] < _AFTER_RAW_OBJECTS_SUFFIX
+
+
+class RemoteStateSnapshot(object):
+  """Snapshot of the tracked objects of the sessions in a container.
+
+  Instances are safe to use from multiple threads.
+  """
+
+  def __init__(self,
+               s3_client,
+               bucket_name,
+               container_prefix,
+               ttl_s=DEFAULT_TTL_S,
+               clock=time.time):
+    """Create an empty RemoteStateSnapshot.
+
+    Args:
+      s3_client: A boto3 S3 client.
+      bucket_name: Name of the S3 bucket.
+      container_prefix: The session container prefix, ending with "/".
+      ttl_s: Time-to-live of the snapshot, in seconds.
+      clock: Function that returns the current time in seconds.
+    """
+    self._s3_client = s3_client
+    self._bucket_name = bucket_name
+    self._container_prefix = container_prefix
+    self._ttl_s = ttl_s
+    self._clock = clock
+    self._lock = threading.Lock()
+    # Maps tracked file name to the set of session prefixes (including the
+    # container prefix) that have the object.
+    self._sessions_with_file = {
+        filename: set() for filename in TRACKED_FILENAMES}
+    # Maps object key to the object dict from the listing, for tracked
+    # objects only.
+    self._objects = dict()
+    # Map session prefix to the numbers of raw data objects and of derived
+    # objects (including those in subdirectories of the session).
+    self._num_raw_objects = collections.Counter()
+    self._num_derived_objects = collections.Counter()
+    self._last_key = None
+    self._full_refresh_time = None
+
+  @property
+  def container_prefix(self):
+    return self._container_prefix
+
+  @property
+  def is_loaded(self):
+    return self._full_refresh_time is not None
+
+  def is_expired(self):
+    return (self._full_refresh_time is None or
+            self._clock() - self._full_refresh_time > self._ttl_s)
+
+  def _list_objects(self, prefix, start_after=None):
+    paginator = self._s3_client.get_paginator("list_objects_v2")
+    kwargs = {"Bucket": self._bucket_name, "Prefix": prefix}
+    if start_after:
+      kwargs["StartAfter"] = start_after
+    for page in paginator.paginate(**kwargs):
+      for obj in page.get("Contents", []):
+        yield obj
+
+  def _get_session_prefix(self, object_key):
+    """Get the session prefix of an object, or None if not in a session."""
+    index = object_key.find("/", len(self._container_prefix))
+    return None if index == -1 else object_key[:index + 1]
+
+  def _count_object(self, object_key):
+    """Count a listed object. Must be called with the lock held."""
+    session_prefix = self._get_session_prefix(object_key)
+    if session_prefix is None:
+      return
+    if _is_raw_object_key(session_prefix, object_key):
+      self._num_raw_objects[session_prefix] += 1
+    else:
+      self._num_derived_objects[session_prefix] += 1
+
+  def _add_object(self, obj):
+    """Record an object. Must be called with the lock held."""
+    session_prefix, filename = _split_key(obj["Key"])
+    if filename not in self._sessions_with_file:
+      return
+    self._sessions_with_file[filename].add(session_prefix)
+    self._objects[obj["Key"]] = obj
+
+  def refresh(self, full=False):
+    """Refresh the snapshot.
+
+    Args:
+      full: Whether to list all the objects of the container. If False, a full
+        listing is done only if the snapshot hasn't been loaded or has expired;
+        otherwise only the keys after the last key seen are listed.
+
+    Returns:
+      The number of objects listed.
+    """
+    full = full or self.is_expired()
+    with self._lock:
+      start_after = None if full else self._last_key
+    refresh_time = self._clock()
+    objects = list(self._list_objects(self._container_prefix, start_after))
+    with self._lock:
+      if full:
+        for session_prefixes in self._sessions_with_file.values():
+          session_prefixes.clear()
+        self._objects.clear()
+        self._num_raw_objects.clear()
+        self._num_derived_objects.clear()
+        self._full_refresh_time = refresh_time
+      for obj in objects:
+        self._add_object(obj)
+        self._count_object(obj["Key"])
+        if self._last_key is None or obj["Key"] > self._last_key:
+          self._last_key = obj["Key"]
+    return len(objects)
+
+  def refresh_session(self, session_prefix):
+    """Refresh the tracked objects of a single session.
+
+    Lists only the derived objects of the session, which typically takes a
+    single request.
+
+    Args:
+      session_prefix: The session prefix, including the container prefix and
+        ending with "/".
+    """
+    objects = list(self._list_objects(
+        session_prefix,
+        start_after=session_prefix + _AFTER_RAW_OBJECTS_SUFFIX))
+    with self._lock:
+      for filename, session_prefixes in self._sessions_with_file.items():
+        session_prefixes.discard(session_prefix)
+        self._objects.pop(session_prefix + filename, None)
+      self._num_derived_objects[session_prefix] = len(objects)
+      for obj in objects:
+        if _split_key(obj["Key"])[0] == session_prefix:
+          self._add_object(obj)
+
+  def record_objects(self, session_prefix, filenames):
+    """Record objects that are known to exist, e.g., after uploading them."""
+    with self._lock:
+      for filename in filenames:
+        object_key = session_prefix + filename
+        if (filename in self._sessions_with_file and
+            object_key not in self._objects):
+          self._count_object(object_key)
+        self._add_object({"Key": object_key})
+
+  def has_object(self, session_prefix, filename):
+    """Whether a session has a tracked object, according to the snapshot."""
+    with self._lock:
+      return session_prefix in self._sessions_with_file[filename]
+
+  def get_object(self, session_prefix, filename):
+    """Get the listing entry of a tracked object, or None if nonexistent."""
+    with self._lock:
+      return self._objects.get(session_prefix + filename)
+
+  def get_num_objects(self, session_prefix):
+    """Get the number of objects of a session, according to the snapshot.
+
+    Derived objects uploaded by other processes are counted only after the
+    session or the whole snapshot is refreshed.
+    """
+    with self._lock:
+      return (self._num_raw_objects[session_prefix] +
+              self._num_derived_objects[session_prefix])
+
+  def get_sessions_with_object(self, filename):
+    """Get the set of session prefixes that have a tracked object."""
+    with self._lock:
+      return set(self._sessions_with_file[filename])
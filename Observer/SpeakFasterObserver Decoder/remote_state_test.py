@@ -0,0 +1,154 @@
+"""Unit tests for the remote_state module."""
+import tensorflow as tf
+
+import file_naming
+import remote_state
+
+_CONTAINER = "observer_data/SPO-2111/Surface/user01/"
+
+
+class FakeS3Client(object):
+  """A minimal in-memory stand-in for the listing API of the S3 client."""
+
+  def __init__(self, keys, page_size=3):
+    self.keys = set(keys)
+    # Maps key to ETag, for keys whose ETag isn't the default one.
+    self.etags = dict()
+    self.page_size = page_size
+    self.list_calls = []
+
+  def get_paginator(self, operation_name):
+    assert operation_name == "list_objects_v2"
+    client = self
+
+    class Paginator(object):
+
+      def paginate(self, Bucket, Prefix, StartAfter=None):
+        client.list_calls.append((Prefix, StartAfter))
+        keys = sorted(key for key in client.keys
+                      if key.startswith(Prefix) and
+                      (StartAfter is None or key > StartAfter))
+        for i in range(0, len(keys), client.page_size):
+          yield {"Contents": [
+              {"Key": key, "ETag": client.etags.get(key, "\"etag\"")}
+              for key in keys[i:i + client.page_size]]}
+
+    return Paginator()
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.time = 1000.0
+
+  def __call__(self):
+    return self.time
+
+
+def _session_keys(session_name, *filenames):
+  prefix = _CONTAINER + session_name + "/"
+  return [prefix + "20211117T202235498Z-Keypresses.protobuf",
+          prefix + "20211117T202236498Z-Screenshot.jpg"] + [
+              prefix + filename for filename in filenames]
+
+
+class RemoteStateSnapshotTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(RemoteStateSnapshotTest, self).setUp()
+    self._client = FakeS3Client(
+        _session_keys("session-1", file_naming.MERGED_TSV_FILENAME,
+                      file_naming.CURATED_PROCESSED_TSV_FILENAME) +
+        _session_keys("session-2", file_naming.MERGED_TSV_FILENAME) +
+        _session_keys("session-3"))
+    self._clock = FakeClock()
+    self._snapshot = remote_state.RemoteStateSnapshot(
+        self._client, "test-bucket", _CONTAINER, ttl_s=60, clock=self._clock)
+
+  def testFullRefresh(self):
+    self.assertFalse(self._snapshot.is_loaded)
+    self._snapshot.refresh()
+    self.assertTrue(self._snapshot.is_loaded)
+    self.assertEqual(
+        self._snapshot.get_sessions_with_object(
+            file_naming.MERGED_TSV_FILENAME),
+        {_CONTAINER + "session-1/", _CONTAINER + "session-2/"})
+    self.assertTrue(self._snapshot.has_object(
+        _CONTAINER + "session-1/", file_naming.CURATED_PROCESSED_TSV_FILENAME))
+    self.assertFalse(self._snapshot.has_object(
+        _CONTAINER + "session-3/", file_naming.MERGED_TSV_FILENAME))
+    self.assertEqual(
+        self._snapshot.get_object(
+            _CONTAINER + "session-2/", file_naming.MERGED_TSV_FILENAME)["Key"],
+        _CONTAINER + "session-2/merged.tsv")
+
+  def testIncrementalRefresh_listsOnlyNewKeys(self):
+    self._snapshot.refresh()
+    self._client.keys.update(
+        _session_keys("session-4", file_naming.MERGED_TSV_FILENAME))
+    num_listed = self._snapshot.refresh()
+    self.assertEqual(num_listed, 3)
+    self.assertEqual(self._client.list_calls[-1],
+                     (_CONTAINER, _CONTAINER + "session-3/"
+                      "20211117T202236498Z-Screenshot.jpg"))
+    self.assertTrue(self._snapshot.has_object(
+        _CONTAINER + "session-4/", file_naming.MERGED_TSV_FILENAME))
+    # Nothing new.
+    self.assertEqual(self._snapshot.refresh(), 0)
+
+  def testExpiredSnapshot_isFullyRefreshed(self):
+    self._snapshot.refresh()
+    self._client.keys.remove(_CONTAINER + "session-2/merged.tsv")
+    self._snapshot.refresh()
+    self.assertTrue(self._snapshot.has_object(
+        _CONTAINER + "session-2/", file_naming.MERGED_TSV_FILENAME))
+    self._clock.time += 61
+    self.assertTrue(self._snapshot.is_expired())
+    self._snapshot.refresh()
+    self.assertFalse(self._snapshot.has_object(
+        _CONTAINER + "session-2/", file_naming.MERGED_TSV_FILENAME))
+    self.assertEqual(self._client.list_calls[-1], (_CONTAINER, None))
+
+  def testRefreshSession_skipsRawObjectsAndReplacesState(self):
+    self._snapshot.refresh()
+    self._client.keys.add(_CONTAINER + "session-3/merged.tsv")
+    self._client.keys.remove(_CONTAINER + "session-1/curated_processed.tsv")
+    self._snapshot.refresh_session(_CONTAINER + "session-3/")
+    self._snapshot.refresh_session(_CONTAINER + "session-1/")
+    self.assertTrue(self._snapshot.has_object(
+        _CONTAINER + "session-3/", file_naming.MERGED_TSV_FILENAME))
+    self.assertFalse(self._snapshot.has_object(
+        _CONTAINER + "session-1/", file_naming.CURATED_PROCESSED_TSV_FILENAME))
+    self.assertEqual(self._client.list_calls[-1],
+                     (_CONTAINER + "session-1/", _CONTAINER + "session-1/:"))
+
+  def testRecordObjects(self):
+    self._snapshot.refresh()
+    self._snapshot.record_objects(
+        _CONTAINER + "session-3/", [file_naming.CLAIM_JSON_FILENAME])
+    self.assertTrue(self._snapshot.has_object(
+        _CONTAINER + "session-3/", file_naming.CLAIM_JSON_FILENAME))
+
+
+  def testGetNumObjects(self):
+    self._snapshot.refresh()
+    self.assertEqual(self._snapshot.get_num_objects(_CONTAINER + "session-1/"),
+                     4)
+    self.assertEqual(self._snapshot.get_num_objects(_CONTAINER + "session-9/"),
+                     0)
+    self._client.keys.update([_CONTAINER + "session-3/merged.tsv",
+                              _CONTAINER + "session-3/archive/index.json"])
+    self._snapshot.refresh_session(_CONTAINER + "session-3/")
+    self._snapshot.record_objects(
+        _CONTAINER + "session-3/", [file_naming.MERGED_TSV_FILENAME,
+                                    file_naming.CLAIM_JSON_FILENAME])
+    # The raw data objects are not listed again, and merged.tsv is counted
+    # once.
+    self.assertEqual(self._snapshot.get_num_objects(_CONTAINER + "session-3/"),
+                     5)
+    self._snapshot.refresh(full=True)
+    self.assertEqual(self._snapshot.get_num_objects(_CONTAINER + "session-3/"),
+                     4)
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,406 @@
+"""In-process S3 transfer engine.
+
+Provides `aws s3 sync`-like downloading and uploading of whole prefixes on top
+of an existing boto3 S3 client, with concurrent and multipart transfers,
+skipping of files that are already up to date, include/exclude filters and
+throughput reporting. Files packed into archives (see session_archive.py) can
+be downloaded from the archives with range reads.
+"""
+import concurrent.futures
+import fnmatch
+import hashlib
+import io
+import os
+import threading
+import time
+
+from boto3.s3 import transfer
+
+import session_archive
+
+# Filter types, with the same semantics as the --include and --exclude flags
+# of `aws s3 sync`.
+INCLUDE = "include"
+EXCLUDE = "exclude"
+
+# Number of files transferred concurrently.
+DEFAULT_MAX_WORKERS = 8
+# Number of concurrent part transfers for each multipart file transfer.
+DEFAULT_MAX_CONCURRENCY_PER_FILE = 4
+# Same as the defaults of the aws CLI and boto3, so that the ETags of objects
+# uploaded by them can be reproduced locally.
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+
+def matches_filters(relative_path, filters):
+  """Determine whether a path is selected by include/exclude filters.
+
+  The semantics are the same as those of `aws s3 sync`: all paths are selected
+  by default and filters that appear later take precedence over the ones that
+  appear earlier.
+
+  Args:
+    relative_path: Path relative to the root of the transfer, with "/" as the
+      separator.
+    filters: A sequence of (filter_type, pattern) tuples, where filter_type is
+      INCLUDE or EXCLUDE and pattern is a Unix shell-style wildcard. None
+      or empty means all paths are selected.
+
+  Returns:
+    A bool.
+  """
+  is_selected = True
+  for filter_type, pattern in (filters or ()):
+    if filter_type not in (INCLUDE, EXCLUDE):
+      raise ValueError("Invalid filter type: %s" % filter_type)
+    if fnmatch.fnmatchcase(relative_path, pattern):
+      is_selected = filter_type == INCLUDE
+  return is_selected
+
+
+def compute_etag(file_path,
+                 multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+                 multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE):
+  """Compute the S3 ETag that a local file would have once uploaded.
+
+  Args:
+    file_path: Path to the local file.
+    multipart_threshold: Files of at least this size are assumed to have been
+      uploaded in multiple parts.
+    multipart_chunksize: Part size assumed for multipart uploads.
+
+  Returns:
+    The ETag as a str, without quotes.
+  """
+  with open(file_path, "rb") as f:
+    if os.path.getsize(file_path) < multipart_threshold:
+      return hashlib.md5(f.read()).hexdigest()
+    part_digests = []
+    while True:
+      chunk = f.read(multipart_chunksize)
+      if not chunk:
+        break
+      part_digests.append(hashlib.md5(chunk).digest())
+  return "%s-%d" % (hashlib.md5(b"".join(part_digests)).hexdigest(),
+                    len(part_digests))
+
+
+class TransferStats(object):
+  """Thread-safe statistics of an ongoing or finished transfer."""
+
+  def __init__(self, total_files=0, total_bytes=0, skipped_files=0):
+    self._lock = threading.Lock()
+    self._start_time = time.time()
+    self._end_time = None
+    self.total_files = total_files
+    self.total_bytes = total_bytes
+    self.skipped_files = skipped_files
+    self.transferred_files = 0
+    self.transferred_bytes = 0
+    # Paths of the transferred files, relative to the local directory.
+    self.transferred_paths = []
+    # Whether the transfer was cancelled before all files were transferred.
+    self.cancelled = False
+
+  def add_bytes(self, num_bytes):
+    with self._lock:
+      self.transferred_bytes += num_bytes
+
+  def add_files(self, relative_paths):
+    with self._lock:
+      self.transferred_files += len(relative_paths)
+      self.transferred_paths.extend(relative_paths)
+
+  def finish(self):
+    self._end_time = time.time()
+
+  @property
+  def elapsed_s(self):
+    return (self._end_time or time.time()) - self._start_time
+
+  @property
+  def bytes_per_second(self):
+    elapsed_s = self.elapsed_s
+    return self.transferred_bytes / elapsed_s if elapsed_s > 0 else 0.0
+
+  def __str__(self):
+    return ("%d of %d file(s) (%.2f of %.2f MB) transferred, "
+            "%d file(s) up to date, in %.1f s (%.2f MB/s)%s" % (
+                self.transferred_files, self.total_files,
+                self.transferred_bytes / 1e6, self.total_bytes / 1e6,
+                self.skipped_files, self.elapsed_s,
+                self.bytes_per_second / 1e6,
+                " (cancelled)" if self.cancelled else ""))
+
+
+class S3TransferEngine(object):
+  """Transfers files between S3 prefixes and local directories."""
+
+  def __init__(self,
+               s3_client,
+               bucket_name,
+               max_workers=DEFAULT_MAX_WORKERS,
+               max_concurrency_per_file=DEFAULT_MAX_CONCURRENCY_PER_FILE,
+               multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+               multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE):
+    """Create an S3TransferEngine.
+
+    Args:
+      s3_client: A boto3 S3 client.
+      bucket_name: Name of the S3 bucket.
+      max_workers: Maximum number of files transferred concurrently.
+      max_concurrency_per_file: Maximum number of concurrent part transfers
+        for each file transferred in multiple parts.
+      multipart_threshold: Size threshold (in bytes) above which multipart
+        transfers are used.
+      multipart_chunksize: Part size (in bytes) of multipart transfers.
+    """
+    self._s3_client = s3_client
+    self._bucket_name = bucket_name
+    self._max_workers = max_workers
+    self._multipart_threshold = multipart_threshold
+    self._multipart_chunksize = multipart_chunksize
+    self._transfer_config = transfer.TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency_per_file)
+
+  def _list_objects(self, prefix):
+    paginator = self._s3_client.get_paginator("list_objects_v2")
+    objects = []
+    for page in paginator.paginate(Bucket=self._bucket_name, Prefix=prefix):
+      objects.extend(page.get("Contents", []))
+    return objects
+
+  def _is_up_to_date(self, file_path, size, etag):
+    """Whether a local file has the same size and ETag as a remote object."""
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) != size:
+      return False
+    return compute_etag(
+        file_path, self._multipart_threshold,
+        self._multipart_chunksize) == etag.strip('"')
+
+  def _run(self, tasks, stats, progress_callback, cancel_event):
+    """Run the transfer tasks concurrently.
+
+    Args:
+      tasks: A list of functions that take a boto3 Callback as the only
+        argument and return the paths of the files that they transferred,
+        relative to the local directory.
+      stats: The TransferStats to update.
+      progress_callback: Optional function to be called with stats as the
+        only argument whenever progress is made.
+      cancel_event: Optional threading.Event. Once it is set, the tasks that
+        haven't started yet are skipped.
+    """
+    def callback(num_bytes):
+      stats.add_bytes(num_bytes)
+      if progress_callback:
+        progress_callback(stats)
+
+    def run_task(task):
+      if cancel_event is not None and cancel_event.is_set():
+        stats.cancelled = True
+        return
+      stats.add_files(task(callback))
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=self._max_workers) as executor:
+      futures = [executor.submit(run_task, task) for task in tasks]
+      for future in concurrent.futures.as_completed(futures):
+        future.result()
+    stats.finish()
+    if progress_callback:
+      progress_callback(stats)
+
+  def download_prefix(self,
+                      prefix,
+                      local_dir,
+                      filters=None,
+                      progress_callback=None,
+                      cancel_event=None,
+                      archive_dir=None):
+    """Download the objects under a prefix to a local directory.
+
+    Objects whose local copies have the same size and ETag are skipped.
+
+    Args:
+      prefix: The S3 prefix. Object keys relative to this prefix determine
+        the local file paths.
+      local_dir: Path to the local destination directory.
+      filters: Optional include/exclude filters (see `matches_filters()`),
+        applied to the object keys relative to prefix.
+      progress_callback: Optional function to be called with a TransferStats
+        object whenever progress is made.
+      cancel_event: Optional threading.Event. Once it is set, files that
+        haven't started transferring are skipped and the returned stats are
+        marked as cancelled.
+      archive_dir: Optional name of the subdirectory of prefix that may hold
+        packed archives of the files (see session_archive.py). Its objects
+        are not downloaded as files. Instead, if it has an index, the packed
+        files are fetched from the archives with range reads, unless the
+        object of a file has changed since it was packed.
+
+    Returns:
+      A TransferStats object.
+    """
+    if prefix and not prefix.endswith("/"):
+      prefix += "/"
+    tasks = []
+    total_bytes = 0
+    skipped_files = 0
+    total_files = 0
+    archive_prefix = prefix + archive_dir + "/" if archive_dir else None
+    index = None
+    # Maps relative path to object, for the objects to download one by one.
+    objects = dict()
+    for obj in self._list_objects(prefix):
+      relative_path = obj["Key"][len(prefix):]
+      if not relative_path or relative_path.endswith("/"):
+        continue
+      if archive_prefix and obj["Key"].startswith(archive_prefix):
+        if obj["Key"] == archive_prefix + session_archive.INDEX_FILENAME:
+          index = self._read_archive_index(obj["Key"])
+        continue
+      objects[relative_path] = obj
+    if index is not None:
+      member_names = []
+      for name, member in sorted(index["members"].items()):
+        obj = objects.get(name)
+        if obj is not None and obj["ETag"].strip('"') != member["md5"]:
+          # The object has changed since it was packed.
+          continue
+        objects.pop(name, None)
+        if not matches_filters(name, filters):
+          continue
+        if session_archive.is_member_up_to_date(
+            os.path.join(local_dir, name), member):
+          skipped_files += 1
+          continue
+        total_bytes += member["size"]
+        member_names.append(name)
+      total_files += len(member_names)
+      for chunk_name, start, end, names in session_archive.plan_range_reads(
+          index, member_names):
+        tasks.append(self._make_archive_read_task(
+            archive_prefix + chunk_name, start, end, index, names, local_dir))
+    for relative_path, obj in objects.items():
+      if not matches_filters(relative_path, filters):
+        continue
+      file_path = os.path.join(local_dir, *relative_path.split("/"))
+      if self._is_up_to_date(file_path, obj["Size"], obj["ETag"]):
+        skipped_files += 1
+        continue
+      total_bytes += obj["Size"]
+      total_files += 1
+      tasks.append(self._make_download_task(
+          obj["Key"], file_path, relative_path))
+    stats = TransferStats(total_files=total_files,
+                          total_bytes=total_bytes,
+                          skipped_files=skipped_files)
+    self._run(tasks, stats, progress_callback, cancel_event)
+    print("Downloaded s3://%s/%s --> %s: %s" %
+          (self._bucket_name, prefix, local_dir, stats))
+    return stats
+
+  def _read_archive_index(self, object_key):
+    """Read an archive index, or return None if it is unusable."""
+    response = self._s3_client.get_object(
+        Bucket=self._bucket_name, Key=object_key)
+    try:
+      return session_archive.parse_index(response["Body"].read())
+    except ValueError as e:
+      print("Not using the archives of s3://%s/%s: %s" %
+            (self._bucket_name, object_key, e))
+      return None
+
+  def _make_archive_read_task(self, object_key, start, end, index,
+                              member_names, local_dir):
+    def read_archive(callback):
+      os.makedirs(local_dir, exist_ok=True)
+      if end >= start:
+        stream = self._s3_client.get_object(
+            Bucket=self._bucket_name, Key=object_key,
+            Range="bytes=%d-%d" % (start, end))["Body"]
+      else:
+        # Only empty members.
+        stream = io.BytesIO()
+      session_archive.extract_members(
+          stream, start, index, member_names, local_dir, callback=callback)
+      return member_names
+    return read_archive
+
+  def _make_download_task(self, object_key, file_path, relative_path):
+    def download(callback):
+      file_dir = os.path.dirname(file_path)
+      if not os.path.isdir(file_dir):
+        os.makedirs(file_dir, exist_ok=True)
+      self._s3_client.download_file(
+          self._bucket_name, object_key, file_path,
+          Config=self._transfer_config, Callback=callback)
+      return [relative_path]
+    return download
+
+  def upload_dir(self,
+                 local_dir,
+                 prefix,
+                 filters=None,
+                 progress_callback=None,
+                 cancel_event=None):
+    """Upload the files in a local directory (recursively) to a prefix.
+
+    Files whose remote copies have the same size and ETag are skipped.
+
+    Args:
+      local_dir: Path to the local source directory.
+      prefix: The destination S3 prefix.
+      filters: Optional include/exclude filters (see `matches_filters()`),
+        applied to the file paths relative to local_dir.
+      progress_callback: Optional function to be called with a TransferStats
+        object whenever progress is made.
+      cancel_event: Optional threading.Event. Once it is set, files that
+        haven't started transferring are skipped and the returned stats are
+        marked as cancelled.
+
+    Returns:
+      A TransferStats object.
+    """
+    if prefix and not prefix.endswith("/"):
+      prefix += "/"
+    remote_objects = {
+        obj["Key"]: obj for obj in self._list_objects(prefix)}
+    tasks = []
+    total_bytes = 0
+    skipped_files = 0
+    for dir_path, _, file_names in os.walk(local_dir):
+      for file_name in sorted(file_names):
+        file_path = os.path.join(dir_path, file_name)
+        relative_path = "/".join(
+            os.path.relpath(file_path, local_dir).split(os.sep))
+        if not matches_filters(relative_path, filters):
+          continue
+        object_key = prefix + relative_path
+        remote_object = remote_objects.get(object_key)
+        if remote_object and self._is_up_to_date(
+            file_path, remote_object["Size"], remote_object["ETag"]):
+          skipped_files += 1
+          continue
+        total_bytes += os.path.getsize(file_path)
+        tasks.append(self._make_upload_task(
+            file_path, object_key, relative_path))
+    stats = TransferStats(total_files=len(tasks),
+                          total_bytes=total_bytes,
+                          skipped_files=skipped_files)
+    self._run(tasks, stats, progress_callback, cancel_event)
+    print("Uploaded %s --> s3://%s/%s: %s" %
+          (local_dir, self._bucket_name, prefix, stats))
+    return stats
+
+  def _make_upload_task(self, file_path, object_key, relative_path):
+    def upload(callback):
+      self._s3_client.upload_file(
+          file_path, self._bucket_name, object_key,
+          Config=self._transfer_config, Callback=callback)
+      return [relative_path]
+    return upload
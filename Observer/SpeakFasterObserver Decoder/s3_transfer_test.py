@@ -0,0 +1,274 @@
+"""Unit tests for the s3_transfer module."""
+import hashlib
+import os
+import tempfile
+import threading
+
+import tensorflow as tf
+
+import local_object_store
+import s3_transfer
+import session_archive
+
+
+class FakeS3Client(object):
+  """A minimal in-memory stand-in for the boto3 S3 client."""
+
+  def __init__(self, objects=None, page_size=2):
+    self.objects = dict(objects or {})
+    self.page_size = page_size
+    self.num_downloads = 0
+    self.num_uploads = 0
+
+  def _etag(self, data):
+    return "\"%s\"" % hashlib.md5(data).hexdigest()
+
+  def get_paginator(self, operation_name):
+    assert operation_name == "list_objects_v2"
+    client = self
+
+    class Paginator(object):
+
+      def paginate(self, Bucket, Prefix):
+        keys = sorted(key for key in client.objects if key.startswith(Prefix))
+        for i in range(0, len(keys), client.page_size):
+          yield {"Contents": [
+              {"Key": key,
+               "Size": len(client.objects[key]),
+               "ETag": client._etag(client.objects[key])}
+              for key in keys[i:i + client.page_size]]}
+
+    return Paginator()
+
+  def download_file(self, Bucket, Key, Filename, Config=None, Callback=None):
+    data = self.objects[Key]
+    with open(Filename, "wb") as f:
+      f.write(data)
+    self.num_downloads += 1
+    if Callback:
+      Callback(len(data))
+
+  def upload_file(self, Filename, Bucket, Key, Config=None, Callback=None):
+    with open(Filename, "rb") as f:
+      self.objects[Key] = f.read()
+    self.num_uploads += 1
+    if Callback:
+      Callback(len(self.objects[Key]))
+
+
+class MatchesFiltersTest(tf.test.TestCase):
+
+  def testNoFilters_selectsEverything(self):
+    self.assertTrue(s3_transfer.matches_filters("a.jpg", None))
+    self.assertTrue(s3_transfer.matches_filters("a.jpg", []))
+
+  def testExcludeAllThenInclude(self):
+    filters = [(s3_transfer.EXCLUDE, "*"),
+               (s3_transfer.INCLUDE, "*.tsv"),
+               (s3_transfer.INCLUDE, "concatenated_audio.wav")]
+    self.assertTrue(s3_transfer.matches_filters("merged.tsv", filters))
+    self.assertTrue(
+        s3_transfer.matches_filters("concatenated_audio.wav", filters))
+    self.assertFalse(s3_transfer.matches_filters("a-Screenshot.jpg", filters))
+
+  def testLaterFiltersTakePrecedence(self):
+    filters = [(s3_transfer.INCLUDE, "*.tsv"),
+               (s3_transfer.EXCLUDE, "curated*")]
+    self.assertFalse(s3_transfer.matches_filters("curated.tsv", filters))
+    self.assertTrue(s3_transfer.matches_filters("merged.tsv", filters))
+
+  def testInvalidFilterType_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, r"Invalid filter type"):
+      s3_transfer.matches_filters("a.tsv", [("foo", "*")])
+
+
+class ComputeEtagTest(tf.test.TestCase):
+
+  def _write(self, data):
+    file_path = os.path.join(tempfile.mkdtemp(), "data.bin")
+    with open(file_path, "wb") as f:
+      f.write(data)
+    return file_path
+
+  def testSinglePart(self):
+    data = b"hello world"
+    self.assertEqual(s3_transfer.compute_etag(self._write(data)),
+                     hashlib.md5(data).hexdigest())
+
+  def testMultipart(self):
+    data = b"a" * 10 + b"b" * 10 + b"c" * 5
+    etag = s3_transfer.compute_etag(
+        self._write(data), multipart_threshold=10, multipart_chunksize=10)
+    expected = hashlib.md5(
+        hashlib.md5(b"a" * 10).digest() + hashlib.md5(b"b" * 10).digest() +
+        hashlib.md5(b"c" * 5).digest()).hexdigest() + "-3"
+    self.assertEqual(etag, expected)
+
+
+class S3TransferEngineTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(S3TransferEngineTest, self).setUp()
+    self._client = FakeS3Client({
+        "sessions/s1/a-Screenshot.jpg": b"jpeg data",
+        "sessions/s1/merged.tsv": b"tsv data",
+        "sessions/s1/sub/b.tsv": b"more tsv data",
+        "sessions/s2/merged.tsv": b"other session",
+    })
+    self._engine = s3_transfer.S3TransferEngine(
+        self._client, "test-bucket", max_workers=3)
+    self._local_dir = tempfile.mkdtemp()
+
+  def _read(self, *path_items):
+    with open(os.path.join(self._local_dir, *path_items), "rb") as f:
+      return f.read()
+
+  def testDownloadPrefix_downloadsAllObjects(self):
+    progress = []
+    stats = self._engine.download_prefix(
+        "sessions/s1/", self._local_dir,
+        progress_callback=lambda s: progress.append(s.transferred_bytes))
+    self.assertEqual(stats.total_files, 3)
+    self.assertEqual(stats.transferred_files, 3)
+    self.assertEqual(stats.transferred_bytes, 9 + 8 + 13)
+    self.assertEqual(stats.skipped_files, 0)
+    self.assertEqual(progress[-1], 30)
+    self.assertEqual(self._read("a-Screenshot.jpg"), b"jpeg data")
+    self.assertEqual(self._read("merged.tsv"), b"tsv data")
+    self.assertEqual(self._read("sub", "b.tsv"), b"more tsv data")
+    self.assertFalse(os.path.exists(os.path.join(self._local_dir, "s2")))
+
+  def testDownloadPrefix_skipsUpToDateFiles(self):
+    self._engine.download_prefix("sessions/s1", self._local_dir)
+    self._client.objects["sessions/s1/merged.tsv"] = b"changed tsv data"
+    stats = self._engine.download_prefix("sessions/s1", self._local_dir)
+    self.assertEqual(stats.transferred_files, 1)
+    self.assertEqual(stats.skipped_files, 2)
+    self.assertEqual(self._client.num_downloads, 4)
+    self.assertEqual(self._read("merged.tsv"), b"changed tsv data")
+
+  def testDownloadPrefix_withFilters(self):
+    stats = self._engine.download_prefix(
+        "sessions/s1/", self._local_dir,
+        filters=[(s3_transfer.EXCLUDE, "*"), (s3_transfer.INCLUDE, "*.tsv")])
+    self.assertEqual(stats.transferred_files, 2)
+    self.assertFalse(
+        os.path.exists(os.path.join(self._local_dir, "a-Screenshot.jpg")))
+
+  def testUploadDir_uploadsFilteredAndChangedFiles(self):
+    with open(os.path.join(self._local_dir, "merged.tsv"), "wb") as f:
+      f.write(b"tsv data")
+    with open(os.path.join(self._local_dir, "curated.tsv"), "wb") as f:
+      f.write(b"curated data")
+    with open(os.path.join(self._local_dir, "session.eaf"), "wb") as f:
+      f.write(b"eaf data")
+    stats = self._engine.upload_dir(
+        self._local_dir, "sessions/s1",
+        filters=[(s3_transfer.EXCLUDE, "*"), (s3_transfer.INCLUDE, "*.tsv")])
+    # merged.tsv is unchanged and session.eaf is excluded.
+    self.assertEqual(stats.transferred_files, 1)
+    self.assertEqual(stats.transferred_paths, ["curated.tsv"])
+    self.assertEqual(stats.skipped_files, 1)
+    self.assertEqual(self._client.objects["sessions/s1/curated.tsv"],
+                     b"curated data")
+    self.assertNotIn("sessions/s1/session.eaf", self._client.objects)
+
+  def testDownloadPrefix_cancelled(self):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    stats = self._engine.download_prefix(
+        "sessions/s1/", self._local_dir, cancel_event=cancel_event)
+    self.assertTrue(stats.cancelled)
+    self.assertEqual(stats.total_files, 3)
+    self.assertEqual(stats.transferred_files, 0)
+    self.assertEqual(self._client.num_downloads, 0)
+    self.assertIn("(cancelled)", str(stats))
+
+
+class DownloadPrefixFromArchivesTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(DownloadPrefixFromArchivesTest, self).setUp()
+    self._files = {
+        "20211117T202235498Z-KeyPresses.protobuf": b"keypresses",
+        "20211117T202235498Z-MicWaveIn.flac": b"flac data",
+        "20211117T202240000Z-Screenshot.jpg": b"jpeg data",
+        "20211117T202245000Z-Screenshot.jpg": b"",
+    }
+    session_dir = tempfile.mkdtemp()
+    for filename, data in self._files.items():
+      with open(os.path.join(session_dir, filename), "wb") as f:
+        f.write(data)
+    archive_dir = tempfile.mkdtemp()
+    session_archive.write_archives(session_dir, archive_dir)
+    self._client = local_object_store.LocalS3Client(tempfile.mkdtemp())
+    for filename, data in self._files.items():
+      self._client.put_object_data("test-bucket", "s1/" + filename, data)
+    self._client.put_object_data("test-bucket", "s1/merged.tsv", b"tsv data")
+    for filename in os.listdir(archive_dir):
+      with open(os.path.join(archive_dir, filename), "rb") as f:
+        self._client.put_object_data(
+            "test-bucket", "s1/archive/" + filename, f.read())
+    self._engine = s3_transfer.S3TransferEngine(
+        self._client, "test-bucket", max_workers=2)
+    self._local_dir = tempfile.mkdtemp()
+
+  def _read(self, filename):
+    with open(os.path.join(self._local_dir, filename), "rb") as f:
+      return f.read()
+
+  def testDownloadsPackedFilesWithRangeReads(self):
+    stats = self._engine.download_prefix(
+        "s1/", self._local_dir, archive_dir="archive")
+    self.assertEqual(stats.total_files, 5)
+    self.assertEqual(stats.transferred_files, 5)
+    self.assertCountEqual(stats.transferred_paths,
+                          list(self._files) + ["merged.tsv"])
+    for filename, data in self._files.items():
+      self.assertEqual(self._read(filename), data)
+    self.assertEqual(self._read("merged.tsv"), b"tsv data")
+    self.assertFalse(
+        os.path.exists(os.path.join(self._local_dir, "archive")))
+    # The index, one range read and merged.tsv.
+    self.assertEqual(self._client.call_counts["GetObject"], 3)
+
+  def testSkipsUpToDateFiles(self):
+    self._engine.download_prefix("s1/", self._local_dir, archive_dir="archive")
+    stats = self._engine.download_prefix(
+        "s1/", self._local_dir, archive_dir="archive")
+    self.assertEqual(stats.transferred_files, 0)
+    self.assertEqual(stats.skipped_files, 5)
+
+  def testAppliesFilters(self):
+    stats = self._engine.download_prefix(
+        "s1/", self._local_dir, archive_dir="archive",
+        filters=[(s3_transfer.EXCLUDE, "*.jpg")])
+    self.assertEqual(stats.transferred_files, 3)
+    self.assertFalse(os.path.exists(
+        os.path.join(self._local_dir, "20211117T202240000Z-Screenshot.jpg")))
+
+  def testChangedObject_isDownloadedInsteadOfPackedFile(self):
+    self._client.put_object_data(
+        "test-bucket", "s1/20211117T202235498Z-MicWaveIn.flac", b"new flac")
+    self._engine.download_prefix("s1/", self._local_dir, archive_dir="archive")
+    self.assertEqual(
+        self._read("20211117T202235498Z-MicWaveIn.flac"), b"new flac")
+
+  def testUnsupportedIndex_fallsBackToObjects(self):
+    self._client.put_object_data(
+        "test-bucket", "s1/archive/index.json", b'{"version": 999}')
+    stats = self._engine.download_prefix(
+        "s1/", self._local_dir, archive_dir="archive")
+    self.assertEqual(stats.transferred_files, 5)
+    for filename, data in self._files.items():
+      self.assertEqual(self._read(filename), data)
+
+  def testWithoutArchiveDir_downloadsArchivesAsFiles(self):
+    stats = self._engine.download_prefix("s1/", self._local_dir)
+    self.assertEqual(stats.transferred_files, 7)
+    self.assertTrue(os.path.isfile(
+        os.path.join(self._local_dir, "archive", "index.json")))
+
+
+if __name__ == "__main__":
+  tf.test.main()
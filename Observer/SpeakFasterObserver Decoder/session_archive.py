@@ -0,0 +1,219 @@
+"""Packed archives of the raw data files of a session.
+
+A long session consists of thousands of small raw data objects (e.g.,
+*-Screenshot.jpg and *-MicWaveIn.flac), and the per-object overhead of S3
+requests dominates the time it takes to download them one by one. The raw data
+files can additionally be packed into a few chunked tar files, written to the
+"archive/" subdirectory of the session along with an index:
+
+  archive/index.json
+  archive/raw-000.tar
+  archive/raw-001.tar
+  ...
+
+The index records the chunk, offset, size and MD5 digest of each member, so
+that the members can be fetched with a few range reads (adjacent members are
+coalesced into one read) and written to files while streaming, without parsing
+the tar headers. The tar files are uncompressed: the raw audio (FLAC) and
+screenshots (JPEG) are already compressed, and uncompressed members can be
+addressed by byte range. The tar files remain readable with standard tools.
+"""
+import hashlib
+import json
+import os
+import tarfile
+
+import session_manifest
+
+ARCHIVE_VERSION = 1
+
+INDEX_FILENAME = "index.json"
+_CHUNK_FILENAME_FORMAT = "raw-%03d.tar"
+
+# Size above which a new tar file is started.
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024
+# Members separated by at most this many bytes are fetched with a single range
+# read, as reading the gap costs less than the overhead of another request.
+DEFAULT_MAX_GAP_BYTES = 1024 * 1024
+_READ_BLOCK_BYTES = 1024 * 1024
+
+
+def compute_md5(file_path):
+  """Compute the MD5 hex digest of a file."""
+  md5 = hashlib.md5()
+  with open(file_path, "rb") as f:
+    for block in iter(lambda: f.read(_READ_BLOCK_BYTES), b""):
+      md5.update(block)
+  return md5.hexdigest()
+
+
+def write_archives(session_dir, output_dir, chunk_bytes=DEFAULT_CHUNK_BYTES):
+  """Pack the raw data files of a session directory into chunked tar files.
+
+  Args:
+    session_dir: Path to the local session directory.
+    output_dir: Path to the directory to write the tar files and the index
+      to. Will be created if it doesn't exist.
+    chunk_bytes: Size above which a new tar file is started.
+
+  Returns:
+    The index, as a dict. It is also written to INDEX_FILENAME in output_dir.
+
+  Raises:
+    ValueError: if session_dir contains no raw data files.
+  """
+  filenames = [
+      filename for filename in sorted(os.listdir(session_dir))
+      if (os.path.isfile(os.path.join(session_dir, filename)) and
+          session_manifest.get_raw_data_stream_name(filename))]
+  if not filenames:
+    raise ValueError("Found no raw data files in %s" % session_dir)
+  os.makedirs(output_dir, exist_ok=True)
+  chunks = []
+  members = dict()
+  tar = None
+  for filename in filenames:
+    if tar is None:
+      chunk_name = _CHUNK_FILENAME_FORMAT % len(chunks)
+      chunk_path = os.path.join(output_dir, chunk_name)
+      tar = tarfile.open(chunk_path, "w", format=tarfile.PAX_FORMAT)
+    file_path = os.path.join(session_dir, filename)
+    tar_info = tar.gettarinfo(file_path, arcname=filename)
+    with open(file_path, "rb") as f:
+      tar.addfile(tar_info, f)
+    # The member data is followed by padding to a multiple of the block size.
+    padded_size = -(-tar_info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+    members[filename] = {
+        "chunk": chunk_name,
+        "offset": tar.offset - padded_size,
+        "size": tar_info.size,
+        "md5": compute_md5(file_path),
+    }
+    if tar.offset >= chunk_bytes:
+      tar.close()
+      tar = None
+      chunks.append(
+          {"name": chunk_name, "size": os.path.getsize(chunk_path)})
+  if tar is not None:
+    tar.close()
+    chunks.append({"name": chunk_name, "size": os.path.getsize(chunk_path)})
+  index = {
+      "version": ARCHIVE_VERSION,
+      "chunks": chunks,
+      "members": members,
+  }
+  with open(os.path.join(output_dir, INDEX_FILENAME), "wt") as f:
+    json.dump(index, f)
+  print("Packed %d raw data files of %s into %d archive(s)" %
+        (len(filenames), session_dir, len(chunks)))
+  return index
+
+
+def parse_index(index_json):
+  """Parse the content of an index file.
+
+  Args:
+    index_json: Content of the index JSON file, as a str or bytes.
+
+  Returns:
+    The index as a dict.
+
+  Raises:
+    ValueError: if the archive version is unsupported or a member name is
+      not a plain file name.
+  """
+  index = json.loads(index_json)
+  if index.get("version") != ARCHIVE_VERSION:
+    raise ValueError(
+        "Unsupported archive version: %s" % index.get("version"))
+  for name in index["members"]:
+    # Members are written directly under the session directory.
+    if os.path.basename(name) != name or name in ("", ".", ".."):
+      raise ValueError("Invalid archive member name: %s" % name)
+  return index
+
+
+def is_member_up_to_date(file_path, member):
+  """Whether a local file has the same size and content as an index member."""
+  if not os.path.isfile(file_path) or os.path.getsize(file_path) != member["size"]:
+    return False
+  return compute_md5(file_path) == member["md5"]
+
+
+def plan_range_reads(index, member_names, max_gap_bytes=DEFAULT_MAX_GAP_BYTES):
+  """Plan the range reads that fetch a set of members.
+
+  Args:
+    index: The index, as returned by `parse_index()`.
+    member_names: Names of the members to fetch.
+    max_gap_bytes: Members separated by at most this many bytes in the same
+      tar file are fetched with a single read.
+
+  Returns:
+    A list of (chunk_name, start, end, member_names) tuples, where start and
+    end are the inclusive byte range of the read and member_names are the
+    names of the members within the range, in the order of their offsets.
+  """
+  members_by_chunk = dict()
+  for name in member_names:
+    member = index["members"][name]
+    members_by_chunk.setdefault(member["chunk"], []).append(name)
+  reads = []
+  for chunk_name in sorted(members_by_chunk):
+    names = sorted(members_by_chunk[chunk_name],
+                   key=lambda name: index["members"][name]["offset"])
+    read = None
+    for name in names:
+      member = index["members"][name]
+      member_end = member["offset"] + member["size"] - 1
+      if read is not None and member["offset"] - read[2] - 1 <= max_gap_bytes:
+        read[2] = max(read[2], member_end)
+        read[3].append(name)
+      else:
+        read = [chunk_name, member["offset"], member_end, [name]]
+        reads.append(read)
+  return [tuple(read) for read in reads]
+
+
+def extract_members(stream, start, index, member_names, local_dir,
+                    callback=None):
+  """Write members to files while reading a range of a tar file.
+
+  Args:
+    stream: File-like object of the range read, e.g., the "Body" of an S3
+      get_object response with a Range.
+    start: Offset of the range in the tar file.
+    index: The index, as returned by `parse_index()`.
+    member_names: Names of the members within the range, in the order of their
+      offsets, as returned by `plan_range_reads()`.
+    local_dir: Directory to write the member files to.
+    callback: Optional function called with the number of bytes of member
+      data written, as they are written.
+  """
+  position = start
+  for name in member_names:
+    member = index["members"][name]
+    _read_exactly(stream, member["offset"] - position)
+    file_path = os.path.join(local_dir, name)
+    tmp_path = file_path + ".tmp"
+    remaining = member["size"]
+    with open(tmp_path, "wb") as f:
+      while remaining:
+        block = _read_exactly(stream, min(remaining, _READ_BLOCK_BYTES))
+        f.write(block)
+        remaining -= len(block)
+        if callback:
+          callback(len(block))
+    os.replace(tmp_path, file_path)
+    position = member["offset"] + member["size"]
+
+
+def _read_exactly(stream, num_bytes):
+  data = []
+  while num_bytes > 0:
+    block = stream.read(num_bytes)
+    if not block:
+      raise ValueError("Unexpected end of archive data")
+    data.append(block)
+    num_bytes -= len(block)
+  return b"".join(data)
@@ -0,0 +1,121 @@
+"""Unit tests for the session_archive module."""
+import io
+import json
+import os
+import tarfile
+import tempfile
+
+import tensorflow as tf
+
+import session_archive
+
+
+class SessionArchiveTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(SessionArchiveTest, self).setUp()
+    self._session_dir = tempfile.mkdtemp()
+    self._files = {
+        "20211117T202235498Z-KeyPresses.protobuf": b"k" * 700,
+        "20211117T202235498Z-MicWaveIn.flac": b"f" * 1500,
+        "20211117T202240000Z-Screenshot.jpg": b"j" * 100,
+    }
+    for filename, data in self._files.items():
+      self._write(filename, data)
+    # Not a raw data file.
+    self._write("merged.tsv", b"tsv data")
+    self._output_dir = tempfile.mkdtemp()
+
+  def _write(self, filename, data):
+    with open(os.path.join(self._session_dir, filename), "wb") as f:
+      f.write(data)
+
+  def _read_range(self, chunk_name, start, end):
+    with open(os.path.join(self._output_dir, chunk_name), "rb") as f:
+      f.seek(start)
+      return io.BytesIO(f.read(end - start + 1))
+
+  def testWriteArchives_writesIndexAndTarFiles(self):
+    index = session_archive.write_archives(self._session_dir, self._output_dir)
+    self.assertEqual(sorted(index["members"]), sorted(self._files))
+    with open(os.path.join(self._output_dir, "index.json"), "rt") as f:
+      self.assertEqual(session_archive.parse_index(f.read()), index)
+    chunk_path = os.path.join(self._output_dir, "raw-000.tar")
+    with tarfile.open(chunk_path) as tar:
+      self.assertCountEqual(tar.getnames(), self._files)
+    with open(chunk_path, "rb") as f:
+      tar_data = f.read()
+    for filename, data in self._files.items():
+      member = index["members"][filename]
+      self.assertEqual(
+          tar_data[member["offset"]:member["offset"] + member["size"]], data)
+
+  def testWriteArchives_startsNewChunks(self):
+    index = session_archive.write_archives(
+        self._session_dir, self._output_dir, chunk_bytes=3000)
+    self.assertEqual([chunk["name"] for chunk in index["chunks"]],
+                     ["raw-000.tar", "raw-001.tar"])
+    self.assertEqual(
+        index["members"]["20211117T202240000Z-Screenshot.jpg"]["chunk"],
+        "raw-001.tar")
+
+  def testWriteArchives_noRawDataFiles_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "Found no raw data files"):
+      session_archive.write_archives(tempfile.mkdtemp(), self._output_dir)
+
+  def testPlanAndExtract_roundTrip(self):
+    index = session_archive.write_archives(self._session_dir, self._output_dir)
+    local_dir = tempfile.mkdtemp()
+    reads = session_archive.plan_range_reads(index, list(self._files))
+    # The members are adjacent, so they are fetched with a single read.
+    self.assertLen(reads, 1)
+    callback_bytes = []
+    for chunk_name, start, end, names in reads:
+      session_archive.extract_members(
+          self._read_range(chunk_name, start, end), start, index, names,
+          local_dir, callback=callback_bytes.append)
+    self.assertEqual(sum(callback_bytes), 700 + 1500 + 100)
+    for filename, data in self._files.items():
+      file_path = os.path.join(local_dir, filename)
+      with open(file_path, "rb") as f:
+        self.assertEqual(f.read(), data)
+      self.assertTrue(session_archive.is_member_up_to_date(
+          file_path, index["members"][filename]))
+
+  def testPlanRangeReads_splitsAtLargeGaps(self):
+    index = session_archive.write_archives(self._session_dir, self._output_dir)
+    reads = session_archive.plan_range_reads(
+        index, ["20211117T202235498Z-KeyPresses.protobuf",
+                "20211117T202240000Z-Screenshot.jpg"],
+        max_gap_bytes=1024)
+    self.assertLen(reads, 2)
+    reads = session_archive.plan_range_reads(
+        index, ["20211117T202235498Z-KeyPresses.protobuf",
+                "20211117T202240000Z-Screenshot.jpg"],
+        max_gap_bytes=8192)
+    self.assertLen(reads, 1)
+    self.assertEqual(reads[0][3], ["20211117T202235498Z-KeyPresses.protobuf",
+                                   "20211117T202240000Z-Screenshot.jpg"])
+
+  def testIsMemberUpToDate_changedFile(self):
+    index = session_archive.write_archives(self._session_dir, self._output_dir)
+    self._write("20211117T202240000Z-Screenshot.jpg", b"x" * 100)
+    self.assertFalse(session_archive.is_member_up_to_date(
+        os.path.join(self._session_dir, "20211117T202240000Z-Screenshot.jpg"),
+        index["members"]["20211117T202240000Z-Screenshot.jpg"]))
+
+  def testParseIndex_unsupportedVersion_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "Unsupported archive version"):
+      session_archive.parse_index(json.dumps({"version": 0, "members": {}}))
+
+  def testParseIndex_invalidMemberName_raisesValueError(self):
+    with self.assertRaisesRegex(ValueError, "Invalid archive member name"):
+      session_archive.parse_index(json.dumps({
+          "version": session_archive.ARCHIVE_VERSION,
+          "chunks": [],
+          "members": {"../merged.tsv": {}},
+      }))
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,84 @@
+"""Persistent local index of facts derived from remote data objects.
+
+The raw objects of an Observer session (e.g., *-Keypresses.protobuf and
+*-SessionEnd.bin) are immutable once uploaded. Facts that are expensive to
+derive from them (e.g., the number of keypresses, which requires downloading
+and parsing a protobuf) are stored in a SQLite database, keyed by the object
+key and the object's ETag, so that they need to be computed only once per
+version of each object.
+"""
+import json
+import sqlite3
+import threading
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS object_facts (
+  object_key TEXT PRIMARY KEY,
+  etag TEXT NOT NULL,
+  facts_json TEXT NOT NULL
+)
+"""
+
+
+class SessionIndex(object):
+  """A SQLite-backed index of per-object facts.
+
+  Instances are safe to use from multiple threads.
+  """
+
+  def __init__(self, db_path):
+    """Create or open a SessionIndex.
+
+    Args:
+      db_path: Path to the SQLite database file. Will be created if it doesn't
+        exist yet.
+    """
+    self._db_path = db_path
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(db_path, check_same_thread=False)
+    with self._lock:
+      self._connection.execute(_CREATE_TABLE_SQL)
+      self._connection.commit()
+
+  @property
+  def db_path(self):
+    return self._db_path
+
+  def get(self, object_key, etag):
+    """Get the facts recorded for an object.
+
+    Args:
+      object_key: Key of the object.
+      etag: The current ETag of the object.
+
+    Returns:
+      The JSON-deserialized facts if they have been recorded for the given
+      object key and ETag. None if no facts have been recorded, or if the
+      facts were recorded for a different ETag (i.e., the object changed).
+    """
+    with self._lock:
+      row = self._connection.execute(
+          "SELECT etag, facts_json FROM object_facts WHERE object_key = ?",
+          (object_key,)).fetchone()
+    if row is None or row[0] != etag:
+      return None
+    return json.loads(row[1])
+
+  def put(self, object_key, etag, facts):
+    """Record the facts for an object, replacing any existing record.
+
+    Args:
+      object_key: Key of the object.
+      etag: ETag of the object from which the facts are derived.
+      facts: The facts. Must be JSON-serializable.
+    """
+    facts_json = json.dumps(facts)
+    with self._lock:
+      self._connection.execute(
+          "INSERT OR REPLACE INTO object_facts (object_key, etag, facts_json) "
+          "VALUES (?, ?, ?)", (object_key, etag, facts_json))
+      self._connection.commit()
+
+  def close(self):
+    with self._lock:
+      self._connection.close()
@@ -0,0 +1,60 @@
+"""Unit tests for the session_index module."""
+import concurrent.futures
+import os
+import tempfile
+
+import tensorflow as tf
+
+import session_index
+
+
+class SessionIndexTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(SessionIndexTest, self).setUp()
+    self._db_path = os.path.join(tempfile.mkdtemp(), "index.sqlite3")
+    self._index = session_index.SessionIndex(self._db_path)
+
+  def tearDown(self):
+    self._index.close()
+    super(SessionIndexTest, self).tearDown()
+
+  def testGetNonexistentKey_returnsNone(self):
+    self.assertIsNone(self._index.get("foo/bar.bin", "\"etag1\""))
+
+  def testPutAndGet_sameEtag(self):
+    self._index.put("foo/bar.bin", "\"etag1\"", {"timezone": "US/Eastern"})
+    self.assertEqual(self._index.get("foo/bar.bin", "\"etag1\""),
+                     {"timezone": "US/Eastern"})
+
+  def testPutAndGet_differentEtagReturnsNone(self):
+    self._index.put("foo/bar.bin", "\"etag1\"", {"num_keypresses": 42})
+    self.assertIsNone(self._index.get("foo/bar.bin", "\"etag2\""))
+
+  def testPut_overwritesExistingRecord(self):
+    self._index.put("foo/bar.bin", "\"etag1\"", {"num_keypresses": 42})
+    self._index.put("foo/bar.bin", "\"etag2\"", {"num_keypresses": 43})
+    self.assertIsNone(self._index.get("foo/bar.bin", "\"etag1\""))
+    self.assertEqual(self._index.get("foo/bar.bin", "\"etag2\""),
+                     {"num_keypresses": 43})
+
+  def testRecordsArePersistedAcrossInstances(self):
+    self._index.put("foo/bar.bin", "\"etag1\"", {"num_keypresses": 42})
+    self._index.close()
+    self._index = session_index.SessionIndex(self._db_path)
+    self.assertEqual(self._index.get("foo/bar.bin", "\"etag1\""),
+                     {"num_keypresses": 42})
+
+  def testConcurrentPutAndGet(self):
+    def put_and_get(i):
+      key = "foo/%d.protobuf" % i
+      self._index.put(key, "\"etag\"", {"num_keypresses": i})
+      return self._index.get(key, "\"etag\"")["num_keypresses"]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+      results = list(executor.map(put_and_get, range(100)))
+    self.assertEqual(results, list(range(100)))
+
+
+if __name__ == "__main__":
+  tf.test.main()
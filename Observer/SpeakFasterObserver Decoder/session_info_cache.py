@@ -0,0 +1,95 @@
+"""Bounded in-memory cache of the info of remote sessions.
+
+Curators typically browse the session list in order, so the info of the
+sessions around the selected one (see DataManager.prefetch_session_info()) is
+fetched in the background and stored here. Selecting one of those sessions
+then takes no requests to S3.
+
+The least recently used entries are evicted once the cache is full. Entries
+expire after a TTL, so that changes made by other curators (e.g., claims) are
+eventually picked up.
+"""
+import collections
+import threading
+import time
+
+# Maximum number of sessions in the cache.
+DEFAULT_MAX_SIZE = 64
+
+# Info of a session.
+#   facts: The facts returned by DataManager._scan_session().
+#   claiming_username: The username of the curator who claimed the session, or
+#     None if the session is unclaimed.
+SessionInfo = collections.namedtuple(
+    "SessionInfo", ("facts", "claiming_username"))
+
+
+class SessionInfoCache(object):
+  """An LRU cache of SessionInfo, keyed by session prefix.
+
+  Instances are safe to use from multiple threads.
+  """
+
+  def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl_s=None, clock=time.time):
+    """Create an empty SessionInfoCache.
+
+    Args:
+      max_size: Maximum number of entries.
+      ttl_s: Time-to-live of the entries, in seconds. None for no expiration.
+      clock: Function that returns the current time in seconds.
+    """
+    if max_size < 1:
+      raise ValueError(
+          "max_size must be a positive integer, got %s" % max_size)
+    self._max_size = max_size
+    self._ttl_s = ttl_s
+    self._clock = clock
+    self._lock = threading.Lock()
+    # Maps session prefix to (time of put, SessionInfo), from the least to the
+    # most recently used.
+    self._entries = collections.OrderedDict()
+
+  def __len__(self):
+    with self._lock:
+      return len(self._entries)
+
+  def __contains__(self, session_prefix):
+    return self.get(session_prefix, touch=False) is not None
+
+  def get(self, session_prefix, touch=True):
+    """Get the cached info of a session.
+
+    Args:
+      session_prefix: The session prefix.
+      touch: Whether to mark the entry as the most recently used.
+
+    Returns:
+      The SessionInfo, or None if it is not cached or has expired.
+    """
+    with self._lock:
+      entry = self._entries.get(session_prefix)
+      if entry is None:
+        return None
+      put_time, session_info = entry
+      if self._ttl_s is not None and self._clock() - put_time > self._ttl_s:
+        del self._entries[session_prefix]
+        return None
+      if touch:
+        self._entries.move_to_end(session_prefix)
+      return session_info
+
+  def put(self, session_prefix, session_info):
+    """Cache the info of a session, evicting the least recently used one."""
+    with self._lock:
+      self._entries[session_prefix] = (self._clock(), session_info)
+      self._entries.move_to_end(session_prefix)
+      while len(self._entries) > self._max_size:
+        self._entries.popitem(last=False)
+
+  def invalidate(self, session_prefix=None):
+    """Remove the info of a session, or of all sessions if None."""
+    with self._lock:
+      if session_prefix is None:
+        self._entries.clear()
+      else:
+        self._entries.pop(session_prefix, None)
@@ -0,0 +1,76 @@
+"""Unit tests for the session_info_cache module."""
+import tensorflow as tf
+
+import session_info_cache
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.time = 1000.0
+
+  def __call__(self):
+    return self.time
+
+
+def _session_info(num_keypresses):
+  return session_info_cache.SessionInfo(
+      {"num_keypresses": num_keypresses}, None)
+
+
+class SessionInfoCacheTest(tf.test.TestCase):
+
+  def testGetAndPut(self):
+    cache = session_info_cache.SessionInfoCache()
+    self.assertIsNone(cache.get("c/s1/"))
+    cache.put("c/s1/", _session_info(10))
+    self.assertEqual(cache.get("c/s1/").facts["num_keypresses"], 10)
+    self.assertIn("c/s1/", cache)
+    self.assertNotIn("c/s2/", cache)
+
+  def testEvictsLeastRecentlyUsed(self):
+    cache = session_info_cache.SessionInfoCache(max_size=2)
+    cache.put("c/s1/", _session_info(1))
+    cache.put("c/s2/", _session_info(2))
+    cache.get("c/s1/")
+    cache.put("c/s3/", _session_info(3))
+    self.assertLen(cache, 2)
+    self.assertIsNotNone(cache.get("c/s1/"))
+    self.assertIsNone(cache.get("c/s2/"))
+    self.assertIsNotNone(cache.get("c/s3/"))
+
+  def testContains_doesNotTouch(self):
+    cache = session_info_cache.SessionInfoCache(max_size=2)
+    cache.put("c/s1/", _session_info(1))
+    cache.put("c/s2/", _session_info(2))
+    self.assertIn("c/s1/", cache)
+    cache.put("c/s3/", _session_info(3))
+    self.assertNotIn("c/s1/", cache)
+
+  def testEntriesExpire(self):
+    clock = FakeClock()
+    cache = session_info_cache.SessionInfoCache(ttl_s=60, clock=clock)
+    cache.put("c/s1/", _session_info(1))
+    clock.time += 60
+    self.assertIsNotNone(cache.get("c/s1/"))
+    clock.time += 1
+    self.assertIsNone(cache.get("c/s1/"))
+    self.assertLen(cache, 0)
+
+  def testInvalidate(self):
+    cache = session_info_cache.SessionInfoCache()
+    cache.put("c/s1/", _session_info(1))
+    cache.put("c/s2/", _session_info(2))
+    cache.invalidate("c/s1/")
+    self.assertNotIn("c/s1/", cache)
+    self.assertIn("c/s2/", cache)
+    cache.invalidate()
+    self.assertLen(cache, 0)
+
+  def testInvalidMaxSize_raisesValueError(self):
+    with self.assertRaises(ValueError):
+      session_info_cache.SessionInfoCache(max_size=0)
+
+
+if __name__ == "__main__":
+  tf.test.main()
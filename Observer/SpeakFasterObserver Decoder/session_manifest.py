@@ -0,0 +1,135 @@
+"""Compact per-session manifest of the raw Observer data.
+
+The manifest is a small JSON file that summarizes the raw data files of a
+session (counts, first and last timestamps, time zone and per-stream byte
+totals). It is written to the session directory during preprocessing and
+uploaded along with the preprocessing results, so that the data manager can
+learn the basic facts about a session from a single small object instead of
+downloading and parsing all the raw data objects.
+"""
+import json
+import os
+
+import pytz
+
+import file_naming
+import keypresses_pb2
+import metadata_pb2
+
+MANIFEST_VERSION = 1
+
+# Files with these extensions are derived (e.g., from preprocessing) rather
+# than raw Observer data and are excluded from the manifest.
+_DERIVED_FILE_EXTENSIONS = (".tsv", ".wav", ".mp4", ".json")
+
+
+def get_raw_data_stream_name(filename):
+  """Get the data stream name of a raw data file, or None if not raw data."""
+  if filename.endswith(_DERIVED_FILE_EXTENSIONS):
+    return None
+  try:
+    data_stream_name = file_naming.get_data_stream_name(filename)
+    file_naming.parse_timestamp_from_filename(filename)
+  except ValueError:
+    return None
+  return data_stream_name
+
+
+def compute_manifest(session_dir):
+  """Compute the manifest of a local session directory.
+
+  Args:
+    session_dir: Path to the local directory that contains the raw data files
+      of the session.
+
+  Returns:
+    The manifest as a JSON-serializable dict.
+
+  Raises:
+    ValueError: if session_dir contains no raw data files.
+  """
+  timezone = None
+  is_session_complete = False
+  first_timestamp = None
+  last_timestamp = None
+  num_keypresses = 0
+  stream_file_counts = dict()
+  stream_bytes = dict()
+  for filename in sorted(os.listdir(session_dir)):
+    file_path = os.path.join(session_dir, filename)
+    if not os.path.isfile(file_path):
+      continue
+    data_stream_name = get_raw_data_stream_name(filename)
+    if data_stream_name is None:
+      continue
+    stream_file_counts[data_stream_name] = (
+        stream_file_counts.get(data_stream_name, 0) + 1)
+    stream_bytes[data_stream_name] = (
+        stream_bytes.get(data_stream_name, 0) + os.path.getsize(file_path))
+    dt, is_utc = file_naming.parse_timestamp_from_filename(filename)
+    if not is_utc:
+      raise NotImplementedError(
+          "Support for non-UTC timestamps is not implemented: %s" % filename)
+    timestamp = pytz.utc.localize(dt).timestamp()
+    if first_timestamp is None or timestamp < first_timestamp:
+      first_timestamp = timestamp
+    if last_timestamp is None or timestamp > last_timestamp:
+      last_timestamp = timestamp
+    if filename.endswith("-SessionEnd.bin"):
+      session_metadata = metadata_pb2.SessionMetadata()
+      with open(file_path, "rb") as f:
+        session_metadata.ParseFromString(f.read())
+      timezone = session_metadata.timezone
+      is_session_complete = True
+    elif filename.endswith("-Keypresses.protobuf"):
+      keypresses = keypresses_pb2.KeyPresses()
+      with open(file_path, "rb") as f:
+        keypresses.ParseFromString(f.read())
+      num_keypresses += len(keypresses.keyPresses)
+  if first_timestamp is None:
+    raise ValueError("Found no raw data files in %s" % session_dir)
+  return {
+      "version": MANIFEST_VERSION,
+      "is_session_complete": is_session_complete,
+      "timezone": timezone,
+      "first_timestamp": first_timestamp,
+      "last_timestamp": last_timestamp,
+      "num_keypresses": num_keypresses,
+      "num_audio_files": stream_file_counts.get("MicWaveIn", 0),
+      "num_screenshots": stream_file_counts.get("Screenshot", 0),
+      "stream_file_counts": stream_file_counts,
+      "stream_bytes": stream_bytes,
+  }
+
+
+def write_manifest(session_dir):
+  """Compute the manifest of a session directory and write it to the directory.
+
+  Returns:
+    Path to the manifest JSON file.
+  """
+  manifest = compute_manifest(session_dir)
+  manifest_path = os.path.join(session_dir, file_naming.MANIFEST_JSON_FILENAME)
+  with open(manifest_path, "wt") as f:
+    json.dump(manifest, f, indent=2)
+  print("Wrote session manifest to %s" % manifest_path)
+  return manifest_path
+
+
+def parse_manifest(manifest_json):
+  """Parse the content of a manifest file.
+
+  Args:
+    manifest_json: Content of the manifest JSON file, as a str or bytes.
+
+  Returns:
+    The manifest as a dict.
+
+  Raises:
+    ValueError: if the manifest version is unsupported.
+  """
+  manifest = json.loads(manifest_json)
+  if manifest.get("version") != MANIFEST_VERSION:
+    raise ValueError(
+        "Unsupported manifest version: %s" % manifest.get("version"))
+  return manifest
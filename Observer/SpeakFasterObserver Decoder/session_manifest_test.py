@@ -0,0 +1,105 @@
+"""Unit tests for the session_manifest module."""
+import json
+import os
+import tempfile
+
+from google import protobuf
+import tensorflow as tf
+
+import file_naming
+import keypresses_pb2
+import metadata_pb2
+import session_manifest
+
+
+def _write_keypresses(file_path, num_keypresses):
+  keypresses = keypresses_pb2.KeyPresses()
+  for i in range(num_keypresses):
+    timestamp = protobuf.timestamp_pb2.Timestamp()
+    timestamp.FromMilliseconds(i * 1000)
+    keypresses.keyPresses.append(
+        keypresses_pb2.KeyPress(KeyPress="A", Timestamp=timestamp))
+  with open(file_path, "wb") as f:
+    f.write(keypresses.SerializeToString())
+
+
+def _write_session_end(file_path, timezone):
+  session_metadata = metadata_pb2.SessionMetadata()
+  session_metadata.timezone = timezone
+  with open(file_path, "wb") as f:
+    f.write(session_metadata.SerializeToString())
+
+
+class SessionManifestTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(SessionManifestTest, self).setUp()
+    self._session_dir = tempfile.mkdtemp()
+
+  def _write_bytes(self, filename, num_bytes):
+    with open(os.path.join(self._session_dir, filename), "wb") as f:
+      f.write(b"\x00" * num_bytes)
+
+  def testComputeManifest_completeSession(self):
+    _write_keypresses(os.path.join(
+        self._session_dir, "20211117T202235000Z-Keypresses.protobuf"), 3)
+    _write_keypresses(os.path.join(
+        self._session_dir, "20211117T202335000Z-Keypresses.protobuf"), 4)
+    _write_session_end(os.path.join(
+        self._session_dir, "20211117T203235000Z-SessionEnd.bin"),
+        "Eastern Time (US & Canada)")
+    self._write_bytes("20211117T202236000Z-MicWaveIn.flac", 100)
+    self._write_bytes("20211117T202336000Z-MicWaveIn.flac", 50)
+    self._write_bytes("20211117T202237000Z-Screenshot.jpg", 10)
+    # Derived files are ignored.
+    self._write_bytes(file_naming.MERGED_TSV_FILENAME, 1000)
+    self._write_bytes(file_naming.CONCATENATED_AUDIO_FILENAME, 1000)
+    self._write_bytes("curation.eaf", 1000)
+
+    manifest = session_manifest.compute_manifest(self._session_dir)
+    self.assertEqual(manifest["version"], session_manifest.MANIFEST_VERSION)
+    self.assertTrue(manifest["is_session_complete"])
+    self.assertEqual(manifest["timezone"], "Eastern Time (US & Canada)")
+    self.assertEqual(manifest["num_keypresses"], 7)
+    self.assertEqual(manifest["num_audio_files"], 2)
+    self.assertEqual(manifest["num_screenshots"], 1)
+    self.assertEqual(manifest["last_timestamp"] - manifest["first_timestamp"],
+                     600)
+    # 2021-11-17T20:22:35Z.
+    self.assertEqual(manifest["first_timestamp"], 1637180555.0)
+    self.assertEqual(manifest["stream_file_counts"], {
+        "Keypresses": 2, "MicWaveIn": 2, "Screenshot": 1, "SessionEnd": 1})
+    self.assertEqual(manifest["stream_bytes"]["MicWaveIn"], 150)
+    self.assertEqual(manifest["stream_bytes"]["Screenshot"], 10)
+
+  def testComputeManifest_incompleteSession(self):
+    _write_keypresses(os.path.join(
+        self._session_dir, "20211117T202235000Z-Keypresses.protobuf"), 3)
+    manifest = session_manifest.compute_manifest(self._session_dir)
+    self.assertFalse(manifest["is_session_complete"])
+    self.assertIsNone(manifest["timezone"])
+    self.assertEqual(manifest["num_keypresses"], 3)
+
+  def testComputeManifest_noRawDataRaisesValueError(self):
+    self._write_bytes(file_naming.MERGED_TSV_FILENAME, 1000)
+    with self.assertRaisesRegex(ValueError, r"Found no raw data files"):
+      session_manifest.compute_manifest(self._session_dir)
+
+  def testWriteAndParseManifest(self):
+    _write_keypresses(os.path.join(
+        self._session_dir, "20211117T202235000Z-Keypresses.protobuf"), 3)
+    manifest_path = session_manifest.write_manifest(self._session_dir)
+    self.assertEqual(os.path.basename(manifest_path),
+                     file_naming.MANIFEST_JSON_FILENAME)
+    with open(manifest_path, "rb") as f:
+      manifest = session_manifest.parse_manifest(f.read())
+    self.assertEqual(manifest,
+                     session_manifest.compute_manifest(self._session_dir))
+
+  def testParseManifest_unsupportedVersionRaisesValueError(self):
+    with self.assertRaisesRegex(ValueError, r"Unsupported manifest version"):
+      session_manifest.parse_manifest(json.dumps({"version": 999}))
+
+
+if __name__ == "__main__":
+  tf.test.main()